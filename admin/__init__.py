@@ -0,0 +1,3 @@
+from admin.routes import admin_routes
+
+__all__ = ['admin_routes']
@@ -0,0 +1,80 @@
+import os
+
+from flask import Blueprint, abort, current_app, jsonify, render_template, request, send_file
+from flask_login import current_user, login_required
+
+import analytics
+import fares
+from booking_events import CONFIRMED, can_transition, normalize_status, transition
+from models import db, Booking
+from sharding import locate, shard_context
+
+admin_routes = Blueprint('admin', __name__, url_prefix='/admin')
+
+# Same convention as booking_confirmation and the bookings API
+ADMIN_USER_ID = 1
+MAX_DAYS = 366
+
+
+@admin_routes.before_request
+@login_required
+def admin_required():
+    # Gates every route on the blueprint, including ones added later
+    if current_user.id != ADMIN_USER_ID:
+        abort(403)
+
+
+def _days():
+    days = request.args.get('days', current_app.config.get('ANALYTICS_CHART_DAYS', 30), type=int)
+    return max(1, min(days, MAX_DAYS))
+
+
+@admin_routes.route('/analytics')
+def analytics_dashboard():
+    return render_template('admin/analytics.html', data=analytics.dashboard_data(_days()),
+                           charts=analytics.CHARTS)
+
+
+@admin_routes.route('/analytics/data')
+def analytics_data():
+    return jsonify(analytics.dashboard_data(_days()))
+
+
+@admin_routes.route('/analytics/charts/<name>.png')
+def analytics_chart(name):
+    if name not in analytics.CHARTS:
+        abort(404)
+    path = analytics.chart_path(name)
+    if not os.path.exists(path):
+        # Not drawn yet: ask the job worker and let the browser retry
+        analytics.request_render()
+        db.session.commit()
+        response = jsonify({'message': 'Chart is being rendered'})
+        response.status_code = 503
+        response.headers['Retry-After'] = '30'
+        return response
+    return send_file(path, mimetype='image/png', conditional=True, etag=True, max_age=60)
+
+
+@admin_routes.route('/fares/reprice', methods=['POST'])
+def reprice_fares():
+    """Re-quote every upcoming booking in the job worker."""
+    queued = fares.request_repricing()
+    db.session.commit()
+    return jsonify({'queued': queued}), 202
+
+
+@admin_routes.route('/bookings/<int:booking_id>/confirm', methods=['POST'])
+def confirm_booking(booking_id):
+    """Confirm a pending booking; the email consumer sends the confirmation."""
+    shard = locate(Booking, [booking_id]).get(booking_id)
+    if shard is None:
+        abort(404)
+    with shard_context(shard):
+        booking = db.session.get(Booking, booking_id)
+        if not can_transition(booking.status, CONFIRMED):
+            status = normalize_status(booking.status)
+            return jsonify({'success': False, 'message': f'Booking is already {status}'}), 409
+        transition(booking, CONFIRMED)
+        db.session.commit()
+    return jsonify({'success': True, 'status': CONFIRMED})
@@ -0,0 +1,321 @@
+import os
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import delete, func, insert, select
+
+from lazy_imports import is_available, lazy_import
+from models import db, Booking
+from scheduler import Job, JOB_QUEUED, enqueue, periodic
+from sharding import scatter
+
+
+def _use_agg():
+    import matplotlib
+    matplotlib.use('Agg')
+
+
+plt = lazy_import('matplotlib.pyplot', setup=_use_agg)
+
+# -------------------------
+#      BOOKING ROLLUPS
+# -------------------------
+#
+# Bookings are counted into hourly buckets by creation time, one row per
+# (hour, dimension, value), and daily rows are summed from the hourly ones.
+# Dimensions:
+#   all          value '' - total bookings and passengers
+#   destination  booking destination
+#   station      pickup location
+#   status       current status, lower-cased
+#
+# A refresh only recomputes the hours that hold bookings created or
+# updated since the last run (Booking.updated_at), so its cost follows the
+# write rate, not the size of the table. Deleted bookings are not noticed
+# until their hour is recomputed for another reason. With region shards
+# the bookings are read from every shard; the rollups stay in the default
+# database.
+
+PERIOD_HOUR = 'hour'
+PERIOD_DAY = 'day'
+HOUR = timedelta(hours=1)
+DAY = timedelta(days=1)
+# Re-read a little before the watermark so commits that raced the last run are seen
+WATERMARK_OVERLAP = timedelta(minutes=2)
+
+
+class BookingRollup(db.Model):
+    __tablename__ = 'booking_rollup'
+    __table_args__ = (
+        db.UniqueConstraint('period', 'dimension', 'bucket', 'value', name='uq_booking_rollup'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    period = db.Column(db.String(4), nullable=False)
+    bucket = db.Column(db.DateTime, nullable=False)
+    dimension = db.Column(db.String(16), nullable=False)
+    value = db.Column(db.String(150), nullable=False, default='')
+    bookings = db.Column(db.Integer, nullable=False, default=0)
+    passengers = db.Column(db.Integer, nullable=False, default=0)
+
+
+class RollupState(db.Model):
+    """How far the rollups have been brought up to date."""
+    __tablename__ = 'rollup_state'
+
+    name = db.Column(db.String(32), primary_key=True)
+    watermark = db.Column(db.DateTime, nullable=False)
+
+
+def hour_start(moment):
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+def day_start(moment):
+    return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _ranges(starts, step):
+    """Merge sorted bucket starts into contiguous [start, end) ranges."""
+    ranges = []
+    for start in sorted(starts):
+        if ranges and ranges[-1][1] == start:
+            ranges[-1][1] = start + step
+        else:
+            ranges.append([start, start + step])
+    return ranges
+
+
+def _dimension_values(row):
+    return (
+        ('all', ''),
+        ('destination', row.destination),
+        ('station', row.location),
+        ('status', (row.status or '').lower()),
+    )
+
+
+def _replace_buckets(period, start, end, totals):
+    db.session.execute(
+        delete(BookingRollup).where(
+            BookingRollup.period == period,
+            BookingRollup.bucket >= start, BookingRollup.bucket < end
+        )
+    )
+    if totals:
+        db.session.execute(insert(BookingRollup), [
+            {'period': period, 'bucket': bucket, 'dimension': dimension, 'value': value,
+             'bookings': counts[0], 'passengers': counts[1]}
+            for (bucket, dimension, value), counts in totals.items()
+        ])
+
+
+def rebuild_hours(start, end):
+    """Recompute the hourly rows for bookings created in [start, end)."""
+    totals = {}
+    rows = scatter(
+        select(Booking.created_at, Booking.destination, Booking.location, Booking.status, Booking.passengers)
+        .where(Booking.created_at >= start, Booking.created_at < end)
+    )
+    for row in rows:
+        bucket = hour_start(row.created_at)
+        for dimension, value in _dimension_values(row):
+            counts = totals.setdefault((bucket, dimension, value), [0, 0])
+            counts[0] += 1
+            counts[1] += row.passengers or 0
+    _replace_buckets(PERIOD_HOUR, start, end, totals)
+
+
+def rebuild_days(start, end):
+    """Recompute the daily rows in [start, end) from the hourly ones."""
+    totals = {}
+    rows = db.session.execute(
+        select(BookingRollup.bucket, BookingRollup.dimension, BookingRollup.value,
+               BookingRollup.bookings, BookingRollup.passengers)
+        .where(
+            BookingRollup.period == PERIOD_HOUR,
+            BookingRollup.bucket >= start, BookingRollup.bucket < end
+        )
+    )
+    for row in rows:
+        counts = totals.setdefault((day_start(row.bucket), row.dimension, row.value), [0, 0])
+        counts[0] += row.bookings
+        counts[1] += row.passengers
+    _replace_buckets(PERIOD_DAY, start, end, totals)
+
+
+def refresh_rollups(now=None):
+    """Bring the rollups up to date; returns the number of hours recomputed.
+
+    The first run has no watermark and rolls up every booking.
+    """
+    now = now or datetime.utcnow()
+    state = db.session.get(RollupState, 'bookings')
+    query = select(Booking.created_at)
+    if state is not None:
+        query = query.where(Booking.updated_at > state.watermark - WATERMARK_OVERLAP)
+    hours = {hour_start(created_at) for created_at, in scatter(query) if created_at}
+
+    for start, end in _ranges(hours, HOUR):
+        rebuild_hours(start, end)
+    for start, end in _ranges({day_start(hour) for hour in hours}, DAY):
+        rebuild_days(start, end)
+
+    if state is None:
+        db.session.add(RollupState(name='bookings', watermark=now))
+    else:
+        state.watermark = now
+    db.session.commit()
+    return len(hours)
+
+
+@periodic('*/5 * * * *', name='refresh_booking_rollups', lease_seconds=600)
+def refresh_booking_rollups():
+    """Roll up recent booking changes and redraw the charts if anything moved."""
+    hours = refresh_rollups()
+    if hours:
+        request_render()
+        db.session.commit()
+    return hours
+
+
+# -------------------------
+#       ROLLUP QUERIES
+# -------------------------
+
+def daily_series(days, dimension='all', value='', today=None):
+    """(day, bookings, passengers) for the last ``days`` days, zero-filled."""
+    today = day_start(today or datetime.utcnow())
+    first = today - timedelta(days=days - 1)
+    rows = db.session.execute(
+        select(BookingRollup.bucket, BookingRollup.bookings, BookingRollup.passengers)
+        .where(
+            BookingRollup.period == PERIOD_DAY, BookingRollup.dimension == dimension,
+            BookingRollup.value == value, BookingRollup.bucket >= first
+        )
+    )
+    found = {row.bucket: (row.bookings, row.passengers) for row in rows}
+    return [
+        (day, *found.get(day, (0, 0)))
+        for day in (first + timedelta(days=n) for n in range(days))
+    ]
+
+
+def top_values(dimension, days, limit=10, today=None):
+    """(value, bookings, passengers) with the most bookings over the last ``days`` days."""
+    first = day_start(today or datetime.utcnow()) - timedelta(days=days - 1)
+    bookings = func.sum(BookingRollup.bookings)
+    return db.session.execute(
+        select(BookingRollup.value, bookings, func.sum(BookingRollup.passengers))
+        .where(
+            BookingRollup.period == PERIOD_DAY, BookingRollup.dimension == dimension,
+            BookingRollup.bucket >= first
+        )
+        .group_by(BookingRollup.value)
+        .order_by(bookings.desc(), BookingRollup.value)
+        .limit(limit)
+    ).all()
+
+
+def dashboard_data(days=30, today=None):
+    """Everything the admin dashboard shows, read from the daily rollups only."""
+    series = daily_series(days, today=today)
+
+    def ranked(dimension, limit=10):
+        return [
+            {'value': value, 'bookings': count, 'passengers': passengers}
+            for value, count, passengers in top_values(dimension, days, limit, today=today)
+        ]
+
+    return {
+        'days': days,
+        'daily': [
+            {'date': day.date().isoformat(), 'bookings': count, 'passengers': passengers}
+            for day, count, passengers in series
+        ],
+        'totals': {
+            'bookings': sum(row[1] for row in series),
+            'passengers': sum(row[2] for row in series),
+        },
+        'destinations': ranked('destination'),
+        'stations': ranked('station'),
+        'statuses': ranked('status', limit=None),
+    }
+
+
+# -------------------------
+#       CHART IMAGES
+# -------------------------
+#
+# PNGs are drawn by a background job into ANALYTICS_CHART_DIR and served as
+# static files, so matplotlib never runs on a request.
+
+CHARTS = ('bookings_per_day', 'passengers_per_day', 'top_destinations', 'top_stations', 'bookings_by_status')
+
+
+def chart_dir(app=None):
+    app = app or current_app
+    return app.config.get('ANALYTICS_CHART_DIR') or os.path.join(app.instance_path, 'analytics_charts')
+
+
+def chart_path(name, app=None):
+    if name not in CHARTS:
+        raise KeyError(f"Unknown chart: {name}")
+    return os.path.join(chart_dir(app), f'{name}.png')
+
+
+def _draw(name, data):
+    fig, ax = plt.subplots(figsize=(8, 3.5), dpi=100)
+    if name in ('bookings_per_day', 'passengers_per_day'):
+        key = name.split('_')[0]
+        days = [row['date'][5:] for row in data['daily']]
+        ax.bar(days, [row[key] for row in data['daily']], color='#0d6efd')
+        ax.set_ylabel(key.title())
+        ax.tick_params(axis='x', labelrotation=90, labelsize=7)
+    else:
+        rows = data[{'top_destinations': 'destinations', 'top_stations': 'stations',
+                     'bookings_by_status': 'statuses'}[name]]
+        ax.barh([row['value'] or '(none)' for row in rows][::-1],
+                [row['bookings'] for row in rows][::-1], color='#198754')
+        ax.set_xlabel('Bookings')
+    ax.set_title(name.replace('_', ' ').capitalize())
+    fig.tight_layout()
+    return fig
+
+
+def render_charts(days=None):
+    """Draw every chart from the rollups; returns the names written."""
+    days = days or current_app.config.get('ANALYTICS_CHART_DAYS', 30)
+    data = dashboard_data(days)
+    directory = chart_dir()
+    os.makedirs(directory, exist_ok=True)
+    written = []
+    for name in CHARTS:
+        fig = _draw(name, data)
+        path = chart_path(name)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        try:
+            fig.savefig(tmp_path, format='png')
+        finally:
+            plt.close(fig)
+        os.replace(tmp_path, path)
+        written.append(name)
+    return written
+
+
+@periodic('7 * * * *', name='render_analytics_charts', lease_seconds=300)
+def render_analytics_charts():
+    """Redraw the admin charts (hourly, and after rollups change)."""
+    if not is_available('matplotlib'):
+        current_app.logger.warning("matplotlib is not installed; analytics charts are not rendered")
+        return 0
+    return len(render_charts())
+
+
+def request_render():
+    """Queue a chart redraw unless one is already waiting; commit to send it."""
+    pending = db.session.execute(
+        select(Job.id).where(Job.name == 'render_analytics_charts', Job.status == JOB_QUEUED).limit(1)
+    ).first()
+    if pending is None:
+        enqueue('render_analytics_charts')
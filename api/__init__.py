@@ -0,0 +1,3 @@
+from api.routes import api_routes
+
+__all__ = ['api_routes']
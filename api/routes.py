@@ -0,0 +1,389 @@
+from datetime import datetime, timedelta
+
+from flask import Blueprint, Response, request, current_app
+from werkzeug.exceptions import TooManyRequests, ServiceUnavailable
+from flask_login import login_required, current_user
+from sqlalchemy import select, insert
+
+import async_support
+from models import db, Ride, Booking, user_ride
+from geo_search import rides_within, nearest_rides
+from destinations import get_index
+from ride_snapshot import request_rebuild
+from ride_feed import record_ride_changes
+from sharding import locate, parse_cursor, scatter, shard_context
+from rate_limit import rate_limit, admission_control
+from booking_events import (
+    CANCELLED, bulk_transition, can_transition, normalize_status, latest_event_id, wait_for_events
+)
+import booking_summary  # noqa: F401 - keeps per-user summaries current
+from fares import InvalidItinerary, quote_itineraries
+from api.serializers import (
+    RIDE_FIELDS, BOOKING_FIELDS, InvalidInput, parse_fields, columns_for,
+    serialize_rows, dumps, maybe_gzip
+)
+
+api_routes = Blueprint('api', __name__, url_prefix='/api/v1')
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+MAX_BATCH = 500
+MAX_FEED_WAIT = 30
+
+
+def json_response(payload, status=200):
+    return Response(dumps(payload), status=status, mimetype='application/json')
+
+
+def error_response(message, status):
+    return json_response({'error': message}, status)
+
+
+@api_routes.after_request
+def compress(response):
+    return maybe_gzip(response, current_app.config.get('API_GZIP_MIN_BYTES', 1024))
+
+
+@api_routes.errorhandler(InvalidInput)
+def bad_request(e):
+    return error_response(str(e), 400)
+
+
+@api_routes.errorhandler(TooManyRequests)
+@api_routes.errorhandler(ServiceUnavailable)
+def overloaded(e):
+    response = error_response(e.description, e.code)
+    response.headers['Retry-After'] = e.retry_after
+    return response
+
+
+def _page_args():
+    limit = request.args.get('limit', DEFAULT_LIMIT, type=int)
+    after = request.args.get('after', 0, type=int)
+    return max(1, min(limit, MAX_LIMIT)), after
+
+
+def _list(model, available, base_filters=()):
+    """Keyset-paginated listing with sparse fieldsets for any resource."""
+    fields = parse_fields(request.args.get('fields'), available)
+    limit, after = _page_args()
+    query = (
+        select(*columns_for(fields, available))
+        .where(model.id > after, *base_filters)
+        .order_by(model.id)
+        .limit(limit)
+    )
+    # Each shard returns its first ``limit`` rows after the cursor; the page is the first of those
+    rows = sorted(scatter(query), key=lambda row: row[0])[:limit]
+    next_cursor = rows[-1][0] if len(rows) == limit else None
+    return json_response({
+        'data': serialize_rows(rows, fields, compact=request.args.get('format') == 'compact'),
+        'next': next_cursor
+    })
+
+
+def _batch_ids(key):
+    """Read a de-duplicated list of integer ids from the JSON body."""
+    data = request.get_json(silent=True) or {}
+    ids = data.get(key)
+    if not isinstance(ids, list) or not ids:
+        raise InvalidInput(f"'{key}' must be a non-empty list of ids")
+    if len(ids) > MAX_BATCH:
+        raise InvalidInput(f"At most {MAX_BATCH} ids per request")
+    try:
+        return list(dict.fromkeys(int(i) for i in ids))
+    except (TypeError, ValueError):
+        raise InvalidInput(f"'{key}' must contain integer ids")
+
+
+def _batch_response(results):
+    summary = {}
+    for item in results:
+        summary[item['result']] = summary.get(item['result'], 0) + 1
+    return json_response({'results': results, 'summary': summary})
+
+
+def _detail(model, available, object_id, base_filters=()):
+    fields = parse_fields(request.args.get('fields'), available)
+    rows = scatter(select(*columns_for(fields, available)).where(model.id == object_id, *base_filters))
+    if not rows:
+        return error_response('Not found', 404)
+    return json_response({'data': serialize_rows(rows[:1], fields)[0]})
+
+
+# -------------------------
+#          RIDES
+# -------------------------
+
+def _ride_filters():
+    filters = []
+    dest = request.args.get('destination')
+    loc = request.args.get('location')
+    if dest:
+        filters.append(Ride.destination.ilike(f"%{dest}%"))
+    if loc:
+        filters.append(Ride.location.ilike(f"%{loc}%"))
+    return filters
+
+
+@api_routes.route('/rides')
+def list_rides():
+    return _list(Ride, RIDE_FIELDS, _ride_filters())
+
+
+@api_routes.route('/rides/nearby')
+def nearby_rides():
+    """Rides starting closest to ``lat``/``lon``.
+
+    With ``radius`` (km) returns every ride inside it, nearest first, up to
+    ``k``; without it returns the ``k`` nearest within 50 km.
+    """
+    lat = request.args.get('lat', type=float)
+    lon = request.args.get('lon', type=float)
+    if lat is None or lon is None or not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        raise InvalidInput("'lat' and 'lon' are required coordinates")
+    k = max(1, min(request.args.get('k', 10, type=int), MAX_LIMIT))
+    radius = request.args.get('radius', type=float)
+    if radius is not None:
+        hits = rides_within(lat, lon, min(radius, 50.0), limit=k)
+    else:
+        hits = nearest_rides(lat, lon, k)
+
+    fields = parse_fields(request.args.get('fields'), RIDE_FIELDS)
+    rows = scatter(
+        select(*columns_for(fields, RIDE_FIELDS)).where(Ride.id.in_([ride_id for ride_id, _ in hits]))
+    ) if hits else []
+    by_id = {row[0]: item for row, item in zip(rows, serialize_rows(rows, fields))}
+    data = []
+    for ride_id, distance in hits:
+        item = by_id.get(ride_id)
+        if item is not None:
+            item['distance_km'] = round(distance, 3)
+            data.append(item)
+    return json_response({'data': data})
+
+
+@api_routes.route('/rides/<int:ride_id>')
+def get_ride(ride_id):
+    return _detail(Ride, RIDE_FIELDS, ride_id)
+
+
+@api_routes.route('/rides/join', methods=['POST'])
+@login_required
+@rate_limit('api_join', 30)
+@admission_control
+def join_rides():
+    """Join several rides in one transaction.
+
+    Body: ``{"ride_ids": [1, 2, 3]}``. Each id gets its own result:
+    ``joined``, ``already_joined`` or ``not_found``.
+    """
+    ride_ids = _batch_ids('ride_ids')
+    # Memberships live on the ride's shard
+    shards = locate(Ride, ride_ids)
+    joined = {ride_id for ride_id, in scatter(
+        select(user_ride.c.ride_id)
+        .where(user_ride.c.user_id == current_user.id, user_ride.c.ride_id.in_(ride_ids))
+    )}
+
+    results = []
+    to_join = []
+    for ride_id in ride_ids:
+        if ride_id not in shards:
+            results.append({'id': ride_id, 'result': 'not_found'})
+        elif ride_id in joined:
+            results.append({'id': ride_id, 'result': 'already_joined'})
+        else:
+            to_join.append({'user_id': current_user.id, 'ride_id': ride_id})
+            results.append({'id': ride_id, 'result': 'joined'})
+
+    if to_join:
+        by_shard = {}
+        for row in to_join:
+            by_shard.setdefault(shards[row['ride_id']], []).append(row)
+        for shard, rows in by_shard.items():
+            with shard_context(shard):
+                db.session.execute(insert(user_ride), rows)
+                record_ride_changes(row['ride_id'] for row in rows)
+                db.session.commit()
+        request_rebuild()
+    db.session.commit()
+    return _batch_response(results)
+
+
+# -------------------------
+#         BOOKINGS
+# -------------------------
+
+@api_routes.route('/bookings')
+@login_required
+def list_bookings():
+    filters = [Booking.user_id == current_user.id]
+    status = request.args.get('status')
+    if status:
+        filters.append(Booking.status == status)
+    return _list(Booking, BOOKING_FIELDS, filters)
+
+
+@api_routes.route('/bookings/<int:booking_id>')
+@login_required
+def get_booking(booking_id):
+    return _detail(Booking, BOOKING_FIELDS, booking_id, [Booking.user_id == current_user.id])
+
+
+@api_routes.route('/bookings/changes')
+@login_required
+def booking_changes():
+    """Booking events after ``since``, for clients that sync incrementally.
+
+    Without ``since`` only the current cursor is returned: list bookings
+    once, then follow the feed from there. With ``wait`` (seconds, up to 30)
+    async workers hold the request until an event arrives; sync workers
+    answer at once and ``retry_after`` tells the client when to ask again.
+    The admin sees every booking's events, other users their own. Cursors
+    are opaque (one position per shard when sharded): send ``next`` back
+    as ``since``.
+    """
+    user_id = None if current_user.id == 1 else current_user.id
+    since = request.args.get('since')
+    if parse_cursor(since) is None:
+        return json_response({'events': [], 'next': latest_event_id(user_id)})
+    limit, _ = _page_args()
+    wait = max(0, min(request.args.get('wait', 0, type=int), MAX_FEED_WAIT))
+    events, cursor = wait_for_events(since, wait, limit=limit, user_id=user_id)
+    return json_response({
+        'events': events,
+        'next': cursor,
+        'retry_after': 0 if events or async_support.is_green() else 5
+    })
+
+
+def _cancel_result(booking, cutoff):
+    # Owners may cancel their bookings; user 1 is the admin (as in booking_confirmation)
+    if booking.user_id != current_user.id and current_user.id != 1:
+        return 'forbidden'
+    if normalize_status(booking.status) == CANCELLED:
+        return 'already_cancelled'
+    if not can_transition(booking.status, CANCELLED):
+        return 'not_cancellable'
+    if datetime.combine(booking.travel_date, booking.travel_time) <= cutoff:
+        return 'too_late'
+    return 'cancelled'
+
+
+@api_routes.route('/bookings/cancel', methods=['POST'])
+@login_required
+@rate_limit('api_cancel', 30)
+@admission_control
+def cancel_bookings():
+    """Cancel several bookings with one bulk update and one commit.
+
+    Body: ``{"booking_ids": [1, 2, 3]}``. Per-id results are ``cancelled``,
+    ``already_cancelled``, ``not_cancellable`` (e.g. expired), ``too_late``
+    (under 2 hours to travel), ``forbidden`` or ``not_found``.
+    """
+    booking_ids = _batch_ids('booking_ids')
+    shards = locate(Booking, booking_ids)
+    rows = {
+        row.id: row for row in scatter(
+            select(Booking.id, Booking.user_id, Booking.status, Booking.travel_date, Booking.travel_time)
+            .where(Booking.id.in_(booking_ids))
+        )
+    }
+
+    cutoff = datetime.now() + timedelta(hours=2)
+    results = []
+    to_cancel = []
+    for booking_id in booking_ids:
+        booking = rows.get(booking_id)
+        result = _cancel_result(booking, cutoff) if booking else 'not_found'
+        if result == 'cancelled':
+            to_cancel.append(booking_id)
+        results.append({'id': booking_id, 'result': result})
+
+    by_shard = {}
+    for booking_id in to_cancel:
+        by_shard.setdefault(shards[booking_id], []).append(booking_id)
+    for shard, ids in by_shard.items():
+        with shard_context(shard):
+            bulk_transition(CANCELLED, Booking.id.in_(ids))
+            db.session.commit()
+    db.session.commit()
+    return _batch_response(results)
+
+
+# -------------------------
+#          FARES
+# -------------------------
+
+@api_routes.route('/fares/quote', methods=['POST'])
+@rate_limit('api_quote', 60)
+def quote_fares():
+    """Price many itineraries in one call.
+
+    Body: ``{"itineraries": [{"location", "destination", "passengers",
+    "travel_date", "travel_time"}, ...]}``. ``quotes`` holds one amount in
+    paise per itinerary, in order, or null for an unknown station.
+    """
+    data = request.get_json(silent=True) or {}
+    itineraries = data.get('itineraries')
+    max_items = current_app.config.get('FARE_QUOTE_MAX_ITEMS', 5000)
+    if not isinstance(itineraries, list) or not itineraries:
+        raise InvalidInput("'itineraries' must be a non-empty list")
+    if len(itineraries) > max_items:
+        raise InvalidInput(f"At most {max_items} itineraries per request")
+    if not all(isinstance(item, dict) for item in itineraries):
+        raise InvalidInput("Each itinerary must be an object")
+    try:
+        quotes = quote_itineraries(itineraries)
+    except InvalidItinerary as e:
+        raise InvalidInput(str(e))
+    return json_response({'currency': 'INR', 'quotes': quotes})
+
+
+# -------------------------
+#          GROUPS
+# -------------------------
+
+@api_routes.route('/groups')
+def list_groups():
+    """Rides grouped by destination, the API counterpart of ``/groups``.
+
+    Paged by ride id like the other lists: a page groups at most ``limit``
+    rides, so a destination can continue on the next page.
+    """
+    fields = parse_fields(request.args.get('fields'), RIDE_FIELDS)
+    limit, after = _page_args()
+    query = (
+        select(*columns_for(fields, RIDE_FIELDS), Ride.destination.label('group_key'))
+        .where(Ride.id > after, *_ride_filters())
+        .order_by(Ride.id)
+        .limit(limit)
+    )
+    rows = sorted(scatter(query), key=lambda row: row[0])[:limit]
+
+    groups = {}
+    for row, item in zip(rows, serialize_rows(rows, fields)):
+        groups.setdefault(row.group_key, []).append(item)
+    return json_response({
+        'data': dict(sorted(groups.items())),
+        'next': rows[-1][0] if len(rows) == limit else None
+    })
+
+
+# -------------------------
+#       DESTINATIONS
+# -------------------------
+
+@api_routes.route('/destinations/autocomplete')
+def autocomplete_destinations():
+    """Canonical destination names for a partially typed ``q``.
+
+    Served from the in-memory index, so typing does not hit the database.
+    Misspelled input falls back to trigram matches.
+    """
+    limit = max(1, min(request.args.get('limit', 8, type=int), 20))
+    suggestions = get_index().suggest(request.args.get('q', ''), limit)
+    response = json_response({'data': suggestions})
+    response.headers['Cache-Control'] = 'public, max-age=60'
+    return response
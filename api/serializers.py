@@ -0,0 +1,142 @@
+import gzip
+import json
+from datetime import date, datetime, time
+from functools import lru_cache
+
+try:
+    import orjson
+except ImportError:  # optional, falls back to the stdlib encoder
+    orjson = None
+
+from models import Ride, Booking
+
+
+class InvalidInput(ValueError):
+    """Malformed query arguments or body; the API answers it with 400."""
+
+
+# -------------------------
+#     RESOURCE FIELDS
+# -------------------------
+
+# Public field name -> column. Queries select only the requested columns, so
+# sparse fieldsets also shrink the SQL result, not just the JSON.
+RIDE_FIELDS = {
+    'id': Ride.id,
+    'driver_id': Ride.driver_id,
+    'name': Ride.name,
+    'location': Ride.location,
+    'destination': Ride.destination,
+    'contact': Ride.contact,
+    'created_at': Ride.created_at,
+}
+
+BOOKING_FIELDS = {
+    'id': Booking.id,
+    'user_id': Booking.user_id,
+    'name': Booking.name,
+    'location': Booking.location,
+    'destination': Booking.destination,
+    'travel_date': Booking.travel_date,
+    'travel_time': Booking.travel_time,
+    'passengers': Booking.passengers,
+    'contact': Booking.contact,
+    'status': Booking.status,
+    'fare': Booking.fare,
+    'created_at': Booking.created_at,
+}
+
+
+def parse_fields(raw, available, required=('id',)):
+    """Turn ``?fields=a,b`` into an ordered tuple of valid field names.
+
+    Required fields (the id, used for cursors) are always included. Raises
+    InvalidInput for unknown names.
+    """
+    if not raw:
+        return tuple(available)
+    requested = [f.strip() for f in raw.split(',') if f.strip()]
+    unknown = [f for f in requested if f not in available]
+    if unknown:
+        raise InvalidInput(f"Unknown fields: {', '.join(unknown)}")
+    fields = list(required)
+    fields += [f for f in requested if f not in fields]
+    return tuple(fields)
+
+
+def columns_for(fields, available):
+    return [available[name].label(name) for name in fields]
+
+
+# -------------------------
+#   COMPILED SERIALIZERS
+# -------------------------
+
+@lru_cache(maxsize=256)
+def row_serializer(fields, native_temporal=True):
+    """Build a function turning a result row (tuple) into a dict for ``fields``.
+
+    The function is generated once per field set as a single dict literal,
+    so serializing a row is one call with no per-field loop or lookups.
+    When the encoder can't handle dates/times natively every value is passed
+    through ``_iso`` instead.
+    """
+    if native_temporal:
+        items = ', '.join(f'{name!r}: row[{i}]' for i, name in enumerate(fields))
+    else:
+        items = ', '.join(f'{name!r}: _conv(row[{i}])' for i, name in enumerate(fields))
+    namespace = {'_conv': _convert}
+    exec(f'def serialize(row):\n    return {{{items}}}\n', namespace)
+    return namespace['serialize']
+
+
+def _convert(value):
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    return value
+
+
+def serialize_rows(rows, fields, compact=False):
+    """Serialize result rows as objects, or as ``{fields, rows}`` when compact."""
+    native = orjson is not None
+    if compact:
+        if native:
+            return {'fields': list(fields), 'rows': [tuple(row) for row in rows]}
+        return {'fields': list(fields), 'rows': [[_convert(v) for v in row] for row in rows]}
+    serialize = row_serializer(fields, native)
+    return [serialize(row) for row in rows]
+
+
+# -------------------------
+#         ENCODING
+# -------------------------
+
+def _default(value):
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(payload):
+    """Encode ``payload`` to compact JSON bytes."""
+    if orjson is not None:
+        return orjson.dumps(payload, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(payload, default=_default, separators=(',', ':')).encode('utf-8')
+
+
+def maybe_gzip(response, min_size, level=5):
+    """Gzip a response body in place when it is large and the client accepts it."""
+    from flask import request
+    if (response.direct_passthrough
+            or response.status_code < 200 or response.status_code >= 300
+            or 'Content-Encoding' in response.headers
+            or 'gzip' not in request.headers.get('Accept-Encoding', '').lower()):
+        return response
+    body = response.get_data()
+    if len(body) < min_size:
+        return response
+    response.set_data(gzip.compress(body, compresslevel=level))
+    response.headers['Content-Encoding'] = 'gzip'
+    response.headers['Content-Length'] = str(len(response.get_data()))
+    response.vary.add('Accept-Encoding')
+    return response
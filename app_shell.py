@@ -0,0 +1,124 @@
+import hashlib
+import os
+import threading
+
+from flask import current_app, make_response, render_template, request, url_for
+
+# -------------------------
+#     ASSET VERSIONS
+# -------------------------
+#
+# url_for('static', filename=...) adds ``v=<hash of the file>``. A
+# versioned URL always names the same bytes, so its response is sent as
+# immutable and browsers reuse it without revalidating; an edited file
+# gets a new URL on the next render. Requests for an old version (pages
+# or fragments rendered before a deploy) are answered with no-cache.
+
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+_versions = {}
+_versions_lock = threading.Lock()
+
+
+def asset_version(filename, app=None):
+    """Short content hash of a static file, or None if it doesn't exist."""
+    app = app or current_app
+    path = os.path.join(app.static_folder, filename)
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    stamp = (stat.st_mtime_ns, stat.st_size)
+    cached = _versions.get(path)
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+    with open(path, 'rb') as f:
+        version = hashlib.sha256(f.read()).hexdigest()[:12]
+    with _versions_lock:
+        _versions[path] = (stamp, version)
+    return version
+
+
+def _add_static_version(endpoint, values):
+    if endpoint == 'static' and 'filename' in values and 'v' not in values:
+        version = asset_version(values['filename'])
+        if version is not None:
+            values['v'] = version
+
+
+def _static_cache_headers(response):
+    if request.endpoint == 'static' and response.status_code == 200:
+        filename = (request.view_args or {}).get('filename', '')
+        current = request.args.get('v') == asset_version(filename)
+        response.headers['Cache-Control'] = IMMUTABLE if current else 'no-cache'
+    return response
+
+
+def conditional(response, private=False):
+    """ETag ``response`` and answer 304 when the client's copy is current.
+
+    The body is still built, but an unchanged page or list costs the
+    client a round trip instead of a download (the service worker
+    revalidates /groups and /my_bookings this way).
+    """
+    response = make_response(response)
+    response.add_etag()
+    response.headers['Cache-Control'] = 'private, no-cache' if private else 'no-cache'
+    return response.make_conditional(request)
+
+
+# -------------------------
+#     SERVICE WORKER
+# -------------------------
+#
+# /sw.js is rendered from templates/sw.js with the versioned shell URLs
+# baked in. Any change to a shell file changes the script, so browsers
+# install the new worker, which precaches the new files and drops the
+# old cache. See the README for the caching rules the worker applies.
+
+SHELL_ASSETS = (
+    'vendor/bootstrap/css/bootstrap.min.css',
+    'vendor/fontawesome/css/all.min.css',
+    'css/style.css',
+    'vendor/bootstrap/js/popper.min.js',
+    'vendor/bootstrap/js/bootstrap.min.js',
+    'js/script.js',
+)
+
+# Loaded by all.min.css through a relative URL, so not versioned
+SHELL_FONTS = (
+    'vendor/fontawesome/webfonts/fa-solid-900.woff2',
+)
+
+
+def shell_urls():
+    """Everything the worker precaches: the versioned assets, the fonts and the offline page."""
+    urls = [url_for('static', filename=name) for name in SHELL_ASSETS]
+    urls += [url_for('static', filename=name, v=None) for name in SHELL_FONTS]
+    urls.append(url_for('offline'))
+    return urls
+
+
+def service_worker():
+    urls = shell_urls()
+    version = hashlib.sha256('\n'.join(urls).encode()).hexdigest()[:12]
+    response = make_response(render_template(
+        'sw.js', version=version, shell=urls, offline_url=url_for('offline'),
+        enabled=current_app.config.get('SERVICE_WORKER_ENABLED', True)
+    ))
+    response.mimetype = 'application/javascript'
+    # Browsers check for a new worker on navigation; never serve them a stale one
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+def offline():
+    return render_template('offline.html')
+
+
+def init_app_shell(app):
+    """Version static URLs, mark them immutable and serve /sw.js and /offline."""
+    app.url_defaults(_add_static_version)
+    app.after_request(_static_cache_headers)
+    app.add_url_rule('/sw.js', 'service_worker', service_worker)
+    app.add_url_rule('/offline', 'offline', offline)
@@ -0,0 +1,74 @@
+import sys
+import threading
+import time
+
+from flask import copy_current_request_context, has_app_context, has_request_context, current_app
+
+
+def is_green():
+    """Return True when running under a monkey patched eventlet hub."""
+    # Monkey patching imports eventlet first, so there is nothing to check if
+    # it isn't loaded. Importing it here instead would set up eventlet's hub
+    # from whatever thread asks, which breaks joining plain threads.
+    patcher = sys.modules.get('eventlet.patcher')
+    return patcher is not None and patcher.is_monkey_patched('socket')
+
+
+def sleep(seconds):
+    """Yield to other green threads (or the OS scheduler) for ``seconds``."""
+    if is_green():
+        import eventlet
+        eventlet.sleep(seconds)
+    else:
+        time.sleep(seconds)
+
+
+def run_blocking(func, *args, **kwargs):
+    """Run a call that blocks in C code without stalling the eventlet hub.
+
+    Under eventlet the call runs on one of tpool's native threads, which
+    has no Flask context, so the caller's app context is pushed there.
+    """
+    if is_green():
+        from eventlet import tpool
+        if not has_app_context():
+            return tpool.execute(func, *args, **kwargs)
+        app = current_app._get_current_object()
+
+        def in_app_context():
+            with app.app_context():
+                return func(*args, **kwargs)
+
+        return tpool.execute(in_app_context)
+    return func(*args, **kwargs)
+
+
+def spawn(func, *args, **kwargs):
+    """Run ``func`` in the background with the current app (and request) context."""
+    if has_request_context():
+        target = copy_current_request_context(func)
+    else:
+        app = current_app._get_current_object()
+
+        def target(*a, **kw):
+            with app.app_context():
+                return func(*a, **kw)
+
+    if is_green():
+        import eventlet
+        return eventlet.spawn(target, *args, **kwargs)
+    thread = threading.Thread(target=target, args=args, kwargs=kwargs, daemon=True)
+    thread.start()
+    return thread
+
+
+def patch_db_drivers():
+    """Make network DB drivers yield to the hub while waiting on the server."""
+    if not is_green():
+        return False
+    try:
+        from psycogreen.eventlet import patch_psycopg
+    except ImportError:
+        return False
+    patch_psycopg()
+    return True
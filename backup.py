@@ -0,0 +1,371 @@
+import gzip
+import os
+import re
+import shutil
+import sqlite3
+import subprocess
+import tempfile
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import create_engine
+
+import destinations
+from models import db
+from scheduler import periodic
+from sharding import DEFAULT_SHARD, get_engine, instance_url, reset_assignments, shard_names
+from template_cache import get_store, invalidate
+
+# -------------------------
+#     ONLINE BACKUP
+# -------------------------
+#
+# Snapshots are taken while the app keeps serving. SQLite databases are
+# copied with the online backup API a few pages at a time, with a pause
+# between steps in which no lock is held, so booking writes carry on. A
+# commit during the copy makes SQLite start it over; every restart
+# doubles the step, and after BACKUP_MAX_RESTARTS the rest is copied in
+# one step (one read lock for the whole copy). The copy is then gzipped
+# into BACKUP_DIR as <database>-<UTC time>Z.db.gz, consistent as of that
+# time. PostgreSQL databases are streamed through pg_dump, which reads
+# from one MVCC snapshot and blocks no writers, into a custom-format
+# <database>-<UTC time>Z.dump that pg_restore reads.
+
+SQLITE_SUFFIX = '.db.gz'
+PG_DUMP_SUFFIX = '.dump'
+
+Snapshot = namedtuple('Snapshot', 'database taken_at path size')
+
+_SNAPSHOT_NAME = re.compile(r'^(?P<database>.+)-(?P<taken_at>\d{8}T\d{6})Z(?P<suffix>\.db\.gz|\.dump)$')
+
+
+class _Restarted(Exception):
+    """Another connection wrote to the source, so SQLite restarted the copy."""
+
+
+def backup_dir(app=None):
+    app = app or current_app
+    return app.config.get('BACKUP_DIR') or os.path.join(app.instance_path, 'backups')
+
+
+def database_names(app=None):
+    """The app's databases (the default one and every shard) and BACKUP_EXTRA_DATABASES."""
+    app = app or current_app
+    return [*shard_names(app), *(app.config.get('BACKUP_EXTRA_DATABASES') or {})]
+
+
+_engines_lock = threading.Lock()
+
+
+def get_database(name, app=None):
+    """The engine for database ``name``."""
+    app = app or current_app
+    extra = app.config.get('BACKUP_EXTRA_DATABASES') or {}
+    if name not in extra:
+        return get_engine(name, app)
+    engines = app.extensions.setdefault('backup_engines', {})
+    with _engines_lock:
+        if name not in engines:
+            engines[name] = create_engine(instance_url(app, extra[name]))
+    return engines[name]
+
+
+def copy_sqlite(source, target, pages=256, pause=0.005, max_restarts=4):
+    """Copy sqlite3 connection ``source`` into ``target`` with the backup API.
+
+    Returns the number of steps taken and of restarts caused by writers.
+    """
+    stats = {'steps': 0, 'restarts': 0}
+    while True:
+        last = [None]
+
+        def progress(status, remaining, total):
+            stats['steps'] += 1
+            if last[0] is not None and remaining > last[0]:
+                raise _Restarted()
+            last[0] = remaining
+            if remaining and pause:
+                # Between steps: no lock held, writers commit here
+                time.sleep(pause)
+
+        step = -1 if stats['restarts'] >= max_restarts else pages << stats['restarts']
+        try:
+            source.backup(target, pages=step, progress=progress)
+            return stats
+        except _Restarted:
+            stats['restarts'] += 1
+
+
+def _snapshot_path(directory, name, taken_at, suffix):
+    return os.path.join(directory, f'{name}-{taken_at:%Y%m%dT%H%M%S}Z{suffix}')
+
+
+def _snapshot_sqlite(name, engine, directory, now):
+    config = current_app.config
+    fd, copy_path = tempfile.mkstemp(prefix=f'.{name}-', suffix='.db', dir=directory)
+    os.close(fd)
+    try:
+        target = sqlite3.connect(copy_path)
+        source = engine.raw_connection()
+        try:
+            stats = copy_sqlite(
+                source.driver_connection, target,
+                pages=config.get('BACKUP_STEP_PAGES', 256),
+                pause=config.get('BACKUP_STEP_PAUSE', 0.005),
+                max_restarts=config.get('BACKUP_MAX_RESTARTS', 4),
+            )
+        finally:
+            source.close()
+            target.close()
+        # Named after the moment the copy is consistent with
+        path = _snapshot_path(directory, name, now or datetime.utcnow(), SQLITE_SUFFIX)
+        with open(copy_path, 'rb') as raw, \
+                gzip.open(path + '.tmp', 'wb', compresslevel=config.get('BACKUP_COMPRESS_LEVEL', 6)) as packed:
+            shutil.copyfileobj(raw, packed, 1 << 20)
+        os.replace(path + '.tmp', path)
+    finally:
+        os.remove(copy_path)
+    current_app.logger.info(f"Snapshot of {name} written to {path} "
+                            f"({stats['steps']} steps, {stats['restarts']} restarts)")
+    return path
+
+
+def _pg_tool(tool, engine):
+    """Command prefix and environment to run ``tool`` against ``engine``'s database."""
+    executable = shutil.which(tool)
+    if executable is None:
+        raise RuntimeError(f"{tool} is not installed; it is needed for PostgreSQL backups")
+    url = engine.url
+    env = dict(os.environ)
+    if url.password:
+        # Kept out of the command line, which other users can see
+        env['PGPASSWORD'] = url.password
+    dsn = url.set(drivername='postgresql', password=None).render_as_string(hide_password=False)
+    return [executable, f'--dbname={dsn}', '--no-owner'], env
+
+
+def _snapshot_postgresql(name, engine, directory, now):
+    command, env = _pg_tool('pg_dump', engine)
+    path = _snapshot_path(directory, name, now or datetime.utcnow(), PG_DUMP_SUFFIX)
+    with open(path + '.tmp', 'wb') as out:
+        process = subprocess.Popen([*command, '--format=custom'], stdout=subprocess.PIPE, env=env)
+        shutil.copyfileobj(process.stdout, out, 1 << 20)
+        process.stdout.close()
+        code = process.wait()
+    if code != 0:
+        os.remove(path + '.tmp')
+        raise RuntimeError(f"pg_dump of {name} failed with exit code {code}")
+    os.replace(path + '.tmp', path)
+    return path
+
+
+def snapshot(name=DEFAULT_SHARD, now=None):
+    """Write a point-in-time snapshot of database ``name`` to BACKUP_DIR; returns its path."""
+    engine = get_database(name)
+    directory = backup_dir()
+    os.makedirs(directory, exist_ok=True)
+    backend = engine.url.get_backend_name()
+    if backend == 'sqlite':
+        return _snapshot_sqlite(name, engine, directory, now)
+    if backend == 'postgresql':
+        return _snapshot_postgresql(name, engine, directory, now)
+    raise ValueError(f"Unsupported database for backup: {backend}")
+
+
+def list_snapshots(name=None):
+    """Snapshots in BACKUP_DIR, oldest first, optionally for one database."""
+    directory = backup_dir()
+    if not os.path.isdir(directory):
+        return []
+    snapshots = []
+    for filename in os.listdir(directory):
+        match = _SNAPSHOT_NAME.match(filename)
+        if match is None or (name is not None and match['database'] != name):
+            continue
+        path = os.path.join(directory, filename)
+        taken_at = datetime.strptime(match['taken_at'], '%Y%m%dT%H%M%S')
+        snapshots.append(Snapshot(match['database'], taken_at, path, os.path.getsize(path)))
+    return sorted(snapshots, key=lambda s: (s.taken_at, s.database))
+
+
+def prune(keep):
+    """Delete all but the newest ``keep`` snapshots of each database; returns how many went."""
+    removed = 0
+    for name in {s.database for s in list_snapshots()}:
+        for old in list_snapshots(name)[:-keep or None]:
+            os.remove(old.path)
+            removed += 1
+    return removed
+
+
+# -------------------------
+#     RESTORE
+# -------------------------
+
+def _unpack(path, directory):
+    target = os.path.join(directory, os.path.basename(path)[:-len('.gz')])
+    with gzip.open(path, 'rb') as packed, open(target, 'wb') as raw:
+        shutil.copyfileobj(packed, raw, 1 << 20)
+    return target
+
+
+# A restore usually runs in its own process (``flask backup restore``).
+# It bumps this counter in the fragment store, and every worker that sees
+# it change drops its own caches of the old data. The store must be shared
+# (the default sqlite:// or redis://) for this to reach other processes;
+# with memory:// only the restoring process forgets the old data.
+RESTORED_KEY = 'v:backup-restored'
+
+
+def _forget_old_data(app):
+    destinations.reset_index()
+    reset_assignments(app)
+
+
+def _after_restore():
+    app = current_app._get_current_object()
+    _forget_old_data(app)
+    invalidate('booking_list')
+    try:
+        app.extensions['backup_restored'] = (get_store(app).incr(RESTORED_KEY), time.monotonic())
+    except Exception as e:
+        app.logger.error(f"Could not tell other workers about the restore: {str(e)}")
+
+
+def check_restored():
+    """Drop this worker's caches if a restore happened since it last looked.
+
+    Looks at most once every BACKUP_RESTORE_CHECK_SECONDS.
+    """
+    app = current_app._get_current_object()
+    seen, checked_at = app.extensions.get('backup_restored', (None, 0.0))
+    now = time.monotonic()
+    if now - checked_at < app.config.get('BACKUP_RESTORE_CHECK_SECONDS', 5):
+        return
+    try:
+        restored = get_store(app).get_many([RESTORED_KEY])[0]
+    except Exception as e:
+        app.logger.error(f"Could not check for a restore: {str(e)}")
+        return
+    restored = int(restored or 0)
+    if seen is not None and restored != seen:
+        app.logger.info("Database restored from a snapshot; dropping cached data")
+        _forget_old_data(app)
+    app.extensions['backup_restored'] = (restored, now)
+
+
+def restore(path, name=None):
+    """Replace database ``name`` (default: the one the snapshot was taken of) with a snapshot.
+
+    Writers are locked out while the pages are copied in; connections
+    still open see the restored data on their next transaction.
+    """
+    match = _SNAPSHOT_NAME.match(os.path.basename(path))
+    if name is None:
+        if match is None:
+            raise ValueError(f"Not a snapshot name, pass the database: {path}")
+        name = match['database']
+    engine = get_database(name)
+    # The session's connection would hold the lock the restore needs
+    db.session.remove()
+    if path.endswith(PG_DUMP_SUFFIX):
+        command, env = _pg_tool('pg_restore', engine)
+        subprocess.run([*command, '--clean', '--if-exists', '--single-transaction', path], env=env, check=True)
+    else:
+        with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(path))) as directory:
+            source = sqlite3.connect(_unpack(path, directory))
+            target = engine.raw_connection()
+            try:
+                source.backup(target.driver_connection)
+            finally:
+                source.close()
+                target.close()
+        engine.dispose()
+    _after_restore()
+    return name
+
+
+_unpacked = {}
+_unpacked_lock = threading.Lock()
+
+
+def restore_file(path, target):
+    """Write SQLite snapshot ``path`` out as the database file ``target``.
+
+    Meant for test fixtures and scratch copies: each snapshot is unpacked
+    once per process, and every later call is a plain file copy.
+    """
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+    with _unpacked_lock:
+        unpacked = _unpacked.get(key)
+        if unpacked is None or not os.path.exists(unpacked):
+            unpacked = _unpack(path, tempfile.mkdtemp(prefix='snapshot-'))
+            _unpacked[key] = unpacked
+    shutil.copyfile(unpacked, target)
+    return target
+
+
+# -------------------------
+#     SCHEDULED SNAPSHOTS
+# -------------------------
+
+@periodic('0 * * * *', name='snapshot_databases', lease_seconds=3600)
+def snapshot_databases(now=None):
+    """Snapshot every database whose newest snapshot is BACKUP_INTERVAL_HOURS old.
+
+    Off unless BACKUP_INTERVAL_HOURS is set; keeps the newest BACKUP_KEEP
+    of each database.
+    """
+    config = current_app.config
+    hours = config.get('BACKUP_INTERVAL_HOURS', 0)
+    if not hours:
+        return 0
+    now = now or datetime.utcnow()
+    # A little slack so an hourly run isn't skipped for a snapshot that
+    # finished a few seconds into the previous hour
+    due = now - timedelta(hours=hours) + timedelta(minutes=5)
+    taken = 0
+    for name in database_names():
+        latest = list_snapshots(name)[-1:]
+        if latest and latest[0].taken_at > due:
+            continue
+        snapshot(name, now=now)
+        taken += 1
+    prune(config.get('BACKUP_KEEP', 24))
+    return taken
+
+
+def init_backup(app):
+    """Register the ``flask backup`` CLI and the per-request restore check."""
+    import click
+
+    app.before_request(check_restored)
+
+    @app.cli.group('backup')
+    def backup_cli():
+        """Database snapshot commands."""
+
+    @backup_cli.command('create')
+    @click.option('--database', 'names', multiple=True, help='Database to snapshot (default: all).')
+    def create_command(names):
+        """Snapshot databases while the app keeps running."""
+        for name in names or database_names():
+            click.echo(snapshot(name))
+
+    @backup_cli.command('list')
+    def list_command():
+        """Show the snapshots in BACKUP_DIR."""
+        for s in list_snapshots():
+            click.echo(f'{s.database:20} {s.taken_at:%Y-%m-%d %H:%M:%S}Z {s.size:14,d}  {s.path}')
+
+    @backup_cli.command('restore')
+    @click.argument('path', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--database', help='Database to replace (default: the one in the snapshot name).')
+    @click.confirmation_option(prompt='This replaces the live database. Continue?')
+    def restore_command(path, database):
+        """Replace a database with a snapshot."""
+        click.echo(f'{restore(path, database)} restored from {path}')
@@ -0,0 +1,113 @@
+"""Admin dashboard queries from rollups versus scanning bookings.
+
+Seeds bookings spread over a year, rolls them up, then times the
+dashboard's numbers (bookings/passengers per day for the window, top
+destinations, top stations, statuses) both ways, plus an incremental
+refresh after a burst of new bookings.
+
+    python benchmarks/bench_analytics.py --bookings 300000 --days 30 --runs 20
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from datetime import time as clock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from sqlalchemy import func, insert, select
+
+from models import db, Booking
+from stations import STATIONS
+from analytics import dashboard_data, day_start, refresh_rollups
+
+PLACES = list(STATIONS)
+STATUSES = ['pending', 'confirmed', 'cancelled', 'expired']
+
+
+def seed(count, rng, now, spread=365 * 86400, chunk=50_000):
+    for start in range(0, count, chunk):
+        rows = []
+        for i in range(start, min(start + chunk, count)):
+            created = now - timedelta(seconds=rng.randrange(spread))
+            rows.append({
+                'name': f'Passenger {i}', 'location': rng.choice(PLACES), 'destination': rng.choice(PLACES),
+                'travel_date': date(2025, 1, 1), 'travel_time': clock(9, 0), 'passengers': rng.randint(1, 4),
+                'contact': '1234567890', 'status': rng.choice(STATUSES),
+                'created_at': created, 'updated_at': created,
+            })
+        db.session.execute(insert(Booking), rows)
+        db.session.commit()
+
+
+def scan_dashboard(days, now):
+    """The same numbers computed straight from the booking table."""
+    first = day_start(now) - timedelta(days=days - 1)
+    window = Booking.created_at >= first
+    day = func.date(Booking.created_at)
+    daily = db.session.execute(
+        select(day, func.count(), func.sum(Booking.passengers)).where(window).group_by(day)
+    ).all()
+    ranked = []
+    for column in (Booking.destination, Booking.location, Booking.status):
+        count = func.count()
+        ranked.append(db.session.execute(
+            select(column, count, func.sum(Booking.passengers)).where(window)
+            .group_by(column).order_by(count.desc()).limit(10)
+        ).all())
+    return daily, ranked
+
+
+def timed(func, runs):
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--bookings', type=int, default=300_000)
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument('--runs', type=int, default=20)
+    parser.add_argument('--burst', type=int, default=500, help='new bookings before the incremental refresh')
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    app = Flask(__name__)
+    app.config.update(SQLALCHEMY_DATABASE_URI=f'sqlite:///{path}', SQLALCHEMY_TRACK_MODIFICATIONS=False)
+    db.init_app(app)
+
+    with app.app_context():
+        db.create_all()
+        now = datetime.utcnow()
+        seed(args.bookings, rng, now)
+
+        started = time.perf_counter()
+        hours = refresh_rollups(now=now)
+        print(f'initial rollup: {hours} hours in {time.perf_counter() - started:.1f} s')
+
+        scan = timed(lambda: scan_dashboard(args.days, now), args.runs)
+        rollup = timed(lambda: dashboard_data(args.days, today=now), args.runs)
+        print(f'{args.bookings} bookings, {args.days}-day dashboard (median of {args.runs})')
+        print(f'  scan bookings  {scan:8.2f} ms')
+        print(f'  rollups        {rollup:8.2f} ms   ({scan / rollup:.0f}x)')
+
+        later = now + timedelta(minutes=5)
+        seed(args.burst, random.Random(8), later, spread=300)
+        started = time.perf_counter()
+        hours = refresh_rollups(now=later)
+        print(f'incremental refresh after {args.burst} new bookings: {hours} hours in '
+              f'{(time.perf_counter() - started) * 1000:.0f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""Compare concurrent-connection capacity of sync and eventlet gunicorn workers.
+
+Each worker class serves ``/slow`` (an I/O wait of ``--delay`` seconds) while
+``--concurrency`` clients hammer it. Sync workers can only overlap as many
+waits as they have processes; eventlet workers overlap up to
+``worker_connections`` per process.
+
+    python benchmarks/bench_async_serving.py --concurrency 200
+"""
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def wait_ready(url, timeout=15):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(url, timeout=1).read()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Server at {url} did not start")
+
+
+def run_clients(url, concurrency, requests_per_client):
+    def client(_):
+        latencies = []
+        for _ in range(requests_per_client):
+            start = time.perf_counter()
+            urllib.request.urlopen(url, timeout=120).read()
+            latencies.append(time.perf_counter() - start)
+        return latencies
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = [l for result in pool.map(client, range(concurrency)) for l in result]
+    return time.perf_counter() - start, sorted(latencies)
+
+
+def bench(worker_class, args):
+    port = free_port()
+    cmd = [
+        sys.executable, '-m', 'gunicorn',
+        '-w', str(args.workers), '-k', worker_class,
+        '--worker-connections', '1000',
+        '-b', f'127.0.0.1:{port}',
+        '--log-level', 'warning',
+        'benchmarks.slow_io_app:app'
+    ]
+    server = subprocess.Popen(cmd, cwd=ROOT)
+    try:
+        base = f'http://127.0.0.1:{port}/slow'
+        wait_ready(f'{base}?delay=0')
+        elapsed, latencies = run_clients(f'{base}?delay={args.delay}', args.concurrency, args.requests)
+    finally:
+        server.terminate()
+        server.wait()
+
+    total = len(latencies)
+    return {
+        'worker_class': worker_class,
+        'requests': total,
+        'req_per_sec': total / elapsed,
+        'p50_ms': statistics.median(latencies) * 1000,
+        'p99_ms': latencies[int(total * 0.99) - 1] * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--concurrency', type=int, default=100)
+    parser.add_argument('--requests', type=int, default=5, help='requests per client')
+    parser.add_argument('--delay', type=float, default=0.2, help='simulated I/O wait in seconds')
+    args = parser.parse_args()
+
+    print(f"{args.workers} workers, {args.concurrency} concurrent clients, {args.delay}s I/O wait")
+    print(f"{'worker':<10}{'requests':>10}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}")
+    for worker_class in ('sync', 'eventlet'):
+        r = bench(worker_class, args)
+        print(f"{r['worker_class']:<10}{r['requests']:>10}{r['req_per_sec']:>10.1f}"
+              f"{r['p50_ms']:>10.0f}{r['p99_ms']:>10.0f}")
+
+
+if __name__ == '__main__':
+    main()
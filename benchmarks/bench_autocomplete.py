@@ -0,0 +1,90 @@
+"""Destination autocomplete latency over a large set of names.
+
+Builds the in-memory index from synthetic destinations and times prefix
+lookups, typo (trigram) lookups and a LIKE query on the same names.
+
+    python benchmarks/bench_autocomplete.py --names 50000 --queries 2000
+"""
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from destinations import DestinationIndex, normalize
+
+WORDS = ['Road', 'Nagar', 'Layout', 'Circle', 'Market', 'Park', 'Station', 'Gate', 'Cross', 'Colony']
+
+
+def make_names(count, rng):
+    names = set()
+    while len(names) < count:
+        stem = ''.join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(4, 9))).title()
+        names.add(f'{stem} {rng.choice(WORDS)}')
+    return sorted(names)
+
+
+def typo(text, rng):
+    i = rng.randrange(1, len(text) - 1)
+    return text[:i] + text[i + 1] + text[i] + text[i + 2:]
+
+
+def report(label, samples):
+    samples = sorted(samples)
+    p99 = samples[max(0, int(len(samples) * 0.99) - 1)]
+    print(f"{label:<24}{statistics.median(samples) * 1e6:>10.1f}{p99 * 1e6:>10.1f}")
+
+
+def timed(func, queries):
+    samples = []
+    for query in queries:
+        t = time.perf_counter()
+        func(query)
+        samples.append(time.perf_counter() - t)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--names', type=int, default=50_000)
+    parser.add_argument('--queries', type=int, default=2000)
+    args = parser.parse_args()
+    rng = random.Random(3)
+
+    names = make_names(args.names, rng)
+    index = DestinationIndex()
+    start = time.perf_counter()
+    for name in names:
+        index.add(name, weight=rng.randint(0, 100))
+    print(f"Indexed {len(names):,} names in {time.perf_counter() - start:.1f}s")
+
+    sample = [rng.choice(names) for _ in range(args.queries)]
+    prefixes = [normalize(name)[:rng.randint(2, 6)] for name in sample]
+    typos = [typo(normalize(name), rng) for name in sample]
+
+    conn = sqlite3.connect(':memory:')
+    conn.execute('CREATE TABLE destination_alias (name TEXT)')
+    conn.executemany('INSERT INTO destination_alias VALUES (?)', [(n,) for n in names])
+
+    def like(prefix):
+        return conn.execute(
+            'SELECT name FROM destination_alias WHERE name LIKE ? OR name LIKE ? LIMIT 8',
+            (f'{prefix}%', f'% {prefix}%')
+        ).fetchall()
+
+    print(f"{'lookup':<24}{'p50 us':>10}{'p99 us':>10}")
+    report('prefix (trie)', timed(index.suggest, prefixes))
+    report('typo (trigram)', timed(index.suggest, typos))
+    report('prefix (SQL LIKE)', timed(like, prefixes[:200]))
+
+    found = sum(name in index.suggest(query) for name, query in zip(sample, typos))
+    print(f"Typo queries with the intended name suggested: {found / len(sample):.0%}")
+
+
+if __name__ == '__main__':
+    main()
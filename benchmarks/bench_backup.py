@@ -0,0 +1,126 @@
+"""Booking write latency with and without an online backup running.
+
+Fills a SQLite database with bookings, then commits new bookings one at a
+time (what /book_ride does) for --seconds while a second process takes
+snapshots back to back: first with no backup, then with the paged
+backup (BACKUP_STEP_PAGES pages per step, BACKUP_STEP_PAUSE between
+steps), then with the whole database copied in a single step for
+comparison. The backup process runs at low CPU priority, as with
+`nice flask backup create`. --wal switches the database to WAL mode first.
+
+    python benchmarks/bench_backup.py --bookings 200000 --seconds 10 [--wal]
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import date, time as clock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from sqlalchemy import insert
+
+from models import db, Booking, User
+from stations import STATIONS
+import backup
+
+NAMES = list(STATIONS)
+
+
+def make_app(directory, **config):
+    app = Flask(__name__)
+    app.config.update(
+        SQLALCHEMY_DATABASE_URI=f'sqlite:///{os.path.join(directory, "app.db")}',
+        SQLALCHEMY_ENGINE_OPTIONS={'connect_args': {'timeout': 60}},
+        BACKUP_DIR=os.path.join(directory, 'backups'),
+        TEMPLATE_BYTECODE_CACHE_ENABLED=False,
+        **config
+    )
+    db.init_app(app)
+    return app
+
+
+def booking_row(rng):
+    return {
+        'user_id': 1, 'name': 'Bench', 'location': rng.choice(NAMES), 'destination': rng.choice(NAMES),
+        'travel_date': date(2030, 1, 1), 'travel_time': clock(9, 0), 'passengers': 1, 'contact': '9876543210',
+    }
+
+
+def fill(directory, count):
+    app = make_app(directory)
+    rng = random.Random(7)
+    with app.app_context():
+        db.create_all()
+        db.session.add(User(name='Bench', email='bench@example.com', contact='1234567890', password_hash='x'))
+        for start in range(0, count, 10_000):
+            db.session.execute(insert(Booking), [booking_row(rng) for _ in range(min(10_000, count - start))])
+        db.session.commit()
+    return os.path.getsize(os.path.join(directory, 'app.db'))
+
+
+def backup_loop(directory, pages, stop):
+    os.nice(10)
+    app = make_app(directory, BACKUP_STEP_PAGES=pages, BACKUP_KEEP=1)
+    taken = 0
+    with app.app_context():
+        while not stop.is_set():
+            backup.snapshot()
+            backup.prune(1)
+            taken += 1
+    print(f'    {taken} snapshots taken')
+
+
+def write_latencies(directory, seconds, interval=0.005):
+    app = make_app(directory)
+    rng = random.Random(11)
+    latencies = []
+    with app.app_context():
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            db.session.add(Booking(**booking_row(rng)))
+            db.session.commit()
+            latencies.append((time.perf_counter() - started) * 1000)
+            time.sleep(interval)
+    latencies.sort()
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--bookings', type=int, default=200_000)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--pages', type=int, default=256, help='pages per backup step')
+    parser.add_argument('--wal', action='store_true', help='put the database in WAL mode')
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    size = fill(directory, args.bookings)
+    if args.wal:
+        sqlite3.connect(os.path.join(directory, 'app.db')).execute('PRAGMA journal_mode=WAL').fetchall()
+    print(f"{args.bookings:,} bookings, {size / 1e6:.0f} MB database, {'WAL' if args.wal else 'rollback journal'}")
+    for label, pages in (('no backup', None), (f'paged backup ({args.pages} pages/step)', args.pages),
+                         ('single-step backup', -1)):
+        stop = multiprocessing.Event()
+        worker = None
+        if pages is not None:
+            worker = multiprocessing.Process(target=backup_loop, args=(directory, pages, stop))
+            worker.start()
+            time.sleep(0.5)
+        latencies = write_latencies(directory, args.seconds)
+        stop.set()
+        if worker is not None:
+            worker.join()
+        p50, p99 = latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.99)]
+        print(f'  {label:32} {len(latencies):6} writes   p50 {p50:6.2f} ms   p99 {p99:7.2f} ms   '
+              f'max {latencies[-1]:8.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""Batch join/cancel endpoints versus one HTTP call (and commit) per item.
+
+Runs against a file-backed SQLite database so each commit pays its real
+fsync cost.
+
+    python benchmarks/bench_batch.py --items 200
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from sqlalchemy import insert, delete, update
+
+from models import db, login_manager, User, Ride, Booking, user_ride
+from api import api_routes
+
+
+def make_app(path):
+    app = Flask(__name__)
+    app.config.update(SQLALCHEMY_DATABASE_URI=f'sqlite:///{path}', SECRET_KEY='bench')
+    db.init_app(app)
+    login_manager.init_app(app)
+    login_manager.user_loader(lambda user_id: db.session.get(User, int(user_id)))
+    app.register_blueprint(api_routes)
+    return app
+
+
+def seed(items):
+    user = User(name='Organizer', email='organizer@example.com', contact='1234567890')
+    user.set_password('password123')
+    db.session.add(user)
+    db.session.commit()
+    db.session.execute(insert(Ride), [
+        {'name': f'Ride {i}', 'location': 'Central Station', 'destination': 'Airport Terminal',
+         'contact': '1234567890'} for i in range(items)
+    ])
+    travel = datetime.now() + timedelta(days=3)
+    db.session.execute(insert(Booking), [
+        {'user_id': user.id, 'name': f'Passenger {i}', 'location': 'Central Station',
+         'destination': 'Airport Terminal', 'travel_date': travel.date(), 'travel_time': travel.time(),
+         'passengers': 1, 'contact': '9876543210', 'status': 'pending'} for i in range(items)
+    ])
+    db.session.commit()
+    return user.id
+
+
+def reset():
+    db.session.execute(delete(user_ride))
+    db.session.execute(update(Booking).values(status='pending'))
+    db.session.commit()
+
+
+def run(label, client, endpoint, key, ids, batch):
+    start = time.perf_counter()
+    if batch:
+        assert client.post(endpoint, json={key: ids}).status_code == 200
+    else:
+        for i in ids:
+            assert client.post(endpoint, json={key: [i]}).status_code == 200
+    elapsed = time.perf_counter() - start
+    calls = 1 if batch else len(ids)
+    print(f"{label:<28}{calls:>8}{elapsed * 1000:>12.0f}{len(ids) / elapsed:>14,.0f}")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--items', type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = make_app(os.path.join(tmp, 'bench.db'))
+        with app.app_context():
+            db.create_all()
+            user_id = seed(args.items)
+            ids = list(range(1, args.items + 1))
+            client = app.test_client()
+            with client.session_transaction() as session:
+                session['_user_id'] = str(user_id)
+
+            print(f"{args.items} items per operation")
+            print(f"{'variant':<28}{'calls':>8}{'ms':>12}{'items/s':>14}")
+            for name, endpoint, key in (('join', '/api/v1/rides/join', 'ride_ids'),
+                                        ('cancel', '/api/v1/bookings/cancel', 'booking_ids')):
+                reset()
+                single = run(f'{name}: one per call', client, endpoint, key, ids, batch=False)
+                reset()
+                batched = run(f'{name}: batch', client, endpoint, key, ids, batch=True)
+                print(f"{'':<28}speedup x{single / batched:.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+"""Dashboard and my_bookings reads with the per-user summary versus loading every booking.
+
+Seeds one heavy user among many others, then times what each page reads
+from the database: before, both pages loaded all of the user's bookings;
+now the dashboard reads the summary row and my_bookings one page (and
+only when its cached fragment is rebuilt). Also times booking writes
+with and without the summary upkeep.
+
+    python benchmarks/bench_booking_summary.py --bookings 5000 --others 100000 --runs 50
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from sqlalchemy import insert
+
+from models import db, Booking
+import booking_events
+from booking_summary import get_summary, user_bookings, rebuild_summary
+
+STATUSES = ['pending', 'confirmed', 'cancelled', 'expired']
+USER_ID = 1
+
+
+def booking_row(user_id, rng, now):
+    travel_at = now + timedelta(hours=rng.randrange(-24 * 365, 24 * 365))
+    return {
+        'user_id': user_id, 'name': 'Passenger', 'location': 'Central Station', 'destination': 'Airport Terminal',
+        'travel_date': travel_at.date(), 'travel_time': travel_at.time().replace(microsecond=0),
+        'passengers': rng.randint(1, 4), 'contact': '1234567890', 'status': rng.choice(STATUSES),
+    }
+
+
+def seed(bookings, others, rng, now, chunk=50_000):
+    rows = [booking_row(USER_ID, rng, now) for _ in range(bookings)]
+    rows += [booking_row(rng.randrange(2, 5000), rng, now) for _ in range(others)]
+    rng.shuffle(rows)
+    for start in range(0, len(rows), chunk):
+        db.session.execute(insert(Booking), rows[start:start + chunk])
+        db.session.commit()
+
+
+def timed(func, runs):
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def write_bookings(count, rng, now):
+    started = time.perf_counter()
+    for _ in range(count):
+        db.session.add(Booking(**booking_row(USER_ID, rng, now)))
+        db.session.commit()
+    return (time.perf_counter() - started) * 1000 / count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--bookings', type=int, default=5000, help="the heavy user's bookings")
+    parser.add_argument('--others', type=int, default=100_000, help="other users' bookings")
+    parser.add_argument('--runs', type=int, default=50)
+    parser.add_argument('--writes', type=int, default=200)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    app = Flask(__name__)
+    app.config.update(SQLALCHEMY_DATABASE_URI=f'sqlite:///{path}', SQLALCHEMY_TRACK_MODIFICATIONS=False)
+    db.init_app(app)
+
+    with app.app_context():
+        db.create_all()
+        now = datetime.now()
+        seed(args.bookings, args.others, rng, now)
+        rebuild_summary(USER_ID)
+        db.session.commit()
+
+        def load_all():
+            db.session.expunge_all()
+            return Booking.query.filter_by(user_id=USER_ID).all()
+
+        def summary():
+            db.session.expunge_all()
+            return get_summary(USER_ID, now=now)
+
+        def first_page():
+            db.session.expunge_all()
+            return user_bookings(USER_ID)
+
+        full = timed(load_all, args.runs)
+        cheap = timed(summary, args.runs)
+        page = timed(first_page, args.runs)
+        print(f'user with {args.bookings} bookings among {args.others} others (median of {args.runs})')
+        print(f'  before: all bookings, per page     {full:8.2f} ms  (dashboard + my_bookings: {2 * full:.2f} ms)')
+        print(f'  dashboard: summary row             {cheap:8.2f} ms  ({full / cheap:.0f}x)')
+        print(f'  my_bookings: first page, on miss   {page:8.2f} ms  ({full / page:.0f}x; 0 queries on a cache hit)')
+
+        with_upkeep = write_bookings(args.writes, rng, now)
+        handlers = booking_events._change_handlers[:]
+        booking_events._change_handlers.clear()
+        without = write_bookings(args.writes, rng, now)
+        booking_events._change_handlers.extend(handlers)
+        print(f'booking write (ORM insert + commit, mean of {args.writes})')
+        print(f'  without summary  {without:6.2f} ms')
+        print(f'  with summary     {with_upkeep:6.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+"""Fare quotes per second: batched numpy evaluation versus one itinerary at a time.
+
+Prices random itineraries between the stations three ways: a plain
+Python loop doing the same arithmetic per itinerary, FareEngine.quote on
+the whole batch (parsing included), and the array core FareEngine.price
+alone. Also times /api/v1/fares/quote end to end, JSON included.
+
+    python benchmarks/bench_fares.py --itineraries 100000 --batch 5000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+
+from geo import haversine_km
+from stations import STATIONS
+from fares import FareEngine, PEAK, NIGHT, WEEKEND_DAY, itinerary_columns
+
+NAMES = list(STATIONS)
+
+
+def make_itineraries(count, rng):
+    first = date(2025, 1, 1)
+    return [
+        {
+            'location': rng.choice(NAMES), 'destination': rng.choice(NAMES), 'passengers': rng.randint(1, 4),
+            'travel_date': (first + timedelta(days=rng.randrange(90))).isoformat(),
+            'travel_time': f'{rng.randrange(24):02d}:{rng.randrange(60):02d}',
+        }
+        for _ in range(count)
+    ]
+
+
+def scalar_quote(item, demand, base=3000, per_km=1200, extra=0.5, free=10, step=0.02, cap=1.5):
+    """The same fare, computed the way a per-booking implementation would."""
+    if item['location'] not in STATIONS or item['destination'] not in STATIONS:
+        return None
+    km = haversine_km(*STATIONS[item['location']], *STATIONS[item['destination']])
+    fare = (base + per_km * km) * (1 + extra * (int(item['passengers']) - 1))
+    day = date.fromisoformat(item['travel_date'])
+    hour = int(item['travel_time'][:2])
+    weekday = day.weekday()
+    if hour >= 22 or hour <= 4:
+        fare *= NIGHT
+    elif weekday < 5 and (7 <= hour < 10 or 17 <= hour < 20):
+        fare *= PEAK
+    elif weekday >= 5 and 10 <= hour < 21:
+        fare *= WEEKEND_DAY
+    load = demand.get((item['location'], day), 0)
+    fare *= min(max(1 + step * max(load - free, 0), 1), cap)
+    return int(round(fare / 100)) * 100
+
+
+def rate(count, func):
+    started = time.perf_counter()
+    func()
+    return count / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--itineraries', type=int, default=100_000)
+    parser.add_argument('--batch', type=int, default=5000, help='itineraries per API call')
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    itineraries = make_itineraries(args.itineraries, rng)
+    demand = {(name, date(2025, 1, 1) + timedelta(days=d)): rng.randrange(30) for name in NAMES for d in range(90)}
+    engine = FareEngine()
+
+    assert engine.quote(itineraries[:1000], demand) == [scalar_quote(i, demand) for i in itineraries[:1000]]
+
+    loop = rate(len(itineraries), lambda: [scalar_quote(i, demand) for i in itineraries])
+    batched = rate(len(itineraries), lambda: engine.quote(itineraries, demand))
+    columns = itinerary_columns(itineraries)
+    origins, destinations = engine.station_codes(columns['location']), engine.station_codes(columns['destination'])
+    core = rate(len(itineraries), lambda: engine.price(origins, destinations, columns['passengers'],
+                                                       columns['weekdays'], columns['hours']))
+    print(f'{len(itineraries)} itineraries, quotes/sec')
+    print(f'  per itinerary (Python loop) {loop:12,.0f}')
+    print(f'  FareEngine.quote (batched)  {batched:12,.0f}   ({batched / loop:.0f}x)')
+    print(f'  FareEngine.price (arrays)   {core:12,.0f}   ({core / loop:.0f}x)')
+
+    from models import db
+    from api import api_routes
+    app = Flask(__name__)
+    app.config.update(SQLALCHEMY_DATABASE_URI=f'sqlite:///{os.path.join(tempfile.mkdtemp(), "bench.db")}',
+                      RATELIMIT_ENABLED=False, FARE_QUOTE_MAX_ITEMS=args.batch)
+    db.init_app(app)
+    app.register_blueprint(api_routes)
+    with app.app_context():
+        db.create_all()
+    client = app.test_client()
+    batches = [itineraries[i:i + args.batch] for i in range(0, len(itineraries), args.batch)]
+
+    def call_api():
+        for batch in batches:
+            response = client.post('/api/v1/fares/quote', json={'itineraries': batch})
+            assert response.status_code == 200
+
+    api = rate(len(itineraries), call_api)
+    print(f'  POST /api/v1/fares/quote    {api:12,.0f}   ({args.batch} per call, JSON and demand query included)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""k-nearest and radius ride lookups over a large ride table.
+
+Seeds rides scattered around the city (denser near the centre), then times
+grid-indexed queries against a full-table distance scan.
+
+    python benchmarks/bench_geo.py --rides 1000000 --queries 200
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from sqlalchemy import insert, select
+
+from models import db, Ride
+from geo import ride_geo_values, haversine_km
+from geo_search import nearest_rides, rides_within
+
+CENTER = (12.9784, 77.5710)
+
+
+def seed(count, rng, chunk=50_000):
+    for start in range(0, count, chunk):
+        rows = []
+        for i in range(start, min(start + chunk, count)):
+            origin = (CENTER[0] + rng.gauss(0, 0.08), CENTER[1] + rng.gauss(0, 0.08))
+            row = {'name': f'Ride {i}', 'location': 'Pickup', 'destination': 'Airport Terminal',
+                   'contact': '1234567890'}
+            row.update(ride_geo_values(row['location'], row['destination'], origin=origin))
+            rows.append(row)
+        db.session.execute(insert(Ride), rows)
+        db.session.commit()
+
+
+def brute_force(lat, lon, k):
+    rows = db.session.execute(select(Ride.id, Ride.origin_lat, Ride.origin_lon)).all()
+    return sorted((haversine_km(lat, lon, r_lat, r_lon), r_id) for r_id, r_lat, r_lon in rows)[:k]
+
+
+def report(label, samples):
+    samples = sorted(samples)
+    p99 = samples[max(0, int(len(samples) * 0.99) - 1)]
+    print(f"{label:<28}{statistics.median(samples) * 1000:>10.2f}{p99 * 1000:>10.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rides', type=int, default=1_000_000)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--k', type=int, default=10)
+    args = parser.parse_args()
+    rng = random.Random(1)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = Flask(__name__)
+        app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(tmp, 'geo.db')}"
+        db.init_app(app)
+        with app.app_context():
+            db.create_all()
+            start = time.perf_counter()
+            seed(args.rides, rng)
+            print(f"Seeded {args.rides:,} rides in {time.perf_counter() - start:.1f}s")
+
+            points = [(CENTER[0] + rng.gauss(0, 0.08), CENTER[1] + rng.gauss(0, 0.08))
+                      for _ in range(args.queries)]
+            knn, radius = [], []
+            for lat, lon in points:
+                t = time.perf_counter()
+                nearest_rides(lat, lon, k=args.k)
+                knn.append(time.perf_counter() - t)
+                t = time.perf_counter()
+                rides_within(lat, lon, 0.5)
+                radius.append(time.perf_counter() - t)
+
+            t = time.perf_counter()
+            expected = [ride_id for _, ride_id in brute_force(*points[0], args.k)]
+            scan = time.perf_counter() - t
+            assert [ride_id for ride_id, _ in nearest_rides(*points[0], k=args.k)] == expected
+
+            print(f"{'query':<28}{'p50 ms':>10}{'p99 ms':>10}")
+            report(f'{args.k}-nearest (grid)', knn)
+            report('within 0.5 km (grid)', radius)
+            report(f'{args.k}-nearest (full scan)', [scan])
+
+
+if __name__ == '__main__':
+    main()
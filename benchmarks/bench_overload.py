@@ -0,0 +1,124 @@
+"""Write-endpoint latency under overload, with and without admission control.
+
+Serves a write route from a threaded server whose simulated database gets
+slower the more queries run at once, then floods it with clients. With
+admission control the excess is turned away with 503 quickly and the
+requests that are admitted keep a bounded p99.
+
+    python benchmarks/bench_overload.py --concurrency 64 --requests 10
+"""
+import argparse
+import logging
+import os
+import statistics
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask, jsonify
+from flask_login import LoginManager
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.pool import NullPool
+from werkzeug.serving import make_server
+
+from rate_limit import admission_control
+
+_active = 0
+_active_lock = threading.Lock()
+
+
+def contended_query(base_ms):
+    """Sleep like a saturated database: each concurrent query adds base_ms."""
+    global _active
+    with _active_lock:
+        _active += 1
+        delay = base_ms * _active / 1000
+    time.sleep(delay)
+    with _active_lock:
+        _active -= 1
+    return delay
+
+
+def make_app(admission, base_ms, max_concurrent):
+    app = Flask(__name__)
+    app.config.update(ADMISSION_CONTROL_ENABLED=admission, ADMISSION_MAX_CONCURRENT=max_concurrent,
+                      ADMISSION_DB_LATENCY_TARGET=base_ms * 4 / 1000)
+    LoginManager(app)
+    engine = create_engine('sqlite://', poolclass=NullPool)
+
+    @event.listens_for(engine, 'connect')
+    def register(conn, _):
+        conn.create_function('contended_query', 1, contended_query)
+
+    @app.route('/write', methods=['POST'])
+    @admission_control
+    def write():
+        with engine.connect() as conn:
+            conn.execute(text('SELECT contended_query(:ms)'), {'ms': base_ms})
+        return jsonify({'ok': True})
+
+    return app
+
+
+def flood(url, concurrency, requests_per_client):
+    def client(_):
+        results = []
+        for _ in range(requests_per_client):
+            start = time.perf_counter()
+            try:
+                urllib.request.urlopen(urllib.request.Request(url, data=b'', method='POST'), timeout=120).read()
+                status = 200
+            except urllib.error.HTTPError as e:
+                status = e.code
+            results.append((status, time.perf_counter() - start))
+        return results
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        return [r for result in pool.map(client, range(concurrency)) for r in result]
+
+
+def bench(admission, args):
+    server = make_server('127.0.0.1', 0, make_app(admission, args.base_ms, args.max_concurrent), threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        results = flood(f'http://127.0.0.1:{server.port}/write', args.concurrency, args.requests)
+    finally:
+        server.shutdown()
+
+    ok = sorted(latency for status, latency in results if status == 200)
+    shed = [latency for status, latency in results if status == 503]
+    return {
+        'mode': 'admission' if admission else 'unlimited',
+        'ok': len(ok),
+        'shed': len(shed),
+        'p50_ms': statistics.median(ok) * 1000,
+        'p99_ms': ok[max(0, int(len(ok) * 0.99) - 1)] * 1000,
+        'shed_ms': statistics.median(shed) * 1000 if shed else 0.0,
+    }
+
+
+def main():
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--requests', type=int, default=10, help='requests per client')
+    parser.add_argument('--base-ms', type=float, default=5.0, help='query time per concurrent query')
+    parser.add_argument('--max-concurrent', type=int, default=8)
+    args = parser.parse_args()
+
+    print(f"{args.concurrency} clients x {args.requests} writes, {args.base_ms} ms per concurrent query")
+    print(f"{'mode':<12}{'ok':>8}{'503':>8}{'p50 ms':>10}{'p99 ms':>10}{'503 ms':>10}")
+    for admission in (False, True):
+        r = bench(admission, args)
+        print(f"{r['mode']:<12}{r['ok']:>8}{r['shed']:>8}{r['p50_ms']:>10.0f}{r['p99_ms']:>10.0f}"
+              f"{r['shed_ms']:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
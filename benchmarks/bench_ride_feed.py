@@ -0,0 +1,73 @@
+"""Ride list refresh: full reload versus the delta feed.
+
+Fills a database with rides, then times what a booking page pays per
+refresh when a handful of rides changed since its last one: the full
+list (what /groups sends every time) against changes_since for the
+client's version. Payload sizes are the JSON bodies sent.
+
+    python benchmarks/bench_ride_feed.py --rides 20000 --changed 10
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from sqlalchemy import insert
+
+from models import db, Ride
+from ride_feed import changes_since, record_ride_changes
+from stations import STATIONS
+
+NAMES = list(STATIONS)
+
+
+def timed(repeat, func):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result = func()
+    return (time.perf_counter() - started) / repeat * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rides', type=int, default=20_000)
+    parser.add_argument('--changed', type=int, default=10, help='rides written between refreshes')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    app = Flask(__name__)
+    app.config.update(SQLALCHEMY_DATABASE_URI=f'sqlite:///{os.path.join(directory, "bench.db")}',
+                      STATION_MATRIX_PATH=os.path.join(directory, 'station_matrix.bin'))
+    db.init_app(app)
+    rng = random.Random(7)
+    with app.app_context():
+        db.create_all()
+        rows = [{'name': f'Ride {i}', 'location': rng.choice(NAMES), 'destination': rng.choice(NAMES),
+                 'contact': '1234567890'} for i in range(args.rides)]
+        record_ride_changes(db.session.scalars(insert(Ride).returning(Ride.id), rows).all())
+        db.session.commit()
+        version = changes_since(None, max_changes=0)['version']
+
+        changed = rng.sample(range(1, args.rides + 1), args.changed)
+        for ride in db.session.scalars(db.select(Ride).where(Ride.id.in_(changed))):
+            ride.location = rng.choice(NAMES)
+        db.session.commit()
+
+        full_ms, full = timed(args.repeat, lambda: json.dumps(changes_since(None)))
+        delta_ms, delta = timed(args.repeat, lambda: json.dumps(changes_since(version)))
+
+    print(f'{args.rides} rides, {args.changed} changed since the last refresh')
+    print(f'  full list   {full_ms:9.2f} ms  {len(full):12,} bytes')
+    print(f'  delta       {delta_ms:9.2f} ms  {len(delta):12,} bytes   '
+          f'({full_ms / delta_ms:.0f}x faster, {len(full) / len(delta):.0f}x smaller)')
+
+
+if __name__ == '__main__':
+    main()
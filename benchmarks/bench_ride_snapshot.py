@@ -0,0 +1,107 @@
+"""Ride filtering from the shared snapshot versus SQL.
+
+Seeds rides, builds the memory-mapped snapshot and times the find_rides
+style destination/location filter and the /groups listing both ways.
+
+    python benchmarks/bench_ride_snapshot.py --rides 200000 --queries 200
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from sqlalchemy import insert, select
+
+from models import db, Ride
+from stations import STATIONS
+from ride_snapshot import build_snapshot, get_snapshot
+
+PLACES = list(STATIONS) + [f'Stop {i}' for i in range(200)]
+
+
+def seed(count, rng, chunk=50_000):
+    for start in range(0, count, chunk):
+        rows = [{'name': f'Ride {i}', 'location': rng.choice(PLACES), 'destination': rng.choice(PLACES),
+                 'contact': '1234567890'} for i in range(start, min(start + chunk, count))]
+        db.session.execute(insert(Ride), rows)
+        db.session.commit()
+
+
+def sql_filter(dest, loc, limit):
+    return db.session.scalars(
+        select(Ride.id)
+        .where(Ride.destination.ilike(f'%{dest}%'), Ride.location.ilike(f'%{loc}%'))
+        .order_by(Ride.id.desc()).limit(limit)
+    ).all()
+
+
+def sql_groups():
+    groups = {}
+    for row in db.session.execute(select(Ride.id, Ride.location, Ride.destination, Ride.created_at)):
+        groups.setdefault(row.destination, []).append(row)
+    return groups
+
+
+def report(label, samples):
+    samples = sorted(samples)
+    p99 = samples[max(0, int(len(samples) * 0.99) - 1)]
+    print(f"{label:<28}{statistics.median(samples) * 1000:>10.2f}{p99 * 1000:>10.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rides', type=int, default=200_000)
+    parser.add_argument('--queries', type=int, default=200)
+    args = parser.parse_args()
+    rng = random.Random(5)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = Flask(__name__)
+        app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(tmp, 'rides.db')}"
+        app.config['RIDE_SNAPSHOT_PATH'] = os.path.join(tmp, 'rides.bin')
+        db.init_app(app)
+        with app.app_context():
+            db.create_all()
+            seed(args.rides, rng)
+            start = time.perf_counter()
+            build_snapshot()
+            size = os.path.getsize(app.config['RIDE_SNAPSHOT_PATH'])
+            print(f"Snapshot of {args.rides:,} rides built in {time.perf_counter() - start:.2f}s "
+                  f"({size / 1e6:.1f} MB)")
+
+            queries = [(rng.choice(PLACES).split()[0], rng.choice(PLACES).split()[-1])
+                       for _ in range(args.queries)]
+            snap, sql = [], []
+            for dest, loc in queries:
+                t = time.perf_counter()
+                ids = get_snapshot().filter(destination=dest, location=loc)['id'][:200].tolist()
+                snap.append(time.perf_counter() - t)
+                t = time.perf_counter()
+                expected = sql_filter(dest, loc, 200)
+                sql.append(time.perf_counter() - t)
+                assert ids == expected
+
+            print(f"{'query':<28}{'p50 ms':>10}{'p99 ms':>10}")
+            report('filter (snapshot)', snap)
+            report('filter (SQL LIKE)', sql)
+
+            runs = 5
+            snapshot = get_snapshot()
+            t = time.perf_counter()
+            for _ in range(runs):
+                snapshot.groups()
+            report('groups (snapshot)', [(time.perf_counter() - t) / runs])
+            t = time.perf_counter()
+            for _ in range(runs):
+                sql_groups()
+            report('groups (SQL)', [(time.perf_counter() - t) / runs])
+
+
+if __name__ == '__main__':
+    main()
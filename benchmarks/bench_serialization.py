@@ -0,0 +1,99 @@
+"""Serialization throughput for the /api/v1 ride listing on 100k rides.
+
+Compares the old pattern (ORM objects -> per-row dict -> jsonify-style
+json.dumps) with the API's column selects, compiled row serializers and
+orjson, in object and compact form.
+
+    python benchmarks/bench_serialization.py --rides 100000
+"""
+import argparse
+import gzip
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from sqlalchemy import insert, select
+
+from models import db, Ride
+from api import serializers
+from api.serializers import RIDE_FIELDS, columns_for, serialize_rows, dumps
+
+STATIONS = ['Central Station', 'North Station', 'South Station', 'East Station',
+            'West Station', 'Airport Terminal', 'Bus Depot', 'Metro Station']
+
+
+def seed(count):
+    start = datetime(2025, 1, 1)
+    db.session.execute(insert(Ride), [
+        {
+            'name': f'Ride {i}',
+            'location': STATIONS[i % len(STATIONS)],
+            'destination': STATIONS[(i * 3 + 1) % len(STATIONS)],
+            'contact': f'98765{i:05d}',
+            'created_at': start + timedelta(minutes=i),
+        }
+        for i in range(count)
+    ])
+    db.session.commit()
+
+
+def legacy():
+    rides = Ride.query.all()
+    payload = [{
+        'id': r.id, 'driver_id': r.driver_id, 'name': r.name, 'location': r.location,
+        'destination': r.destination, 'contact': r.contact,
+        'created_at': r.created_at.strftime('%Y-%m-%d %H:%M'),
+    } for r in rides]
+    return json.dumps(payload).encode('utf-8')
+
+
+def api(fields, compact=False):
+    rows = db.session.execute(select(*columns_for(fields, RIDE_FIELDS)).order_by(Ride.id)).all()
+    return dumps({'data': serialize_rows(rows, fields, compact=compact)})
+
+
+def timed(label, func, count, repeat):
+    best = None
+    for _ in range(repeat):
+        db.session.expunge_all()
+        start = time.perf_counter()
+        body = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    gz = len(gzip.compress(body, compresslevel=5))
+    print(f"{label:<34}{count / best:>14,.0f}{best * 1000:>10.0f}{len(body) / 1024:>12,.0f}{gz / 1024:>10,.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rides', type=int, default=100_000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        seed(args.rides)
+
+        all_fields = tuple(RIDE_FIELDS)
+        sparse = ('id', 'destination', 'created_at')
+        print(f"{args.rides:,} rides, best of {args.repeat}")
+        print(f"{'variant':<34}{'rows/s':>14}{'ms':>10}{'KiB':>12}{'gz KiB':>10}")
+        timed('legacy ORM + dict + json', legacy, args.rides, args.repeat)
+        timed('api all fields', lambda: api(all_fields), args.rides, args.repeat)
+        timed('api ?fields=id,destination,...', lambda: api(sparse), args.rides, args.repeat)
+        timed('api ?format=compact', lambda: api(all_fields, compact=True), args.rides, args.repeat)
+        if serializers.orjson is not None:
+            serializers.orjson = None
+            timed('api all fields (stdlib json)', lambda: api(all_fields), args.rides, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
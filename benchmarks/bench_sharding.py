@@ -0,0 +1,103 @@
+"""Booking writes and booking-page reads with the data on one database or split over shards.
+
+Writer processes (like separate web workers) each commit bookings one at
+a time (what /book_ride does) from random pickup stations, first with
+everything in one SQLite file, then with SHARD_DATABASES spreading the
+stations over --shards files. Then times one page of a user's bookings
+(the my_bookings query), which is a scatter-gather across all shards in
+the sharded run.
+
+    python benchmarks/bench_sharding.py --shards 4 --workers 8 --bookings 4000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+import time
+from datetime import date, time as clock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+
+from models import db, Booking, User
+from stations import STATIONS
+import booking_summary
+from sharding import shard_context, shard_for
+
+NAMES = list(STATIONS)
+
+
+def make_app(directory, shards):
+    app = Flask(__name__)
+    app.config.update(
+        SQLALCHEMY_DATABASE_URI=f'sqlite:///{os.path.join(directory, "main.db")}',
+        SQLALCHEMY_ENGINE_OPTIONS={'connect_args': {'timeout': 60}},
+        SHARD_DATABASES={f'shard{i}': f'sqlite:///{os.path.join(directory, f"shard{i}.db")}' for i in range(shards)},
+    )
+    db.init_app(app)
+    return app
+
+
+def setup(directory, shards):
+    app = make_app(directory, shards)
+    with app.app_context():
+        db.create_all()
+        user = User(name='Bench', email='bench@example.com', contact='1234567890', password_hash='x')
+        db.session.add(user)
+        db.session.commit()
+    return app
+
+
+def worker(directory, shards, seed, count):
+    app = make_app(directory, shards)
+    rng = random.Random(seed)
+    with app.app_context():
+        for _ in range(count):
+            location = rng.choice(NAMES)
+            booking = Booking(
+                user_id=1, name='Bench', location=location, destination=rng.choice(NAMES),
+                travel_date=date(2030, 1, 1), travel_time=clock(9, 0), passengers=1, contact='9876543210'
+            )
+            with shard_context(shard_for(location)):
+                db.session.add(booking)
+                db.session.commit()
+
+
+def write_bookings(directory, shards, count, workers):
+    share = count // workers
+    with ProcessPoolExecutor(workers) as pool:
+        # Warm the pool (imports, app setup) outside the timing
+        list(pool.map(worker, [directory] * workers, [shards] * workers, range(workers), [1] * workers))
+        started = time.perf_counter()
+        list(pool.map(worker, [directory] * workers, [shards] * workers, range(workers), [share] * workers))
+        return share * workers / (time.perf_counter() - started)
+
+
+def page_ms(app, repeat=50):
+    with app.app_context():
+        started = time.perf_counter()
+        for _ in range(repeat):
+            booking_summary.user_bookings(1)
+        return (time.perf_counter() - started) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--shards', type=int, default=4)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--bookings', type=int, default=4000)
+    parser.add_argument('--dir', help='where the databases go (default: a new temporary directory)')
+    args = parser.parse_args()
+
+    for label, shards in (('one database', 0), (f'{args.shards} shards', args.shards)):
+        directory = tempfile.mkdtemp(dir=args.dir)
+        app = setup(directory, shards)
+        rate = write_bookings(directory, shards, args.bookings, args.workers)
+        print(f'{label:14} {rate:10,.0f} bookings/sec   my_bookings page {page_ms(app):6.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""Measure cold import and create_app time, with a -X importtime breakdown.
+
+Each run starts a fresh interpreter so nothing is cached in-process.
+
+    python benchmarks/bench_startup.py --runs 5 --top 15
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+COLD_START = (
+    "import time; t = time.perf_counter(); "
+    "from app import create_app; create_app(); "
+    "print(time.perf_counter() - t)"
+)
+
+# Optional dependencies that should never be imported just to boot the app;
+# the routes that need them import them on first use
+HEAVY_MODULES = ['matplotlib', 'plotly', 'PIL', 'numpy']
+
+
+def cold_start_seconds():
+    out = subprocess.run(
+        [sys.executable, '-c', COLD_START],
+        cwd=ROOT, capture_output=True, text=True, check=True
+    )
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def import_times(statement='import app'):
+    """Return ``(module, self_us, cumulative_us)`` rows from ``-X importtime``."""
+    out = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', statement],
+        cwd=ROOT, capture_output=True, text=True, check=True
+    )
+    rows = []
+    for line in out.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        rows.append((name.strip(), int(self_us), int(cumulative_us)))
+    return rows
+
+
+def loaded_heavy_modules():
+    check = f"import sys, app; print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    out = subprocess.run([sys.executable, '-c', check], cwd=ROOT, capture_output=True, text=True, check=True)
+    return [m for m in out.stdout.strip().split(',') if m]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=15, help='slowest top-level imports to list')
+    args = parser.parse_args()
+
+    samples = [cold_start_seconds() for _ in range(args.runs)]
+    print(f"create_app cold start over {args.runs} runs: "
+          f"median {statistics.median(samples) * 1000:.0f} ms, max {max(samples) * 1000:.0f} ms")
+
+    rows = import_times()
+    top_level = [r for r in rows if '.' not in r[0]]
+    print(f"\n{'module':<40}{'cumulative ms':>15}")
+    for name, _, cumulative in sorted(top_level, key=lambda r: -r[2])[:args.top]:
+        print(f"{name:<40}{cumulative / 1000:>15.1f}")
+
+    heavy = loaded_heavy_modules()
+    print(f"\nHeavy modules loaded by 'import app': {', '.join(heavy) or 'none'}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+"""Template compile and render times with and without the template caches.
+
+Compile: a fresh Jinja environment (a new worker, or a restart) loading
+the heavy pages from source versus from the shared bytecode cache.
+Render: my_bookings for a user with many bookings and book_ride with its
+station selector, fully rendered versus served from {% cache %} fragments.
+
+    python benchmarks/bench_templates.py --bookings 200 --runs 200
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, datetime
+from datetime import time as clock
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask, render_template
+
+from template_cache import init_template_cache
+from forms import BookingForm
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PAGES = ['index.html', 'book_ride.html', 'my_bookings.html']
+# Endpoints base.html and the pages link to
+ENDPOINTS = ['index', 'dashboard', 'book_ride', 'find_rides', 'my_bookings', 'logout', 'login', 'register']
+
+
+def make_app(cache_dir, fragments=True):
+    app = Flask('app', root_path=ROOT)
+    app.config.update(
+        SECRET_KEY='bench', WTF_CSRF_ENABLED=False,
+        TEMPLATE_BYTECODE_CACHE_DIR=cache_dir, FRAGMENT_CACHE_ENABLED=fragments
+    )
+    init_template_cache(app)
+    for endpoint in ENDPOINTS:
+        app.add_url_rule(f'/{endpoint}', endpoint, lambda: '')
+    app.add_url_rule('/booking_confirmation/<int:booking_id>', 'booking_confirmation', lambda booking_id: '')
+    user = SimpleNamespace(id=1, is_authenticated=True, username='Bench')
+    app.context_processor(lambda: {'current_user': user})
+    return app
+
+
+def make_bookings(count):
+    return [
+        SimpleNamespace(
+            id=i, name='Passenger', contact='9876543210', location='Central Station',
+            destination=f'Destination {i % 40}', travel_date=date(2025, 1, 1 + i % 28),
+            travel_time=clock(9, i % 60), passengers=1 + i % 4, status=['pending', 'confirmed', 'cancelled'][i % 3],
+            created_at=datetime(2024, 12, 1, 12, 0)
+        )
+        for i in range(count)
+    ]
+
+
+def timed(func, runs):
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def compile_all(cache_dir, use_cache):
+    app = make_app(cache_dir)
+    if not use_cache:
+        app.jinja_env.bytecode_cache = None
+    started = time.perf_counter()
+    for page in PAGES:
+        app.jinja_env.get_template(page)
+    return (time.perf_counter() - started) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--bookings', type=int, default=200)
+    parser.add_argument('--runs', type=int, default=200)
+    args = parser.parse_args()
+
+    cache_dir = tempfile.mkdtemp()
+    compile_all(cache_dir, use_cache=True)  # fill the bytecode cache once
+    cold = statistics.median(compile_all(cache_dir, False) for _ in range(20))
+    warm = statistics.median(compile_all(cache_dir, True) for _ in range(20))
+    print(f'compile {", ".join(PAGES)} in a fresh worker')
+    print(f'  from source     {cold:8.2f} ms')
+    print(f'  bytecode cache  {warm:8.2f} ms   ({cold / warm:.1f}x)')
+
+    bookings = make_bookings(args.bookings)
+    for label, fragments in (('full render', False), ('fragments', True)):
+        app = make_app(cache_dir, fragments=fragments)
+        with app.test_request_context('/my_bookings'):
+            my_bookings = timed(lambda: render_template('my_bookings.html', bookings=bookings), args.runs)
+        with app.test_request_context('/book_ride'):
+            form = BookingForm()
+            book_ride = timed(lambda: render_template('book_ride.html', form=form), args.runs)
+        if not fragments:
+            baseline = (my_bookings, book_ride)
+            print(f'render (median of {args.runs})')
+            print(f'  {label:14}  my_bookings ({args.bookings} bookings) {my_bookings:7.3f} ms   '
+                  f'book_ride {book_ride:7.3f} ms')
+        else:
+            print(f'  {label:14}  my_bookings ({args.bookings} bookings) {my_bookings:7.3f} ms   '
+                  f'book_ride {book_ride:7.3f} ms   ({baseline[0] / my_bookings:.0f}x / '
+                  f'{baseline[1] / book_ride:.1f}x)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""Station travel-time lookups from the mapped matrix.
+
+Times opening the matrix file (what each worker does once), single
+origin/destination lookups, and clustering the destinations of a
+/groups-sized list of rides, against running the shortest-path search
+per request.
+
+    python benchmarks/bench_travel_times.py --lookups 200000 --rides 5000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stations import STATIONS, STATION_LINKS
+from travel_times import TravelTimes, build_matrix, shortest_times
+
+NAMES = list(STATIONS)
+
+
+def per_second(count, func):
+    started = time.perf_counter()
+    func()
+    return count / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--lookups', type=int, default=200_000)
+    parser.add_argument('--rides', type=int, default=5000)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    path = os.path.join(tempfile.mkdtemp(), 'station_matrix.bin')
+    started = time.perf_counter()
+    build_matrix(path)
+    print(f'build matrix ({len(NAMES)} stations)   {(time.perf_counter() - started) * 1000:8.3f} ms')
+    started = time.perf_counter()
+    times = TravelTimes(path)
+    print(f'open (mmap) per worker          {(time.perf_counter() - started) * 1000:8.3f} ms')
+
+    pairs = [(rng.choice(NAMES), rng.choice(NAMES)) for _ in range(args.lookups)]
+    index = {name: i for i, name in enumerate(NAMES)}
+    search = per_second(len(pairs) // 100, lambda: [
+        shortest_times(NAMES, STATION_LINKS)[index[a]][index[b]] for a, b in pairs[:len(pairs) // 100]
+    ])
+    lookup = per_second(len(pairs), lambda: [times.minutes(a, b) for a, b in pairs])
+    print('lookups/sec')
+    print(f'  shortest-path search per request {search:12,.0f}')
+    print(f'  matrix lookup                    {lookup:12,.0f}   ({lookup / search:.0f}x)')
+
+    rides = [(rng.choice(NAMES), rng.choice(NAMES)) for _ in range(args.rides)]
+    started = time.perf_counter()
+    for origin, destination in rides:
+        times.cluster(destination, 5)
+        times.minutes(origin, destination)
+    print(f'/groups clustering for {args.rides} rides  {(time.perf_counter() - started) * 1000:8.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,14 @@
+from flask import Flask, jsonify, request
+
+import async_support
+
+# Minimal app used by bench_async_serving: /slow stands in for a request that
+# spends most of its time waiting on SMTP or the database.
+app = Flask(__name__)
+
+
+@app.route('/slow')
+def slow():
+    delay = request.args.get('delay', 0.2, type=float)
+    async_support.sleep(delay)
+    return jsonify({'slept': delay})
@@ -0,0 +1,365 @@
+import heapq
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, func, insert, inspect, select, update
+from sqlalchemy.orm import Session
+
+from flask import current_app
+
+import async_support
+from models import db, Booking
+from cache_invalidation import invalidate_on_commit
+from sharding import DEFAULT_SHARD, current_shard, format_cursor, on_each_shard, parse_cursor
+
+# -------------------------
+#    BOOKING STATE MACHINE
+# -------------------------
+#
+#   pending    -> confirmed, cancelled, expired
+#   confirmed  -> cancelled
+#   joined     -> cancelled
+#   cancelled, expired are final
+#
+# Bookings start as pending (booked through the form) or joined (joined a
+# posted ride). Every status change goes through ``transition`` or
+# ``bulk_transition``, or through the ORM (``booking.status = ...``), which
+# is checked at flush; each one appends a BookingEvent.
+
+PENDING = 'pending'
+CONFIRMED = 'confirmed'
+JOINED = 'joined'
+CANCELLED = 'cancelled'
+EXPIRED = 'expired'
+
+STATUSES = (PENDING, CONFIRMED, JOINED, CANCELLED, EXPIRED)
+TRANSITIONS = {
+    PENDING: {CONFIRMED, CANCELLED, EXPIRED},
+    CONFIRMED: {CANCELLED},
+    JOINED: {CANCELLED},
+    CANCELLED: set(),
+    EXPIRED: set(),
+}
+
+EVENT_CREATED = 'created'
+EVENT_STATUS_CHANGED = 'status_changed'
+
+
+class InvalidTransition(ValueError):
+    pass
+
+
+def normalize_status(status):
+    """Canonical spelling of a status; older rows hold 'Pending', 'Cancelled', ..."""
+    value = (status or PENDING).strip().lower()
+    if value not in TRANSITIONS:
+        raise InvalidTransition(f"Unknown booking status: {status}")
+    return value
+
+
+def spellings(statuses):
+    """Every spelling of ``statuses`` that may still be stored, for IN filters."""
+    return sorted({variant for status in statuses for variant in (status, status.title())})
+
+
+def can_transition(from_status, to_status):
+    return normalize_status(to_status) in TRANSITIONS[normalize_status(from_status)]
+
+
+class BookingEvent(db.Model):
+    """Append-only log of booking changes; ``id`` is the change-feed cursor."""
+    __tablename__ = 'booking_event'
+    __table_args__ = (
+        # Per-user feeds walk the user's events in id order
+        db.Index('ix_booking_event_user', 'user_id', 'id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    booking_id = db.Column(db.BigInteger, db.ForeignKey('booking.id'), nullable=False, index=True)
+    user_id = db.Column(db.Integer, nullable=True)
+    event = db.Column(db.String(20), nullable=False)
+    from_status = db.Column(db.String(20), nullable=True)
+    to_status = db.Column(db.String(20), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    booking = db.relationship(Booking)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'booking_id': self.booking_id,
+            'event': self.event,
+            'from_status': self.from_status,
+            'to_status': self.to_status,
+            'created_at': self.created_at.isoformat(),
+        }
+
+
+# One booking's status change as seen by change handlers; from_status is
+# None for a new booking, travel_at the departure as a naive local datetime.
+BookingChange = namedtuple('BookingChange', 'booking_id user_id from_status to_status travel_at')
+
+_change_handlers = []
+
+
+def on_change(handler):
+    """Register ``handler(connection, changes)`` to run inside every writing transaction.
+
+    Handlers see each batch of BookingChange tuples right after the rows
+    are written (after flush for the ORM, after the UPDATE for bulk
+    transitions), so whatever they maintain commits or rolls back with
+    the bookings themselves.
+    """
+    _change_handlers.append(handler)
+    return handler
+
+
+def _travel_at(travel_date, travel_time):
+    return datetime.combine(travel_date, travel_time) if travel_date and travel_time else None
+
+
+@event.listens_for(Session, 'before_flush')
+def _record_booking_changes(session, flush_context, instances):
+    """Check ORM status changes against the state machine and log them."""
+    changes = session.info.setdefault('booking_changes', [])
+    for booking in list(session.new):
+        if isinstance(booking, Booking):
+            booking.status = normalize_status(booking.status)
+            session.add(BookingEvent(
+                booking=booking, user_id=booking.user_id, event=EVENT_CREATED, to_status=booking.status
+            ))
+            changes.append((booking, None, booking.status))
+    for booking in list(session.dirty):
+        if not isinstance(booking, Booking):
+            continue
+        history = inspect(booking).attrs.status.history
+        if not history.has_changes() or not history.deleted:
+            continue
+        old, new = normalize_status(history.deleted[0]), normalize_status(booking.status)
+        booking.status = new
+        if old == new:
+            continue
+        if new not in TRANSITIONS[old]:
+            raise InvalidTransition(f"Booking {booking.id} cannot go from {old} to {new}")
+        session.add(BookingEvent(
+            booking_id=booking.id, user_id=booking.user_id, event=EVENT_STATUS_CHANGED,
+            from_status=old, to_status=new
+        ))
+        changes.append((booking, old, new))
+
+
+@event.listens_for(Session, 'after_flush')
+def _run_change_handlers(session, flush_context):
+    changes = session.info.pop('booking_changes', None)
+    if not changes or not _change_handlers:
+        return
+    changes = [
+        BookingChange(booking.id, booking.user_id, old, new, _travel_at(booking.travel_date, booking.travel_time))
+        for booking, old, new in changes
+    ]
+    connection = session.connection()
+    for handler in _change_handlers:
+        handler(connection, changes)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_changes(session):
+    session.info.pop('booking_changes', None)
+
+
+def transition(booking, to_status):
+    """Move one booking to ``to_status``; raises InvalidTransition if not allowed.
+
+    The event is written when the session flushes, in the caller's commit.
+    """
+    to_status = normalize_status(to_status)
+    if not can_transition(booking.status, to_status):
+        raise InvalidTransition(
+            f"Booking {booking.id} cannot go from {normalize_status(booking.status)} to {to_status}"
+        )
+    booking.status = to_status
+    return booking
+
+
+def bulk_transition(to_status, *conditions, chunk_size=500):
+    """Move every booking matching ``conditions`` that may go to ``to_status``.
+
+    Bookings in a state that can't reach ``to_status`` are skipped. Rows are
+    locked while read (on databases that support it), updated in chunks and
+    logged with one multi-row insert; commit is left to the caller. Returns
+    the ids that changed.
+    """
+    to_status = normalize_status(to_status)
+    sources = spellings(status for status, targets in TRANSITIONS.items() if to_status in targets)
+    rows = db.session.execute(
+        select(Booking.id, Booking.user_id, Booking.status, Booking.travel_date, Booking.travel_time)
+        .where(*conditions, Booking.status.in_(sources))
+        .with_for_update()
+    ).all()
+    if not rows:
+        return []
+    ids = [row.id for row in rows]
+    for start in range(0, len(ids), chunk_size):
+        db.session.execute(
+            update(Booking)
+            .where(Booking.id.in_(ids[start:start + chunk_size]), Booking.status.in_(sources))
+            .values(status=to_status)
+            .execution_options(synchronize_session=False)
+        )
+    for user_id in {row.user_id for row in rows}:
+        invalidate_on_commit('booking_list', user_id)
+    now = datetime.utcnow()
+    db.session.execute(insert(BookingEvent), [
+        {'booking_id': row.id, 'user_id': row.user_id, 'event': EVENT_STATUS_CHANGED,
+         'from_status': normalize_status(row.status), 'to_status': to_status, 'created_at': now}
+        for row in rows
+    ])
+    if _change_handlers:
+        changes = [
+            BookingChange(row.id, row.user_id, normalize_status(row.status), to_status,
+                          _travel_at(row.travel_date, row.travel_time))
+            for row in rows
+        ]
+        connection = db.session.connection()
+        for handler in _change_handlers:
+            handler(connection, changes)
+    return ids
+
+
+# -------------------------
+#        CHANGE FEED
+# -------------------------
+#
+# Consumers remember the last event id they processed and ask for anything
+# after it. On SQLite, which commits one writer at a time, commit order is
+# id order. On PostgreSQL it is not: a transaction holding a lower id can
+# commit after a higher one was read. Background consumers (``consume``)
+# therefore stop at a gap in the ids and only step over it once the event
+# after it is BOOKING_FEED_GAP_SECONDS old; by then the missing id was
+# rolled back or has become visible. The live feed for pages
+# (``wait_for_events``) doesn't wait: there a late event only shows up
+# when the page reloads. Events live on the shard of their booking, so a
+# feed cursor holds one position per shard (see sharding.format_cursor);
+# with one database it is just the last event id.
+
+def _latest_event_id(user_id):
+    query = select(func.max(BookingEvent.id))
+    if user_id is not None:
+        query = query.where(BookingEvent.user_id == user_id)
+    return db.session.execute(query).scalar() or 0
+
+
+def latest_event_id(user_id=None):
+    """The feed cursor as of now."""
+    return format_cursor(on_each_shard(_latest_event_id, user_id))
+
+
+def events_since(since, limit=100, user_id=None, booking_id=None):
+    """Events after ``since`` in id order, optionally for one user or booking (current shard)."""
+    query = select(BookingEvent).where(BookingEvent.id > since).order_by(BookingEvent.id).limit(limit)
+    if user_id is not None:
+        query = query.where(BookingEvent.user_id == user_id)
+    if booking_id is not None:
+        query = query.where(BookingEvent.booking_id == booking_id)
+    return db.session.scalars(query).all()
+
+
+def _shard_events(positions, limit, user_id):
+    shard = current_shard()
+    events = [(shard, e.to_dict()) for e in events_since(positions[shard], limit, user_id)]
+    # End the read transaction so SQLite doesn't hold a snapshot between polls
+    db.session.rollback()
+    return events
+
+
+def _poll(positions, limit, user_id):
+    # Each shard's events stay in id order; shards interleave by time
+    merged = heapq.merge(
+        *on_each_shard(_shard_events, positions, limit, user_id).values(),
+        key=lambda item: item[1]['created_at']
+    )
+    positions = dict(positions)
+    events = []
+    for shard, booking_event in merged:
+        if len(events) == limit:
+            break
+        positions[shard] = booking_event['id']
+        events.append(booking_event)
+    return events, positions
+
+
+def wait_for_events(since, timeout, limit=100, user_id=None, interval=0.5):
+    """Long-poll: events after cursor ``since``, waiting up to ``timeout`` for the first.
+
+    Returns the events and the cursor to ask from next. Only async workers
+    actually wait; a sync worker answers at once so a single poll can't pin
+    it (as with booking_confirmation).
+    """
+    positions = parse_cursor(since)
+    events, positions = async_support.run_blocking(_poll, positions, limit, user_id)
+    deadline = time.monotonic() + (timeout if async_support.is_green() else 0)
+    while not events and time.monotonic() < deadline:
+        async_support.sleep(interval)
+        events, positions = async_support.run_blocking(_poll, positions, limit, user_id)
+    return events, format_cursor(positions)
+
+
+class FeedCursor(db.Model):
+    """Where a named background consumer has read the booking feed up to."""
+    __tablename__ = 'booking_feed_cursor'
+
+    name = db.Column(db.String(32), primary_key=True)
+    last_event_id = db.Column(db.Integer, nullable=False, default=0)
+
+
+def _ready(events, after, settled_before):
+    """The leading run of ``events`` the cursor may move past.
+
+    Stops at the first id that doesn't follow ``after`` directly, unless
+    that event was written before ``settled_before``.
+    """
+    ready = []
+    for booking_event in events:
+        if booking_event.id != after + 1 and booking_event.created_at > settled_before:
+            break
+        ready.append(booking_event)
+        after = booking_event.id
+    return ready
+
+
+def _consume(name, handler, batch_size):
+    cursor = db.session.get(FeedCursor, name)
+    if cursor is None:
+        cursor = FeedCursor(name=name, last_event_id=0)
+        db.session.add(cursor)
+    grace = timedelta(seconds=current_app.config.get('BOOKING_FEED_GAP_SECONDS', 60))
+    handled = 0
+    while True:
+        events = _ready(events_since(cursor.last_event_id, batch_size), cursor.last_event_id,
+                        datetime.utcnow() - grace)
+        if not events:
+            break
+        for booking_event in events:
+            handler(booking_event)
+        cursor.last_event_id = events[-1].id
+        db.session.commit()
+        handled += len(events)
+    db.session.commit()
+    return handled
+
+
+def consume(name, handler, batch_size=500):
+    """Feed events after ``name``'s cursor to ``handler`` and advance it.
+
+    The handler's writes and the new cursor are committed together, so a
+    batch is handled again only if that commit never happened. Events
+    after a fresh gap in the ids wait for a later run (see above). Each shard
+    is read in turn with its own cursor row ("name@shard"; the default
+    shard's is plain ``name``), kept in the default database. Returns the
+    number of events handled.
+    """
+    def run():
+        shard = current_shard()
+        return _consume(name if shard == DEFAULT_SHARD else f'{name}@{shard}', handler, batch_size)
+    return sum(on_each_shard(run).values())
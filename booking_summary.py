@@ -0,0 +1,224 @@
+from collections import Counter
+from datetime import datetime
+
+from sqlalchemy import case, func, insert, select, tuple_, update
+
+from models import db, Booking
+from sharding import newest, on_each_shard, scatter_objects
+from booking_events import (
+    STATUSES, PENDING, JOINED, CONFIRMED, normalize_status, on_change, spellings
+)
+
+# -------------------------
+#   PER-USER BOOKING SUMMARY
+# -------------------------
+#
+# One row per user with their booking counts by status, how many active
+# trips are still ahead and which one is next. The row is adjusted by
+# deltas in the same transaction as every booking write (ORM or bulk), so
+# the dashboard reads a single primary-key row instead of the user's
+# bookings. The upcoming/next fields age as time passes; they are
+# recomputed from the (user_id, departure) index when the next trip has
+# departed or was cancelled ("stale"). With region shards each shard keeps
+# rows for the bookings it holds and get_summary adds them up.
+
+ACTIVE = (PENDING, JOINED, CONFIRMED)
+PAGE_SIZE = 20
+
+
+class BookingSummary(db.Model):
+    __tablename__ = 'booking_summary'
+
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    total = db.Column(db.Integer, nullable=False, default=0)
+    # One column per status, named after it
+    pending = db.Column(db.Integer, nullable=False, default=0)
+    confirmed = db.Column(db.Integer, nullable=False, default=0)
+    joined = db.Column(db.Integer, nullable=False, default=0)
+    cancelled = db.Column(db.Integer, nullable=False, default=0)
+    expired = db.Column(db.Integer, nullable=False, default=0)
+    upcoming = db.Column(db.Integer, nullable=False, default=0)
+    next_booking_id = db.Column(db.BigInteger, nullable=True)
+    next_trip_at = db.Column(db.DateTime, nullable=True)
+    stale = db.Column(db.Boolean, nullable=False, default=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def by_status(self):
+        return {status: getattr(self, status) for status in STATUSES}
+
+    def to_dict(self):
+        return {
+            'total': self.total,
+            'by_status': self.by_status(),
+            'upcoming': self.upcoming,
+            'next_booking_id': self.next_booking_id,
+            'next_trip_at': self.next_trip_at.isoformat() if self.next_trip_at else None,
+        }
+
+
+def _upcoming(connection, user_id, now):
+    """Active future trips of one user: (count, next booking id, next departure)."""
+    where = (
+        Booking.user_id == user_id,
+        tuple_(Booking.travel_date, Booking.travel_time) > (now.date(), now.time()),
+        Booking.status.in_(spellings(ACTIVE)),
+    )
+    count = connection.execute(select(func.count()).select_from(Booking).where(*where)).scalar()
+    first = connection.execute(
+        select(Booking.id, Booking.travel_date, Booking.travel_time).where(*where)
+        .order_by(Booking.travel_date, Booking.travel_time, Booking.id).limit(1)
+    ).first()
+    if first is None:
+        return count, None, None
+    return count, first.id, datetime.combine(first.travel_date, first.travel_time)
+
+
+def _next_trip_values(connection, user_id, now):
+    count, booking_id, travel_at = _upcoming(connection, user_id, now)
+    return {'upcoming': count, 'next_booking_id': booking_id, 'next_trip_at': travel_at, 'stale': False}
+
+
+def _compute(connection, user_id, now):
+    """Every summary column for one user, from their bookings."""
+    counts = Counter()
+    for status, count in connection.execute(
+        select(Booking.status, func.count()).where(Booking.user_id == user_id).group_by(Booking.status)
+    ):
+        counts[normalize_status(status)] += count
+    values = {status: counts[status] for status in STATUSES}
+    values.update(_next_trip_values(connection, user_id, now), user_id=user_id, total=sum(counts.values()))
+    return values
+
+
+def rebuild_summary(user_id, connection=None, now=None):
+    """Recompute one user's summary from scratch (first use, or repairs)."""
+    connection = connection or db.session.connection()
+    values = _compute(connection, user_id, now or datetime.now())
+    result = connection.execute(update(BookingSummary).where(BookingSummary.user_id == user_id).values(**values))
+    if not result.rowcount:
+        connection.execute(insert(BookingSummary).values(**values))
+    return values
+
+
+@on_change
+def apply_booking_changes(connection, changes, now=None):
+    """Fold a batch of booking changes into the owners' summaries."""
+    now = now or datetime.now()
+    deltas = {}
+    for change in changes:
+        if change.user_id is None:
+            continue
+        delta = deltas.setdefault(change.user_id, {'counts': Counter(), 'upcoming': 0, 'first': None, 'removed': []})
+        if change.from_status is None:
+            delta['counts']['total'] += 1
+        else:
+            delta['counts'][change.from_status] -= 1
+        delta['counts'][change.to_status] += 1
+        if change.travel_at is None or change.travel_at <= now:
+            continue
+        was_active, is_active = change.from_status in ACTIVE, change.to_status in ACTIVE
+        if is_active and not was_active:
+            delta['upcoming'] += 1
+            trip = (change.travel_at, change.booking_id)
+            delta['first'] = min(delta['first'], trip) if delta['first'] else trip
+        elif was_active and not is_active:
+            delta['upcoming'] -= 1
+            delta['removed'].append(change.booking_id)
+
+    summary = BookingSummary
+    for user_id, delta in deltas.items():
+        values = {
+            column: getattr(summary, column) + count
+            for column, count in delta['counts'].items() if count
+        }
+        if delta['upcoming']:
+            values['upcoming'] = summary.upcoming + delta['upcoming']
+        if delta['first']:
+            # SET expressions all see the old row, so both columns test the same condition
+            travel_at, booking_id = delta['first']
+            earlier = (summary.next_trip_at.is_(None)) | (summary.next_trip_at > travel_at)
+            values['next_trip_at'] = case((earlier, travel_at), else_=summary.next_trip_at)
+            values['next_booking_id'] = case((earlier, booking_id), else_=summary.next_booking_id)
+        if delta['removed']:
+            values['stale'] = case((summary.next_booking_id.in_(delta['removed']), True), else_=summary.stale)
+        if not values:
+            continue
+        values['updated_at'] = datetime.utcnow()
+        result = connection.execute(update(summary).where(summary.user_id == user_id).values(**values))
+        if not result.rowcount:
+            # No summary yet: build it from the bookings, which already include this batch
+            rebuild_summary(user_id, connection, now)
+
+
+def _shard_summary(user_id, now):
+    summary = db.session.get(BookingSummary, user_id)
+    if summary is None:
+        rebuild_summary(user_id, now=now)
+    elif summary.stale or (summary.next_trip_at is not None and summary.next_trip_at <= now):
+        db.session.execute(
+            update(BookingSummary).where(BookingSummary.user_id == user_id)
+            .values(**_next_trip_values(db.session.connection(), user_id, now))
+        )
+    else:
+        return summary
+    db.session.commit()
+    return db.session.get(BookingSummary, user_id, populate_existing=True)
+
+
+def _combine(user_id, summaries):
+    """One summary (not stored) adding up the shards' rows."""
+    combined = BookingSummary(user_id=user_id, upcoming=sum(s.upcoming for s in summaries))
+    combined.total = sum(s.total for s in summaries)
+    for status in STATUSES:
+        setattr(combined, status, sum(getattr(s, status) for s in summaries))
+    trips = [(s.next_trip_at, s.next_booking_id) for s in summaries if s.next_trip_at is not None]
+    combined.next_trip_at, combined.next_booking_id = min(trips) if trips else (None, None)
+    return combined
+
+
+def get_summary(user_id, now=None):
+    """The user's summary row, with upcoming/next brought up to date if needed."""
+    now = now or datetime.now()
+    summaries = list(on_each_shard(_shard_summary, user_id, now).values())
+    if len(summaries) == 1:
+        return summaries[0]
+    return _combine(user_id, summaries)
+
+
+# -------------------------
+#     BOOKING PAGES
+# -------------------------
+
+def user_bookings(user_id, before=None, limit=PAGE_SIZE):
+    """One page of a user's bookings, newest first; ``before`` is the last id shown."""
+    query = select(Booking).where(Booking.user_id == user_id)
+    if before is not None:
+        query = query.where(Booking.id < before)
+    # Each shard returns its newest ``limit``; the page is the newest of those
+    return newest(scatter_objects(query.order_by(Booking.id.desc()).limit(limit)), limit)
+
+
+class LazyList:
+    """A list loaded on first use, so a cached fragment never runs the query."""
+
+    def __init__(self, load):
+        self._load = load
+        self._items = None
+
+    @property
+    def items(self):
+        if self._items is None:
+            self._items = self._load()
+        return self._items
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    def __bool__(self):
+        return bool(self.items)
+
+    def __getitem__(self, index):
+        return self.items[index]
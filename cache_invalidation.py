@@ -0,0 +1,44 @@
+from flask import current_app, has_app_context
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from models import db, Booking
+import template_cache
+
+# -------------------------
+#   WRITE-DRIVEN INVALIDATION
+# -------------------------
+#
+# Cached fragments named after the data they show are dropped once a write
+# to that data commits:
+#   'booking_list', user_id   a user's bookings changed
+# ORM writes are picked up at flush; bulk (Core) writes call
+# ``invalidate_on_commit`` themselves.
+
+
+def invalidate_on_commit(name, *args, session=None):
+    """Invalidate fragment ``name``/``args`` when the current transaction commits."""
+    session = session or db.session()
+    session.info.setdefault('fragment_invalidations', set()).add((name, *args))
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_writes(session, flush_context):
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, Booking):
+            invalidate_on_commit('booking_list', obj.user_id, session=session)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate(session):
+    pending = session.info.pop('fragment_invalidations', None)
+    if not pending or not has_app_context():
+        return
+    app = current_app._get_current_object()
+    for name, *args in pending:
+        template_cache.invalidate(name, *args, app=app)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard(session):
+    session.info.pop('fragment_invalidations', None)
@@ -38,9 +38,129 @@ class Config:
     JWT_SECRET_KEY = os.getenv('JWT_SECRET_KEY', 'jwt-secret-key')
     JWT_ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
+    # JSON API responses larger than this are gzipped
+    API_GZIP_MIN_BYTES = int(os.getenv('API_GZIP_MIN_BYTES', 1024))
+
     # WebSocket configuration
     SOCKETIO_MESSAGE_QUEUE = None  # For development, use in-memory
 
+    # Background jobs
+    SCHEDULER_IN_PROCESS = os.getenv('SCHEDULER_IN_PROCESS', 'False').lower() == 'true'
+    SCHEDULER_POLL_INTERVAL = float(os.getenv('SCHEDULER_POLL_INTERVAL', 1.0))
+    SCHEDULER_LEASE_SECONDS = int(os.getenv('SCHEDULER_LEASE_SECONDS', 300))
+
+    # Booking feed consumers (emails) wait this long for an event id that
+    # was skipped to commit, before moving past it (see booking_events.py)
+    BOOKING_FEED_GAP_SECONDS = float(os.getenv('BOOKING_FEED_GAP_SECONDS', 60))
+
+    # Travel reminders
+    REMINDER_LEAD_HOURS = int(os.getenv('REMINDER_LEAD_HOURS', 24))
+    REMINDER_BATCH_SIZE = int(os.getenv('REMINDER_BATCH_SIZE', 500))
+
+    # Destination autocomplete: how often each worker picks up new names
+    DESTINATION_REFRESH_SECONDS = float(os.getenv('DESTINATION_REFRESH_SECONDS', 5))
+
+    # Shared ride snapshot (defaults to instance/ride_snapshot.bin); reads
+    # fall back to SQL when it is older than RIDE_SNAPSHOT_MAX_AGE seconds
+    RIDE_SNAPSHOT_PATH = os.getenv('RIDE_SNAPSHOT_PATH')
+    RIDE_SNAPSHOT_MAX_AGE = int(os.getenv('RIDE_SNAPSHOT_MAX_AGE', 180))
+    RIDE_SNAPSHOT_CHECK_SECONDS = float(os.getenv('RIDE_SNAPSHOT_CHECK_SECONDS', 1.0))
+
+    # Station travel-time matrix (defaults to instance/station_matrix.bin,
+    # rebuilt when the station graph changes); /groups merges destinations
+    # within GROUP_NEARBY_MINUTES of each other
+    STATION_MATRIX_PATH = os.getenv('STATION_MATRIX_PATH')
+    GROUP_NEARBY_MINUTES = int(os.getenv('GROUP_NEARBY_MINUTES', 5))
+
+    # Ride delta feed (/groups/changes): clients further behind than the
+    # retention, or than RIDE_FEED_MAX_CHANGES rides, get a full reset
+    RIDE_CHANGE_RETENTION_HOURS = int(os.getenv('RIDE_CHANGE_RETENTION_HOURS', 24))
+    RIDE_FEED_MAX_CHANGES = int(os.getenv('RIDE_FEED_MAX_CHANGES', 1000))
+
+    # Region shards for rides, bookings and ride members, as
+    # "name=uri,name=uri" (relative SQLite paths are under instance/). Append
+    # new shards at the end: a shard's position is part of the ids it issues
+    SHARD_DATABASES = dict(
+        item.strip().split('=', 1) for item in os.getenv('SHARD_DATABASES', '').split(',') if item.strip()
+    )
+    SHARD_MAP_TTL = int(os.getenv('SHARD_MAP_TTL', 30))
+
+    # Online backups (defaults to instance/backups): SQLite is copied
+    # BACKUP_STEP_PAGES pages at a time with BACKUP_STEP_PAUSE seconds
+    # between steps. Scheduled snapshots are off while BACKUP_INTERVAL_HOURS
+    # is 0. Extra databases to include are "name=uri,name=uri". Workers
+    # look for a restore (and drop their caches) every
+    # BACKUP_RESTORE_CHECK_SECONDS.
+    BACKUP_DIR = os.getenv('BACKUP_DIR')
+    BACKUP_INTERVAL_HOURS = float(os.getenv('BACKUP_INTERVAL_HOURS', 0))
+    BACKUP_KEEP = int(os.getenv('BACKUP_KEEP', 24))
+    BACKUP_STEP_PAGES = int(os.getenv('BACKUP_STEP_PAGES', 256))
+    BACKUP_STEP_PAUSE = float(os.getenv('BACKUP_STEP_PAUSE', 0.005))
+    BACKUP_MAX_RESTARTS = int(os.getenv('BACKUP_MAX_RESTARTS', 4))
+    BACKUP_COMPRESS_LEVEL = int(os.getenv('BACKUP_COMPRESS_LEVEL', 6))
+    BACKUP_RESTORE_CHECK_SECONDS = float(os.getenv('BACKUP_RESTORE_CHECK_SECONDS', 5))
+    BACKUP_EXTRA_DATABASES = dict(
+        item.strip().split('=', 1) for item in os.getenv('BACKUP_EXTRA_DATABASES', '').split(',') if item.strip()
+    )
+
+    # Rate limiting: memory:// (per worker), sqlite:///path (per host, relative
+    # paths are under instance/) or redis:// (across hosts)
+    RATELIMIT_ENABLED = os.getenv('RATELIMIT_ENABLED', 'True').lower() == 'true'
+    RATELIMIT_STORAGE_URL = os.getenv('RATELIMIT_STORAGE_URL', 'sqlite:///ratelimit.db')
+
+    # Admission control: concurrent write requests per worker, reduced while
+    # average DB query time is above the target (seconds)
+    ADMISSION_CONTROL_ENABLED = os.getenv('ADMISSION_CONTROL_ENABLED', 'True').lower() == 'true'
+    ADMISSION_MAX_CONCURRENT = int(os.getenv('ADMISSION_MAX_CONCURRENT', 16))
+    ADMISSION_DB_LATENCY_TARGET = float(os.getenv('ADMISSION_DB_LATENCY_TARGET', 0.05))
+
+    # Idempotency keys: how long responses are kept for replay, and how long
+    # a duplicate waits for the first request before getting 409
+    IDEMPOTENCY_TTL_SECONDS = int(os.getenv('IDEMPOTENCY_TTL_SECONDS', 86400))
+    IDEMPOTENCY_LOCK_SECONDS = int(os.getenv('IDEMPOTENCY_LOCK_SECONDS', 30))
+    IDEMPOTENCY_WAIT_SECONDS = float(os.getenv('IDEMPOTENCY_WAIT_SECONDS', 5))
+
+    # Write-behind ride posting: group ride inserts into fewer transactions.
+    # Durability is commit (wait for the group commit), journal or memory.
+    WRITE_BEHIND_ENABLED = os.getenv('WRITE_BEHIND_ENABLED', 'False').lower() == 'true'
+    WRITE_BEHIND_DURABILITY = os.getenv('WRITE_BEHIND_DURABILITY', 'commit')
+    WRITE_BEHIND_BATCH_SIZE = int(os.getenv('WRITE_BEHIND_BATCH_SIZE', 200))
+    WRITE_BEHIND_MAX_DELAY = float(os.getenv('WRITE_BEHIND_MAX_DELAY', 0.05))
+    WRITE_BEHIND_JOURNAL_DIR = os.getenv('WRITE_BEHIND_JOURNAL_DIR')
+
+    # Admin analytics: chart images are drawn by a background job into
+    # ANALYTICS_CHART_DIR (defaults to instance/analytics_charts)
+    ANALYTICS_CHART_DIR = os.getenv('ANALYTICS_CHART_DIR')
+    ANALYTICS_CHART_DAYS = int(os.getenv('ANALYTICS_CHART_DAYS', 30))
+
+    # Templates: compiled bytecode shared by all workers (defaults to
+    # instance/jinja_cache) and {% cache %} fragments in FRAGMENT_CACHE_URL:
+    # memory:// (per worker, so invalidations miss the other workers),
+    # sqlite:///path (per host, relative paths are under instance/) or redis://
+    TEMPLATE_BYTECODE_CACHE_ENABLED = os.getenv('TEMPLATE_BYTECODE_CACHE_ENABLED', 'True').lower() == 'true'
+    TEMPLATE_BYTECODE_CACHE_DIR = os.getenv('TEMPLATE_BYTECODE_CACHE_DIR')
+    FRAGMENT_CACHE_ENABLED = os.getenv('FRAGMENT_CACHE_ENABLED', 'True').lower() == 'true'
+    FRAGMENT_CACHE_URL = os.getenv('FRAGMENT_CACHE_URL', 'sqlite:///fragment_cache.db')
+    FRAGMENT_CACHE_DEFAULT_TTL = int(os.getenv('FRAGMENT_CACHE_DEFAULT_TTL', 300))
+    FRAGMENT_CACHE_MAX_ENTRIES = int(os.getenv('FRAGMENT_CACHE_MAX_ENTRIES', 5000))
+
+    # Service worker (/sw.js): precached app shell and offline outbox.
+    # Setting it to False makes installed workers clear their caches and
+    # unregister on the next visit.
+    SERVICE_WORKER_ENABLED = os.getenv('SERVICE_WORKER_ENABLED', 'True').lower() == 'true'
+
+    # Fares (in paise): flag fall + per km between stations, each extra
+    # passenger adds FARE_EXTRA_PASSENGER of the fare, and more than
+    # FARE_DEMAND_FREE bookings from a station on a day add FARE_DEMAND_STEP
+    # each, up to FARE_DEMAND_CAP
+    FARE_BASE_PAISE = int(os.getenv('FARE_BASE_PAISE', 3000))
+    FARE_PER_KM_PAISE = int(os.getenv('FARE_PER_KM_PAISE', 1200))
+    FARE_EXTRA_PASSENGER = float(os.getenv('FARE_EXTRA_PASSENGER', 0.5))
+    FARE_DEMAND_FREE = int(os.getenv('FARE_DEMAND_FREE', 10))
+    FARE_DEMAND_STEP = float(os.getenv('FARE_DEMAND_STEP', 0.02))
+    FARE_DEMAND_CAP = float(os.getenv('FARE_DEMAND_CAP', 1.5))
+    FARE_QUOTE_MAX_ITEMS = int(os.getenv('FARE_QUOTE_MAX_ITEMS', 5000))
+
 
 class DevelopmentConfig(Config):
     """Development configuration."""
@@ -52,6 +172,9 @@ class TestingConfig(Config):
     """Testing configuration."""
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    RATELIMIT_ENABLED = False
+    RATELIMIT_STORAGE_URL = 'memory://'
+    FRAGMENT_CACHE_URL = 'memory://'
     WTF_CSRF_ENABLED = False
     MAIL_SUPPRESS_SEND = True
 
@@ -0,0 +1,273 @@
+import re
+import threading
+import time
+import unicodedata
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import event, inspect, select, update
+from sqlalchemy.orm import Session
+
+from models import db, Ride, Booking
+from sharding import on_each_shard
+from stations import STATIONS
+
+# -------------------------
+#    DESTINATION ALIASES
+# -------------------------
+
+
+class DestinationAlias(db.Model):
+    """Maps a normalized spelling to the canonical destination name."""
+    __tablename__ = 'destination_alias'
+
+    id = db.Column(db.Integer, primary_key=True)
+    key = db.Column(db.String(150), unique=True, nullable=False)
+    name = db.Column(db.String(150), nullable=False, index=True)
+    uses = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+_non_alnum = re.compile(r'[^a-z0-9]+')
+
+
+def normalize(text):
+    """Lowercase, strip accents and punctuation, collapse whitespace."""
+    if not text:
+        return ''
+    text = unicodedata.normalize('NFKD', text).encode('ascii', 'ignore').decode('ascii')
+    return _non_alnum.sub(' ', text.lower()).strip()
+
+
+def trigrams(key):
+    padded = f'  {key} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def similarity(a, b):
+    """Trigram Jaccard similarity of two normalized keys."""
+    ta, tb = trigrams(a), trigrams(b)
+    return len(ta & tb) / len(ta | tb) if ta and tb else 0.0
+
+
+def display_name(raw):
+    cleaned = ' '.join(raw.split())
+    return cleaned.title() if cleaned.islower() else cleaned
+
+
+# -------------------------
+#    AUTOCOMPLETE INDEX
+# -------------------------
+
+class _Node:
+    __slots__ = ('children', 'top')
+
+    def __init__(self):
+        self.children = {}
+        self.top = []  # [(weight, name)], heaviest first
+
+
+class DestinationIndex:
+    """In-memory prefix trie plus trigram index over canonical destinations.
+
+    Every word start of a name is inserted ("airport terminal" and
+    "terminal"), and each trie node keeps its own top-``top_k`` names by
+    weight, so a prefix lookup is a walk of ``len(prefix)`` nodes with no
+    scan. Names are added incrementally; weights only grow, so a name can
+    only enter a node's top list on its own update.
+    """
+
+    def __init__(self, top_k=10, common_gram=500):
+        self.top_k = top_k
+        self.common_gram = common_gram
+        self.root = _Node()
+        self.weights = {}
+        self.aliases = {}
+        self.grams = {}
+        self.last_alias_id = 0
+        self.loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.weights)
+
+    def add(self, name, weight=1, key=None):
+        """Add ``weight`` to a canonical name and record ``key`` as an alias."""
+        with self._lock:
+            canonical_key = normalize(name)
+            if key:
+                self.aliases[key] = name
+            self.aliases.setdefault(canonical_key, name)
+            total = self.weights.get(name, 0) + weight
+            self.weights[name] = total
+            for gram in trigrams(canonical_key):
+                self.grams.setdefault(gram, set()).add(name)
+            words = canonical_key.split(' ')
+            for i in range(len(words)):
+                self._insert(' '.join(words[i:]), name, total)
+
+    def _insert(self, key, name, weight):
+        node = self.root
+        self._update_top(node, name, weight)
+        for char in key:
+            node = node.children.setdefault(char, _Node())
+            self._update_top(node, name, weight)
+
+    def _update_top(self, node, name, weight):
+        top = [entry for entry in node.top if entry[1] != name]
+        top.append((weight, name))
+        top.sort(key=lambda entry: (-entry[0], entry[1]))
+        node.top = top[:self.top_k]
+
+    def _walk(self, key):
+        node = self.root
+        for char in key:
+            node = node.children.get(char)
+            if node is None:
+                return None
+        return node
+
+    def suggest(self, query, limit=8):
+        """Suggestions for what the user has typed so far, best first."""
+        key = normalize(query)
+        node = self._walk(key)
+        if node is not None and node.top:
+            return [name for _, name in node.top[:limit]]
+        return [name for name, _ in self.fuzzy(key, limit)]
+
+    def fuzzy(self, key, limit=8, threshold=0.3):
+        """Names sharing enough trigrams with ``key`` (typo tolerance)."""
+        if not key:
+            return []
+        # Rarest grams first; very common ones ("oad", " st") only add noise
+        # and dominate the cost once some candidates have been found
+        postings = sorted((self.grams.get(gram, ()) for gram in trigrams(key)), key=len)
+        counts = {}
+        for names in postings:
+            if counts and len(names) > self.common_gram:
+                break
+            for name in names:
+                counts[name] = counts.get(name, 0) + 1
+        best = sorted(counts, key=lambda name: -counts[name])[:limit * 4]
+        scored = [(name, similarity(key, normalize(name))) for name in best]
+        scored = [item for item in scored if item[1] >= threshold]
+        scored.sort(key=lambda item: (-item[1], -self.weights.get(item[0], 0)))
+        return scored[:limit]
+
+
+_index = DestinationIndex()
+
+
+def reset_index():
+    """Drop the cached index, e.g. after the database was replaced."""
+    global _index
+    _index = DestinationIndex()
+
+
+def get_index():
+    """The process-wide index, loaded on first use and topped up periodically.
+
+    Only alias rows newer than the last one seen are read on refresh, so
+    names added by other workers show up without a rebuild.
+    """
+    index = _index
+    interval = current_app.config.get('DESTINATION_REFRESH_SECONDS', 5)
+    if index.loaded_at and time.monotonic() - index.loaded_at < interval:
+        return index
+
+    if not index.loaded_at:
+        for station in STATIONS:
+            index.add(station, weight=0)
+    rows = db.session.execute(
+        select(DestinationAlias.id, DestinationAlias.key, DestinationAlias.name, DestinationAlias.uses)
+        .where(DestinationAlias.id > index.last_alias_id)
+        .order_by(DestinationAlias.id)
+    ).all()
+    for alias_id, key, name, uses in rows:
+        index.add(name, weight=uses, key=key)
+        index.last_alias_id = alias_id
+    index.loaded_at = time.monotonic()
+    return index
+
+
+def _record_alias(session, key, name, uses):
+    """Insert the alias if missing and count its uses, tolerating races."""
+    dialect = session.get_bind().dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        if dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+        session.execute(
+            insert(DestinationAlias)
+            .values(key=key, name=name, uses=0, created_at=datetime.utcnow())
+            .on_conflict_do_nothing(index_elements=['key'])
+        )
+    elif session.execute(select(DestinationAlias.id).where(DestinationAlias.key == key)).first() is None:
+        session.execute(DestinationAlias.__table__.insert().values(key=key, name=name, uses=0))
+    session.execute(
+        update(DestinationAlias).where(DestinationAlias.key == key).values(uses=DestinationAlias.uses + uses)
+    )
+
+
+def canonicalize(raw, session=None, uses=1):
+    """Return the canonical spelling of a destination, recording new aliases.
+
+    Only a known alias of the same normalized key is rewritten. Near misses
+    are left alone: "Sector 21" is not "Sector 12" and "West Station" is not
+    "East Station", however many trigrams they share. Fuzzy matches are only
+    offered as autocomplete suggestions, for the user to pick.
+    """
+    key = normalize(raw)
+    if not key:
+        return raw
+    session = session or db.session
+    index = get_index()
+    name = index.aliases.get(key)
+    if name is None:
+        # Another worker may already have mapped this spelling
+        name = session.execute(select(DestinationAlias.name).where(DestinationAlias.key == key)).scalar()
+    if name is None:
+        name = display_name(raw)
+    _record_alias(session, key, name, uses)
+    index.add(name, weight=uses, key=key)
+    return name
+
+
+@event.listens_for(Session, 'before_flush')
+def _canonicalize_destinations(session, flush_context, instances):
+    # Group by spelling so a bulk flush costs one lookup per distinct value
+    pending = {}
+    for obj in list(session.new) + list(session.dirty):
+        if not isinstance(obj, (Ride, Booking)) or not obj.destination:
+            continue
+        if obj in session.dirty and not inspect(obj).attrs.destination.history.has_changes():
+            continue
+        pending.setdefault(obj.destination, []).append(obj)
+
+    with session.no_autoflush:
+        for raw, objs in pending.items():
+            name = canonicalize(raw, session, uses=len(objs))
+            for obj in objs:
+                obj.destination = name
+
+
+def _canonicalize_shard():
+    changed = 0
+    for model in (Ride, Booking):
+        names = db.session.scalars(select(model.destination).distinct()).all()
+        for raw in names:
+            name = canonicalize(raw)
+            if name != raw:
+                result = db.session.execute(
+                    update(model).where(model.destination == raw).values(destination=name)
+                    .execution_options(synchronize_session=False)
+                )
+                changed += result.rowcount
+        db.session.commit()
+    return changed
+
+
+def canonicalize_existing():
+    """Rewrite destinations stored before canonicalization was enabled."""
+    return sum(on_each_shard(_canonicalize_shard).values())
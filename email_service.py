@@ -2,12 +2,27 @@ from flask import render_template, current_app
 from flask_mail import Mail, Message
 import os
 
+import async_support
+
 mail = Mail()
 
 def init_mail(app):
     """Initialize Flask-Mail with the app."""
     mail.init_app(app)
 
+def _send_logged(msg):
+    try:
+        mail.send(msg)
+    except Exception as e:
+        current_app.logger.error(f"Background email send failed: {str(e)}")
+
+def _deliver(msg):
+    """Send a message; under eventlet workers the SMTP exchange runs on its own green thread."""
+    if async_support.is_green():
+        async_support.spawn(_send_logged, msg)
+    else:
+        mail.send(msg)
+
 def send_booking_confirmation_email(booking):
     """Send booking confirmation email to user."""
     try:
@@ -28,7 +43,7 @@ def send_booking_confirmation_email(booking):
         )
 
         # Send email
-        mail.send(msg)
+        _deliver(msg)
         current_app.logger.info(f"Booking confirmation email sent for booking {booking.id}")
 
     except Exception as e:
@@ -55,7 +70,7 @@ def send_booking_cancellation_email(booking):
         )
 
         # Send email
-        mail.send(msg)
+        _deliver(msg)
         current_app.logger.info(f"Booking cancellation email sent for booking {booking.id}")
 
     except Exception as e:
@@ -81,7 +96,7 @@ def send_admin_booking_notification(booking):
         )
 
         # Send email
-        mail.send(msg)
+        _deliver(msg)
         current_app.logger.info(f"Admin booking notification sent for booking {booking.id}")
 
     except Exception as e:
@@ -107,7 +122,7 @@ def send_registration_welcome_email(user):
         )
 
         # Send email
-        mail.send(msg)
+        _deliver(msg)
         current_app.logger.info(f"Welcome email sent to user {user.email}")
 
     except Exception as e:
@@ -134,7 +149,7 @@ def send_payment_success_email(booking, payment_details):
         )
 
         # Send email
-        mail.send(msg)
+        _deliver(msg)
         current_app.logger.info(f"Payment success email sent for booking {booking.id}")
 
     except Exception as e:
@@ -161,8 +176,26 @@ def send_ride_join_notification(ride, joining_user):
         )
 
         # Send email
-        mail.send(msg)
+        _deliver(msg)
         current_app.logger.info(f"Ride join notification sent for ride {ride.id}")
 
     except Exception as e:
         current_app.logger.error(f"Failed to send ride join notification: {str(e)}")
+
+def send_bulk_messages(messages):
+    """Send many messages over a single SMTP connection.
+
+    Errors are logged and re-raised so the calling job can be retried.
+    """
+    if not messages:
+        return 0
+    try:
+        with mail.connect() as conn:
+            for msg in messages:
+                conn.send(msg)
+        current_app.logger.info(f"Sent batch of {len(messages)} emails")
+        return len(messages)
+
+    except Exception as e:
+        current_app.logger.error(f"Failed to send email batch: {str(e)}")
+        raise
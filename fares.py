@@ -0,0 +1,263 @@
+from collections import Counter
+from datetime import datetime, time
+
+from flask import current_app
+from sqlalchemy import func, select, tuple_, update
+
+from geo import EARTH_RADIUS_KM
+from lazy_imports import lazy_import
+from models import db, Booking, MAX_PASSENGERS, MIN_PASSENGERS
+from scheduler import Job, JOB_QUEUED, enqueue, task
+from stations import STATIONS
+from booking_events import PENDING, JOINED, CONFIRMED, spellings
+from cache_invalidation import invalidate_on_commit
+from sharding import on_each_shard, scatter
+
+np = lazy_import('numpy')
+
+# -------------------------
+#        FARE MODEL
+# -------------------------
+#
+# fare = pair base fare (flag fall + per km between the two stations)
+#        x passenger factor (each extra passenger adds FARE_EXTRA_PASSENGER)
+#        x time-of-day multiplier (weekday x hour table below)
+#        x demand multiplier (active bookings from the same station that day)
+#
+# Amounts are integer paise, the unit payment gateways take, rounded to
+# whole rupees. Every step is an array operation, so a batch of thousands
+# of itineraries is priced with a handful of numpy calls.
+
+PEAK, NIGHT, WEEKEND_DAY = 1.3, 1.2, 1.1
+ACTIVE = (PENDING, JOINED, CONFIRMED)
+UNPRICED = -1
+
+
+def time_multipliers():
+    """(7, 24) multipliers indexed by weekday (Monday = 0) and departure hour."""
+    table = np.ones((7, 24))
+    table[:, [22, 23, 0, 1, 2, 3, 4]] = NIGHT
+    table[:5, 7:10] = PEAK
+    table[:5, 17:20] = PEAK
+    table[5:, 10:21] = WEEKEND_DAY
+    return table
+
+
+class FareEngine:
+    """Prices itineraries between the stations in ``stations``.
+
+    ``price`` is the vectorized core and takes parallel arrays; ``quote``
+    accepts itinerary dicts as they arrive from forms and the API.
+    """
+
+    def __init__(self, stations=STATIONS, base=3000, per_km=1200, extra_passenger=0.5,
+                 demand_free=10, demand_step=0.02, demand_cap=1.5):
+        self.names = list(stations)
+        self.codes = {name.lower(): code for code, name in enumerate(self.names)}
+        lat, lon = np.radians(np.array(list(stations.values()), dtype=float)).T
+        # Pairwise haversine distances, once for the whole table
+        a = (np.sin((lat[None, :] - lat[:, None]) / 2) ** 2
+             + np.cos(lat)[:, None] * np.cos(lat)[None, :] * np.sin((lon[None, :] - lon[:, None]) / 2) ** 2)
+        self.distance_km = 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+        self.base_fares = base + per_km * self.distance_km
+        self.time_multipliers = time_multipliers()
+        self.extra_passenger = extra_passenger
+        self.demand_free = demand_free
+        self.demand_step = demand_step
+        self.demand_cap = demand_cap
+
+    def station_codes(self, names):
+        """Station codes for names (case-insensitive); UNPRICED for unknown ones."""
+        # Look up each distinct spelling once, then spread the codes back out
+        distinct, inverse = np.unique(np.array(names, dtype=str), return_inverse=True)
+        lookup = np.array([self.codes.get(name.strip().lower(), UNPRICED) for name in distinct], dtype=np.int32)
+        return lookup[inverse.reshape(-1)]
+
+    def demand_multipliers(self, bookings):
+        extra = np.maximum(np.asarray(bookings) - self.demand_free, 0)
+        return np.clip(1 + self.demand_step * extra, 1, self.demand_cap)
+
+    def demand_table_lookup(self, demand, origins, days):
+        """Bookings per itinerary from a {(station, date): count} mapping."""
+        day_numbers = days.astype(np.int64)
+        first = day_numbers.min()
+        table = np.zeros((len(self.names), day_numbers.max() - first + 1), dtype=np.int64)
+        for (station, day), count in demand.items():
+            code = self.codes.get(station.lower())
+            offset = np.datetime64(day, 'D').astype(np.int64) - first
+            if code is not None and 0 <= offset < table.shape[1]:
+                table[code, offset] = count
+        return np.where(origins >= 0, table[np.maximum(origins, 0), day_numbers - first], 0)
+
+    def price(self, origins, destinations, passengers, weekdays, hours, demand=None):
+        """Fares in paise for parallel arrays of codes, counts and times.
+
+        ``demand`` is the number of active bookings already leaving from the
+        same station that day; rows with unknown stations or no passengers
+        get UNPRICED.
+        """
+        origins, destinations = np.asarray(origins), np.asarray(destinations)
+        passengers = np.asarray(passengers)
+        priced = (origins >= 0) & (destinations >= 0) & (passengers >= 1)
+        fares = self.base_fares[np.where(priced, origins, 0), np.where(priced, destinations, 0)]
+        fares = fares * (1 + self.extra_passenger * (np.maximum(passengers, 1) - 1))
+        fares = fares * self.time_multipliers[weekdays, hours]
+        if demand is not None:
+            fares = fares * self.demand_multipliers(demand)
+        paise = np.rint(fares / 100).astype(np.int64) * 100
+        return np.where(priced, paise, UNPRICED)
+
+    def quote(self, itineraries, demand=None):
+        """Fares in paise for itinerary dicts; None where a fare can't be given.
+
+        Each itinerary has ``location``, ``destination``, ``passengers``,
+        ``travel_date`` (date or YYYY-MM-DD) and ``travel_time`` (time or
+        HH:MM). ``demand`` maps (station, date) to active bookings, as
+        returned by ``station_demand``.
+        """
+        return self.quote_columns(itinerary_columns(itineraries), demand)
+
+    def quote_columns(self, columns, demand=None):
+        """``quote`` for itineraries already split by ``itinerary_columns``."""
+        origins = self.station_codes(columns['location'])
+        load = None
+        if demand is not None:
+            load = self.demand_table_lookup(demand, origins, columns['days'])
+        fares = self.price(origins, self.station_codes(columns['destination']), columns['passengers'],
+                           columns['weekdays'], columns['hours'], load)
+        return [None if fare == UNPRICED else int(fare) for fare in fares]
+
+
+class InvalidItinerary(ValueError):
+    pass
+
+
+def _hour(travel_time):
+    # H:MM and HH:MM[:SS]; a time object stringifies as HH:MM:SS
+    text = str(travel_time)
+    if text[1:2] == ':':
+        text = '0' + text
+    return time.fromisoformat(text).hour
+
+
+def itinerary_columns(itineraries):
+    """Split itinerary dicts into arrays; raises InvalidItinerary on malformed values."""
+    try:
+        days = np.array([str(item.get('travel_date'))[:10] for item in itineraries], dtype='datetime64[D]')
+    except (TypeError, ValueError):
+        raise InvalidItinerary("travel_date must be YYYY-MM-DD")
+    if np.isnat(days).any():
+        raise InvalidItinerary("travel_date must be YYYY-MM-DD")
+    try:
+        hours = np.array([_hour(item.get('travel_time')) for item in itineraries], dtype=np.int64)
+        # Only a missing count means 1
+        passengers = np.array([1 if item.get('passengers') is None else int(item['passengers'])
+                               for item in itineraries], dtype=np.int64)
+    except (TypeError, ValueError, OverflowError):
+        raise InvalidItinerary("travel_time must be HH:MM and passengers a number")
+    if ((passengers < MIN_PASSENGERS) | (passengers > MAX_PASSENGERS)).any():
+        raise InvalidItinerary(f"passengers must be between {MIN_PASSENGERS} and {MAX_PASSENGERS}")
+    return {
+        'location': [item.get('location') for item in itineraries],
+        'destination': [item.get('destination') for item in itineraries],
+        'passengers': passengers,
+        'days': days,
+        # 1970-01-01 was a Thursday
+        'weekdays': (days.astype(np.int64) + 3) % 7,
+        'hours': hours,
+    }
+
+
+def get_engine(app=None):
+    app = app or current_app
+    engine = app.extensions.get('fare_engine')
+    if engine is None:
+        config = app.config
+        engine = FareEngine(
+            base=config.get('FARE_BASE_PAISE', 3000),
+            per_km=config.get('FARE_PER_KM_PAISE', 1200),
+            extra_passenger=config.get('FARE_EXTRA_PASSENGER', 0.5),
+            demand_free=config.get('FARE_DEMAND_FREE', 10),
+            demand_step=config.get('FARE_DEMAND_STEP', 0.02),
+            demand_cap=config.get('FARE_DEMAND_CAP', 1.5),
+        )
+        app.extensions['fare_engine'] = engine
+    return engine
+
+
+def station_demand(dates):
+    """Active bookings per (station, travel date) for the given dates, in one query."""
+    dates = sorted(set(dates))
+    if not dates:
+        return {}
+    rows = scatter(
+        select(Booking.location, Booking.travel_date, func.count())
+        .where(Booking.travel_date.in_(dates), Booking.status.in_(spellings(ACTIVE)))
+        .group_by(Booking.location, Booking.travel_date)
+    )
+    demand = Counter()
+    for location, travel_date, count in rows:
+        demand[location, travel_date] += count
+    return dict(demand)
+
+
+def quote_itineraries(itineraries):
+    """Quotes for a batch, including the demand of the days it covers."""
+    columns = itinerary_columns(itineraries)
+    return get_engine().quote_columns(columns, demand=station_demand(columns['days'].astype(object)))
+
+
+# -------------------------
+#        REPRICING
+# -------------------------
+
+@task('reprice_bookings', lease_seconds=600)
+def reprice_bookings(chunk_size=5000, now=None):
+    """Re-quote every active future booking; returns how many fares changed.
+
+    Bookings are read and priced ``chunk_size`` at a time (one numpy pass
+    per chunk), shard by shard, and only changed fares are written back.
+    """
+    engine = get_engine()
+    now = now or datetime.now()
+    upcoming = (
+        tuple_(Booking.travel_date, Booking.travel_time) > (now.date(), now.time()),
+        Booking.status.in_(spellings(ACTIVE)),
+    )
+    dates = scatter(select(Booking.travel_date).where(*upcoming).distinct())
+    demand = station_demand(travel_date for travel_date, in dates)
+    return sum(on_each_shard(_reprice_shard, engine, upcoming, demand, chunk_size).values())
+
+
+def _reprice_shard(engine, upcoming, demand, chunk_size):
+    columns = (Booking.id, Booking.location, Booking.destination, Booking.passengers,
+               Booking.travel_date, Booking.travel_time, Booking.fare)
+    changed = 0
+    last_id = 0
+    while True:
+        rows = db.session.execute(
+            select(*columns).where(Booking.id > last_id, *upcoming).order_by(Booking.id).limit(chunk_size)
+        ).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+        fares = engine.quote([row._asdict() for row in rows], demand=demand)
+        updates = [{'id': row.id, 'fare': fare} for row, fare in zip(rows, fares) if fare != row.fare]
+        if updates:
+            db.session.execute(update(Booking), updates)
+            changed += len(updates)
+    if changed:
+        invalidate_on_commit('booking_list')
+    db.session.commit()
+    return changed
+
+
+def request_repricing():
+    """Queue a repricing run unless one is already waiting; commit to send it."""
+    pending = db.session.execute(
+        select(Job.id).where(Job.name == 'reprice_bookings', Job.status == JOB_QUEUED).limit(1)
+    ).first()
+    if pending is None:
+        enqueue('reprice_bookings')
+        return True
+    return False
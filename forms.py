@@ -0,0 +1,53 @@
+from flask_wtf import FlaskForm
+from wtforms import (
+    StringField, PasswordField, SubmitField, BooleanField,
+    DateField, TimeField, IntegerField, SelectField
+)
+from wtforms.validators import (
+    DataRequired, Email, EqualTo, Length, NumberRange
+)
+
+from models import MAX_PASSENGERS, MIN_PASSENGERS
+from stations import STATIONS
+
+
+class RegisterForm(FlaskForm):
+    name = StringField('Name', validators=[DataRequired(), Length(min=2, max=150)])
+    email = StringField('Email', validators=[DataRequired(), Email()])
+    contact = StringField('Contact', validators=[DataRequired(), Length(min=10, max=50)])
+    password = PasswordField('Password', validators=[DataRequired(), Length(min=6)])
+    confirm_password = PasswordField(
+        'Confirm Password',
+        validators=[DataRequired(), EqualTo('password')]
+    )
+    submit = SubmitField('Register')
+
+
+class LoginForm(FlaskForm):
+    email = StringField('Email', validators=[DataRequired(), Email()])
+    password = PasswordField('Password', validators=[DataRequired()])
+    remember = BooleanField('Remember Me')
+    submit = SubmitField('Login')
+
+
+class RideForm(FlaskForm):
+    name = StringField('Name', validators=[DataRequired(), Length(min=2, max=150)])
+    location = StringField('Location', validators=[DataRequired()])
+    destination = StringField('Destination', validators=[DataRequired()])
+    contact = StringField('Contact', validators=[DataRequired(), Length(min=10, max=50)])
+    submit = SubmitField('Create Ride')
+
+
+class BookingForm(FlaskForm):
+    name = StringField('Your Name', validators=[DataRequired(), Length(min=2, max=150)])
+    location = SelectField(
+        'Current Location/Station',
+        choices=[('', '-- Select Location --')] + [(name, name) for name in STATIONS],
+        validators=[DataRequired()]
+    )
+    destination = StringField('Destination', validators=[DataRequired(), Length(min=2, max=150)])
+    travel_date = DateField('Date of Travel', validators=[DataRequired()])
+    travel_time = TimeField('Time of Travel', validators=[DataRequired()])
+    passengers = IntegerField('Number of Passengers', validators=[DataRequired(), NumberRange(min=MIN_PASSENGERS, max=MAX_PASSENGERS)])
+    contact = StringField('Contact Number', validators=[DataRequired(), Length(min=10, max=15)])
+    submit = SubmitField('Book Ride')
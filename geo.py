@@ -0,0 +1,84 @@
+import math
+
+from stations import station_coordinates
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = 111.32
+
+# Rides are bucketed into a fixed lat/lon grid (~1.1 km cells). A cell id is
+# row * CELL_COLUMNS + col, so every grid row is a contiguous id range and a
+# bounding box becomes one BETWEEN per row on an ordinary B-tree index.
+CELL_DEGREES = 0.01
+CELL_COLUMNS = int(round(360 / CELL_DEGREES))
+CELL_KM = CELL_DEGREES * KM_PER_DEGREE
+
+
+def _row(lat):
+    return int(math.floor((min(max(lat, -90.0), 89.999999) + 90.0) / CELL_DEGREES))
+
+
+def _col(lon):
+    return int(math.floor((lon + 180.0) / CELL_DEGREES))
+
+
+def cell_of(lat, lon):
+    """Grid cell id for a coordinate."""
+    return _row(lat) * CELL_COLUMNS + _col(lon) % CELL_COLUMNS
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance between two coordinates in kilometres."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def bounding_box(lat, lon, radius_km):
+    """(lat0, lat1, lon0, lon1) of a circle; longitudes may fall outside [-180, 180]."""
+    dlat = radius_km / KM_PER_DEGREE
+    lat0, lat1 = max(lat - dlat, -90.0), min(lat + dlat, 90.0)
+    widest = max(abs(lat0), abs(lat1))
+    dlon = radius_km / (KM_PER_DEGREE * max(math.cos(math.radians(widest)), 1e-6))
+    return lat0, lat1, lon - dlon, lon + dlon
+
+
+def cell_ranges(lat, lon, radius_km):
+    """Cell id ranges (inclusive) covering the bounding box of a circle."""
+    lat0, lat1, lon0, lon1 = bounding_box(lat, lon, radius_km)
+    col0, col1 = _col(lon0), _col(lon1)
+    if col1 - col0 + 1 >= CELL_COLUMNS:
+        spans = [(0, CELL_COLUMNS - 1)]
+    elif col0 < 0:
+        spans = [(col0 + CELL_COLUMNS, CELL_COLUMNS - 1), (0, col1)]
+    elif col1 >= CELL_COLUMNS:
+        spans = [(col0, CELL_COLUMNS - 1), (0, col1 - CELL_COLUMNS)]
+    else:
+        spans = [(col0, col1)]
+
+    ranges = []
+    for row in range(_row(lat0), _row(lat1) + 1):
+        base = row * CELL_COLUMNS
+        ranges.extend((base + lo, base + hi) for lo, hi in spans)
+    return ranges
+
+
+def ride_geo_values(location, destination, origin=None, dest=None):
+    """Column values for a ride's coordinates.
+
+    Explicit ``origin``/``dest`` (lat, lon) pairs win; otherwise known station
+    names are looked up. Used by the ORM listener and by bulk insert paths,
+    which bypass ORM events.
+    """
+    origin = origin or station_coordinates(location)
+    dest = dest or station_coordinates(destination)
+    values = {
+        'origin_lat': None, 'origin_lon': None, 'origin_cell': None,
+        'dest_lat': None, 'dest_lon': None,
+    }
+    if origin:
+        values.update(origin_lat=origin[0], origin_lon=origin[1], origin_cell=cell_of(*origin))
+    if dest:
+        values.update(dest_lat=dest[0], dest_lon=dest[1])
+    return values
@@ -0,0 +1,64 @@
+from sqlalchemy import select, or_
+
+from models import Ride
+from geo import bounding_box, cell_ranges, haversine_km
+from sharding import scatter, scatter_objects
+
+# First radius tried by nearest_rides; doubled until enough rides are found
+INITIAL_RADIUS_KM = 0.25
+
+
+def rides_within(lat, lon, radius_km, limit=None):
+    """Return ``(ride_id, distance_km)`` pairs within ``radius_km``, nearest first.
+
+    The grid cells select index ranges and the bounding box is checked on
+    the covering index entries, so only rides inside the box reach Python,
+    where exact distances are computed. Every shard is searched.
+    """
+    ranges = cell_ranges(lat, lon, radius_km)
+    lat0, lat1, lon0, lon1 = bounding_box(lat, lon, radius_km)
+    query = (
+        select(Ride.id, Ride.origin_lat, Ride.origin_lon)
+        .where(or_(*[Ride.origin_cell.between(lo, hi) for lo, hi in ranges]))
+        .where(Ride.origin_lat.between(lat0, lat1))
+    )
+    if -180.0 <= lon0 and lon1 <= 180.0:
+        query = query.where(Ride.origin_lon.between(lon0, lon1))
+    rows = scatter(query)
+
+    hits = []
+    for ride_id, ride_lat, ride_lon in rows:
+        distance = haversine_km(lat, lon, ride_lat, ride_lon)
+        if distance <= radius_km:
+            hits.append((ride_id, distance))
+    hits.sort(key=lambda hit: hit[1])
+    return hits[:limit] if limit else hits
+
+
+def nearest_rides(lat, lon, k=10, max_radius_km=50.0):
+    """Return the ``k`` nearest ``(ride_id, distance_km)`` pairs.
+
+    Searches a growing radius so dense areas stay cheap and sparse areas
+    still find matches up to ``max_radius_km``.
+    """
+    radius = INITIAL_RADIUS_KM
+    while True:
+        radius = min(radius, max_radius_km)
+        hits = rides_within(lat, lon, radius)
+        if len(hits) >= k or radius >= max_radius_km:
+            return hits[:k]
+        radius *= 2
+
+
+def load_rides(hits):
+    """Load Ride objects for ``hits`` in order, with ``distance_km`` set."""
+    if not hits:
+        return []
+    by_id = {ride.id: ride for ride in scatter_objects(select(Ride).where(Ride.id.in_([ride_id for ride_id, _ in hits])))}
+    rides = []
+    for ride_id, distance in hits:
+        ride = by_id.get(ride_id)
+        if ride is not None:
+            ride.distance_km = round(distance, 2)
+            rides.append(ride)
+    return rides
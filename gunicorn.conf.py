@@ -0,0 +1,89 @@
+# Gunicorn settings, loaded automatically from the working directory.
+#
+# Pick a preset with GUNICORN_PROFILE:
+#   cpu     - sync workers, one per core plus headroom (default)
+#   io      - threaded workers for routes that mostly wait on SMTP/DB
+#   memory  - few workers, aggressive recycling for small containers
+#
+# Any value can still be overridden with the usual GUNICORN_CMD_ARGS or
+# command line flags, and WEB_CONCURRENCY / GUNICORN_THREADS pin the sizes.
+import multiprocessing
+import os
+
+cores = multiprocessing.cpu_count()
+
+PROFILES = {
+    'cpu': {
+        'worker_class': 'sync',
+        'workers': cores * 2 + 1,
+        'threads': 1,
+        'max_requests': 2000,
+    },
+    'io': {
+        'worker_class': 'gthread',
+        'workers': cores + 1,
+        'threads': 8,
+        'max_requests': 2000,
+    },
+    'memory': {
+        'worker_class': 'gthread',
+        'workers': 2,
+        'threads': 4,
+        'max_requests': 500,
+    },
+}
+
+profile_name = os.getenv('GUNICORN_PROFILE', 'cpu')
+profile = PROFILES.get(profile_name, PROFILES['cpu'])
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', profile['worker_class'])
+workers = int(os.getenv('WEB_CONCURRENCY', profile['workers']))
+threads = int(os.getenv('GUNICORN_THREADS', profile['threads']))
+worker_connections = 1000
+
+# Recycle workers to bound memory growth; jitter keeps them from restarting together
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', profile['max_requests']))
+max_requests_jitter = max_requests // 10
+
+timeout = 30
+graceful_timeout = 30
+keepalive = 5
+
+# Load the app once in the master so imports, models and compiled templates
+# are shared copy-on-write. Eventlet must monkey patch before the app is
+# imported, so preloading is off for that worker class.
+preload_app = worker_class != 'eventlet'
+
+accesslog = '-'
+errorlog = '-'
+loglevel = os.getenv('LOG_LEVEL', 'info').lower()
+
+
+def when_ready(server):
+    if not preload_app:
+        return
+    from warmup import warm_app
+    warm_app(server.app.wsgi())
+    server.log.info(f"Profile {profile_name}: {workers} x {worker_class} workers, {threads} threads")
+
+
+def post_fork(server, worker):
+    # Connections opened in the master must not be shared across processes
+    if not preload_app:
+        return
+    app = server.app.wsgi()
+    try:
+        from models import db
+        with app.app_context():
+            db.engine.dispose(close=False)
+    except Exception as e:
+        # The app may not use the database at all
+        server.log.debug(f"Skipping engine dispose: {e}")
+
+
+def worker_exit(server, worker):
+    # Write out rides still held by the write-behind buffer
+    buffer = server.app.wsgi().extensions.get('ride_write_buffer')
+    if buffer is not None:
+        buffer.close()
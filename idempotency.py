@@ -0,0 +1,234 @@
+import hashlib
+import time
+from datetime import datetime, timedelta
+from functools import wraps
+
+from flask import Response, current_app, jsonify, make_response, request
+from flask_login import current_user
+from sqlalchemy import delete, select, update
+from sqlalchemy.exc import IntegrityError
+
+import async_support
+from models import db
+from scheduler import periodic
+
+# -------------------------
+#     IDEMPOTENCY KEYS
+# -------------------------
+
+KEY_PENDING = 'pending'
+KEY_DONE = 'done'
+
+
+class IdempotencyKey(db.Model):
+    """A write request seen with an ``Idempotency-Key`` and its response.
+
+    The row is claimed before the view runs, so concurrent duplicates see
+    it and wait; once the view returns, the response is stored and replayed
+    for any retry until ``expires_at``.
+    """
+    __tablename__ = 'idempotency_key'
+    __table_args__ = (
+        db.UniqueConstraint('owner', 'scope', 'key', name='uq_idempotency_owner_scope_key'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    owner = db.Column(db.String(64), nullable=False)
+    scope = db.Column(db.String(32), nullable=False)
+    key = db.Column(db.String(128), nullable=False)
+    request_hash = db.Column(db.String(64), nullable=False)
+    status = db.Column(db.String(10), nullable=False, default=KEY_PENDING)
+    locked_until = db.Column(db.DateTime, nullable=True)
+    response_status = db.Column(db.Integer, nullable=True)
+    response_mimetype = db.Column(db.String(100), nullable=True)
+    response_location = db.Column(db.String(500), nullable=True)
+    response_body = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+
+def request_key():
+    """The client's idempotency key from the header, form or JSON body."""
+    key = request.headers.get('Idempotency-Key')
+    if not key:
+        key = request.form.get('idempotency_key')
+    if not key and request.is_json:
+        body = request.get_json(silent=True)
+        if isinstance(body, dict):
+            key = body.get('idempotency_key')
+    return str(key)[:128] if key else None
+
+
+def request_fingerprint():
+    """Hash of what is being written, to catch a key reused for another request."""
+    digest = hashlib.sha256(request.path.encode())
+    if request.is_json:
+        digest.update(request.get_data())
+    else:
+        # Form field order and the CSRF token change between renders of the same form
+        for name in sorted(request.form):
+            if name not in ('csrf_token', 'idempotency_key'):
+                digest.update(f'{name}={request.form.getlist(name)}'.encode())
+    return digest.hexdigest()
+
+
+def _owner():
+    if current_user and current_user.is_authenticated:
+        return f'user:{current_user.get_id()}'
+    return f'ip:{request.remote_addr}'
+
+
+def _claim(owner, scope, key, fingerprint, now):
+    """Insert the key as pending, or take over an expired / abandoned one.
+
+    Returns True if this request now owns the key.
+    """
+    config = current_app.config
+    values = dict(
+        request_hash=fingerprint, status=KEY_PENDING,
+        locked_until=now + timedelta(seconds=config.get('IDEMPOTENCY_LOCK_SECONDS', 30)),
+        expires_at=now + timedelta(seconds=config.get('IDEMPOTENCY_TTL_SECONDS', 86400)),
+        response_status=None, response_mimetype=None, response_location=None, response_body=None
+    )
+    try:
+        db.session.add(IdempotencyKey(owner=owner, scope=scope, key=key, created_at=now, **values))
+        db.session.commit()
+        return True
+    except IntegrityError:
+        db.session.rollback()
+
+    # Reuse the row if it has expired, or if its request died mid-flight
+    result = db.session.execute(
+        update(IdempotencyKey)
+        .where(
+            IdempotencyKey.owner == owner, IdempotencyKey.scope == scope, IdempotencyKey.key == key,
+            (IdempotencyKey.expires_at < now) |
+            ((IdempotencyKey.status == KEY_PENDING) & (IdempotencyKey.locked_until < now))
+        )
+        .values(created_at=now, **values)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return result.rowcount == 1
+
+
+def _load(owner, scope, key):
+    row = db.session.execute(
+        select(IdempotencyKey).where(
+            IdempotencyKey.owner == owner, IdempotencyKey.scope == scope, IdempotencyKey.key == key
+        )
+    ).scalar_one_or_none()
+    if row is not None:
+        db.session.expunge(row)
+    db.session.rollback()
+    return row
+
+
+def _replay(row):
+    response = Response(row.response_body, status=row.response_status, mimetype=row.response_mimetype)
+    if row.response_location:
+        response.headers['Location'] = row.response_location
+    response.headers['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def _conflict(message, status):
+    response = jsonify({'success': False, 'message': message})
+    response.status_code = status
+    if status == 409:
+        response.headers['Retry-After'] = '1'
+    return response
+
+
+def idempotent(scope):
+    """Run a write view at most once per client-supplied idempotency key.
+
+    Requests without a key run as before. The first request with a key
+    runs the view and its response is kept for ``IDEMPOTENCY_TTL_SECONDS``;
+    retries get that response back (with ``Idempotent-Replayed: true``)
+    without touching the database again. A duplicate that arrives while the
+    first is still running waits for it, up to ``IDEMPOTENCY_WAIT_SECONDS``,
+    then gets 409. Reusing a key for a different request body gets 422.
+
+    Refusals (4xx, or JSON with ``"success": false``, e.g. a form that did
+    not validate) are not kept: nothing was written, so the client may fix
+    the request and send it again under the same key.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapped(*args, **kwargs):
+            key = request_key() if request.method == 'POST' else None
+            if not key:
+                return view(*args, **kwargs)
+
+            owner = _owner()
+            fingerprint = request_fingerprint()
+            now = datetime.utcnow()
+            if not _claim(owner, scope, key, fingerprint, now):
+                deadline = time.monotonic() + current_app.config.get('IDEMPOTENCY_WAIT_SECONDS', 5)
+                while True:
+                    row = _load(owner, scope, key)
+                    if row is None:
+                        return _conflict('Request is being processed, please retry', 409)
+                    if row.request_hash != fingerprint:
+                        return _conflict('Idempotency key was already used for a different request', 422)
+                    if row.status == KEY_DONE:
+                        return _replay(row)
+                    if time.monotonic() >= deadline:
+                        return _conflict('Request is being processed, please retry', 409)
+                    async_support.sleep(0.05)
+
+            try:
+                response = make_response(view(*args, **kwargs))
+            except Exception:
+                db.session.rollback()
+                _release(owner, scope, key)
+                raise
+
+            if response.status_code >= 500 or response.is_streamed or _refused(response):
+                # Let the client retry for real
+                _release(owner, scope, key)
+                return response
+            db.session.execute(
+                update(IdempotencyKey)
+                .where(IdempotencyKey.owner == owner, IdempotencyKey.scope == scope, IdempotencyKey.key == key)
+                .values(
+                    status=KEY_DONE, locked_until=None,
+                    response_status=response.status_code,
+                    response_mimetype=response.mimetype,
+                    response_location=response.headers.get('Location'),
+                    response_body=response.get_data(as_text=True)
+                )
+                .execution_options(synchronize_session=False)
+            )
+            db.session.commit()
+            return response
+        return wrapped
+    return decorator
+
+
+def _refused(response):
+    if 400 <= response.status_code < 500:
+        return True
+    body = response.get_json(silent=True) if response.is_json else None
+    return isinstance(body, dict) and body.get('success') is False
+
+
+def _release(owner, scope, key):
+    db.session.execute(
+        delete(IdempotencyKey).where(
+            IdempotencyKey.owner == owner, IdempotencyKey.scope == scope,
+            IdempotencyKey.key == key, IdempotencyKey.status == KEY_PENDING
+        )
+    )
+    db.session.commit()
+
+
+@periodic('17 * * * *', name='purge_idempotency_keys')
+def purge_idempotency_keys(now=None):
+    """Delete expired idempotency keys."""
+    result = db.session.execute(
+        delete(IdempotencyKey).where(IdempotencyKey.expires_at < (now or datetime.utcnow()))
+    )
+    db.session.commit()
+    return result.rowcount
@@ -0,0 +1,53 @@
+import importlib
+import importlib.util
+
+
+class LazyModule:
+    """Module proxy that imports the real module on first attribute access.
+
+    Heavy optional dependencies (matplotlib, plotly, Pillow) are bound at
+    module level with ``lazy_import`` so only the routes that actually use
+    them pay their import cost, and only on first use.
+    """
+
+    def __init__(self, name, setup=None):
+        self.__dict__['_name'] = name
+        self.__dict__['_setup'] = setup
+        self.__dict__['_module'] = None
+
+    def _load(self):
+        module = self.__dict__['_module']
+        if module is None:
+            setup = self.__dict__['_setup']
+            if setup is not None:
+                setup()
+            module = importlib.import_module(self.__dict__['_name'])
+            self.__dict__['_module'] = module
+        return module
+
+    @property
+    def is_loaded(self):
+        return self.__dict__['_module'] is not None
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __setattr__(self, attr, value):
+        setattr(self._load(), attr, value)
+
+    def __repr__(self):
+        state = 'loaded' if self.is_loaded else 'not loaded'
+        return f"<lazy module {self.__dict__['_name']!r} ({state})>"
+
+
+def lazy_import(name, setup=None):
+    """Return a proxy for ``name``; ``setup`` runs just before the real import."""
+    return LazyModule(name, setup)
+
+
+def is_available(name):
+    """Check whether an optional dependency is installed without importing it."""
+    try:
+        return importlib.util.find_spec(name.split('.')[0]) is not None
+    except (ImportError, ValueError):
+        return False
@@ -0,0 +1,149 @@
+from datetime import datetime
+from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
+from flask_login import LoginManager, UserMixin
+from sqlalchemy import event
+
+from geo import ride_geo_values
+
+# -------------------------
+#  DATABASE INITIALIZATION
+# -------------------------
+
+
+class RoutingSession(Session):
+    """db.session's class: a session may carry a ``route`` (set by sharding.shard_context)
+    that sends some statements to another engine."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        route = self.info.get('route')
+        if route is not None and bind is None:
+            engine = route(mapper, clause)
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+login_manager = LoginManager()
+
+# -------------------------
+#        MODELS (MODEL B)
+# -------------------------
+
+# Sharded ride and booking ids (milliseconds * 256 + shard, see
+# sharding.py) need 64 bits, so they and every column holding one are
+# BIGINT. On SQLite, whose INTEGER is 64-bit already, the primary keys stay
+# INTEGER so they remain rowid aliases and still autoincrement.
+SHARDED_ID = db.BigInteger().with_variant(db.Integer(), 'sqlite')
+
+# Many-to-Many table between users and rides
+user_ride = db.Table(
+    'user_ride',
+    db.Column('user_id', db.Integer, db.ForeignKey('user.id'), primary_key=True),
+    db.Column('ride_id', db.BigInteger, db.ForeignKey('ride.id'), primary_key=True),
+    # Rider counts for a handful of rides (the ride feed) look up by ride
+    db.Index('ix_user_ride_ride', 'ride_id')
+)
+
+class User(db.Model, UserMixin):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(150), nullable=False)
+    email = db.Column(db.String(150), unique=True, nullable=False)
+    contact = db.Column(db.String(50), nullable=False)
+    password_hash = db.Column(db.String(150), nullable=False)
+
+    # rides created by this user
+    my_rides = db.relationship(
+        'Ride',
+        backref='driver',
+        lazy=True,
+        foreign_keys='Ride.driver_id'
+    )
+
+    # rides this user joined
+    joined_rides = db.relationship(
+        'Ride',
+        secondary=user_ride,
+        backref='joined_users',
+        lazy=True
+    )
+
+    def set_password(self, password):
+        from werkzeug.security import generate_password_hash
+        self.password_hash = generate_password_hash(password)
+
+    def check_password(self, password):
+        from werkzeug.security import check_password_hash
+        return check_password_hash(self.password_hash, password)
+
+
+class Ride(db.Model):
+    __table_args__ = (
+        # Covering index for radius / nearest-ride lookups (see geo.py)
+        db.Index('ix_ride_origin_cell', 'origin_cell', 'origin_lat', 'origin_lon'),
+    )
+
+    id = db.Column(SHARDED_ID, primary_key=True)
+    driver_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
+    name = db.Column(db.String(150), nullable=False)
+    location = db.Column(db.String(150), nullable=False)
+    destination = db.Column(db.String(150), nullable=False)
+    contact = db.Column(db.String(50), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    # Coordinates, filled from the station list or supplied by the client
+    origin_lat = db.Column(db.Float, nullable=True)
+    origin_lon = db.Column(db.Float, nullable=True)
+    origin_cell = db.Column(db.Integer, nullable=True)
+    dest_lat = db.Column(db.Float, nullable=True)
+    dest_lon = db.Column(db.Float, nullable=True)
+
+
+@event.listens_for(Ride, 'before_insert')
+@event.listens_for(Ride, 'before_update')
+def _fill_ride_coordinates(mapper, connection, ride):
+    def pair(lat, lon):
+        return (lat, lon) if lat is not None and lon is not None else None
+
+    values = ride_geo_values(
+        ride.location, ride.destination,
+        pair(ride.origin_lat, ride.origin_lon), pair(ride.dest_lat, ride.dest_lon)
+    )
+    for column, value in values.items():
+        setattr(ride, column, value)
+
+
+# Passengers on one booking, as BookingForm and the fare quotes accept
+MIN_PASSENGERS = 1
+MAX_PASSENGERS = 8
+
+
+class Booking(db.Model):
+    __table_args__ = (
+        # Departure-window scans for reminders
+        db.Index('ix_booking_departure', 'travel_date', 'travel_time', 'status'),
+        # Analytics rollups: recently changed bookings, then their hour buckets
+        db.Index('ix_booking_updated', 'updated_at'),
+        db.Index('ix_booking_created', 'created_at'),
+        # A user's bookings newest first, and their next trips
+        db.Index('ix_booking_user', 'user_id', 'id'),
+        db.Index('ix_booking_user_departure', 'user_id', 'travel_date', 'travel_time'),
+    )
+
+    id = db.Column(SHARDED_ID, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
+    name = db.Column(db.String(150), nullable=False)
+    location = db.Column(db.String(150), nullable=False)
+    destination = db.Column(db.String(150), nullable=False)
+    travel_date = db.Column(db.Date, nullable=False)
+    travel_time = db.Column(db.Time, nullable=False)
+    passengers = db.Column(db.Integer, nullable=False)
+    contact = db.Column(db.String(50), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    status = db.Column(db.String(20), default='pending')
+    reminder_queued_at = db.Column(db.DateTime, nullable=True)
+    # Quoted fare in paise (fares.py); filled in by the repricing job
+    fare = db.Column(db.Integer, nullable=True)
+    # Set on every UPDATE, including bulk ones, so rollups can find changes
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
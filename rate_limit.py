@@ -0,0 +1,278 @@
+import math
+import os
+import sqlite3
+import threading
+import time
+from functools import wraps
+
+from flask import current_app, has_request_context, request
+from flask_login import current_user
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from werkzeug.exceptions import TooManyRequests, ServiceUnavailable
+
+from sharding import instance_url
+
+# -------------------------
+#    TOKEN BUCKET STORES
+# -------------------------
+#
+# Every store implements ``take(key, rate, burst, now)`` and returns
+# ``(allowed, retry_after_seconds)``. A bucket holds up to ``burst`` tokens
+# and refills at ``rate`` tokens per second; each request takes one.
+
+
+def refill(tokens, updated_at, rate, burst, now):
+    """Token count after refilling since ``updated_at``."""
+    return min(burst, tokens + max(0.0, now - updated_at) * rate)
+
+
+def decide(tokens, rate):
+    """Return (allowed, tokens_left, retry_after) for one request."""
+    if tokens >= 1:
+        return True, tokens - 1, 0.0
+    return False, tokens, (1 - tokens) / rate
+
+
+class MemoryStore:
+    """Buckets in this process only; limits are per worker."""
+
+    def __init__(self, max_keys=100_000):
+        self.buckets = {}
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+
+    def take(self, key, rate, burst, now=None):
+        now = time.time() if now is None else now
+        with self._lock:
+            tokens, updated_at = self.buckets.get(key, (burst, now))
+            allowed, tokens, retry_after = decide(refill(tokens, updated_at, rate, burst, now), rate)
+            if len(self.buckets) >= self.max_keys and key not in self.buckets:
+                # Drop the oldest half; a forgotten bucket simply starts full again
+                for old in sorted(self.buckets, key=lambda k: self.buckets[k][1])[:self.max_keys // 2]:
+                    del self.buckets[old]
+            self.buckets[key] = (tokens, now)
+        return allowed, retry_after
+
+
+class SQLiteStore:
+    """Buckets in a local SQLite file, shared by every worker on the host.
+
+    Stands in for Redis on single-machine deployments and in development:
+    same semantics, no extra service. ``BEGIN IMMEDIATE`` serializes the
+    read-modify-write across processes.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS rate_bucket '
+                         '(key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL)')
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=OFF')
+            self._local.conn = conn
+        return conn
+
+    def take(self, key, rate, burst, now=None):
+        now = time.time() if now is None else now
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute('SELECT tokens, updated_at FROM rate_bucket WHERE key = ?', (key,)).fetchone()
+            tokens, updated_at = row if row else (burst, now)
+            allowed, tokens, retry_after = decide(refill(tokens, updated_at, rate, burst, now), rate)
+            conn.execute('INSERT OR REPLACE INTO rate_bucket (key, tokens, updated_at) VALUES (?, ?, ?)',
+                         (key, tokens, now))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return allowed, retry_after
+
+
+# Same algorithm as above, run atomically inside Redis
+_REDIS_TAKE = """
+local rate, burst, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated_at')
+local tokens = tonumber(state[1]) or burst
+local updated_at = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - updated_at) * rate)
+local allowed = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated_at', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000) + 1000)
+return {allowed, tostring(tokens)}
+"""
+
+
+class RedisStore:
+    """Buckets in Redis, shared by every worker on every host."""
+
+    def __init__(self, url):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.script = self.client.register_script(_REDIS_TAKE)
+
+    def take(self, key, rate, burst, now=None):
+        now = time.time() if now is None else now
+        allowed, tokens = self.script(keys=[f'ratelimit:{key}'], args=[rate, burst, now])
+        if allowed:
+            return True, 0.0
+        return False, (1 - float(tokens)) / rate
+
+
+def create_store(url):
+    """Build a store from ``RATELIMIT_STORAGE_URL``: memory://, sqlite:///path or redis://."""
+    if not url or url.startswith('memory://'):
+        return MemoryStore()
+    if url.startswith('sqlite:///'):
+        return SQLiteStore(url[len('sqlite:///'):])
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisStore(url)
+    raise ValueError(f"Unsupported rate limit storage: {url}")
+
+
+def get_store():
+    store = current_app.extensions.get('rate_limit_store')
+    if store is None:
+        url = current_app.config.get('RATELIMIT_STORAGE_URL')
+        if url and url.startswith('sqlite:///'):
+            # Relative paths are under the instance folder, as for the databases
+            url = f"sqlite:///{instance_url(current_app, url).database}"
+        store = create_store(url)
+        current_app.extensions['rate_limit_store'] = store
+    return store
+
+
+def client_key():
+    """Rate limit identity: the logged-in user, otherwise the client address."""
+    if current_user and current_user.is_authenticated:
+        return f'user:{current_user.get_id()}'
+    return f'ip:{request.remote_addr}'
+
+
+def rate_limit(scope, rate, per=60, burst=None, methods=('POST',)):
+    """Allow ``rate`` requests per ``per`` seconds per client on a view.
+
+    ``burst`` (default ``rate``) is how many can arrive back to back. Only
+    ``methods`` are counted, so a form's GET is never limited. Over the
+    limit the view is not called and the client gets 429 with Retry-After.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapped(*args, **kwargs):
+            if request.method in methods and current_app.config.get('RATELIMIT_ENABLED', True):
+                key = f'{scope}:{client_key()}'
+                try:
+                    allowed, retry_after = get_store().take(key, rate / per, burst or rate)
+                except Exception as e:
+                    # A broken limiter store must not take the site down with it
+                    current_app.logger.error(f"Rate limit check failed: {str(e)}")
+                    allowed, retry_after = True, 0
+                if not allowed:
+                    raise TooManyRequests(retry_after=max(1, math.ceil(retry_after)))
+            return view(*args, **kwargs)
+        return wrapped
+    return decorator
+
+
+# -------------------------
+#     ADMISSION CONTROL
+# -------------------------
+
+class AdmissionGate:
+    """Caps concurrent write requests per worker, tighter when the DB is slow.
+
+    Query latency is tracked as an exponentially weighted average. While it
+    stays under ``latency_target`` up to ``max_concurrent`` requests run at
+    once; above it the limit shrinks in proportion (never below one), so
+    excess requests are turned away immediately with 503 instead of
+    queueing behind a struggling database and inflating everyone's p99.
+    """
+
+    def __init__(self, max_concurrent=16, latency_target=0.05, smoothing=0.2):
+        self.max_concurrent = max_concurrent
+        self.latency_target = latency_target
+        self.smoothing = smoothing
+        self.latency = 0.0
+        self.in_flight = 0
+        self._lock = threading.Lock()
+
+    def record_latency(self, seconds):
+        self.latency += self.smoothing * (seconds - self.latency)
+
+    @property
+    def limit(self):
+        if self.latency <= self.latency_target:
+            return self.max_concurrent
+        return max(1, int(self.max_concurrent * self.latency_target / self.latency))
+
+    def try_enter(self):
+        with self._lock:
+            if self.in_flight >= self.limit:
+                return False
+            self.in_flight += 1
+            return True
+
+    def leave(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def retry_after(self):
+        # Roughly how long the requests already admitted need to drain
+        return max(1, math.ceil(self.in_flight * max(self.latency, self.latency_target)))
+
+
+def get_gate():
+    gate = current_app.extensions.get('admission_gate')
+    if gate is None:
+        gate = AdmissionGate(
+            max_concurrent=current_app.config.get('ADMISSION_MAX_CONCURRENT', 16),
+            latency_target=current_app.config.get('ADMISSION_DB_LATENCY_TARGET', 0.05)
+        )
+        current_app.extensions['admission_gate'] = gate
+    return gate
+
+
+# Only queries run while serving a request feed the gate: the job worker's
+# batch scans, backups and CLI commands say nothing about how fast this
+# worker's requests are answered.
+@event.listens_for(Engine, 'before_cursor_execute')
+def _query_started(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context():
+        conn.info['query_started_at'] = time.perf_counter()
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _query_finished(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.pop('query_started_at', None)
+    if started is not None and has_request_context():
+        gate = current_app.extensions.get('admission_gate')
+        if gate is not None:
+            gate.record_latency(time.perf_counter() - started)
+
+
+def admission_control(view):
+    """Shed the request with 503 when this worker is at its write limit."""
+    @wraps(view)
+    def wrapped(*args, **kwargs):
+        if request.method == 'GET' or not current_app.config.get('ADMISSION_CONTROL_ENABLED', True):
+            return view(*args, **kwargs)
+        gate = get_gate()
+        if not gate.try_enter():
+            raise ServiceUnavailable(retry_after=gate.retry_after())
+        try:
+            return view(*args, **kwargs)
+        finally:
+            gate.leave()
+    return wrapped
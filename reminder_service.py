@@ -0,0 +1,125 @@
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from flask import current_app
+from flask_mail import Message
+from sqlalchemy import select, update, tuple_
+
+from models import db, Booking, User
+from scheduler import task, periodic, enqueue
+from booking_events import PENDING, JOINED, CONFIRMED, spellings
+from email_service import send_bulk_messages
+from sharding import DEFAULT_SHARD, on_each_shard, scatter, shard_context
+
+# Statuses that still expect the passenger to travel, in every stored spelling
+ACTIVE_STATUSES = spellings([PENDING, JOINED, CONFIRMED])
+
+REMINDER_COLUMNS = (
+    Booking.id, Booking.name, Booking.contact, Booking.location,
+    Booking.destination, Booking.travel_date, Booking.travel_time,
+    Booking.passengers
+)
+
+# A booking row with its owner's email (users and bookings may sit in
+# different databases, so they are read separately)
+Reminder = namedtuple('Reminder', [column.key for column in REMINDER_COLUMNS] + ['email'])
+
+
+def due_booking_ids(now, lead, batch_size):
+    """Yield pages of booking ids departing within ``lead`` that have no reminder yet.
+
+    Pages are walked with a keyset on (travel_date, travel_time, id), which
+    follows ``ix_booking_departure``, so each page is an index range scan and
+    only ids are held in memory.
+    """
+    end = now + lead
+    last = (now.date(), now.time(), 0)
+    while True:
+        ids = db.session.execute(
+            select(Booking.id, Booking.travel_date, Booking.travel_time)
+            .where(
+                tuple_(Booking.travel_date, Booking.travel_time, Booking.id) > last,
+                tuple_(Booking.travel_date, Booking.travel_time) <= (end.date(), end.time()),
+                Booking.status.in_(ACTIVE_STATUSES),
+                Booking.reminder_queued_at.is_(None)
+            )
+            .order_by(Booking.travel_date, Booking.travel_time, Booking.id)
+            .limit(batch_size)
+        ).all()
+        if not ids:
+            return
+        yield [row.id for row in ids]
+        last = (ids[-1].travel_date, ids[-1].travel_time, ids[-1].id)
+
+
+def _recipient(row):
+    if row.email:
+        return row.email
+    return row.contact if '@' in row.contact else f"{row.contact}@temp.com"
+
+
+def render_reminders(rows):
+    """Build reminder messages for a page of booking rows with one compiled template."""
+    template = current_app.jinja_env.get_template('emails/travel_reminder.html')
+    sender = current_app.config['MAIL_DEFAULT_SENDER']
+    return [
+        Message(
+            subject=f"Travel Reminder - Travel Company #{row.id}",
+            recipients=[_recipient(row)],
+            html=template.render(booking=row),
+            sender=sender
+        )
+        for row in rows
+    ]
+
+
+@task('send_travel_reminder_batch', concurrency=4, lease_seconds=900)
+def send_travel_reminder_batch(booking_ids):
+    """Render and send reminders for one page of bookings."""
+    bookings = sorted(scatter(
+        select(*REMINDER_COLUMNS, Booking.user_id)
+        .where(Booking.id.in_(booking_ids), Booking.status.in_(ACTIVE_STATUSES))
+    ), key=lambda row: row.id)
+    user_ids = {row.user_id for row in bookings if row.user_id is not None}
+    emails = {}
+    if user_ids:
+        emails = dict(db.session.execute(select(User.id, User.email).where(User.id.in_(user_ids))).all())
+    rows = [Reminder(*row[:-1], emails.get(row.user_id)) for row in bookings]
+    return send_bulk_messages(render_reminders(rows))
+
+
+def _queue_shard_reminders(now, lead, batch_size):
+    queued = 0
+    for booking_ids in due_booking_ids(now, lead, batch_size):
+        db.session.execute(
+            update(Booking)
+            .where(Booking.id.in_(booking_ids))
+            .values(reminder_queued_at=datetime.utcnow())
+            .execution_options(synchronize_session=False)
+        )
+        with shard_context(DEFAULT_SHARD):
+            enqueue('send_travel_reminder_batch', {'booking_ids': booking_ids})
+            db.session.commit()
+        db.session.commit()
+        queued += len(booking_ids)
+    return queued
+
+
+@periodic('*/10 * * * *', name='queue_travel_reminders')
+def queue_travel_reminders(now=None):
+    """Fan out reminder batches for bookings departing within the lead window.
+
+    Each page is stamped and its send job committed in the same transaction,
+    so a booking is never queued twice and a queued batch is never lost. On
+    a region shard the job (in the default database) is committed just
+    before the stamp, so a crash in between can repeat a reminder but not
+    drop one.
+    """
+    now = now or datetime.now()
+    lead = timedelta(hours=current_app.config.get('REMINDER_LEAD_HOURS', 24))
+    batch_size = current_app.config.get('REMINDER_BATCH_SIZE', 500)
+
+    queued = sum(on_each_shard(_queue_shard_reminders, now, lead, batch_size).values())
+    if queued:
+        current_app.logger.info(f"Queued travel reminders for {queued} bookings")
+    return queued
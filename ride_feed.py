@@ -0,0 +1,158 @@
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import delete, event, func, insert, select
+from sqlalchemy.orm import Session
+
+from models import db, Ride, user_ride
+from scheduler import periodic
+from sharding import current_shard, format_cursor, newest, on_each_shard, parse_cursor, scatter
+from travel_times import get_travel_times
+
+# -------------------------
+#      RIDE CHANGE LOG
+# -------------------------
+#
+# Every ride write (post, join, edit, delete) appends the ride id to
+# ride_change in the same transaction; the newest change id is the feed
+# version. A client that sent version N gets the current state of the
+# rides changed after N, and the ids of those that no longer exist, so a
+# refresh costs what changed, not what exists. ORM writes are recorded at
+# flush; bulk (Core) writes call ``record_ride_changes`` themselves. Each
+# shard logs its own rides, so with region shards the version holds one
+# position per shard (see sharding.format_cursor).
+
+
+class RideChange(db.Model):
+    __tablename__ = 'ride_change'
+
+    id = db.Column(db.Integer, primary_key=True)
+    ride_id = db.Column(db.BigInteger, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+
+def record_ride_changes(ride_ids, connection=None):
+    """Log changes to ``ride_ids`` in the current transaction."""
+    now = datetime.utcnow()
+    rows = [{'ride_id': ride_id, 'created_at': now} for ride_id in ride_ids]
+    if rows:
+        (connection or db.session.connection()).execute(insert(RideChange), rows)
+
+
+@event.listens_for(Session, 'after_flush')
+def _record_flushed_rides(session, flush_context):
+    changed = [obj.id for obj in (*session.new, *session.dirty, *session.deleted) if isinstance(obj, Ride)]
+    if changed:
+        record_ride_changes(changed, connection=session.connection())
+
+
+def _latest_version():
+    return db.session.execute(select(func.max(RideChange.id))).scalar() or 0
+
+
+def latest_version():
+    return format_cursor(on_each_shard(_latest_version))
+
+
+# -------------------------
+#        FEED READS
+# -------------------------
+
+def ride_records(rows):
+    """Ride rows (id, location, destination, created_at, riders) as feed records."""
+    times = get_travel_times()
+    nearby = current_app.config.get('GROUP_NEARBY_MINUTES', 5)
+    return [
+        {
+            'id': ride_id,
+            # Destinations a few minutes apart (e.g. Central Station and Bus
+            # Depot) share a group, named after the first station of the cluster
+            'group': times.cluster(destination, nearby) or destination,
+            'origin': origin,
+            'destination': destination,
+            'riders': riders,
+            'eta_minutes': times.minutes(origin, destination),
+            'date': created_at.strftime('%Y-%m-%d %H:%M') if created_at else None,
+        }
+        for ride_id, origin, destination, created_at, riders in rows
+    ]
+
+
+def ride_rows(ride_ids=None):
+    """Rides with their rider counts, newest first; all of them when no ids are given."""
+    riders = select(user_ride.c.ride_id, func.count().label('riders')).group_by(user_ride.c.ride_id)
+    query = select(Ride.id, Ride.location, Ride.destination, Ride.created_at)
+    if ride_ids is not None:
+        riders = riders.where(user_ride.c.ride_id.in_(ride_ids))
+        query = query.where(Ride.id.in_(ride_ids))
+    riders = riders.subquery()
+    return newest(scatter(
+        query.add_columns(func.coalesce(riders.c.riders, 0))
+        .outerjoin(riders, riders.c.ride_id == Ride.id)
+        .order_by(Ride.id.desc())
+    ), key=lambda row: row[0])
+
+
+def _shard_changes(positions, max_changes):
+    """This shard's version and the rides changed after the client's position on it.
+
+    The ids are None when the shard can't answer with a delta.
+    """
+    version = _latest_version()
+    if positions is None:
+        return version, None
+    since = positions[current_shard()]
+    oldest = db.session.execute(select(func.min(RideChange.id))).scalar()
+    if since == version or (oldest is not None and oldest <= since + 1 <= version):
+        ids = db.session.scalars(
+            select(RideChange.ride_id).where(RideChange.id > since, RideChange.id <= version)
+            .distinct().limit(max_changes + 1)
+        ).all()
+        if len(ids) <= max_changes:
+            return version, ids
+    return version, None
+
+
+def changes_since(since, max_changes=None):
+    """Rides changed after version ``since``.
+
+    Returns ``{'version', 'reset', 'rides', 'removed'}``. ``reset`` means
+    the client's version is unknown, too old (its changes were purged) or
+    too far behind, and ``rides`` is then the full list to start over from.
+    The version is read first, so a write that lands during the read is
+    sent again next time rather than missed.
+    """
+    if max_changes is None:
+        max_changes = current_app.config.get('RIDE_FEED_MAX_CHANGES', 1000)
+    shards = on_each_shard(_shard_changes, parse_cursor(since), max_changes)
+    version = format_cursor({shard: shard_version for shard, (shard_version, _) in shards.items()})
+    changed = [ids for _, ids in shards.values()]
+    if None not in changed:
+        # A ride moved between shards shows up on both; it is only removed if found on neither
+        ids = sorted(set().union(*changed))
+        if len(ids) <= max_changes:
+            rows = ride_rows(ids) if ids else []
+            found = {row[0] for row in rows}
+            return {'version': version, 'reset': False, 'rides': ride_records(rows),
+                    'removed': sorted(set(ids) - found)}
+    return {'version': version, 'reset': True, 'rides': ride_records(ride_rows()), 'removed': []}
+
+
+def _purge(cutoff):
+    result = db.session.execute(
+        delete(RideChange).where(RideChange.created_at < cutoff, RideChange.id < _latest_version())
+    )
+    db.session.commit()
+    return result.rowcount
+
+
+@periodic('23 * * * *', name='purge_ride_changes')
+def purge_ride_changes(now=None):
+    """Drop changes older than RIDE_CHANGE_RETENTION_HOURS, keeping the newest.
+
+    Clients further behind than that get a full reset.
+    """
+    hours = current_app.config.get('RIDE_CHANGE_RETENTION_HOURS', 24)
+    cutoff = (now or datetime.utcnow()) - timedelta(hours=hours)
+    return sum(on_each_shard(_purge, cutoff).values())
+
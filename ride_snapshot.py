@@ -0,0 +1,239 @@
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+
+from flask import current_app
+from sqlalchemy import func, select
+
+from lazy_imports import lazy_import
+from models import db, Ride, user_ride
+from scheduler import Job, JOB_QUEUED, enqueue, periodic
+from sharding import newest, scatter
+
+np = lazy_import('numpy')
+
+# -------------------------
+#      SNAPSHOT FORMAT
+# -------------------------
+#
+# One file, rewritten atomically by whichever worker runs the rebuild job
+# and mapped read-only by every web worker:
+#
+#   header   magic, version, built_at (epoch), row count, string table size
+#   rows     fixed-size records, newest ride first; ids are 64-bit, as
+#            sharded ids (milliseconds * 256 + shard) need
+#   strings  JSON list; locations and destinations are stored as indexes into it
+
+MAGIC = b'RSNP'
+VERSION = 2
+HEADER = struct.Struct('<4sH2xdQQ')
+
+_dtype = None
+
+
+def record_dtype():
+    global _dtype
+    if _dtype is None:
+        _dtype = np.dtype([
+            ('id', '<i8'),
+            ('location', '<i4'),
+            ('destination', '<i4'),
+            ('riders', '<i4'),
+            ('created_at', '<f8'),
+            ('origin_lat', '<f4'),
+            ('origin_lon', '<f4'),
+        ])
+    return _dtype
+
+
+def snapshot_path(app=None):
+    app = app or current_app
+    return app.config.get('RIDE_SNAPSHOT_PATH') or os.path.join(app.instance_path, 'ride_snapshot.bin')
+
+
+def build_snapshot(path=None):
+    """Write a fresh snapshot of all rides to ``path``; returns the row count.
+
+    The file is written next to the old one and renamed over it, so readers
+    never see a partial snapshot and keep their old mapping until they
+    notice the new file.
+    """
+    path = path or snapshot_path()
+    riders = (
+        select(user_ride.c.ride_id, func.count().label('riders'))
+        .group_by(user_ride.c.ride_id)
+        .subquery()
+    )
+    rows = newest(scatter(
+        select(Ride.id, Ride.location, Ride.destination, func.coalesce(riders.c.riders, 0),
+               Ride.created_at, Ride.origin_lat, Ride.origin_lon)
+        .outerjoin(riders, riders.c.ride_id == Ride.id)
+        .order_by(Ride.id.desc())
+    ), key=lambda row: row[0])
+
+    strings = {}
+
+    def intern(value):
+        code = strings.get(value)
+        if code is None:
+            code = strings[value] = len(strings)
+        return code
+
+    records = np.array([
+        (ride_id, intern(location), intern(destination), count,
+         created_at.timestamp() if created_at else 0.0,
+         lat if lat is not None else np.nan, lon if lon is not None else np.nan)
+        for ride_id, location, destination, count, created_at, lat, lon in rows
+    ], dtype=record_dtype())
+    string_table = json.dumps(list(strings)).encode('utf-8')
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, time.time(), len(records), len(string_table)))
+        f.write(records.tobytes())
+        f.write(string_table)
+    os.replace(tmp_path, path)
+    return len(records)
+
+
+# -------------------------
+#          READER
+# -------------------------
+
+class RideSnapshot:
+    """Read-only view of a snapshot file backed by a shared memory map.
+
+    ``rows`` is a numpy structured array over the mapped pages, so every
+    worker reads the same physical memory and filters with vectorized
+    comparisons instead of a database round trip.
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            stat = os.fstat(f.fileno())
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.path = path
+        self.identity = (stat.st_ino, stat.st_mtime_ns)
+        magic, version, self.built_at, count, strings_size = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"Not a ride snapshot: {path}")
+        dtype = record_dtype()
+        self.rows = np.frombuffer(self._map, dtype=dtype, count=count, offset=HEADER.size)
+        start = HEADER.size + count * dtype.itemsize
+        self.strings = json.loads(self._map[start:start + strings_size])
+        self._folded = [value.lower() for value in self.strings]
+
+    def __len__(self):
+        return len(self.rows)
+
+    @property
+    def age(self):
+        return time.time() - self.built_at
+
+    def codes_containing(self, needle):
+        """Boolean table over string codes: True where the text contains ``needle``.
+
+        Only the distinct strings are searched; rows are then matched with
+        one table lookup per row.
+        """
+        needle = needle.lower()
+        return np.fromiter((needle in value for value in self._folded), dtype=bool, count=len(self._folded))
+
+    def filter(self, destination=None, location=None):
+        """Rows whose destination / location contain the given text, newest first."""
+        mask = np.ones(len(self.rows), dtype=bool)
+        if destination:
+            mask &= self.codes_containing(destination)[self.rows['destination']]
+        if location:
+            mask &= self.codes_containing(location)[self.rows['location']]
+        return self.rows[mask]
+
+    def records(self, rows):
+        """Plain dicts for ``rows``, with codes resolved back to strings."""
+        strings = self.strings
+        return [
+            {
+                'id': ride_id,
+                'location': strings[location],
+                'destination': strings[destination],
+                'riders': riders,
+                'created_at': created_at,
+            }
+            for ride_id, location, destination, riders, created_at in zip(
+                rows['id'].tolist(), rows['location'].tolist(), rows['destination'].tolist(),
+                rows['riders'].tolist(), rows['created_at'].tolist()
+            )
+        ]
+
+    def groups(self, rows=None):
+        """Records grouped by destination, in first-seen (newest ride) order."""
+        grouped = {}
+        for record in self.records(self.rows if rows is None else rows):
+            grouped.setdefault(record['destination'], []).append(record)
+        return grouped
+
+
+_readers = {}
+_readers_lock = threading.Lock()
+
+
+def get_snapshot(max_age=None):
+    """The current snapshot for this app, or None if missing or too stale.
+
+    The file is re-stat'ed at most once per ``RIDE_SNAPSHOT_CHECK_SECONDS``
+    and remapped only when a rebuild has replaced it. Callers fall back to
+    SQL when this returns None.
+    """
+    config = current_app.config
+    path = snapshot_path()
+    max_age = config.get('RIDE_SNAPSHOT_MAX_AGE', 180) if max_age is None else max_age
+    now = time.monotonic()
+
+    with _readers_lock:
+        snapshot, checked_at = _readers.get(path, (None, 0.0))
+        if snapshot is None or now - checked_at >= config.get('RIDE_SNAPSHOT_CHECK_SECONDS', 1.0):
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                _readers.pop(path, None)
+                return None
+            if snapshot is None or snapshot.identity != (stat.st_ino, stat.st_mtime_ns):
+                try:
+                    snapshot = RideSnapshot(path)
+                except (OSError, ValueError) as e:
+                    current_app.logger.warning(f"Could not open ride snapshot: {str(e)}")
+                    return None
+            _readers[path] = (snapshot, now)
+
+    if snapshot.age > max_age:
+        return None
+    return snapshot
+
+
+# -------------------------
+#      REBUILD JOBS
+# -------------------------
+
+@periodic('* * * * *', name='rebuild_ride_snapshot', lease_seconds=120)
+def rebuild_ride_snapshot():
+    """Rebuild the shared ride snapshot (runs on one worker at a time)."""
+    count = build_snapshot()
+    current_app.logger.info(f"Ride snapshot rebuilt with {count} rides")
+    return count
+
+
+def request_rebuild():
+    """Queue a rebuild after rides changed, unless one is already waiting.
+
+    Commit with the caller's writes; the rebuild runs on the job worker
+    within a poll interval instead of waiting for the next minute.
+    """
+    pending = db.session.execute(
+        select(Job.id).where(Job.name == 'rebuild_ride_snapshot', Job.status == JOB_QUEUED).limit(1)
+    ).first()
+    if pending is None:
+        enqueue('rebuild_ride_snapshot')
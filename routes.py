@@ -1,17 +1,40 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify
+from flask import Blueprint, abort, render_template, redirect, url_for, flash, request, jsonify
 from flask_login import login_user, login_required, logout_user, current_user
-from models_fixed import db, User, Ride, Booking
+from werkzeug.datastructures import MultiDict
+from models import db, User, Ride, Booking, user_ride
 from forms import RegisterForm, LoginForm, RideForm, BookingForm
 from datetime import datetime, timedelta
+import time
+
+from sqlalchemy import insert, select
+
+import async_support
+import destinations  # noqa: F401  (canonicalizes destinations on flush)
+from geo_search import rides_within, load_rides
+from stations import station_coordinates
+from travel_times import get_travel_times
+from ride_feed import changes_since, ride_records, ride_rows, record_ride_changes
+from ride_snapshot import get_snapshot, request_rebuild
+from app_shell import conditional
+from sharding import find, locate, newest, scatter, scatter_objects, shard_context, shard_for
+from rate_limit import rate_limit, admission_control
+from idempotency import idempotent
+from write_behind import post_ride
+from booking_events import PENDING, CANCELLED, can_transition, transition
+from booking_summary import PAGE_SIZE, LazyList, get_summary, user_bookings
 
 main_routes = Blueprint('main', __name__)
 
+FIND_RIDES_LIMIT = 200
+
 @main_routes.route('/')
 def index():
     form = RideForm()
     return render_template('index.html', form=form)
 
 @main_routes.route('/register', methods=['GET', 'POST'])
+@rate_limit('register', 5, per=3600)
+@admission_control
 def register():
     if current_user.is_authenticated:
         return redirect(url_for('main.dashboard'))
@@ -20,7 +43,8 @@ def register():
         if User.query.filter_by(email=form.email.data).first():
             flash("Email already registered", "warning")
             return redirect(url_for('main.register'))
-        user = User(username=form.name.data, email=form.email.data, password=form.password.data)
+        user = User(name=form.name.data, email=form.email.data, contact=form.contact.data)
+        user.set_password(form.password.data)
         db.session.add(user)
         db.session.commit()
         flash("Account created. Please log in.", "success")
@@ -34,7 +58,7 @@ def login():
     form = LoginForm()
     if form.validate_on_submit():
         user = User.query.filter_by(email=form.email.data).first()
-        if user and user.password == form.password.data:  # Note: In production, use password hashing
+        if user and user.check_password(form.password.data):
             login_user(user, remember=form.remember.data)
             flash("Logged in successfully.", "success")
             next_page = request.args.get('next')
@@ -52,55 +76,88 @@ def logout():
 @main_routes.route('/dashboard')
 @login_required
 def dashboard():
-    # Get user's bookings
-    bookings = Booking.query.filter_by(user_id=current_user.id).all()
-    return render_template('dashboard.html', bookings=bookings)
+    # Counts and next trip from the summary row, not the user's bookings
+    return render_template('dashboard.html', summary=get_summary(current_user.id))
+
+def _ride_values(form):
+    return {
+        'name': form.name.data,
+        'location': form.location.data,
+        'destination': form.destination.data,
+        'contact': form.contact.data,
+        'driver_id': current_user.id if current_user.is_authenticated else None,
+    }
 
 @main_routes.route('/find_rides', methods=['GET', 'POST'])
 def find_rides():
     form = RideForm()
-    rides = Ride.query
     if form.validate_on_submit():
         # Create a ride
-        ride = Ride(
-            origin=form.location.data,
-            destination=form.destination.data,
-            date=datetime.combine(form.travel_date.data, form.travel_time.data) if hasattr(form, 'travel_date') else datetime.now()
-        )
-        db.session.add(ride)
-        db.session.commit()
+        post_ride(_ride_values(form))
         flash("Ride created successfully.", "success")
         return redirect(url_for('main.dashboard') if current_user.is_authenticated else url_for('main.index'))
 
+    # Nearest rides by coordinates (?lat=&lon=) or by station name (?near=)
+    lat = request.args.get('lat', type=float)
+    lon = request.args.get('lon', type=float)
+    near = station_coordinates(request.args.get('near'))
+    if near:
+        lat, lon = near
+    if lat is not None and lon is not None:
+        radius = min(request.args.get('radius', 5.0, type=float), 50.0)
+        rides = load_rides(rides_within(lat, lon, radius, limit=50))
+        return render_template('find_rides.html', form=form, rides=rides)
+
     # Filtering by destination/location if provided in GET params
     dest = request.args.get('destination')
     loc = request.args.get('location')
+    snapshot = get_snapshot()
+    if snapshot is not None:
+        # Filter in memory, then load only the rides that are shown
+        ids = snapshot.filter(destination=dest, location=loc)['id'][:FIND_RIDES_LIMIT].tolist()
+        by_id = {ride.id: ride for ride in scatter_objects(select(Ride).where(Ride.id.in_(ids)))} if ids else {}
+        rides = [by_id[ride_id] for ride_id in ids if ride_id in by_id]
+        return render_template('find_rides.html', form=form, rides=rides)
+
+    query = select(Ride)
     if dest:
-        rides = rides.filter(Ride.destination.ilike(f"%{dest}%"))
+        query = query.where(Ride.destination.ilike(f"%{dest}%"))
     if loc:
-        rides = rides.filter(Ride.origin.ilike(f"%{loc}%"))
+        query = query.where(Ride.location.ilike(f"%{loc}%"))
 
-    rides = rides.order_by(Ride.date.desc()).all()
+    rides = newest(scatter_objects(query.order_by(Ride.id.desc()).limit(FIND_RIDES_LIMIT)), FIND_RIDES_LIMIT)
     return render_template('find_rides.html', form=form, rides=rides)
 
 @main_routes.route('/book_ride', methods=['GET', 'POST'])
+@rate_limit('book_ride', 10)
+@admission_control
+@idempotent('book_ride')
 def book_ride():
     form = BookingForm()
     if request.method == 'POST':
         if form.validate_on_submit():
             booking = Booking(
                 user_id=current_user.id if current_user.is_authenticated else None,
-                ride_id=request.form.get('ride_id', 1),  # Default to first ride, adjust as needed
-                status='Pending'
+                name=form.name.data,
+                location=form.location.data,
+                destination=form.destination.data,
+                travel_date=form.travel_date.data,
+                travel_time=form.travel_time.data,
+                passengers=form.passengers.data,
+                contact=form.contact.data,
+                status=PENDING
             )
-            db.session.add(booking)
-            db.session.commit()
+            # Bookings live on the shard of their pickup station
+            with shard_context(shard_for(booking.location)):
+                db.session.add(booking)
+                db.session.commit()
+                booking_id = booking.id
 
             flash("Your ride has been booked successfully!", "success")
             return jsonify({
                 'success': True,
                 'message': 'Ride booked successfully!',
-                'booking_id': booking.id
+                'booking_id': booking_id
             })
         else:
             errors = []
@@ -116,74 +173,138 @@ def book_ride():
 @main_routes.route('/my_bookings')
 @login_required
 def my_bookings():
-    bookings = Booking.query.filter_by(user_id=current_user.id).order_by(Booking.timestamp.desc()).all()
-    return render_template('my_bookings.html', bookings=bookings)
+    # Pages are cached per user in a store all workers share; the query only
+    # runs when the fragment is rebuilt
+    before = request.args.get('before', type=int)
+    user_id = current_user.id
+    bookings = LazyList(lambda: user_bookings(user_id, before=before))
+    return conditional(render_template('my_bookings.html', bookings=bookings, before=before, page_size=PAGE_SIZE),
+                       private=True)
 
 @main_routes.route('/cancel_booking/<int:booking_id>', methods=['POST'])
 @login_required
 def cancel_booking(booking_id):
-    booking = Booking.query.get_or_404(booking_id)
-    if booking.user_id != current_user.id:
-        return jsonify({'success': False, 'message': 'Permission denied'})
+    shard = locate(Booking, [booking_id]).get(booking_id)
+    if shard is None:
+        abort(404)
+    user_id = current_user.id
+    with shard_context(shard):
+        booking = db.session.get(Booking, booking_id)
+        if booking.user_id != user_id:
+            return jsonify({'success': False, 'message': 'Permission denied'})
 
-    # Only allow cancellation if more than 2 hours away
-    if booking.ride and booking.ride.date > datetime.now() + timedelta(hours=2):
-        booking.status = 'Cancelled'
-        db.session.commit()
-        return jsonify({'success': True, 'message': 'Booking cancelled successfully'})
-    else:
-        return jsonify({'success': False, 'message': 'Cannot cancel booking less than 2 hours before travel'})
+        # Only allow cancellation if more than 2 hours away
+        if not can_transition(booking.status, CANCELLED):
+            return jsonify({'success': False, 'message': f'Booking is already {booking.status}'})
+        if datetime.combine(booking.travel_date, booking.travel_time) > datetime.now() + timedelta(hours=2):
+            transition(booking, CANCELLED)
+            db.session.commit()
+            return jsonify({'success': True, 'message': 'Booking cancelled successfully'})
+        else:
+            return jsonify({'success': False, 'message': 'Cannot cancel booking less than 2 hours before travel'})
+
+def _booking_status(booking_id):
+    rows = scatter(select(Booking.status).where(Booking.id == booking_id))
+    # End the read transaction so SQLite doesn't hold a snapshot between polls
+    db.session.rollback()
+    return rows[0][0] if rows else None
+
+def _wait_for_status_change(booking_id, known_status, timeout):
+    """Long-poll until the booking status differs from ``known_status``.
+
+    Only async workers actually wait; a sync worker answers immediately so
+    a single poll can't pin it.
+    """
+    status = async_support.run_blocking(_booking_status, booking_id)
+    deadline = time.monotonic() + (timeout if async_support.is_green() else 0)
+    while status == known_status and time.monotonic() < deadline:
+        async_support.sleep(1)
+        status = async_support.run_blocking(_booking_status, booking_id)
+    return status
 
 @main_routes.route('/booking_confirmation/<int:booking_id>')
 def booking_confirmation(booking_id):
-    booking = Booking.query.get_or_404(booking_id)
+    booking = find(Booking, booking_id)
+    if booking is None:
+        abort(404)
     # Check if user owns this booking or is admin
-    if current_user.is_authenticated and (booking.user_id == current_user.id or current_user.id == 1):
-        return render_template('booking_confirmation.html', booking=booking)
-    elif not current_user.is_authenticated and booking.user_id is None:
-        return render_template('booking_confirmation.html', booking=booking)
+    if current_user.is_authenticated:
+        allowed = booking.user_id == current_user.id or current_user.id == 1
     else:
+        allowed = booking.user_id is None
+    if not allowed:
         flash("You don't have permission to view this booking.", "danger")
         return redirect(url_for('main.index'))
 
+    if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+        wait = min(request.args.get('wait', 0, type=int), 30)
+        status = _wait_for_status_change(booking.id, request.args.get('status'), wait)
+        return jsonify({
+            'status': status,
+            'retry_after': 0 if async_support.is_green() else 30
+        })
+    eta = get_travel_times().minutes(booking.location, booking.destination)
+    arrival = None
+    if eta is not None:
+        arrival = datetime.combine(booking.travel_date, booking.travel_time) + timedelta(minutes=eta)
+    return render_template('booking_confirmation.html', booking=booking, eta=eta, arrival=arrival)
+
 @main_routes.route('/join', methods=['POST'])
 @login_required
+@rate_limit('join', 30)
+@admission_control
+@idempotent('join')
 def join():
     data = request.form or request.json
-    ride_id = data.get('ride_id')
-    ride = Ride.query.get(ride_id)
-    if ride:
-        # Create booking for this user and ride
-        booking = Booking(user_id=current_user.id, ride_id=ride.id, status='Joined')
-        db.session.add(booking)
-        db.session.commit()
+    try:
+        ride_id = int(data.get('ride_id'))
+    except (TypeError, ValueError):
+        return jsonify({"success": False, "message": "Ride not found"})
+    shard = locate(Ride, [ride_id]).get(ride_id)
+    if shard:
+        # Membership is written next to the ride, on its shard
+        user_id = current_user.id
+        with shard_context(shard):
+            joined = db.session.execute(
+                select(user_ride.c.ride_id)
+                .where(user_ride.c.user_id == user_id, user_ride.c.ride_id == ride_id)
+            ).first()
+            if not joined:
+                db.session.execute(insert(user_ride).values(user_id=user_id, ride_id=ride_id))
+                record_ride_changes([ride_id])
+                request_rebuild()
+            db.session.commit()
         return jsonify({"success": True, "message": "Successfully joined the ride"})
     return jsonify({"success": False, "message": "Ride not found"})
 
 @main_routes.route('/groups')
 def groups():
-    rides = Ride.query.all()
+    snapshot = get_snapshot()
+    if snapshot is not None:
+        rides = [
+            (r['id'], r['location'], r['destination'], datetime.fromtimestamp(r['created_at']), r['riders'])
+            for r in snapshot.records(snapshot.rows)
+        ]
+    else:
+        rides = ride_rows()
     groups = {}
-    for ride in rides:
-        dest = ride.destination
-        if dest not in groups:
-            groups[dest] = []
-        groups[dest].append({
-            "id": ride.id,
-            "origin": ride.origin,
-            "destination": ride.destination,
-            "date": ride.date.strftime('%Y-%m-%d %H:%M')
-        })
-    return jsonify(groups)
+    for record in ride_records(rides):
+        groups.setdefault(record['group'], []).append(record)
+    return conditional(jsonify(groups))
+
+@main_routes.route('/groups/changes')
+def group_changes():
+    # Only the rides changed since the client's ?since=<version>; a full
+    # list (reset) when the client has none or is too far behind
+    return conditional(jsonify(changes_since(request.args.get('since'))))
 
 @main_routes.route('/submit', methods=['POST'])
+@rate_limit('submit', 5, burst=10)
+@admission_control
+@idempotent('submit')
 def submit():
-    data = request.json
-    ride = Ride(
-        origin=data.get('location'),
-        destination=data.get('destination'),
-        date=datetime.now()  # Adjust as needed
-    )
-    db.session.add(ride)
-    db.session.commit()
+    form = RideForm(formdata=MultiDict(request.get_json(silent=True) or {}))
+    if not form.validate():
+        return jsonify({"success": False, "message": "Invalid ride", "errors": form.errors}), 400
+    post_ride(_ride_values(form))
     return jsonify({"message": "Ride created successfully"})
@@ -0,0 +1,395 @@
+import importlib
+import json
+import os
+import socket
+import threading
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import and_, func, or_, select, update
+
+from models import db
+
+# -------------------------
+#        JOB TABLES
+# -------------------------
+
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_DONE = 'done'
+JOB_FAILED = 'failed'
+
+
+class Job(db.Model):
+    """A unit of deferred work, claimed by workers through a time-limited lease."""
+    __table_args__ = (
+        db.Index('ix_job_claim', 'status', 'run_at'),
+        db.Index('ix_job_name_status', 'name', 'status'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    payload = db.Column(db.Text, nullable=False, default='{}')
+    status = db.Column(db.String(20), nullable=False, default=JOB_QUEUED)
+    run_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=5)
+    locked_by = db.Column(db.String(100), nullable=True)
+    lease_expires_at = db.Column(db.DateTime, nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    @property
+    def args(self):
+        return json.loads(self.payload or '{}')
+
+
+class PeriodicJob(db.Model):
+    """Persistent state of a cron-style job so only one worker fires each run."""
+    name = db.Column(db.String(100), primary_key=True)
+    cron = db.Column(db.String(100), nullable=False)
+    next_run_at = db.Column(db.DateTime, nullable=False)
+    last_run_at = db.Column(db.DateTime, nullable=True)
+
+
+# -------------------------
+#      CRON SCHEDULES
+# -------------------------
+
+class CronSchedule:
+    """Five-field cron expression: minute hour day-of-month month day-of-week."""
+
+    RANGES = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 7)]
+
+    def __init__(self, expression):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f"Cron expression needs 5 fields: {expression!r}")
+        self.expression = expression
+        parsed = [self._parse(field, lo, hi) for field, (lo, hi) in zip(fields, self.RANGES)]
+        self.minutes, self.hours, self.days, self.months, weekdays = parsed
+        # Cron allows both 0 and 7 for Sunday
+        self.weekdays = {d % 7 for d in weekdays}
+        self.days_restricted = fields[2] != '*'
+        self.weekdays_restricted = fields[4] != '*'
+
+    @staticmethod
+    def _parse(field, lo, hi):
+        values = set()
+        for part in field.split(','):
+            step = 1
+            if '/' in part:
+                part, step = part.split('/')
+                step = int(step)
+            if part == '*':
+                start, end = lo, hi
+            elif '-' in part:
+                start, end = (int(v) for v in part.split('-'))
+            else:
+                start = int(part)
+                end = hi if step > 1 else start
+            if start < lo or end > hi or start > end or step < 1:
+                raise ValueError(f"Invalid cron field: {field!r}")
+            values.update(range(start, end + 1, step))
+        return values
+
+    def _day_matches(self, dt):
+        weekday = (dt.weekday() + 1) % 7
+        day_ok = dt.day in self.days
+        weekday_ok = weekday in self.weekdays
+        if self.days_restricted and self.weekdays_restricted:
+            return day_ok or weekday_ok
+        return day_ok and weekday_ok
+
+    def next_after(self, dt):
+        """Return the first matching minute strictly after ``dt``."""
+        dt = dt.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = dt + timedelta(days=366 * 5)
+        while dt < limit:
+            if dt.month not in self.months:
+                dt = (dt.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+                continue
+            if not self._day_matches(dt):
+                dt = dt.replace(hour=0, minute=0) + timedelta(days=1)
+                continue
+            if dt.hour not in self.hours:
+                dt = dt.replace(minute=0) + timedelta(hours=1)
+                continue
+            if dt.minute not in self.minutes:
+                dt += timedelta(minutes=1)
+                continue
+            return dt
+        raise ValueError(f"Cron expression never fires: {self.expression!r}")
+
+
+# -------------------------
+#       TASK REGISTRY
+# -------------------------
+
+class Task:
+    def __init__(self, name, func, concurrency, max_attempts, lease_seconds, retry_backoff):
+        self.name = name
+        self.func = func
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.lease_seconds = lease_seconds
+        self.retry_backoff = retry_backoff
+
+    def retry_delay(self, attempts):
+        return timedelta(seconds=self.retry_backoff * (2 ** (attempts - 1)))
+
+
+_tasks = {}
+_periodic = {}
+
+
+def task(name=None, concurrency=1, max_attempts=5, lease_seconds=None, retry_backoff=30):
+    """Register a function as a job handler; it receives the job payload as kwargs."""
+    def decorator(func):
+        task_name = name or func.__name__
+        _tasks[task_name] = Task(task_name, func, concurrency, max_attempts,
+                                 lease_seconds, retry_backoff)
+        func.task_name = task_name
+        return func
+    return decorator
+
+
+def periodic(cron, name=None, **task_options):
+    """Register a handler that is enqueued on a cron schedule."""
+    def decorator(func):
+        func = task(name=name, **task_options)(func)
+        _periodic[func.task_name] = CronSchedule(cron)
+        return func
+    return decorator
+
+
+def get_task(name):
+    return _tasks.get(name)
+
+
+def enqueue(name, payload=None, run_at=None):
+    """Queue a job in the current session.
+
+    The job is committed together with the caller's own writes, so a booking
+    and its follow-up work (emails, status updates) are stored atomically.
+    """
+    task_def = _tasks.get(name)
+    if task_def is None:
+        raise KeyError(f"Unknown task: {name}")
+    job = Job(
+        name=name,
+        payload=json.dumps(payload or {}),
+        run_at=run_at or datetime.utcnow(),
+        max_attempts=task_def.max_attempts
+    )
+    db.session.add(job)
+    return job
+
+
+# -------------------------
+#          WORKER
+# -------------------------
+
+def _claimable(now):
+    """Queued jobs, and running jobs whose lease expired with attempts left."""
+    return or_(
+        Job.status == JOB_QUEUED,
+        and_(Job.status == JOB_RUNNING, Job.lease_expires_at < now, Job.attempts < Job.max_attempts)
+    )
+
+
+class Worker:
+    """Claims due jobs with a lease, runs them and records the outcome.
+
+    Execution is at-least-once: a job whose worker dies is picked up again
+    once its lease expires, so handlers must be safe to re-run.
+    """
+
+    def __init__(self, app, worker_id=None, batch_size=10):
+        self.app = app
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+        self.batch_size = batch_size
+        self.poll_interval = app.config.get('SCHEDULER_POLL_INTERVAL', 1.0)
+        self.default_lease = app.config.get('SCHEDULER_LEASE_SECONDS', 300)
+        self._stop = threading.Event()
+
+    def stop(self):
+        self._stop.set()
+
+    def run(self):
+        """Poll for work until stopped."""
+        importlib.import_module('tasks')  # registers handlers
+        self.app.logger.info(f"Job worker {self.worker_id} started")
+        while not self._stop.is_set():
+            with self.app.app_context():
+                try:
+                    self.schedule_periodic()
+                    processed = self.run_once()
+                except Exception as e:
+                    db.session.rollback()
+                    self.app.logger.error(f"Job worker loop failed: {str(e)}")
+                    processed = 0
+                finally:
+                    db.session.remove()
+            if not processed:
+                self._stop.wait(self.poll_interval)
+
+    def schedule_periodic(self, now=None):
+        """Enqueue every periodic job that is due, exactly once across workers."""
+        now = now or datetime.utcnow()
+        enqueued = 0
+        for name, schedule in _periodic.items():
+            state = db.session.get(PeriodicJob, name)
+            if state is None or state.cron != schedule.expression:
+                if state is None:
+                    state = PeriodicJob(name=name)
+                    db.session.add(state)
+                state.cron = schedule.expression
+                state.next_run_at = schedule.next_after(now)
+                db.session.commit()
+                continue
+            if state.next_run_at > now:
+                continue
+            due = state.next_run_at
+            # Compare-and-set on next_run_at: only the worker that moves it forward enqueues
+            result = db.session.execute(
+                update(PeriodicJob)
+                .where(PeriodicJob.name == name, PeriodicJob.next_run_at == due)
+                .values(next_run_at=schedule.next_after(now), last_run_at=now)
+                .execution_options(synchronize_session=False)
+            )
+            if result.rowcount == 1:
+                enqueue(name, run_at=due)
+                enqueued += 1
+            db.session.commit()
+        return enqueued
+
+    def fail_abandoned(self, now=None):
+        """Fail running jobs whose lease expired on their last allowed attempt.
+
+        A worker that died (or was killed for running too long) never records
+        the outcome; reclaiming such a job forever would retry a job that
+        keeps crashing its worker without limit.
+        """
+        now = now or datetime.utcnow()
+        result = db.session.execute(
+            update(Job)
+            .where(Job.status == JOB_RUNNING, Job.lease_expires_at < now, Job.attempts >= Job.max_attempts)
+            .values(status=JOB_FAILED, finished_at=now, locked_by=None, lease_expires_at=None,
+                    last_error='Lease expired on the last attempt')
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        return result.rowcount
+
+    def claim(self, now=None):
+        """Lease up to ``batch_size`` due jobs, respecting per-task concurrency.
+
+        Jobs whose lease expired are taken over only while they have attempts left.
+        """
+        now = now or datetime.utcnow()
+        self.fail_abandoned(now)
+        candidates = db.session.execute(
+            select(Job.id, Job.name)
+            .where(
+                Job.name.in_(list(_tasks)),
+                Job.run_at <= now,
+                _claimable(now)
+            )
+            .order_by(Job.run_at, Job.id)
+            .limit(self.batch_size * 4)
+        ).all()
+
+        claimed = []
+        for job_id, name in candidates:
+            if len(claimed) >= self.batch_size:
+                break
+            task_def = _tasks[name]
+            lease = timedelta(seconds=task_def.lease_seconds or self.default_lease)
+            running = (
+                select(func.count(Job.id))
+                .where(Job.name == name, Job.status == JOB_RUNNING, Job.lease_expires_at >= now)
+                .scalar_subquery()
+            )
+            result = db.session.execute(
+                update(Job)
+                .where(Job.id == job_id, _claimable(now), running < task_def.concurrency)
+                .values(
+                    status=JOB_RUNNING,
+                    locked_by=self.worker_id,
+                    lease_expires_at=now + lease,
+                    attempts=Job.attempts + 1
+                )
+                .execution_options(synchronize_session=False)
+            )
+            db.session.commit()
+            if result.rowcount == 1:
+                claimed.append(job_id)
+        return claimed
+
+    def run_once(self):
+        """Claim and execute one batch of jobs; returns how many ran."""
+        claimed = self.claim()
+        for job_id in claimed:
+            self.execute(job_id)
+        return len(claimed)
+
+    def execute(self, job_id):
+        job = db.session.get(Job, job_id)
+        task_def = _tasks[job.name]
+        args = job.args
+        attempts = job.attempts
+        db.session.commit()
+
+        try:
+            task_def.func(**args)
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.error(f"Job {job_id} ({task_def.name}) failed: {str(e)}")
+            if attempts >= task_def.max_attempts:
+                values = dict(status=JOB_FAILED, finished_at=datetime.utcnow())
+            else:
+                values = dict(status=JOB_QUEUED, run_at=datetime.utcnow() + task_def.retry_delay(attempts))
+            self._finish(job_id, last_error=str(e), **values)
+            return False
+
+        self._finish(job_id, status=JOB_DONE, finished_at=datetime.utcnow())
+        return True
+
+    def _finish(self, job_id, **values):
+        # Only the lease holder may record the outcome; a stolen lease means
+        # another worker is already re-running the job.
+        db.session.execute(
+            update(Job)
+            .where(Job.id == job_id, Job.locked_by == self.worker_id, Job.status == JOB_RUNNING)
+            .values(locked_by=None, lease_expires_at=None, **values)
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+
+
+def start_background_worker(app, **worker_options):
+    """Run a worker on a daemon thread inside the web process."""
+    worker = Worker(app, **worker_options)
+    thread = threading.Thread(target=worker.run, name='job-worker', daemon=True)
+    thread.start()
+    return worker
+
+
+def init_scheduler(app):
+    """Register the ``flask jobs`` CLI and optionally start an in-process worker."""
+    import click
+
+    @app.cli.group('jobs')
+    def jobs_cli():
+        """Background job commands."""
+
+    @jobs_cli.command('worker')
+    @click.option('--batch-size', default=10, show_default=True)
+    def worker_command(batch_size):
+        """Run a job worker in the foreground."""
+        Worker(app, batch_size=batch_size).run()
+
+    if app.config.get('SCHEDULER_IN_PROCESS'):
+        start_background_worker(app)
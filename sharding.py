@@ -0,0 +1,546 @@
+import threading
+import time
+import zlib
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from datetime import datetime
+from functools import partial
+
+from flask import current_app, has_app_context
+from sqlalchemy import bindparam, case, create_engine, delete, event, exists, func, insert, inspect, literal, select, update
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.util import find_tables
+
+from models import db, Ride, Booking, user_ride
+
+# -------------------------
+#          SHARDS
+# -------------------------
+#
+# Rides, bookings and ride memberships are partitioned by origin: every
+# origin station belongs to one shard, from shard_map when it has been
+# placed there (see rebalance) and otherwise by a hash of its name. What is
+# written in the same transaction as those rows (booking events, booking
+# summaries, the ride change log) lives on the same shard, so it still
+# commits or rolls back with them. The default database is the shard
+# named 'default' and also keeps everything else (users, destinations,
+# jobs, idempotency keys, shard_map); the other shards are SHARD_DATABASES
+# ({name: uri}) and hold only the shard-local tables. With no
+# SHARD_DATABASES everything stays in the default database, as before.
+#
+# Code reaches a shard through ``shard_context``: inside it db.session
+# sends statements on shard-local tables (and bare session.connection()
+# calls, as made by flush listeners and change handlers) to the shard's
+# engine and everything else to the default database, so the existing
+# queries and jobs run unchanged on any shard. ``on_each_shard`` and
+# ``scatter`` run them on every shard for the callers to merge.
+#
+# Ride and booking ids are unique across shards: in sharded mode each
+# shard hands out
+#
+#   id = value * ID_STRIDE + shard number
+#
+# where value is max(last value + 1, current time in ms), so ids stay
+# roughly time ordered across shards and keep their meaning when a row is
+# moved. Shard numbers are positions in SHARD_DATABASES (default is 0):
+# add new shards at the end and never reorder or remove one with data.
+# Log ids (booking events, ride changes) are per shard; feeds over them
+# use cursors with one position per shard (see format_cursor).
+
+DEFAULT_SHARD = 'default'
+ID_STRIDE = 256
+SHARD_LOCAL_TABLES = frozenset((
+    'ride', 'booking', 'user_ride', 'booking_event', 'booking_summary', 'ride_change', 'shard_sequence'
+))
+
+
+class ShardAssignment(db.Model):
+    """Origin stations placed on a shard explicitly (by rebalance)."""
+    __tablename__ = 'shard_map'
+
+    station = db.Column(db.String(150), primary_key=True)
+    shard = db.Column(db.String(50), nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class ShardSequence(db.Model):
+    """The next id value a shard hands out, per table."""
+    __tablename__ = 'shard_sequence'
+
+    name = db.Column(db.String(50), primary_key=True)
+    next_value = db.Column(db.BigInteger, nullable=False, default=0)
+
+
+SHARDED_MODELS = (Ride, Booking)
+
+
+def shard_databases(app=None):
+    return (app or current_app).config.get('SHARD_DATABASES') or {}
+
+
+def is_sharded(app=None):
+    return bool(shard_databases(app))
+
+
+def shard_names(app=None):
+    """Every shard, the default database first."""
+    return [DEFAULT_SHARD, *shard_databases(app)]
+
+
+def shard_number(name):
+    return shard_names().index(name)
+
+
+_engines_lock = threading.Lock()
+
+
+def instance_url(app, uri):
+    """``uri`` as a URL, with relative SQLite paths under the instance folder
+    (as for SQLALCHEMY_DATABASE_URI)."""
+    url = make_url(uri)
+    if url.get_backend_name() == 'sqlite' and url.database not in (None, '', ':memory:') \
+            and not url.database.startswith('/'):
+        url = url.set(database=f'{app.instance_path}/{url.database}')
+    return url
+
+
+def _shard_local_tables():
+    # The models of the logs and summaries that live next to the bookings
+    import booking_events, booking_summary, ride_feed  # noqa: F401
+    return [table for name, table in db.metadata.tables.items() if name in SHARD_LOCAL_TABLES]
+
+
+def _create_tables(engine):
+    tables = _shard_local_tables()
+    for _ in tables:
+        try:
+            db.metadata.create_all(engine, tables=tables)
+            return
+        except OperationalError:
+            # Another worker created one between the check and the CREATE;
+            # the next pass skips it
+            continue
+    db.metadata.create_all(engine, tables=tables)
+
+
+def get_engine(name, app=None):
+    """The engine for shard ``name``, creating its tables on first use."""
+    app = app or current_app
+    if name == DEFAULT_SHARD:
+        return db.engine
+    engines = app.extensions.setdefault('shards', {})
+    engine = engines.get(name)
+    if engine is None:
+        with _engines_lock:
+            engine = engines.get(name)
+            if engine is None:
+                engine = create_engine(instance_url(app, shard_databases(app)[name]))
+                _create_tables(engine)
+                engines[name] = engine
+    return engine
+
+
+# -------------------------
+#         ROUTING
+# -------------------------
+
+def station_key(location):
+    return location.strip().lower() if location else ''
+
+
+def _station_expr(model):
+    return func.lower(func.trim(model.location))
+
+
+def _load_assignments(app):
+    cached = app.extensions.get('shard_map')
+    ttl = app.config.get('SHARD_MAP_TTL', 30)
+    if cached is None or time.monotonic() - cached[0] > ttl:
+        assignments = dict(db.session.execute(select(ShardAssignment.station, ShardAssignment.shard)).all())
+        cached = app.extensions['shard_map'] = (time.monotonic(), assignments)
+    return cached[1]
+
+
+def reset_assignments(app=None):
+    """Forget the cached shard map so the next lookup reads it again."""
+    (app or current_app).extensions.pop('shard_map', None)
+
+
+def shard_for(location):
+    """The shard that holds rides and bookings leaving from ``location``."""
+    names = shard_names()
+    key = station_key(location)
+    if len(names) == 1 or not key:
+        return DEFAULT_SHARD
+    shard = _load_assignments(current_app).get(key)
+    if shard in names:
+        return shard
+    return names[zlib.crc32(key.encode('utf-8')) % len(names)]
+
+
+def _route(engine, mapper, clause):
+    """RoutingSession route: ``engine`` for shard-local tables, None (default) otherwise."""
+    if mapper is not None:
+        tables = inspect(mapper).tables
+    elif clause is not None:
+        tables = find_tables(clause, include_aliases=True, include_joins=True, include_crud=True)
+    else:
+        # A bare session.connection(): flush listeners and change handlers
+        # writing logs and summaries next to the bookings
+        return engine
+    return engine if any(table.name in SHARD_LOCAL_TABLES for table in tables) else None
+
+
+def current_shard():
+    """The shard db.session is on."""
+    return db.session.info.get('shard', DEFAULT_SHARD)
+
+
+@contextmanager
+def shard_context(name):
+    """Run the block with db.session on shard ``name``.
+
+    Another shard gets its own app context, and so its own db.session,
+    which is closed when the block ends: commit inside the block. A shard
+    that db.session is already on is used as is.
+    """
+    if name == current_shard():
+        yield
+        return
+    app = current_app._get_current_object()
+    route = None if name == DEFAULT_SHARD else partial(_route, get_engine(name, app))
+    with app.app_context():
+        db.session.info['shard'] = name
+        if route is not None:
+            db.session.info['route'] = route
+        yield
+
+
+# -------------------------
+#        SHARD IDS
+# -------------------------
+
+# Built once: ids are allocated on every sharded insert
+_NEXT_VALUE = case(
+    (ShardSequence.next_value > bindparam('now'), ShardSequence.next_value), else_=bindparam('now')
+)
+_RESERVE = (
+    update(ShardSequence).where(ShardSequence.name == bindparam('table_name'))
+    .values(next_value=_NEXT_VALUE + bindparam('count')).returning(ShardSequence.next_value)
+)
+_START = insert(ShardSequence).from_select(
+    ['name', 'next_value'],
+    select(bindparam('table_name'), literal(0))
+    .where(~exists().where(ShardSequence.name == bindparam('table_name')))
+)
+
+
+def allocate_ids(connection, table_name, count, shard):
+    """Reserve ``count`` ids for ``table_name`` on ``shard``, in the caller's transaction."""
+    params = {'table_name': table_name, 'now': int(time.time() * 1000), 'count': count}
+    end = connection.execute(_RESERVE, params).scalar()
+    if end is None:
+        connection.execute(_START, params)
+        end = connection.execute(_RESERVE, params).scalar()
+    number = shard_number(shard)
+    return [value * ID_STRIDE + number for value in range(end - count, end)]
+
+
+@event.listens_for(Session, 'before_flush')
+def _assign_shard_ids(session, flush_context, instances):
+    if not has_app_context() or not is_sharded():
+        return
+    pending = defaultdict(list)
+    for obj in session.new:
+        if isinstance(obj, SHARDED_MODELS) and obj.id is None:
+            pending[obj.__table__.name].append(obj)
+    shard = session.info.get('shard', DEFAULT_SHARD)
+    for table_name, objs in pending.items():
+        for obj, ident in zip(objs, allocate_ids(session.connection(), table_name, len(objs), shard)):
+            obj.id = ident
+
+
+# -------------------------
+#      SCATTER-GATHER
+# -------------------------
+
+def on_each_shard(func, *args, **kwargs):
+    """Call ``func`` on every shard in turn (see shard_context): {shard: result}.
+
+    With one database that is a single call in the current context.
+    """
+    results = {}
+    for name in shard_names():
+        with shard_context(name):
+            results[name] = func(*args, **kwargs)
+    return results
+
+
+def _rows(statement):
+    return db.session.execute(statement).all()
+
+
+def _objects(statement):
+    return db.session.scalars(statement).all()
+
+
+def scatter(statement):
+    """Run a read on every shard and return all the rows.
+
+    Ordering, limits and aggregates apply per shard; callers merge the
+    results.
+    """
+    return [row for rows in on_each_shard(_rows, statement).values() for row in rows]
+
+
+def scatter_objects(statement):
+    """Like ``scatter`` for ORM entities; objects from other shards come back detached."""
+    return [obj for objs in on_each_shard(_objects, statement).values() for obj in objs]
+
+
+def newest(items, limit=None, key=lambda item: item.id):
+    """Merge per-shard results newest id first, keeping ``limit``.
+
+    A row seen on two shards (mid-rebalance) is kept once.
+    """
+    unique = {key(item): item for item in items}
+    return sorted(unique.values(), key=key, reverse=True)[:limit]
+
+
+def locate(model, ids):
+    """Map each existing id of ``model`` to the shard holding it."""
+    ids = list(ids)
+    found = {}
+    if not ids:
+        return found
+    for name, idents in on_each_shard(_objects, select(model.id).where(model.id.in_(ids))).items():
+        for ident in idents:
+            found.setdefault(ident, name)
+    return found
+
+
+def find(model, ident):
+    """One ``model`` row by id from whichever shard holds it, or None."""
+    for name in shard_names():
+        with shard_context(name):
+            obj = db.session.get(model, ident)
+        if obj is not None:
+            return obj
+    return None
+
+
+# -------------------------
+#       FEED CURSORS
+# -------------------------
+
+def format_cursor(positions):
+    """A feed cursor for {shard: last log id}.
+
+    With one database that is the id itself, as before sharding; otherwise
+    every shard's id in shard order, joined by dots ("120.7.33").
+    """
+    names = shard_names()
+    if len(names) == 1:
+        return positions.get(DEFAULT_SHARD, 0)
+    return '.'.join(str(positions.get(name, 0)) for name in names)
+
+
+def parse_cursor(value):
+    """{shard: last log id} from a cursor, or None when there is none or it is malformed.
+
+    Shards added after the cursor was issued start from the beginning.
+    """
+    if value is None or value == '':
+        return None
+    names = shard_names()
+    parts = str(value).split('.')
+    if len(parts) > len(names):
+        return None
+    try:
+        ids = [int(part) for part in parts]
+    except ValueError:
+        return None
+    positions = dict.fromkeys(names, 0)
+    positions.update(zip(names, ids))
+    return positions
+
+
+# -------------------------
+#        REBALANCING
+# -------------------------
+
+def _station_loads():
+    loads = Counter()
+    for model in SHARDED_MODELS:
+        station = _station_expr(model)
+        for key, count in db.session.execute(select(station, func.count()).group_by(station)):
+            loads[key or ''] += count
+    return loads
+
+
+def station_loads():
+    """Rides plus bookings per origin station and shard: {station: Counter(shard=rows)}."""
+    loads = defaultdict(Counter)
+    for name, counts in on_each_shard(_station_loads).items():
+        for station, count in counts.items():
+            loads[station][name] += count
+    return loads
+
+
+def plan_rebalance(sizes, assignment, names):
+    """Stations to move so shard sizes even out: {station: new shard}.
+
+    ``sizes`` maps station -> rows and ``assignment`` station -> shard.
+    Each step moves the station that most reduces the spread (the sum of
+    squared shard sizes) to the emptiest shard, and stops when no single
+    move helps, so a balanced layout is left alone and few rows move.
+    """
+    assignment = dict(assignment)
+    totals = Counter({name: 0 for name in names})
+    for station, size in sizes.items():
+        totals[assignment[station]] += size
+    moves = {}
+    while True:
+        light = min(names, key=lambda name: (totals[name], name))
+        best, best_gain = None, 0
+        for station, shard in assignment.items():
+            size = sizes[station]
+            # Moving ``size`` rows from ``shard`` to ``light`` changes the
+            # sum of squares by 2 * size * (size - gap)
+            gain = size * (totals[shard] - totals[light] - size)
+            if gain > best_gain or (gain == best_gain and best is not None and (size, station) > (sizes[best], best)):
+                best, best_gain = station, gain
+        if best is None:
+            return moves
+        totals[assignment[best]] -= sizes[best]
+        totals[light] += sizes[best]
+        assignment[best] = moves[best] = light
+
+
+def _copy_rows(target, table, rows, key):
+    """Insert ``rows`` into ``table`` on ``target``, skipping keys it already has."""
+    columns = [table.c[name] for name in key]
+    wanted = {tuple(row[name] for name in key) for row in rows}
+    present = set(target.execute(select(*columns).where(columns[-1].in_({k[-1] for k in wanted}))).all())
+    rows = [dict(row) for row in rows if tuple(row[name] for name in key) not in present]
+    if rows:
+        target.execute(insert(table), rows)
+
+
+def _after_move(connection, model, rows):
+    """Bring a shard's change log or summaries up to date with rows moved in or out."""
+    from booking_summary import rebuild_summary
+    from ride_feed import record_ride_changes
+    if model is Ride:
+        record_ride_changes([row['id'] for row in rows], connection=connection)
+        return
+    for user_id in {row['user_id'] for row in rows if row['user_id'] is not None}:
+        rebuild_summary(user_id, connection)
+
+
+def move_station(station, source, target, batch_size=500):
+    """Move one station's rides (with their members) and bookings between shards.
+
+    Each batch is committed on the target before it is deleted from the
+    source, so an interrupted move leaves copies, never gaps; running it
+    again finishes the job. Both shards log the moved rides as changed and
+    rebuild the owners' booking summaries; booking events stay in the log
+    of the shard that wrote them.
+    """
+    moved = 0
+    with get_engine(source).connect() as src, get_engine(target).connect() as dst:
+        for model in SHARDED_MODELS:
+            table = model.__table__
+            while True:
+                rows = src.execute(
+                    select(table).where(_station_expr(model) == station).limit(batch_size)
+                ).mappings().all()
+                if not rows:
+                    break
+                ids = [row['id'] for row in rows]
+                _copy_rows(dst, table, rows, ('id',))
+                if model is Ride:
+                    members = src.execute(select(user_ride).where(user_ride.c.ride_id.in_(ids))).mappings().all()
+                    if members:
+                        _copy_rows(dst, user_ride, members, ('user_id', 'ride_id'))
+                _after_move(dst, model, rows)
+                dst.commit()
+                if model is Ride:
+                    src.execute(delete(user_ride).where(user_ride.c.ride_id.in_(ids)))
+                src.execute(delete(table).where(table.c.id.in_(ids)))
+                _after_move(src, model, rows)
+                src.commit()
+                moved += len(rows)
+    return moved
+
+
+def rebalance(dry_run=False, batch_size=500):
+    """Even out rows across shards and move misplaced rows.
+
+    Every station seen is pinned in shard_map, so adding a shard later
+    doesn't rehash existing stations; rows on a shard other than their
+    station's are moved there (e.g. rows written before sharding, or
+    during an earlier rebalance).
+    """
+    names = shard_names()
+    loads = station_loads()
+    sizes = {station: sum(counts.values()) for station, counts in loads.items() if station}
+    assignment = {station: shard_for(station) for station in sizes}
+    moves = plan_rebalance(sizes, assignment, names)
+    assignment.update(moves)
+    totals = Counter({name: 0 for name in names})
+    for station, size in sizes.items():
+        totals[assignment[station]] += size
+    report = {'moves': moves, 'shard_rows': dict(totals), 'rows_moved': 0}
+    if dry_run:
+        return report
+
+    stored = dict(db.session.execute(select(ShardAssignment.station, ShardAssignment.shard)).all())
+    for station, shard in assignment.items():
+        if station not in stored:
+            db.session.add(ShardAssignment(station=station, shard=shard))
+        elif stored[station] != shard:
+            db.session.execute(
+                update(ShardAssignment).where(ShardAssignment.station == station).values(shard=shard)
+            )
+    db.session.commit()
+    reset_assignments()
+
+    for station, shard in assignment.items():
+        for source in loads[station]:
+            if source != shard:
+                report['rows_moved'] += move_station(station, source, shard, batch_size)
+    return report
+
+
+def init_sharding(app):
+    """Register the ``flask shards`` CLI."""
+    import click
+
+    @app.cli.group('shards')
+    def shards_cli():
+        """Ride and booking shard commands."""
+
+    @shards_cli.command('status')
+    def status_command():
+        """Show rows per shard."""
+        totals = Counter()
+        for counts in station_loads().values():
+            totals.update(counts)
+        for name in shard_names():
+            click.echo(f'{name:20} {totals[name]:10d}')
+
+    @shards_cli.command('rebalance')
+    @click.option('--dry-run', is_flag=True, help='Only print the planned moves.')
+    @click.option('--batch-size', default=500, show_default=True)
+    def rebalance_command(dry_run, batch_size):
+        """Spread stations evenly over the shards and move their rows."""
+        report = rebalance(dry_run=dry_run, batch_size=batch_size)
+        for station, shard in sorted(report['moves'].items()):
+            click.echo(f'{station} -> {shard}')
+        for name, rows in report['shard_rows'].items():
+            click.echo(f'{name:20} {rows:10d}')
+        if not dry_run:
+            click.echo(f"{report['rows_moved']} rows moved")
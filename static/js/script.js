@@ -42,6 +42,15 @@ async function apiRequest(url, options = {}) {
     }
 }
 
+// Idempotency keys: one per logical write, reused on retries so a double
+// click or a resend after a timeout is applied only once by the server
+function newIdempotencyKey() {
+    if (window.crypto && crypto.randomUUID) {
+        return crypto.randomUUID();
+    }
+    return `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
+}
+
 // UI Utilities
 function showNotification(message, type = 'info', duration = 5000) {
     const notification = document.createElement('div');
@@ -129,9 +138,12 @@ function handleFormSubmission(formId, endpoint, successCallback = null) {
         e.preventDefault();
 
         const submitBtn = form.querySelector('button[type="submit"]');
+        if (submitBtn.disabled) return;
         const originalText = submitBtn.textContent;
         const spinner = showSpinner(submitBtn);
         submitBtn.textContent = 'Processing...';
+        submitBtn.disabled = true;
+        form.dataset.idempotencyKey = form.dataset.idempotencyKey || newIdempotencyKey();
 
         try {
             const formData = new FormData(form);
@@ -145,12 +157,14 @@ function handleFormSubmission(formId, endpoint, successCallback = null) {
 
             const result = await apiRequest(`${CONFIG.baseUrl}${endpoint}`, {
                 method: 'POST',
-                body: JSON.stringify(data)
+                body: JSON.stringify(data),
+                headers: { 'Idempotency-Key': form.dataset.idempotencyKey }
             });
 
             if (result.success !== false) {
                 showNotification(result.message || 'Operation completed successfully!', 'success');
                 form.reset();
+                delete form.dataset.idempotencyKey;
 
                 if (successCallback) {
                     successCallback(result);
@@ -165,6 +179,7 @@ function handleFormSubmission(formId, endpoint, successCallback = null) {
         } finally {
             hideSpinner(submitBtn);
             submitBtn.textContent = originalText;
+            submitBtn.disabled = false;
         }
     });
 }
@@ -185,79 +200,276 @@ function initializeRidePosting() {
     }
 }
 
-// Group Loading with Modern UI
-async function loadGroups() {
-    const groupsContainer = $('#groups-list');
-    if (!groupsContainer) return;
+// Ride Groups: delta sync and on-demand rendering
+//
+// The view keeps the rides it has seen and the feed version they are
+// current as of. A refresh asks /groups/changes for what changed since
+// that version and patches only those cards. Cards are created when the
+// end of their group scrolls near the viewport, a page at a time, so a
+// long list costs neither a full download nor a full DOM rebuild.
+const RIDE_PAGE_SIZE = 24;
+
+function escapeHtml(value) {
+    const entities = { '&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;' };
+    return String(value ?? '').replace(/[&<>"']/g, c => entities[c]);
+}
 
-    try {
-        showSpinner(groupsContainer);
-        const data = await apiRequest(`${CONFIG.baseUrl}/groups`);
+class RideGroupsView {
+    // options.renderGroup(name) -> HTML containing .ride-count and .ride-cards
+    // options.renderCard(ride) -> HTML for one card
+    // options.emptyHtml -> shown while there are no rides
+    constructor(container, options) {
+        this.container = container;
+        this.options = options;
+        this.version = null;
+        this.groups = new Map();
+        this.groupOf = new Map();
+        this.empty = null;
+        this.observer = 'IntersectionObserver' in window
+            ? new IntersectionObserver(entries => this.onVisible(entries), { rootMargin: '400px' })
+            : null;
+    }
 
-        groupsContainer.innerHTML = '';
+    async refresh() {
+        const since = this.version === null ? '' : `?since=${this.version}`;
+        const data = await apiRequest(`${CONFIG.baseUrl}/groups/changes${since}`);
+        if (data.reset) {
+            this.clear();
+        }
+        data.removed.forEach(id => this.removeRide(id));
+        data.rides.forEach(ride => this.upsertRide(ride));
+        this.version = data.version;
+        this.updateEmpty();
+        return data;
+    }
 
-        if (Object.keys(data).length === 0) {
-            groupsContainer.innerHTML = `
-                <div class="text-center p-5">
-                    <i class="fas fa-users fa-3x text-muted mb-3"></i>
-                    <h4 class="text-muted">No ride groups yet</h4>
-                    <p class="text-secondary">Be the first to post a ride and start a group!</p>
-                </div>
-            `;
+    // Refresh now and then every intervalMs while the page is visible
+    start(intervalMs = 30000) {
+        const tick = () => {
+            if (document.visibilityState === 'visible') {
+                this.refresh().catch(error => console.error('Error refreshing ride groups:', error));
+            }
+        };
+        this.timer = setInterval(tick, intervalMs);
+        // The first list may come from the service worker's cache; catch up
+        // with a delta as soon as it has fetched a newer one
+        if ('serviceWorker' in navigator) {
+            navigator.serviceWorker.addEventListener('message', event => {
+                const message = event.data || {};
+                if (message.type === 'refreshed' && new URL(message.url).pathname === '/groups/changes') {
+                    tick();
+                }
+            });
+        }
+        return this.refresh();
+    }
+
+    clear() {
+        this.groups.forEach(group => this.dropGroup(group));
+        this.groupOf.clear();
+    }
+
+    getGroup(name) {
+        let group = this.groups.get(name);
+        if (!group) {
+            const element = document.createElement('div');
+            element.innerHTML = this.options.renderGroup(escapeHtml(name));
+            const sentinel = document.createElement('div');
+            element.appendChild(sentinel);
+            group = {
+                name,
+                element,
+                sentinel,
+                count: element.querySelector('.ride-count'),
+                cards: element.querySelector('.ride-cards'),
+                ids: [],            // newest first
+                rides: new Map(),
+                rendered: new Map() // ride id -> card element, for ids[0 .. rendered.size)
+            };
+            this.groups.set(name, group);
+            this.container.appendChild(element);
+            if (this.observer) {
+                this.observer.observe(sentinel);
+            }
+        }
+        return group;
+    }
+
+    dropGroup(group) {
+        if (this.observer) {
+            this.observer.unobserve(group.sentinel);
+        }
+        group.element.remove();
+        this.groups.delete(group.name);
+    }
+
+    createCard(ride) {
+        const template = document.createElement('template');
+        template.innerHTML = this.options.renderCard(ride).trim();
+        const card = template.content.firstElementChild;
+        card.dataset.rideId = ride.id;
+        return card;
+    }
+
+    upsertRide(ride) {
+        const previous = this.groupOf.get(ride.id);
+        if (previous !== undefined && previous !== ride.group) {
+            this.removeRide(ride.id);
+        }
+        const group = this.getGroup(ride.group);
+        this.groupOf.set(ride.id, ride.group);
+        const existing = group.rendered.get(ride.id);
+        if (group.rides.has(ride.id)) {
+            group.rides.set(ride.id, ride);
+            if (existing) {
+                const card = this.createCard(ride);
+                existing.replaceWith(card);
+                group.rendered.set(ride.id, card);
+            }
             return;
         }
 
-        for (const [destination, rides] of Object.entries(data)) {
-            const groupCard = document.createElement('div');
-            groupCard.className = 'card mb-4 fade-in-up';
-            groupCard.innerHTML = `
-                <div class="card-header">
-                    <h5 class="mb-0">
-                        <i class="fas fa-map-marker-alt me-2"></i>
-                        ${destination}
-                        <span class="badge bg-primary ms-2">${rides.length} ride${rides.length !== 1 ? 's' : ''}</span>
-                    </h5>
+        group.rides.set(ride.id, ride);
+        let index = group.ids.findIndex(id => id < ride.id);
+        if (index === -1) {
+            index = group.ids.length;
+        }
+        group.ids.splice(index, 0, ride.id);
+        // Only place the card if it falls inside the part already rendered
+        if (index < group.rendered.size) {
+            const card = this.createCard(ride);
+            group.cards.insertBefore(card, group.rendered.get(group.ids[index + 1]) || null);
+            group.rendered.set(ride.id, card);
+        } else if (!this.observer) {
+            this.renderMore(group);
+        }
+        this.updateCount(group);
+    }
+
+    removeRide(id) {
+        const name = this.groupOf.get(id);
+        const group = name === undefined ? null : this.groups.get(name);
+        this.groupOf.delete(id);
+        if (!group) return;
+        group.rides.delete(id);
+        group.ids = group.ids.filter(other => other !== id);
+        const card = group.rendered.get(id);
+        if (card) {
+            card.remove();
+            group.rendered.delete(id);
+        }
+        if (group.ids.length === 0) {
+            this.dropGroup(group);
+        } else {
+            this.updateCount(group);
+        }
+    }
+
+    renderMore(group) {
+        const start = group.rendered.size;
+        const end = this.observer ? Math.min(start + RIDE_PAGE_SIZE, group.ids.length) : group.ids.length;
+        if (start >= end) return false;
+        const fragment = document.createDocumentFragment();
+        for (const id of group.ids.slice(start, end)) {
+            const card = this.createCard(group.rides.get(id));
+            group.rendered.set(id, card);
+            fragment.appendChild(card);
+        }
+        group.cards.appendChild(fragment);
+        return true;
+    }
+
+    onVisible(entries) {
+        entries.forEach(entry => {
+            if (!entry.isIntersecting) return;
+            const group = [...this.groups.values()].find(g => g.sentinel === entry.target);
+            if (group && this.renderMore(group)) {
+                // Re-observe so a sentinel that is still in view asks for the next page
+                this.observer.unobserve(entry.target);
+                this.observer.observe(entry.target);
+            }
+        });
+    }
+
+    updateCount(group) {
+        if (group.count) {
+            const count = group.ids.length;
+            group.count.textContent = `${count} ride${count !== 1 ? 's' : ''}`;
+        }
+    }
+
+    updateEmpty() {
+        if (this.groups.size === 0 && !this.empty) {
+            this.empty = document.createElement('div');
+            this.empty.innerHTML = this.options.emptyHtml;
+            this.container.appendChild(this.empty);
+        } else if (this.groups.size > 0 && this.empty) {
+            this.empty.remove();
+            this.empty = null;
+        }
+    }
+}
+
+let groupsView = null;
+
+async function loadGroups() {
+    const groupsContainer = $('#groups-list');
+    if (!groupsContainer) return;
+
+    const first = !groupsView;
+    if (first) {
+        groupsContainer.innerHTML = '';
+        groupsView = new RideGroupsView(groupsContainer, {
+            renderGroup: name => `
+                <div class="card mb-4 fade-in-up">
+                    <div class="card-header">
+                        <h5 class="mb-0">
+                            <i class="fas fa-map-marker-alt me-2"></i>
+                            ${name}
+                            <span class="badge bg-primary ms-2 ride-count"></span>
+                        </h5>
+                    </div>
+                    <div class="card-body">
+                        <div class="row ride-cards"></div>
+                    </div>
                 </div>
-                <div class="card-body">
-                    <div class="row">
-                        ${rides.map(ride => `
-                            <div class="col-md-6 col-lg-4 mb-3">
-                                <div class="card h-100 border-0 shadow-sm">
-                                    <div class="card-body">
-                                        <h6 class="card-title">
-                                            <i class="fas fa-car text-primary me-2"></i>
-                                            ${ride.name}
-                                        </h6>
-                                        <div class="text-muted small mb-2">
-                                            <i class="fas fa-clock me-1"></i>
-                                            ${ride.date || 'Flexible timing'}
-                                        </div>
-                                        <div class="text-muted small">
-                                            <i class="fas fa-phone me-1"></i>
-                                            ${ride.contact}
-                                        </div>
-                                    </div>
-                                </div>
+            `,
+            renderCard: ride => `
+                <div class="col-md-6 col-lg-4 mb-3">
+                    <div class="card h-100 border-0 shadow-sm">
+                        <div class="card-body">
+                            <h6 class="card-title">
+                                <i class="fas fa-car text-primary me-2"></i>
+                                ${escapeHtml(ride.origin)} &rarr; ${escapeHtml(ride.destination)}
+                            </h6>
+                            <div class="text-muted small mb-2">
+                                <i class="fas fa-clock me-1"></i>
+                                ${escapeHtml(ride.date || 'Flexible timing')}
+                                ${ride.eta_minutes != null ? `&middot; about ${ride.eta_minutes} min` : ''}
                             </div>
-                        `).join('')}
+                            <div class="text-muted small">
+                                <i class="fas fa-users me-1"></i>
+                                ${ride.riders} joined
+                            </div>
+                        </div>
                     </div>
                 </div>
-            `;
-
-            groupsContainer.appendChild(groupCard);
-            fadeIn(groupCard);
-        }
+            `,
+            emptyHtml: `
+                <div class="text-center p-5">
+                    <i class="fas fa-users fa-3x text-muted mb-3"></i>
+                    <h4 class="text-muted">No ride groups yet</h4>
+                    <p class="text-secondary">Be the first to post a ride and start a group!</p>
+                </div>
+            `
+        });
+    }
 
+    try {
+        await (first ? groupsView.start() : groupsView.refresh());
     } catch (error) {
         console.error('Error loading groups:', error);
-        groupsContainer.innerHTML = `
-            <div class="alert alert-danger">
-                <i class="fas fa-exclamation-triangle me-2"></i>
-                Failed to load ride groups. Please refresh the page.
-            </div>
-        `;
-    } finally {
-        hideSpinner(groupsContainer);
+        showNotification('Failed to load ride groups. Please refresh the page.', 'error');
     }
 }
 
@@ -390,6 +602,89 @@ function initializeResponsiveNav() {
     }
 }
 
+// Destination autocomplete backed by /api/v1/destinations/autocomplete.
+// Requests are debounced and answers cached per prefix, so typing a word
+// costs one or two round trips instead of one per key press.
+function initializeDestinationAutocomplete() {
+    const inputs = $$('input[name="destination"]');
+    const cache = new Map();
+
+    inputs.forEach((input, index) => {
+        const list = document.createElement('datalist');
+        list.id = `destination-suggestions-${index}`;
+        input.setAttribute('list', list.id);
+        input.setAttribute('autocomplete', 'off');
+        input.after(list);
+
+        let timer = null;
+        input.addEventListener('input', function() {
+            clearTimeout(timer);
+            const query = input.value.trim().toLowerCase();
+            if (query.length < 2) {
+                return;
+            }
+            timer = setTimeout(async () => {
+                try {
+                    if (!cache.has(query)) {
+                        const result = await apiRequest(
+                            `${CONFIG.baseUrl}/api/v1/destinations/autocomplete?q=${encodeURIComponent(query)}`
+                        );
+                        cache.set(query, result.data || []);
+                    }
+                    list.innerHTML = '';
+                    cache.get(query).forEach(name => {
+                        const option = document.createElement('option');
+                        option.value = name;
+                        list.appendChild(option);
+                    });
+                } catch (error) {
+                    // Suggestions are optional; the field still works without them
+                }
+            }, 150);
+        });
+    });
+}
+
+// Service Worker: cached app shell and offline outbox (templates/sw.js)
+//
+// The worker answers with cached pages and data first and tells the page
+// when a fresher copy arrived ('refreshed'). Bookings and joins made
+// offline are queued by the worker and sent again on reconnect; it
+// reports each result ('replayed'), or that the user has to sign in
+// first ('signin-required').
+function initializeServiceWorker() {
+    if (!('serviceWorker' in navigator)) return;
+
+    navigator.serviceWorker.register('/sw.js').catch(error => {
+        console.error('Service worker registration failed:', error);
+    });
+
+    const replay = () => {
+        if (navigator.serviceWorker.controller) {
+            navigator.serviceWorker.controller.postMessage({ type: 'replay' });
+        }
+    };
+    window.addEventListener('online', replay);
+    replay();
+
+    navigator.serviceWorker.addEventListener('message', event => {
+        const message = event.data || {};
+        if (message.type === 'replayed') {
+            const what = message.path === '/join' ? 'ride join' : 'booking';
+            if (message.success) {
+                showNotification(`Your offline ${what} was sent: ${escapeHtml(message.result.message || 'done')}`, 'success');
+            } else {
+                showNotification(`Your offline ${what} could not be completed: ${escapeHtml(message.result.message || 'please try again')}`, 'error', 10000);
+            }
+        } else if (message.type === 'signin-required') {
+            const what = message.path === '/join' ? 'ride join' : 'booking';
+            showNotification(`Sign in again to send your offline ${what}. It is kept until then.`, 'warning', 10000);
+        } else if (message.type === 'refreshed' && message.url === window.location.href) {
+            showNotification('This page has been updated. <a href="" class="alert-link">Reload</a> to see the latest.', 'info', 10000);
+        }
+    });
+}
+
 // Initialize everything when DOM is loaded
 document.addEventListener('DOMContentLoaded', function() {
     console.log('🚀 Travel Company JavaScript loaded!');
@@ -400,6 +695,7 @@ document.addEventListener('DOMContentLoaded', function() {
     initializeDashboard();
     initializeModals();
     initializeResponsiveNav();
+    initializeDestinationAutocomplete();
 
     // Load initial data
     if ($('#groups-list')) {
@@ -418,11 +714,7 @@ document.addEventListener('DOMContentLoaded', function() {
         showNotification('An unexpected error occurred. Please refresh the page.', 'error');
     });
 
-    // Service worker for PWA (if needed later)
-    if ('serviceWorker' in navigator) {
-        // Register service worker for offline functionality
-        // navigator.serviceWorker.register('/sw.js');
-    }
+    initializeServiceWorker();
 
     console.log('✅ All Travel Company features initialized!');
 });
@@ -432,6 +724,9 @@ window.TravelCompany = {
     showNotification,
     apiRequest,
     loadGroups,
+    RideGroupsView,
+    escapeHtml,
+    newIdempotencyKey,
     fadeIn,
     fadeOut
 };
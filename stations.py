@@ -0,0 +1,41 @@
+# Pickup stations offered in the booking form, with their coordinates
+# (latitude, longitude). Order here is the order shown in the form.
+STATIONS = {
+    'Central Station': (12.9784, 77.5710),
+    'North Station': (13.0280, 77.5800),
+    'South Station': (12.9200, 77.5850),
+    'East Station': (12.9900, 77.6600),
+    'West Station': (12.9750, 77.5000),
+    'Airport Terminal': (13.1986, 77.7066),
+    'Bus Depot': (12.9770, 77.5720),
+    'Metro Station': (12.9760, 77.6030),
+}
+
+# Road links between stations with typical travel time in minutes, both
+# ways. travel_times.py derives the all-pairs shortest times from these.
+STATION_LINKS = [
+    ('Central Station', 'Bus Depot', 3),
+    ('Central Station', 'Metro Station', 8),
+    ('Central Station', 'North Station', 15),
+    ('Central Station', 'South Station', 16),
+    ('Central Station', 'West Station', 18),
+    ('Metro Station', 'East Station', 14),
+    ('North Station', 'East Station', 20),
+    ('North Station', 'West Station', 22),
+    ('South Station', 'East Station', 25),
+    ('North Station', 'Airport Terminal', 40),
+    ('East Station', 'Airport Terminal', 45),
+]
+
+
+def station_coordinates(name):
+    """Return (lat, lon) for a station name, matching case-insensitively."""
+    if not name:
+        return None
+    coords = STATIONS.get(name)
+    if coords is None:
+        wanted = name.strip().lower()
+        for station, station_coords in STATIONS.items():
+            if station.lower() == wanted:
+                return station_coords
+    return coords
@@ -0,0 +1,83 @@
+from datetime import datetime
+
+from sqlalchemy import or_, and_
+
+from models import db, Booking
+from scheduler import task, periodic, enqueue
+from booking_events import (
+    CANCELLED, CONFIRMED, EXPIRED, EVENT_STATUS_CHANGED, bulk_transition, consume
+)
+import email_service
+from sharding import find, on_each_shard
+import reminder_service  # noqa: F401 - registers reminder tasks
+import ride_snapshot  # noqa: F401 - registers the snapshot rebuild
+import idempotency  # noqa: F401 - registers the key purge
+import analytics  # noqa: F401 - registers rollup and chart jobs
+import booking_summary  # noqa: F401 - keeps per-user summaries current
+import fares  # noqa: F401 - registers the repricing job
+import ride_feed  # noqa: F401 - registers the change log purge
+import backup  # noqa: F401 - registers the scheduled snapshots
+
+# -------------------------
+#       EMAIL TASKS
+# -------------------------
+
+
+@task('send_booking_confirmation', concurrency=4)
+def send_booking_confirmation(booking_id):
+    """Send the booking confirmation and admin notification off the request path."""
+    booking = find(Booking, booking_id)
+    if booking is None:
+        return
+    email_service.send_booking_confirmation_email(booking)
+    email_service.send_admin_booking_notification(booking)
+
+
+@task('send_booking_cancellation', concurrency=4)
+def send_booking_cancellation(booking_id):
+    """Send the booking cancellation email off the request path."""
+    booking = find(Booking, booking_id)
+    if booking is None:
+        return
+    email_service.send_booking_cancellation_email(booking)
+
+
+# -------------------------
+#      PERIODIC TASKS
+# -------------------------
+
+
+def _expire_pending(now):
+    expired = bulk_transition(
+        EXPIRED,
+        or_(
+            Booking.travel_date < now.date(),
+            and_(Booking.travel_date == now.date(), Booking.travel_time < now.time())
+        )
+    )
+    db.session.commit()
+    return len(expired)
+
+
+@periodic('*/15 * * * *', name='expire_pending_bookings')
+def expire_pending_bookings():
+    """Mark pending bookings whose travel time has passed as expired."""
+    return sum(on_each_shard(_expire_pending, datetime.now()).values())
+
+
+# -------------------------
+#   BOOKING FEED CONSUMERS
+# -------------------------
+
+
+def _notify(booking_event):
+    if booking_event.to_status == CONFIRMED:
+        enqueue('send_booking_confirmation', {'booking_id': booking_event.booking_id})
+    elif booking_event.to_status == CANCELLED and booking_event.event == EVENT_STATUS_CHANGED:
+        enqueue('send_booking_cancellation', {'booking_id': booking_event.booking_id})
+
+
+@periodic('* * * * *', name='notify_booking_changes')
+def notify_booking_changes():
+    """Queue emails for bookings confirmed or cancelled since the last run."""
+    return consume('emails', _notify)
@@ -0,0 +1,270 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app
+from jinja2 import FileSystemBytecodeCache, nodes
+from jinja2.ext import Extension
+from markupsafe import Markup
+
+from sharding import instance_url
+
+# -------------------------
+#     BYTECODE CACHE
+# -------------------------
+#
+# Compiled templates are written to TEMPLATE_BYTECODE_CACHE_DIR (default
+# instance/jinja_cache). Every worker, and every restart, loads the
+# compiled code from there instead of re-parsing the source. Entries are
+# keyed by the template source checksum, so an edited template is simply
+# compiled again.
+
+
+def bytecode_cache_dir(app):
+    return app.config.get('TEMPLATE_BYTECODE_CACHE_DIR') or os.path.join(app.instance_path, 'jinja_cache')
+
+
+# -------------------------
+#     FRAGMENT STORES
+# -------------------------
+#
+# Every store implements ``get_many(keys)`` (values or None), ``set(key,
+# value, ttl)`` and ``incr(key)``, and says with ``shared`` whether other
+# workers see its entries. Fragments are keyed by the versions of their
+# name and arguments; invalidating bumps a version, so stale entries are
+# never read again and simply age out.
+
+
+class MemoryFragmentStore:
+    """Fragments in this process only; invalidations reach this worker only."""
+
+    shared = False
+
+    def __init__(self, max_entries=5000):
+        self.entries = OrderedDict()
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+
+    def get_many(self, keys):
+        now = time.time()
+        values = []
+        with self._lock:
+            for key in keys:
+                entry = self.entries.get(key)
+                if entry is None or (entry[1] is not None and entry[1] < now):
+                    values.append(None)
+                else:
+                    self.entries.move_to_end(key)
+                    values.append(entry[0])
+        return values
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self.entries[key] = (value, time.time() + ttl if ttl else None)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def incr(self, key):
+        with self._lock:
+            value = int(self.entries.get(key, (0, None))[0]) + 1
+            self.entries[key] = (value, None)
+            return value
+
+
+class SQLiteFragmentStore:
+    """Fragments in a local SQLite file, shared by every worker on the host."""
+
+    shared = True
+    PURGE_EVERY = 500
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._writes = 0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = self._connect()
+        conn.execute('CREATE TABLE IF NOT EXISTS fragment '
+                     '(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL)')
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=OFF')
+            self._local.conn = conn
+        return conn
+
+    def get_many(self, keys):
+        marks = ','.join('?' * len(keys))
+        rows = dict(self._connect().execute(
+            f'SELECT key, value FROM fragment WHERE key IN ({marks}) '
+            'AND (expires_at IS NULL OR expires_at >= ?)', (*keys, time.time())
+        ))
+        return [rows.get(key) for key in keys]
+
+    def set(self, key, value, ttl=None):
+        conn = self._connect()
+        conn.execute('INSERT OR REPLACE INTO fragment (key, value, expires_at) VALUES (?, ?, ?)',
+                     (key, value, time.time() + ttl if ttl else None))
+        self._writes += 1
+        if self._writes % self.PURGE_EVERY == 0:
+            conn.execute('DELETE FROM fragment WHERE expires_at < ?', (time.time(),))
+
+    def incr(self, key):
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute('SELECT value FROM fragment WHERE key = ?', (key,)).fetchone()
+            value = int(row[0]) + 1 if row else 1
+            conn.execute('INSERT OR REPLACE INTO fragment (key, value, expires_at) VALUES (?, ?, NULL)',
+                         (key, str(value)))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return value
+
+
+class RedisFragmentStore:
+    """Fragments in Redis, shared by every worker on every host."""
+
+    shared = True
+
+    def __init__(self, url):
+        import redis
+        self.client = redis.Redis.from_url(url, decode_responses=True)
+
+    def get_many(self, keys):
+        return self.client.mget([f'fragment:{key}' for key in keys])
+
+    def set(self, key, value, ttl=None):
+        self.client.set(f'fragment:{key}', value, ex=int(ttl) if ttl else None)
+
+    def incr(self, key):
+        return self.client.incr(f'fragment:{key}')
+
+
+def create_store(url, max_entries=5000):
+    """Build a store from ``FRAGMENT_CACHE_URL``: memory://, sqlite:///path or redis://."""
+    if not url or url.startswith('memory://'):
+        return MemoryFragmentStore(max_entries)
+    if url.startswith('sqlite:///'):
+        return SQLiteFragmentStore(url[len('sqlite:///'):])
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisFragmentStore(url)
+    raise ValueError(f"Unsupported fragment cache storage: {url}")
+
+
+def get_store(app=None):
+    app = app or current_app
+    store = app.extensions.get('fragment_store')
+    if store is None:
+        url = app.config.get('FRAGMENT_CACHE_URL')
+        if url and url.startswith('sqlite:///'):
+            # Relative paths are under the instance folder, as for the databases
+            url = f"sqlite:///{instance_url(app, url).database}"
+        store = create_store(url, app.config.get('FRAGMENT_CACHE_MAX_ENTRIES', 5000))
+        app.extensions['fragment_store'] = store
+    return store
+
+
+# -------------------------
+#     FRAGMENT CACHING
+# -------------------------
+
+def _key(name, args):
+    return '|'.join([name, *(str(arg) for arg in args)])
+
+
+def _version_keys(name, args):
+    """One version per key prefix, so invalidating a prefix drops everything under it."""
+    return [f'v:{_key(name, args[:size])}' for size in range(len(args) + 1)]
+
+
+def render_fragment(name, args, ttl, render, shared=False):
+    """Return the cached HTML for ``name``/``args``, or ``render()`` and store it.
+
+    With ``shared`` the fragment is only cached in a store every worker
+    sees: a per-worker copy would outlive an invalidation made by another.
+    """
+    config = current_app.config
+    if not config.get('FRAGMENT_CACHE_ENABLED', True):
+        return render()
+    key = _key(name, args)
+    store = get_store()
+    if shared and not store.shared:
+        return render()
+    try:
+        versions = store.get_many(_version_keys(name, list(args)))
+        fragment_key = f"f:{key}|{'.'.join(str(version or 0) for version in versions)}"
+        cached = store.get_many([fragment_key])[0]
+    except Exception as e:
+        # A broken cache store must not break the page
+        current_app.logger.error(f"Fragment cache read failed: {str(e)}")
+        return render()
+    if cached is not None:
+        return Markup(cached)
+    html = render()
+    try:
+        store.set(fragment_key, str(html), ttl if ttl is not None else config.get('FRAGMENT_CACHE_DEFAULT_TTL', 300))
+    except Exception as e:
+        current_app.logger.error(f"Fragment cache write failed: {str(e)}")
+    return html
+
+
+def invalidate(name, *args, app=None):
+    """Drop fragments cached as ``name`` whose key starts with ``args``.
+
+    ``invalidate('booking_list', 7)`` drops every page of user 7's list,
+    ``invalidate('booking_list')`` every user's.
+    """
+    app = app or current_app
+    key = _key(name, args)
+    try:
+        get_store(app).incr(f'v:{key}')
+    except Exception as e:
+        app.logger.error(f"Fragment cache invalidation of {key} failed: {str(e)}")
+
+
+class FragmentCacheExtension(Extension):
+    """``{% cache 'name', arg, ..., ttl=300 %}...{% endcache %}``
+
+    The body is rendered once per distinct (name, args) and reused until
+    ``ttl`` seconds pass (default FRAGMENT_CACHE_DEFAULT_TTL) or
+    ``invalidate`` is called for the name or a leading part of the key.
+    Only put things in the key that the body depends on, most general first.
+    ``shared=True`` skips the cache unless every worker shares the store,
+    for fragments that must not outlive a write made through another worker.
+    """
+    tags = {'cache'}
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        args = [parser.parse_expression()]
+        options = {'ttl': nodes.Const(None), 'shared': nodes.Const(False)}
+        while parser.stream.skip_if('comma'):
+            current = parser.stream.current
+            if current.type == 'name' and current.value in options and parser.stream.look().test('assign'):
+                parser.stream.skip(2)
+                options[current.value] = parser.parse_expression()
+            else:
+                args.append(parser.parse_expression())
+        body = parser.parse_statements(('name:endcache',), drop_needle=True)
+        call = self.call_method('_cache', [args[0], nodes.List(args[1:]), options['ttl'], options['shared']])
+        return nodes.CallBlock(call, [], [], body).set_lineno(lineno)
+
+    def _cache(self, name, args, ttl, shared, caller):
+        return render_fragment(name, args, ttl, caller, shared)
+
+
+def init_template_cache(app):
+    """Enable the shared bytecode cache and the ``{% cache %}`` tag."""
+    if app.config.get('TEMPLATE_BYTECODE_CACHE_ENABLED', True):
+        directory = bytecode_cache_dir(app)
+        os.makedirs(directory, exist_ok=True)
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache(directory)
+    app.jinja_env.add_extension(FragmentCacheExtension)
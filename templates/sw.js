@@ -0,0 +1,288 @@
+// ========================================
+// TRAVEL COMPANY - SERVICE WORKER
+// ========================================
+//
+// Rendered by app_shell.service_worker; the shell list and version are
+// filled in per deploy.
+//
+// - Shell (vendored CSS/JS, fonts, offline page): precached on install.
+//   Static URLs carry a content hash, so they are served cache-first.
+// - /groups, /groups/changes (full list) and /my_bookings: stale-while-
+//   revalidate. The cached copy is answered at once and refreshed in the
+//   background with a conditional request.
+// - Other pages: network first, falling back to a cached copy or the
+//   offline page.
+// - POST /book_ride and /join: sent as usual; when the network is down
+//   the request is kept in IndexedDB and replayed on reconnect with its
+//   Idempotency-Key, so a replay can't book or join twice. A replay that
+//   isn't answered with JSON (e.g. redirected to /login after the session
+//   expired) stays queued until the user signs in again.
+//
+// Cached pages are per user: they are dropped on any write, login or
+// logout.
+
+const VERSION = {{ version|tojson }};
+const ENABLED = {{ enabled|tojson }};
+const SHELL_CACHE = `shell-${VERSION}`;
+const DATA_CACHE = 'data-v1';
+const DATA_CACHE_MAX_ENTRIES = 30;
+const SHELL = {{ shell|tojson }};
+const OFFLINE_URL = {{ offline_url|tojson }};
+
+const REVALIDATED_PATHS = ['/groups', '/groups/changes', '/my_bookings'];
+const QUEUED_PATHS = ['/book_ride', '/join'];
+// Headers a replay needs; the browser adds cookies itself
+const REPLAYED_HEADERS = ['content-type', 'idempotency-key', 'x-requested-with', 'x-csrftoken'];
+
+// ----------------------------------------
+// Lifecycle
+// ----------------------------------------
+
+self.addEventListener('install', event => {
+    if (!ENABLED) {
+        self.skipWaiting();
+        return;
+    }
+    event.waitUntil(
+        caches.open(SHELL_CACHE)
+            .then(cache => cache.addAll(SHELL))
+            .then(() => self.skipWaiting())
+    );
+});
+
+self.addEventListener('activate', event => {
+    event.waitUntil((async () => {
+        const keep = ENABLED ? [SHELL_CACHE, DATA_CACHE] : [];
+        for (const name of await caches.keys()) {
+            if (!keep.includes(name)) {
+                await caches.delete(name);
+            }
+        }
+        if (!ENABLED) {
+            // Switched off (SERVICE_WORKER_ENABLED=False): leave nothing behind
+            await self.registration.unregister();
+            return;
+        }
+        await self.clients.claim();
+        await replayOutbox();
+    })());
+});
+
+// ----------------------------------------
+// Fetch routing
+// ----------------------------------------
+
+self.addEventListener('fetch', event => {
+    if (!ENABLED) return;
+    const request = event.request;
+    const url = new URL(request.url);
+    if (url.origin !== self.location.origin) return;
+
+    if (request.method !== 'GET') {
+        if (request.method === 'POST' && QUEUED_PATHS.includes(url.pathname)) {
+            event.respondWith(sendOrQueue(request));
+        } else {
+            event.respondWith(fetch(request).finally(clearData));
+        }
+        return;
+    }
+    if (url.pathname === '/logout' || url.pathname === '/login') {
+        event.respondWith(clearData().then(() => fetch(request)));
+    } else if (url.pathname.startsWith('/static/')) {
+        event.respondWith(cacheFirst(request));
+    } else if (REVALIDATED_PATHS.includes(url.pathname) && !url.searchParams.has('since')) {
+        event.respondWith(staleWhileRevalidate(event, request));
+    } else if (request.mode === 'navigate') {
+        event.respondWith(networkFirst(request));
+    }
+});
+
+async function cacheFirst(request) {
+    const cached = await caches.match(request);
+    if (cached) return cached;
+    const response = await fetch(request);
+    if (response.ok && new URL(request.url).searchParams.has('v')) {
+        const cache = await caches.open(SHELL_CACHE);
+        await cache.put(request, response.clone());
+    }
+    return response;
+}
+
+async function staleWhileRevalidate(event, request) {
+    const cache = await caches.open(DATA_CACHE);
+    const cached = await cache.match(request);
+    const refreshed = fetch(request).then(async response => {
+        // Only keep what the user should see again: no redirects to /login
+        if (response.ok && !response.redirected) {
+            await cache.put(request, response.clone());
+            await trimCache(cache, DATA_CACHE_MAX_ENTRIES);
+            if (cached && cached.headers.get('ETag') !== response.headers.get('ETag')) {
+                await notify({ type: 'refreshed', url: request.url });
+            }
+        }
+        return response;
+    });
+    if (cached) {
+        event.waitUntil(refreshed.catch(() => {}));
+        return cached;
+    }
+    return refreshed.catch(() => offlineResponse(request));
+}
+
+async function networkFirst(request) {
+    try {
+        return await fetch(request);
+    } catch (error) {
+        return (await caches.match(request)) || offlineResponse(request);
+    }
+}
+
+async function offlineResponse(request) {
+    if (request.mode === 'navigate') {
+        const page = await caches.match(OFFLINE_URL);
+        if (page) return page;
+    }
+    return Response.error();
+}
+
+async function trimCache(cache, maxEntries) {
+    const keys = await cache.keys();
+    for (const key of keys.slice(0, Math.max(0, keys.length - maxEntries))) {
+        await cache.delete(key);
+    }
+}
+
+function clearData() {
+    return caches.delete(DATA_CACHE);
+}
+
+async function notify(message) {
+    const windows = await self.clients.matchAll({ type: 'window' });
+    windows.forEach(client => client.postMessage(message));
+}
+
+// ----------------------------------------
+// Offline outbox
+// ----------------------------------------
+
+function openOutbox() {
+    return new Promise((resolve, reject) => {
+        const open = indexedDB.open('travel-outbox', 1);
+        open.onupgradeneeded = () => open.result.createObjectStore('requests', { keyPath: 'id', autoIncrement: true });
+        open.onsuccess = () => resolve(open.result);
+        open.onerror = () => reject(open.error);
+    });
+}
+
+async function outbox(mode, use) {
+    const db = await openOutbox();
+    return new Promise((resolve, reject) => {
+        const transaction = db.transaction('requests', mode);
+        const result = use(transaction.objectStore('requests'));
+        transaction.oncomplete = () => resolve(result && result.result);
+        transaction.onerror = () => reject(transaction.error);
+    });
+}
+
+async function sendOrQueue(request) {
+    const copy = request.clone();
+    try {
+        const response = await fetch(request);
+        await clearData();
+        return response;
+    } catch (error) {
+        await enqueue(copy);
+        return new Response(JSON.stringify({
+            success: true,
+            queued: true,
+            message: "You're offline. We'll send this as soon as you're back online."
+        }), { status: 202, headers: { 'Content-Type': 'application/json' } });
+    }
+}
+
+async function enqueue(request) {
+    const headers = {};
+    REPLAYED_HEADERS.forEach(name => {
+        if (request.headers.has(name)) headers[name] = request.headers.get(name);
+    });
+    // The key makes the replay safe to repeat if its response is lost too
+    headers['idempotency-key'] = headers['idempotency-key'] || self.crypto.randomUUID();
+    const entry = {
+        url: request.url,
+        headers,
+        body: await request.arrayBuffer(),
+        queuedAt: Date.now()
+    };
+    await outbox('readwrite', store => store.add(entry));
+    if (self.registration.sync) {
+        await self.registration.sync.register('outbox').catch(() => {});
+    }
+}
+
+let replaying = null;
+
+function replayOutbox() {
+    // One replay at a time, in the order the requests were made
+    replaying = replaying || drainOutbox().finally(() => { replaying = null; });
+    return replaying;
+}
+
+async function drainOutbox() {
+    const entries = await outbox('readonly', store => store.getAll());
+    for (const entry of entries || []) {
+        let response;
+        try {
+            response = await fetch(entry.url, {
+                method: 'POST',
+                headers: entry.headers,
+                body: entry.body,
+                credentials: 'same-origin'
+            });
+        } catch (error) {
+            return false; // still offline; the next sync, message or start tries again
+        }
+        if (response.status === 429 || response.status === 503) {
+            return false; // rate limited or shedding load: keep it for later
+        }
+        // A signed-out replay is redirected to the login page. Nothing was
+        // booked, so keep the entry until a page load after signing in
+        // replays it, and don't report a result
+        if (response.redirected || response.status === 401) {
+            await notify({ type: 'signin-required', path: new URL(entry.url).pathname });
+            return false;
+        }
+        // Any other non-JSON answer (a proxy or server error page) says
+        // nothing about the request either: keep it for later
+        if (!(response.headers.get('content-type') || '').includes('application/json')) {
+            return false;
+        }
+        const result = await response.json().catch(() => null);
+        if (result === null) {
+            return false; // cut off mid-body: the idempotency key makes a retry safe
+        }
+        await outbox('readwrite', store => store.delete(entry.id));
+        await clearData();
+        await notify({
+            type: 'replayed',
+            path: new URL(entry.url).pathname,
+            success: response.ok && result.success !== false,
+            result
+        });
+    }
+    return true;
+}
+
+self.addEventListener('sync', event => {
+    if (event.tag === 'outbox') {
+        // Rejecting asks the browser to retry the sync later
+        event.waitUntil(replayOutbox().then(drained => {
+            if (!drained) throw new Error('Outbox not drained');
+        }));
+    }
+});
+
+self.addEventListener('message', event => {
+    if (event.data && event.data.type === 'replay') {
+        event.waitUntil(replayOutbox());
+    }
+});
@@ -3,6 +3,8 @@ import os
 import tempfile
 from datetime import datetime, timedelta
 
+from flask import g
+
 from app import create_app
 from models import db, User, Ride, Booking
 
@@ -13,14 +15,17 @@ def app():
     # Create a temporary database for testing
     db_fd, db_path = tempfile.mkstemp()
 
-    app = create_app()
-    app.config.update({
-        'TESTING': True,
-        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{db_path}',
-        'SECRET_KEY': 'test-secret-key',
-        'WTF_CSRF_ENABLED': False,  # Disable CSRF for testing
-        'MAIL_SUPPRESS_SEND': True,  # Suppress email sending in tests
-    })
+    app = create_app(
+        'testing',
+        SQLALCHEMY_DATABASE_URI=f'sqlite:///{db_path}',
+        SECRET_KEY='test-secret-key',
+    )
+
+    @app.before_request
+    def forget_loaded_user():
+        # Test requests run inside the fixture's app context and share its
+        # `g`, where Flask-Login keeps the user of the previous request
+        g.pop('_login_user', None)
 
     with app.app_context():
         db.create_all()
@@ -46,16 +51,15 @@ def runner(app):
 @pytest.fixture
 def test_user(app):
     """Create a test user."""
-    with app.app_context():
-        user = User(
-            name='Test User',
-            email='test@example.com',
-            contact='1234567890'
-        )
-        user.set_password('password123')
-        db.session.add(user)
-        db.session.commit()
-        return user
+    user = User(
+        name='Test User',
+        email='test@example.com',
+        contact='1234567890'
+    )
+    user.set_password('password123')
+    db.session.add(user)
+    db.session.commit()
+    return user
 
 
 @pytest.fixture
@@ -73,33 +77,31 @@ def authenticated_client(client, test_user):
 @pytest.fixture
 def test_booking(app, test_user):
     """Create a test booking."""
-    with app.app_context():
-        booking = Booking(
-            user_id=test_user.id,
-            name='Test Passenger',
-            location='Central Station',
-            destination='Airport',
-            travel_date=datetime.now().date() + timedelta(days=7),
-            travel_time=datetime.now().time(),
-            passengers=2,
-            contact='9876543210'
-        )
-        db.session.add(booking)
-        db.session.commit()
-        return booking
+    booking = Booking(
+        user_id=test_user.id,
+        name='Test Passenger',
+        location='Central Station',
+        destination='Airport',
+        travel_date=datetime.now().date() + timedelta(days=7),
+        travel_time=datetime.now().time(),
+        passengers=2,
+        contact='9876543210'
+    )
+    db.session.add(booking)
+    db.session.commit()
+    return booking
 
 
 @pytest.fixture
 def test_ride(app, test_user):
     """Create a test ride."""
-    with app.app_context():
-        ride = Ride(
-            driver_id=test_user.id,
-            name='Test Ride',
-            location='Central Station',
-            destination='Airport',
-            contact='1234567890'
-        )
-        db.session.add(ride)
-        db.session.commit()
-        return ride
+    ride = Ride(
+        driver_id=test_user.id,
+        name='Test Ride',
+        location='Central Station',
+        destination='Airport',
+        contact='1234567890'
+    )
+    db.session.add(ride)
+    db.session.commit()
+    return ride
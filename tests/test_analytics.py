@@ -0,0 +1,183 @@
+from datetime import date, datetime, time, timedelta
+
+import pytest
+from sqlalchemy import update
+
+import analytics
+from analytics import BookingRollup, daily_series, dashboard_data, refresh_rollups, top_values
+from models import db, User, Booking
+from scheduler import Job
+
+NOW = datetime(2024, 6, 10, 12, 0)
+
+
+def add_booking(created_at, destination='Airport Terminal', location='Central Station',
+                passengers=1, status='pending'):
+    booking = Booking(
+        name='Passenger', location=location, destination=destination,
+        travel_date=date(2024, 7, 1), travel_time=time(9, 0), passengers=passengers,
+        contact='1234567890', status=status, created_at=created_at, updated_at=created_at
+    )
+    db.session.add(booking)
+    db.session.commit()
+    return booking
+
+
+def login(client, user_id):
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user_id)
+
+
+@pytest.fixture
+def admin(app):
+    user = User(name='Admin', email='admin@example.com', contact='1')
+    user.set_password('password123')
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+
+class TestBookingRollups:
+    """Test cases for the incremental booking rollups."""
+
+    def test_first_refresh_rolls_up_everything(self, app):
+        """Test bookings are counted per day, destination, station and status."""
+        add_booking(NOW - timedelta(days=1), passengers=2)
+        add_booking(NOW - timedelta(days=1, hours=3), destination='City Center', passengers=3)
+        add_booking(NOW, location='Bus Depot', status='Pending')
+
+        refresh_rollups(now=NOW)
+
+        series = daily_series(2, today=NOW)
+        assert [(count, passengers) for _, count, passengers in series] == [(2, 5), (1, 1)]
+        assert top_values('destination', 2, today=NOW)[0][:2] == ('Airport Terminal', 2)
+        assert dict((v, c) for v, c, _ in top_values('station', 2, today=NOW)) == {
+            'Central Station': 2, 'Bus Depot': 1}
+        assert top_values('status', 2, today=NOW) == [('pending', 3, 6)]
+
+    def test_refresh_only_recomputes_changed_hours(self, app):
+        """Test a second refresh touches only hours with new or updated bookings."""
+        add_booking(NOW - timedelta(days=3))
+        refresh_rollups(now=NOW)
+
+        add_booking(NOW + timedelta(minutes=5), passengers=4)
+
+        assert refresh_rollups(now=NOW + timedelta(minutes=10)) == 1
+        assert [row[1] for row in daily_series(4, today=NOW)] == [1, 0, 0, 1]
+
+    def test_status_changes_move_between_buckets(self, app):
+        """Test bulk status updates are picked up through updated_at."""
+        booking = add_booking(NOW - timedelta(days=2))
+        refresh_rollups(now=NOW)
+
+        db.session.execute(update(Booking).where(Booking.id == booking.id).values(status='expired'))
+        db.session.commit()
+        refresh_rollups(now=datetime.utcnow() + timedelta(minutes=1))
+
+        assert top_values('status', 3, today=NOW) == [('expired', 1, 1)]
+
+    def test_day_rows_match_hour_rows(self, app):
+        """Test daily rows are the sum of their hourly rows."""
+        for hours in range(0, 48, 5):
+            add_booking(NOW - timedelta(hours=hours), passengers=hours % 3 + 1)
+        refresh_rollups(now=NOW)
+
+        def total(period):
+            return sum(
+                row.passengers for row in BookingRollup.query.filter_by(period=period, dimension='all')
+            )
+
+        assert total('hour') == total('day') == sum(h % 3 + 1 for h in range(0, 48, 5))
+
+    def test_refresh_job_queues_chart_render(self, app):
+        """Test the periodic refresh asks for new charts only when data changed."""
+        assert analytics.refresh_booking_rollups() == 0
+        assert Job.query.filter_by(name='render_analytics_charts').count() == 0
+
+        add_booking(datetime.utcnow())
+        analytics.refresh_booking_rollups()
+        analytics.refresh_booking_rollups()
+
+        assert Job.query.filter_by(name='render_analytics_charts').count() == 1
+
+
+class TestAdminAnalytics:
+    """Test cases for the admin analytics endpoints."""
+
+    def test_non_admin_is_forbidden(self, client, app, admin):
+        """Test only the admin user can read analytics."""
+        other = User(name='Other', email='other@example.com', contact='2')
+        other.set_password('password123')
+        db.session.add(other)
+        db.session.commit()
+        login(client, other.id)
+
+        assert client.get('/admin/analytics/data').status_code == 403
+
+    def test_every_admin_route_is_gated(self, client, app, admin):
+        """Test each /admin route sends anonymous users to log in and refuses other users."""
+        rules = [rule for rule in app.url_map.iter_rules() if rule.endpoint.startswith('admin.')]
+        other = User(name='Other', email='other@example.com', contact='2')
+        other.set_password('password123')
+        db.session.add(other)
+        db.session.commit()
+
+        def statuses():
+            return {
+                rule.rule: client.open(rule.rule.replace('<name>', 'daily').replace('<int:booking_id>', '1'),
+                                       method='POST' if 'POST' in rule.methods else 'GET').status_code
+                for rule in rules
+            }
+
+        assert len(rules) >= 4
+        assert set(statuses().values()) == {302}
+        login(client, other.id)
+        assert set(statuses().values()) == {403}
+
+    def test_data_comes_from_rollups(self, client, app, admin):
+        """Test the data endpoint reflects the last refresh, not live bookings."""
+        add_booking(datetime.utcnow(), passengers=2)
+        refresh_rollups()
+        add_booking(datetime.utcnow())
+        login(client, admin.id)
+
+        data = client.get('/admin/analytics/data?days=7').get_json()
+
+        assert data['totals'] == {'bookings': 1, 'passengers': 2}
+        assert len(data['daily']) == 7
+        assert data['destinations'][0]['value'] == 'Airport Terminal'
+
+    def test_missing_chart_queues_render(self, client, app, admin, tmp_path):
+        """Test a chart that was never drawn returns 503 and queues a render."""
+        app.config['ANALYTICS_CHART_DIR'] = str(tmp_path)
+        login(client, admin.id)
+
+        response = client.get('/admin/analytics/charts/bookings_per_day.png')
+
+        assert response.status_code == 503
+        assert Job.query.filter_by(name='render_analytics_charts').count() == 1
+        assert client.get('/admin/analytics/charts/nope.png').status_code == 404
+
+    def test_cached_chart_is_served_with_etag(self, client, app, admin, tmp_path):
+        """Test rendered charts are served as files and revalidate with 304."""
+        app.config['ANALYTICS_CHART_DIR'] = str(tmp_path)
+        (tmp_path / 'top_stations.png').write_bytes(b'\x89PNG fake')
+        login(client, admin.id)
+
+        first = client.get('/admin/analytics/charts/top_stations.png')
+        again = client.get('/admin/analytics/charts/top_stations.png',
+                           headers={'If-None-Match': first.headers['ETag']})
+
+        assert first.status_code == 200
+        assert first.mimetype == 'image/png'
+        assert again.status_code == 304
+
+    def test_render_writes_every_chart(self, app, tmp_path):
+        """Test the render job draws all charts from the rollups."""
+        pytest.importorskip('matplotlib')
+        app.config['ANALYTICS_CHART_DIR'] = str(tmp_path)
+        add_booking(datetime.utcnow())
+        refresh_rollups()
+
+        assert analytics.render_analytics_charts() == len(analytics.CHARTS)
+        assert sorted(p.name for p in tmp_path.iterdir()) == sorted(f'{n}.png' for n in analytics.CHARTS)
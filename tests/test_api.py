@@ -0,0 +1,233 @@
+import gzip
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+from models import db, Ride, Booking
+from api.serializers import parse_fields, row_serializer, serialize_rows, RIDE_FIELDS
+
+
+def add_rides(count, destination='Airport Terminal'):
+    for i in range(count):
+        db.session.add(Ride(
+            name=f'Ride {i}',
+            location='Central Station',
+            destination=destination,
+            contact='1234567890'
+        ))
+    db.session.commit()
+
+
+def make_user(name, email):
+    from models import User
+    user = User(name=name, email=email, contact='1234567890')
+    user.set_password('password123')
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+
+def login(client, user):
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user.id)
+
+
+def add_booking(user, travel_at, status='pending'):
+    booking = Booking(
+        user_id=user.id, name=user.name, location='Central Station',
+        destination='Airport', travel_date=travel_at.date(),
+        travel_time=travel_at.time(), passengers=1, contact='9876543210',
+        status=status
+    )
+    db.session.add(booking)
+    db.session.commit()
+    return booking
+
+
+class TestSerializers:
+    """Test cases for the compiled row serializers."""
+
+    def test_parse_fields_always_includes_id(self):
+        """Test sparse fieldsets keep the id for cursors."""
+        assert parse_fields('destination,name', RIDE_FIELDS) == ('id', 'destination', 'name')
+        assert parse_fields(None, RIDE_FIELDS) == tuple(RIDE_FIELDS)
+
+    def test_parse_fields_rejects_unknown(self):
+        """Test unknown field names are rejected."""
+        with pytest.raises(ValueError):
+            parse_fields('id,password_hash', RIDE_FIELDS)
+
+    def test_row_serializer_is_cached(self):
+        """Test serializers are compiled once per field set."""
+        fields = ('id', 'name')
+        assert row_serializer(fields) is row_serializer(fields)
+        assert row_serializer(fields)((1, 'Ride')) == {'id': 1, 'name': 'Ride'}
+
+    def test_compact_rows(self):
+        """Test compact mode returns field names once and rows as arrays."""
+        result = serialize_rows([(1, 'A'), (2, 'B')], ('id', 'name'), compact=True)
+        assert result['fields'] == ['id', 'name']
+        assert [list(r) for r in result['rows']] == [[1, 'A'], [2, 'B']]
+
+
+class TestRidesApi:
+    """Test cases for /api/v1/rides."""
+
+    def test_list_rides_with_sparse_fields(self, client, app):
+        """Test only requested fields are returned."""
+        add_rides(3)
+        response = client.get('/api/v1/rides?fields=destination')
+
+        assert response.status_code == 200
+        data = response.get_json()['data']
+        assert len(data) == 3
+        assert set(data[0]) == {'id', 'destination'}
+
+    def test_keyset_pagination(self, client, app):
+        """Test the next cursor walks all rides without overlap."""
+        add_rides(5)
+        first = client.get('/api/v1/rides?limit=2&fields=id').get_json()
+        second = client.get(f"/api/v1/rides?limit=2&fields=id&after={first['next']}").get_json()
+
+        assert [r['id'] for r in first['data']] == [1, 2]
+        assert [r['id'] for r in second['data']] == [3, 4]
+
+    def test_unknown_field_is_bad_request(self, client, app):
+        """Test invalid fieldsets return 400."""
+        response = client.get('/api/v1/rides?fields=secret')
+        assert response.status_code == 400
+
+    def test_ride_detail_not_found(self, client, app):
+        """Test missing rides return 404 JSON."""
+        response = client.get('/api/v1/rides/999')
+        assert response.status_code == 404
+        assert response.get_json()['error'] == 'Not found'
+
+    def test_large_payload_is_gzipped(self, client, app):
+        """Test responses over the threshold are gzipped when accepted."""
+        add_rides(50)
+        response = client.get('/api/v1/rides', headers={'Accept-Encoding': 'gzip'})
+
+        assert response.headers['Content-Encoding'] == 'gzip'
+        data = json.loads(gzip.decompress(response.data))
+        assert len(data['data']) == 50
+
+    def test_groups_by_destination(self, client, app):
+        """Test rides are grouped by destination."""
+        add_rides(2, destination='Airport Terminal')
+        add_rides(1, destination='Bus Depot')
+        data = client.get('/api/v1/groups?fields=name').get_json()['data']
+
+        assert len(data['Airport Terminal']) == 2
+        assert set(data['Bus Depot'][0]) == {'id', 'name'}
+
+    def test_groups_are_paged(self, client, app):
+        """Test /groups returns at most `limit` rides and a cursor to the rest."""
+        add_rides(3, destination='Airport Terminal')
+        add_rides(2, destination='Bus Depot')
+        first = client.get('/api/v1/groups?fields=id&limit=4').get_json()
+        second = client.get(f"/api/v1/groups?fields=id&limit=4&after={first['next']}").get_json()
+
+        assert {name: len(rides) for name, rides in first['data'].items()} == {'Airport Terminal': 3, 'Bus Depot': 1}
+        assert (second['data'], second['next']) == ({'Bus Depot': [{'id': 5}]}, None)
+
+    def test_library_errors_are_not_bad_requests(self, client, app, monkeypatch):
+        """Test only invalid input maps to 400; other ValueErrors stay server errors."""
+        def broken(*args, **kwargs):
+            raise ValueError('bug')
+        monkeypatch.setattr('api.routes.scatter', broken)
+        app.config['PROPAGATE_EXCEPTIONS'] = False
+
+        assert client.get('/api/v1/rides').status_code == 500
+
+
+class TestBookingsApi:
+    """Test cases for /api/v1/bookings."""
+
+    def test_bookings_require_login(self, client):
+        """Test anonymous users cannot list bookings."""
+        response = client.get('/api/v1/bookings')
+        assert response.status_code in [302, 401]
+
+    def test_list_own_bookings(self, client, app):
+        """Test users only see their own bookings, with ISO dates."""
+        from models import User
+        owner = User(name='Owner', email='owner@example.com', contact='1234567890')
+        other = User(name='Other', email='other@example.com', contact='1111111111')
+        owner.set_password('password123')
+        other.set_password('password123')
+        db.session.add_all([owner, other])
+        db.session.commit()
+        travel_date = datetime.now().date() + timedelta(days=7)
+        for user in (owner, other):
+            db.session.add(Booking(
+                user_id=user.id, name=user.name, location='Central Station',
+                destination='Airport', travel_date=travel_date,
+                travel_time=datetime.now().time(), passengers=1, contact='9876543210'
+            ))
+        db.session.commit()
+
+        with client.session_transaction() as session:
+            session['_user_id'] = str(owner.id)
+        response = client.get('/api/v1/bookings?fields=travel_date,status,name')
+
+        assert response.status_code == 200
+        bookings = response.get_json()['data']
+        assert [b['name'] for b in bookings] == ['Owner']
+        assert bookings[0]['status'] == 'pending'
+        assert bookings[0]['travel_date'] == travel_date.isoformat()
+
+
+class TestBatchApi:
+    """Test cases for the batch join and cancel endpoints."""
+
+    def test_join_many_rides(self, client, app):
+        """Test joining several rides reports a result per id."""
+        from models import user_ride
+        user = make_user('Joiner', 'joiner@example.com')
+        add_rides(3)
+        login(client, user)
+        db.session.execute(user_ride.insert().values(user_id=user.id, ride_id=2))
+        db.session.commit()
+
+        response = client.post('/api/v1/rides/join', json={'ride_ids': [1, 2, 3, 99, 1]})
+
+        assert response.status_code == 200
+        data = response.get_json()
+        assert [r['result'] for r in data['results']] == ['joined', 'already_joined', 'joined', 'not_found']
+        assert data['summary'] == {'joined': 2, 'already_joined': 1, 'not_found': 1}
+        assert db.session.query(user_ride).filter_by(user_id=user.id).count() == 3
+
+    def test_cancel_many_bookings(self, client, app):
+        """Test bulk cancellation applies the same rules as single cancels."""
+        make_user('Admin', 'admin@example.com')  # user 1 is the admin
+        owner = make_user('Owner', 'owner@example.com')
+        other = make_user('Other', 'other@example.com')
+        later = datetime.now() + timedelta(days=2)
+        ok = add_booking(owner, later)
+        soon = add_booking(owner, datetime.now() + timedelta(minutes=30))
+        done = add_booking(owner, later, status='Cancelled')
+        foreign = add_booking(other, later)
+        login(client, owner)
+
+        response = client.post('/api/v1/bookings/cancel', json={
+            'booking_ids': [ok.id, soon.id, done.id, foreign.id, 999]
+        })
+
+        results = {r['id']: r['result'] for r in response.get_json()['results']}
+        assert results == {
+            ok.id: 'cancelled', soon.id: 'too_late', done.id: 'already_cancelled',
+            foreign.id: 'forbidden', 999: 'not_found'
+        }
+        db.session.expire_all()
+        assert db.session.get(Booking, ok.id).status == 'cancelled'
+        assert db.session.get(Booking, soon.id).status == 'pending'
+
+    def test_batch_requires_id_list(self, client, app):
+        """Test malformed batch bodies are rejected."""
+        login(client, make_user('Joiner', 'joiner@example.com'))
+
+
+        assert client.post('/api/v1/rides/join', json={'ride_ids': []}).status_code == 400
+        assert client.post('/api/v1/rides/join', json={'ride_ids': ['x']}).status_code == 400
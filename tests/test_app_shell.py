@@ -0,0 +1,79 @@
+import json
+import re
+
+from flask import jsonify, url_for
+
+from app_shell import IMMUTABLE, asset_version, conditional
+
+
+def shell_from(script):
+    return json.loads(re.search(r'^const SHELL = (.*);$', script, re.M).group(1))
+
+
+class TestAppShell:
+    """Test cases for versioned static assets and the service worker."""
+
+    def test_static_urls_carry_a_content_version(self, app, client):
+        """Test static URLs are versioned, cached for good, and stale versions revalidate."""
+        with app.test_request_context():
+            url = url_for('static', filename='css/style.css')
+        version = asset_version('css/style.css', app)
+
+        assert url == f'/static/css/style.css?v={version}'
+        assert client.get(url).headers['Cache-Control'] == IMMUTABLE
+        assert client.get('/static/css/style.css?v=0ld').headers['Cache-Control'] == 'no-cache'
+        assert client.get('/static/css/style.css').headers['Cache-Control'] == 'no-cache'
+
+    def test_service_worker_precaches_the_shell(self, client):
+        """Test /sw.js lists the vendored shell, each entry is served, and the worker is never cached."""
+        response = client.get('/sw.js')
+        script = response.get_data(as_text=True)
+        shell = shell_from(script)
+
+        assert response.mimetype == 'application/javascript'
+        assert response.headers['Cache-Control'] == 'no-cache'
+        assert 'const ENABLED = true;' in script
+        assert '/offline' in shell
+        assert any(url.startswith('/static/vendor/bootstrap/js/bootstrap.min.js?v=') for url in shell)
+        for url in shell:
+            assert client.get(url).status_code == 200, url
+        # No page in the shell may pull assets from a CDN
+        assert 'https://' not in client.get('/offline').get_data(as_text=True)
+
+    def test_worker_changes_with_the_assets(self, app, client, tmp_path):
+        """Test a new asset version changes the worker script, and disabling it ships an unregistering worker."""
+        before = client.get('/sw.js').get_data(as_text=True)
+        static = tmp_path / 'static'
+        (static / 'css').mkdir(parents=True)
+        (static / 'css' / 'style.css').write_text('body { color: red; }')
+        app.static_folder = str(static)
+        after = client.get('/sw.js').get_data(as_text=True)
+
+        assert before != after
+        assert f"/static/css/style.css?v={asset_version('css/style.css', app)}" in shell_from(after)
+
+        app.config['SERVICE_WORKER_ENABLED'] = False
+        assert 'const ENABLED = false;' in client.get('/sw.js').get_data(as_text=True)
+
+    def test_signed_out_replays_stay_queued(self, client):
+        """Test a signed-out replay is redirected to /login, which the worker does not count as sent."""
+        response = client.post('/join', headers={'X-Requested-With': 'XMLHttpRequest'})
+        assert response.status_code == 302 and '/login' in response.headers['Location']
+
+        drain = client.get('/sw.js').get_data(as_text=True).split('async function drainOutbox')[1]
+        keep = drain.index('response.redirected')
+        assert keep < drain.index('store.delete(entry.id)')
+        assert keep < drain.index("type: 'replayed'")
+
+    def test_conditional_answers_not_modified(self, app):
+        """Test an unchanged body is answered with 304 and a changed one in full."""
+        with app.test_request_context('/groups'):
+            first = conditional(jsonify({'rides': [1]}))
+        etag = first.headers['ETag']
+        with app.test_request_context('/groups', headers={'If-None-Match': etag}):
+            same = conditional(jsonify({'rides': [1]}))
+            changed = conditional(jsonify({'rides': [1, 2]}), private=True)
+
+        assert (first.status_code, first.headers['Cache-Control']) == (200, 'no-cache')
+        assert same.status_code == 304
+        assert (changed.status_code, changed.headers['Cache-Control']) == (200, 'private, no-cache')
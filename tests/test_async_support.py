@@ -0,0 +1,54 @@
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Monkey patching can't be undone, so eventlet runs in its own interpreter
+UNDER_EVENTLET = """
+import eventlet
+eventlet.monkey_patch()
+
+import os, tempfile
+from flask import current_app
+from sqlalchemy import func, select
+
+import async_support
+from app import create_app
+from models import db, User
+
+path = tempfile.mkstemp()[1]
+app = create_app('testing', SQLALCHEMY_DATABASE_URI=f'sqlite:///{path}')
+
+
+def count_users(offset):
+    # Needs the app: the config and the session both come from current_app
+    return current_app.config['TESTING'], db.session.scalar(select(func.count(User.id))) + offset
+
+
+with app.app_context():
+    db.create_all()
+    print(async_support.is_green(), *async_support.run_blocking(count_users, 5))
+print(async_support.run_blocking(sum, [1, 2]))
+os.remove(path)
+"""
+
+
+class TestRunBlocking:
+    """Test cases for offloading blocking calls."""
+
+    def test_runs_inline_without_eventlet(self, app):
+        """Test the call runs in the caller's thread and context when not green."""
+        from flask import current_app
+        from async_support import is_green, run_blocking
+
+        assert not is_green()
+        assert run_blocking(lambda: current_app.name) == app.name
+
+    def test_app_context_follows_into_tpool(self):
+        """Test under eventlet the tpool thread sees the caller's app and database."""
+        out = subprocess.run([sys.executable, '-c', UNDER_EVENTLET], cwd=ROOT,
+                             capture_output=True, text=True, timeout=60)
+
+        assert out.returncode == 0, out.stderr
+        assert out.stdout.split() == ['True', 'True', '5', '3']
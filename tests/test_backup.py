@@ -0,0 +1,123 @@
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from models import db, User
+from backup import RESTORED_KEY, copy_sqlite, list_snapshots, restore, restore_file, snapshot, snapshot_databases
+from template_cache import get_store
+
+
+@pytest.fixture
+def backup_app(app, tmp_path):
+    app.config['BACKUP_DIR'] = str(tmp_path / 'backups')
+    return app
+
+
+def add_user(name):
+    user = User(name=name, email=f'{name.lower()}@example.com', contact='1234567890')
+    user.set_password('password123')
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+
+def names():
+    return sorted(u.name for u in db.session.query(User))
+
+
+class TestBackup:
+    """Test cases for online snapshots and restore."""
+
+    def test_copy_finishes_while_another_connection_writes(self, tmp_path):
+        """Test a paged copy under constant writes ends with a consistent database."""
+        path = tmp_path / 'source.db'
+        source = sqlite3.connect(path)
+        source.execute('CREATE TABLE t (x BLOB)')
+        source.executemany('INSERT INTO t VALUES (?)', [(b'x' * 1000,)] * 5000)
+        source.commit()
+        done = threading.Event()
+
+        def write():
+            writer = sqlite3.connect(path, timeout=10)
+            while not done.is_set():
+                writer.execute('INSERT INTO t VALUES (1)')
+                writer.commit()
+                time.sleep(0.001)
+            writer.close()
+
+        thread = threading.Thread(target=write)
+        thread.start()
+        target = sqlite3.connect(tmp_path / 'copy.db')
+        try:
+            stats = copy_sqlite(source, target, pages=50, pause=0.001, max_restarts=2)
+        finally:
+            done.set()
+            thread.join()
+
+        assert stats['steps'] > 1
+        assert target.execute('PRAGMA integrity_check').fetchone() == ('ok',)
+        assert target.execute('SELECT count(*) FROM t').fetchone()[0] >= 5000
+
+    def test_snapshot_and_restore(self, backup_app):
+        """Test a snapshot is listed, compressed, and brings the data back on restore."""
+        add_user('Before')
+        path = snapshot(now=datetime(2030, 1, 2, 3, 4, 5))
+        add_user('After')
+
+        [taken] = list_snapshots()
+        assert (taken.database, taken.taken_at, taken.path) == ('default', datetime(2030, 1, 2, 3, 4, 5), path)
+        assert path.endswith('default-20300102T030405Z.db.gz')
+        with open(path, 'rb') as f:
+            assert f.read(2) == b'\x1f\x8b'
+
+        assert restore(path) == 'default'
+        assert names() == ['Before']
+
+    def test_restore_file_for_fixtures(self, backup_app, tmp_path):
+        """Test a snapshot can be written out as a standalone database file, repeatedly."""
+        add_user('Fixture')
+        path = snapshot()
+
+        for copy in ('one.db', 'two.db'):
+            target = restore_file(path, str(tmp_path / copy))
+            rows = sqlite3.connect(target).execute('SELECT name FROM user').fetchall()
+            assert rows == [('Fixture',)]
+
+    def test_cli_is_registered(self, backup_app):
+        """Test create_app registers the flask backup commands."""
+        add_user('Cli')
+        runner = backup_app.test_cli_runner()
+
+        assert runner.invoke(args=['backup', 'create']).exit_code == 0
+        result = runner.invoke(args=['backup', 'list'])
+        assert result.exit_code == 0 and result.output.startswith('default ')
+
+    def test_restore_reaches_other_workers(self, backup_app, client):
+        """Test a restore made elsewhere makes each worker drop its cached shard map on its next check."""
+        backup_app.config['BACKUP_RESTORE_CHECK_SECONDS'] = 0
+        client.get('/')
+        backup_app.extensions['shard_map'] = 'old'
+        client.get('/')
+        assert backup_app.extensions['shard_map'] == 'old'
+
+        # What `flask backup restore` does in its own process, through the shared store
+        get_store(backup_app).incr(RESTORED_KEY)
+        client.get('/')
+
+        assert backup_app.extensions.get('shard_map') != 'old'
+
+    def test_scheduled_snapshots(self, backup_app):
+        """Test the periodic job is off by default, waits out the interval and prunes."""
+        now = datetime(2030, 1, 1, 12)
+        assert snapshot_databases(now=now) == 0
+
+        backup_app.config.update(BACKUP_INTERVAL_HOURS=1, BACKUP_KEEP=2)
+        assert snapshot_databases(now=now) == 1
+        assert snapshot_databases(now=now + timedelta(minutes=30)) == 0
+        assert snapshot_databases(now=now + timedelta(hours=1)) == 1
+        assert snapshot_databases(now=now + timedelta(hours=2)) == 1
+
+        assert [s.taken_at.hour for s in list_snapshots('default')] == [13, 14]
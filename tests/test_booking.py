@@ -104,6 +104,24 @@ class TestBookingSystem:
         assert data['success'] == False
         assert 'Cannot cancel' in data['message']
 
+    def test_booking_cancellation_uses_travel_date_and_time(self, authenticated_client, test_booking):
+        """Test the 2-hour cutoff is measured against the booking's own travel date and time."""
+        from models import db, Booking
+        soon = datetime.now() + timedelta(hours=1, minutes=50)
+        test_booking.travel_date, test_booking.travel_time = soon.date(), soon.time()
+        db.session.commit()
+
+        assert authenticated_client.post(f'/cancel_booking/{test_booking.id}').get_json()['success'] is False
+        assert db.session.get(Booking, test_booking.id).status != 'cancelled'
+
+        later = datetime.now() + timedelta(hours=2, minutes=10)
+        test_booking.travel_date, test_booking.travel_time = later.date(), later.time()
+        db.session.commit()
+
+        assert authenticated_client.post(f'/cancel_booking/{test_booking.id}').get_json()['success'] is True
+        db.session.expire_all()
+        assert db.session.get(Booking, test_booking.id).status == 'cancelled'
+
     def test_booking_cancellation_wrong_user(self, client, test_booking, app):
         """Test booking cancellation by wrong user."""
         # Create another user
@@ -156,6 +174,18 @@ class TestBookingSystem:
         assert b'Booking Confirmed' in response.data
         assert str(test_booking.id).encode() in response.data
 
+    def test_booking_confirmation_status_poll(self, authenticated_client, test_booking):
+        """Test status polling returns JSON without waiting under sync workers."""
+        response = authenticated_client.get(
+            f'/booking_confirmation/{test_booking.id}?wait=25&status=pending',
+            headers={'X-Requested-With': 'XMLHttpRequest'}
+        )
+
+        assert response.status_code == 200
+        data = response.get_json()
+        assert data['status'] == 'pending'
+        assert data['retry_after'] == 30
+
     def test_booking_confirmation_wrong_user(self, client, test_booking, app):
         """Test viewing booking confirmation by wrong user."""
         # Create another user
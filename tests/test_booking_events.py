@@ -0,0 +1,214 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import insert
+
+from models import db, User, Booking
+from scheduler import Job
+from booking_events import (
+    BookingEvent, InvalidTransition, bulk_transition, consume, transition,
+    CANCELLED, CONFIRMED, EXPIRED
+)
+from tasks import expire_pending_bookings, notify_booking_changes
+
+
+def make_user(name, email):
+    user = User(name=name, email=email, contact='1234567890')
+    user.set_password('password123')
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+
+def login(client, user):
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user.id)
+
+
+def add_booking(user=None, status='pending', travel_at=None):
+    travel_at = travel_at or datetime.now() + timedelta(days=2)
+    booking = Booking(
+        user_id=user.id if user else None, name='Passenger', location='Central Station',
+        destination='Airport Terminal', travel_date=travel_at.date(), travel_time=travel_at.time(),
+        passengers=1, contact='9876543210', status=status
+    )
+    db.session.add(booking)
+    db.session.commit()
+    return booking
+
+
+def events_for(booking):
+    return [(e.event, e.from_status, e.to_status)
+            for e in BookingEvent.query.filter_by(booking_id=booking.id).order_by(BookingEvent.id)]
+
+
+class TestBookingStateMachine:
+    """Test cases for booking status transitions and the event log."""
+
+    def test_creation_is_logged_with_canonical_status(self, app):
+        """Test new bookings get a created event and a lower-case status."""
+        booking = add_booking(status='Pending')
+
+        assert booking.status == 'pending'
+        assert events_for(booking) == [('created', None, 'pending')]
+
+    def test_transition_appends_event(self, app):
+        """Test a valid status change is stored with its previous status."""
+        booking = add_booking()
+        transition(booking, CONFIRMED)
+        db.session.commit()
+        transition(booking, CANCELLED)
+        db.session.commit()
+
+        assert events_for(booking)[1:] == [
+            ('status_changed', 'pending', 'confirmed'),
+            ('status_changed', 'confirmed', 'cancelled'),
+        ]
+
+    def test_invalid_transitions_are_rejected(self, app):
+        """Test final states cannot be left, through transition() or the ORM."""
+        booking = add_booking(status='expired')
+
+        with pytest.raises(InvalidTransition):
+            transition(booking, CONFIRMED)
+
+        booking.status = 'pending'
+        with pytest.raises(InvalidTransition):
+            db.session.commit()
+        db.session.rollback()
+        assert len(events_for(booking)) == 1
+
+    def test_bulk_transition_skips_ineligible_rows(self, app):
+        """Test bulk changes only touch bookings that may make the move."""
+        pending = add_booking()
+        joined = add_booking(status='joined')
+
+        changed = bulk_transition(CONFIRMED, Booking.id.in_([pending.id, joined.id]))
+        db.session.commit()
+
+        assert changed == [pending.id]
+        db.session.expire_all()
+        assert db.session.get(Booking, joined.id).status == 'joined'
+        assert events_for(pending)[-1] == ('status_changed', 'pending', 'confirmed')
+
+    def test_expiry_handles_legacy_spelling(self, app):
+        """Test the expiry job moves old 'Pending' rows and logs them."""
+        past = datetime.now() - timedelta(days=1)
+        db.session.execute(insert(Booking), [{
+            'name': 'Old', 'location': 'Central Station', 'destination': 'Airport Terminal',
+            'travel_date': past.date(), 'travel_time': past.time(), 'passengers': 1,
+            'contact': '1', 'status': 'Pending'
+        }])
+        db.session.commit()
+
+        assert expire_pending_bookings() == 1
+        assert BookingEvent.query.filter_by(to_status=EXPIRED, from_status='pending').count() == 1
+
+
+class TestChangeFeed:
+    """Test cases for the booking change feed."""
+
+    def test_feed_starts_at_current_cursor(self, client, app):
+        """Test a client without a cursor gets the latest one and no history."""
+        user = make_user('Owner', 'owner@example.com')
+        add_booking(user)
+        login(client, user)
+
+        data = client.get('/api/v1/bookings/changes').get_json()
+
+        assert data['events'] == []
+        assert data['next'] == BookingEvent.query.one().id
+
+    def test_feed_returns_own_events_after_cursor(self, client, app):
+        """Test users only see events for their own bookings, in order."""
+        make_user('Admin', 'admin@example.com')  # user 1 is the admin
+        owner = make_user('Owner', 'owner@example.com')
+        other = make_user('Other', 'other@example.com')
+        mine = add_booking(owner)
+        login(client, owner)
+        cursor = client.get('/api/v1/bookings/changes').get_json()['next']
+
+        add_booking(other)
+        transition(mine, CANCELLED)
+        db.session.commit()
+        data = client.get(f'/api/v1/bookings/changes?since={cursor}').get_json()
+
+        assert [(e['booking_id'], e['to_status']) for e in data['events']] == [(mine.id, 'cancelled')]
+        assert data['next'] == data['events'][-1]['id']
+        again = client.get(f"/api/v1/bookings/changes?since={data['next']}").get_json()
+        assert again['events'] == [] and again['next'] == data['next']
+
+    def test_cancel_api_writes_events(self, client, app):
+        """Test bulk cancellation through the API is logged."""
+        make_user('Admin', 'admin@example.com')
+        owner = make_user('Owner', 'owner@example.com')
+        booking = add_booking(owner)
+        expired = add_booking(owner, status='expired')
+        login(client, owner)
+
+        response = client.post('/api/v1/bookings/cancel', json={'booking_ids': [booking.id, expired.id]})
+
+        results = {r['id']: r['result'] for r in response.get_json()['results']}
+        assert results == {booking.id: 'cancelled', expired.id: 'not_cancellable'}
+        assert events_for(booking)[-1] == ('status_changed', 'pending', 'cancelled')
+
+    def test_consumer_advances_cursor(self, app):
+        """Test a named consumer sees each event once."""
+        seen = []
+        add_booking()
+        assert consume('test', seen.append) == 1
+        assert consume('test', seen.append) == 0
+        add_booking()
+        assert consume('test', seen.append) == 1
+        assert len(seen) == 2
+
+    def test_consumer_waits_for_a_gap_to_settle(self, app):
+        """Test a consumer stops at a fresh gap in the ids, takes a late commit in order, and skips an old gap."""
+        booking = add_booking()
+        first = BookingEvent.query.one().id
+
+        def log(event_id, created_at=None):
+            db.session.add(BookingEvent(id=event_id, booking_id=booking.id, event='status_changed',
+                                        from_status='pending', to_status='pending',
+                                        created_at=created_at or datetime.utcnow()))
+            db.session.commit()
+
+        seen = []
+        log(first + 2)
+        assert consume('test', lambda e: seen.append(e.id)) == 1
+        # The lower id commits late (possible on PostgreSQL): nothing is skipped
+        log(first + 1)
+        assert consume('test', lambda e: seen.append(e.id)) == 2
+        # A gap older than BOOKING_FEED_GAP_SECONDS was rolled back
+        log(first + 5, created_at=datetime.utcnow() - timedelta(minutes=5))
+        assert consume('test', lambda e: seen.append(e.id)) == 1
+
+        assert seen == [first, first + 1, first + 2, first + 5]
+
+    def test_admin_confirmation_sends_the_email(self, client, app):
+        """Test an admin confirms a pending booking once and the notifier queues its email."""
+        admin = make_user('Admin', 'admin@example.com')
+        booking = add_booking()
+        login(client, admin)
+
+        response = client.post(f'/admin/bookings/{booking.id}/confirm')
+        assert response.get_json() == {'success': True, 'status': CONFIRMED}
+        assert client.post(f'/admin/bookings/{booking.id}/confirm').status_code == 409
+        assert client.post('/admin/bookings/999999/confirm').status_code == 404
+        assert events_for(booking)[-1] == ('status_changed', 'pending', 'confirmed')
+
+        notify_booking_changes()
+        jobs = Job.query.filter_by(name='send_booking_confirmation').all()
+        assert [job.payload for job in jobs] == [f'{{"booking_id": {booking.id}}}']
+
+    def test_cancellation_email_is_queued_from_feed(self, app):
+        """Test the notifier queues one cancellation email per cancelled booking."""
+        booking = add_booking()
+        transition(booking, CANCELLED)
+        db.session.commit()
+
+        notify_booking_changes()
+        notify_booking_changes()
+
+        jobs = Job.query.filter_by(name='send_booking_cancellation').all()
+        assert len(jobs) == 1
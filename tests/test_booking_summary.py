@@ -0,0 +1,145 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert
+
+from models import db, User, Booking
+from booking_events import CANCELLED, CONFIRMED, bulk_transition, transition
+from booking_summary import BookingSummary, LazyList, get_summary, user_bookings
+
+
+def make_user(name='Owner', email='owner@example.com'):
+    user = User(name=name, email=email, contact='1234567890')
+    user.set_password('password123')
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+
+def add_booking(user, days=2, status='pending'):
+    travel_at = (datetime.now() + timedelta(days=days)).replace(microsecond=0)
+    booking = Booking(
+        user_id=user.id, name='Passenger', location='Central Station', destination='Airport Terminal',
+        travel_date=travel_at.date(), travel_time=travel_at.time(), passengers=1, contact='9876543210',
+        status=status
+    )
+    db.session.add(booking)
+    db.session.commit()
+    return booking
+
+
+def stored(user):
+    return db.session.get(BookingSummary, user.id, populate_existing=True)
+
+
+class TestBookingSummary:
+    """Test cases for the incrementally maintained per-user summary."""
+
+    def test_new_bookings_update_counts_and_next_trip(self, app):
+        """Test creating bookings adjusts totals, upcoming and the next trip."""
+        user = make_user()
+        later = add_booking(user, days=5)
+        sooner = add_booking(user, days=1)
+        add_booking(user, days=-1)
+
+        summary = stored(user)
+        assert (summary.total, summary.pending, summary.upcoming) == (3, 3, 2)
+        assert summary.next_booking_id == sooner.id
+        assert summary.next_trip_at == datetime.combine(sooner.travel_date, sooner.travel_time)
+        assert later.id != summary.next_booking_id
+
+    def test_cancelling_next_trip_moves_to_the_following_one(self, app):
+        """Test a cancelled next trip is replaced on the next read."""
+        user = make_user()
+        sooner = add_booking(user, days=1)
+        later = add_booking(user, days=3)
+
+        transition(sooner, CANCELLED)
+        db.session.commit()
+        assert stored(user).stale
+
+        summary = get_summary(user.id)
+        assert (summary.pending, summary.cancelled, summary.upcoming) == (1, 1, 1)
+        assert summary.next_booking_id == later.id and not summary.stale
+
+    def test_bulk_transitions_are_counted(self, app):
+        """Test bulk status changes update the summary like ORM ones."""
+        user = make_user()
+        first, second = add_booking(user), add_booking(user, days=4)
+
+        bulk_transition(CONFIRMED, Booking.id.in_([first.id, second.id]))
+        db.session.commit()
+
+        summary = stored(user)
+        assert (summary.total, summary.pending, summary.confirmed, summary.upcoming) == (2, 0, 2, 2)
+
+    def test_rollback_leaves_summary_unchanged(self, app):
+        """Test the summary commits and rolls back with the booking write."""
+        user = make_user()
+        booking = add_booking(user)
+        transition(booking, CANCELLED)
+        db.session.flush()
+        db.session.rollback()
+
+        summary = stored(user)
+        assert (summary.pending, summary.cancelled, summary.upcoming) == (1, 0, 1)
+
+    def test_missing_summary_is_built_from_bookings(self, app):
+        """Test bookings that predate the summary are counted on first read."""
+        user = make_user()
+        travel_at = datetime.now() + timedelta(days=2)
+        db.session.execute(insert(Booking), [{
+            'user_id': user.id, 'name': 'Old', 'location': 'Central Station', 'destination': 'Airport Terminal',
+            'travel_date': travel_at.date(), 'travel_time': travel_at.time(), 'passengers': 1,
+            'contact': '1', 'status': status
+        } for status in ('Pending', 'cancelled')])
+        db.session.commit()
+        assert stored(user) is None
+
+        summary = get_summary(user.id)
+        assert (summary.total, summary.pending, summary.cancelled, summary.upcoming) == (2, 1, 1, 1)
+
+    def test_departed_next_trip_is_refreshed_on_read(self, app):
+        """Test the next trip moves on once its departure has passed."""
+        user = make_user()
+        sooner = add_booking(user, days=1)
+        later = add_booking(user, days=3)
+
+        summary = get_summary(user.id, now=datetime.combine(sooner.travel_date, sooner.travel_time))
+        assert summary.upcoming == 1 and summary.next_booking_id == later.id
+
+
+class TestBookingPages:
+    """Test cases for the paged, lazily loaded booking list."""
+
+    def test_pages_are_newest_first(self, app):
+        """Test paging with ``before`` walks back through the bookings."""
+        user = make_user()
+        ids = [add_booking(user).id for _ in range(5)]
+
+        first = user_bookings(user.id, limit=3)
+        rest = user_bookings(user.id, before=first[-1].id, limit=3)
+
+        assert [b.id for b in first + rest] == ids[::-1]
+
+    def test_cached_fragment_skips_the_query(self, app):
+        """Test the list query only runs when the cached fragment is rebuilt."""
+        app.extensions.pop('fragment_store', None)
+        app.config['FRAGMENT_CACHE_URL'] = 'memory://'
+        user = make_user()
+        add_booking(user)
+        loads = []
+
+        def load():
+            loads.append(1)
+            return user_bookings(user.id)
+
+        template = app.jinja_env.from_string(
+            "{% cache 'booking_list', user_id, 0 %}{{ bookings | length }}{% endcache %}"
+        )
+        with app.test_request_context():
+            assert template.render(user_id=user.id, bookings=LazyList(load)) == '1'
+            assert template.render(user_id=user.id, bookings=LazyList(load)) == '1'
+            add_booking(user)
+            assert template.render(user_id=user.id, bookings=LazyList(load)) == '2'
+
+        assert len(loads) == 2
@@ -0,0 +1,121 @@
+import time
+
+import pytest
+
+import destinations
+from models import db, Ride
+from destinations import DestinationAlias, DestinationIndex, normalize, canonicalize
+
+
+@pytest.fixture(autouse=True)
+def fresh_index():
+    destinations.reset_index()
+    yield
+    destinations.reset_index()
+
+
+def add_ride(destination):
+    ride = Ride(name='Ride', location='Central Station', destination=destination, contact='1234567890')
+    db.session.add(ride)
+    db.session.commit()
+    return ride
+
+
+class TestNormalize:
+    """Test cases for destination key normalization."""
+
+    def test_case_punctuation_and_spacing(self):
+        """Test spellings that differ only cosmetically share a key."""
+        assert normalize('  Airport-Terminal ') == 'airport terminal'
+        assert normalize('AIRPORT   terminal!') == 'airport terminal'
+        assert normalize('Café Coffee Day') == 'cafe coffee day'
+
+
+class TestDestinationIndex:
+    """Test cases for the in-memory autocomplete index."""
+
+    def test_prefix_and_word_start(self):
+        """Test suggestions match the start of any word, heaviest first."""
+        index = DestinationIndex()
+        index.add('Airport Terminal', weight=5)
+        index.add('Air Force Station', weight=1)
+        index.add('Central Station', weight=3)
+
+        assert index.suggest('air') == ['Airport Terminal', 'Air Force Station']
+        assert index.suggest('stat') == ['Central Station', 'Air Force Station']
+
+    def test_typo_falls_back_to_trigrams(self):
+        """Test a misspelled query still finds the destination."""
+        index = DestinationIndex()
+        index.add('Airport Terminal')
+        index.add('Bus Depot')
+
+        assert index.suggest('airprot terminal')[0] == 'Airport Terminal'
+
+    def test_near_misses_are_suggested(self):
+        """Test similar names are offered while typing, misspellings included."""
+        index = DestinationIndex()
+        index.add('Sector 12')
+        index.add('Sector 21')
+
+        assert index.suggest('sector') == ['Sector 12', 'Sector 21']
+        assert index.suggest('sectr 21')[0] == 'Sector 21'
+
+    def test_lookup_is_fast(self):
+        """Test prefix lookups stay well under a millisecond on a large index."""
+        index = DestinationIndex()
+        for i in range(5000):
+            index.add(f'Place {i} Road', weight=i % 17)
+
+        start = time.perf_counter()
+        for i in range(1000):
+            index.suggest(f'place {i % 500}')
+        assert (time.perf_counter() - start) / 1000 < 0.001
+
+
+class TestCanonicalization:
+    """Test cases for canonicalizing destinations on write."""
+
+    def test_variants_are_stored_canonically(self, app):
+        """Test different spellings of a station are saved as one name."""
+        rides = [add_ride(name) for name in ('airport terminal', 'AIRPORT-TERMINAL', ' Airport  Terminal!')]
+
+        assert {ride.destination for ride in rides} == {'Airport Terminal'}
+        assert DestinationAlias.query.filter_by(key='airport terminal').one().uses == 3
+
+    def test_new_destination_is_learned(self, app):
+        """Test an unknown destination becomes canonical for later variants."""
+        first = add_ride('lalbagh botanical garden')
+        second = add_ride('LALBAGH Botanical-Garden')
+
+        assert first.destination == 'Lalbagh Botanical Garden'
+        assert second.destination == 'Lalbagh Botanical Garden'
+
+    def test_near_misses_are_not_rewritten(self, app):
+        """Test only the same normalized spelling is merged, never a similar name."""
+        pairs = [('Airport Terminal 1', 'Airport Terminal 2'), ('Sector 12', 'Sector 21'),
+                 ('Koramangala 5th Block', 'Koramangala 6th Block'), ('East Station', 'West Station'),
+                 ('Airport Terminal', 'Airport')]
+        for known, near in pairs:
+            add_ride(known)
+            assert add_ride(near).destination == near
+
+    def test_unchanged_rows_are_not_touched(self, app):
+        """Test updating other columns does not record another use."""
+        ride = add_ride('Bus Depot')
+        ride.contact = '5555555555'
+        db.session.commit()
+
+        assert DestinationAlias.query.filter_by(key='bus depot').one().uses == 1
+
+    def test_autocomplete_api(self, client, app):
+        """Test the endpoint suggests canonical names for a prefix."""
+        add_ride('Lalbagh Botanical Garden')
+
+        response = client.get('/api/v1/destinations/autocomplete?q=lal')
+
+        assert response.status_code == 200
+        assert response.get_json()['data'] == ['Lalbagh Botanical Garden']
+        assert client.get('/api/v1/destinations/autocomplete?q=lalbagh gardn').get_json()['data'][0] == \
+            'Lalbagh Botanical Garden'
+        assert canonicalize('lalbagh  botanical garden') == 'Lalbagh Botanical Garden'
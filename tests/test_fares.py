@@ -0,0 +1,157 @@
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from models import db, User, Booking
+from scheduler import Job
+from fares import FareEngine, InvalidItinerary, reprice_bookings
+
+# 2025-01-06 is a Monday
+MONDAY = '2025-01-06'
+SATURDAY = '2025-01-11'
+
+
+def itinerary(location='Central Station', destination='Airport Terminal', passengers=1,
+              travel_date=MONDAY, travel_time='12:00'):
+    return {'location': location, 'destination': destination, 'passengers': passengers,
+            'travel_date': travel_date, 'travel_time': travel_time}
+
+
+def make_user(name, email):
+    user = User(name=name, email=email, contact='1234567890')
+    user.set_password('password123')
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+
+def login(client, user):
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user.id)
+
+
+def add_booking(days=2, location='Central Station', status='pending'):
+    travel_at = datetime.now() + timedelta(days=days)
+    booking = Booking(
+        name='Passenger', location=location, destination='Airport Terminal', travel_date=travel_at.date(),
+        travel_time=travel_at.time(), passengers=2, contact='9876543210', status=status
+    )
+    db.session.add(booking)
+    db.session.commit()
+    return booking
+
+
+class TestFareEngine:
+    """Test cases for the batched fare calculation."""
+
+    def test_fares_follow_distance_and_passengers(self):
+        """Test longer trips and more passengers cost more, in whole rupees."""
+        engine = FareEngine()
+        short, far, group, unknown = engine.quote([
+            itinerary(destination='Bus Depot'),
+            itinerary(),
+            itinerary(passengers=3),
+            itinerary(destination='Somewhere Else'),
+        ])
+
+        assert short < far < group
+        assert far % 100 == 0 and unknown is None
+        assert group == pytest.approx(far * 2, abs=100)
+
+    def test_time_of_day_multipliers(self):
+        """Test peaks, nights and weekend days cost more than weekday middays."""
+        engine = FareEngine()
+        midday, peak, night, weekend = engine.quote([
+            itinerary(), itinerary(travel_time='08:15'), itinerary(travel_time='23:30'),
+            itinerary(travel_date=SATURDAY),
+        ])
+
+        assert midday < weekend < peak
+        assert midday < night
+
+    def test_demand_multiplier_is_capped(self):
+        """Test busy stations cost more, up to the cap."""
+        engine = FareEngine(demand_free=2, demand_step=0.1, demand_cap=1.2)
+        quiet, busy, packed = [
+            engine.quote([itinerary()], demand={('Central Station', date(2025, 1, 6)): count})[0]
+            for count in (2, 3, 50)
+        ]
+
+        assert busy == pytest.approx(quiet * 1.1, abs=100)
+        assert packed == pytest.approx(quiet * 1.2, abs=100)
+
+    def test_malformed_itineraries_are_rejected(self):
+        """Test bad dates and times raise ValueError."""
+        engine = FareEngine()
+        with pytest.raises(ValueError):
+            engine.quote([itinerary(travel_date='06/01/2025')])
+        with pytest.raises(ValueError):
+            engine.quote([itinerary(travel_time='noon')])
+        with pytest.raises(ValueError):
+            engine.quote([itinerary(travel_time='25:00')])
+
+    def test_itinerary_values_are_read_as_written(self):
+        """Test single-digit hours are accepted and only a missing passenger count is taken as 1."""
+        engine = FareEngine()
+        padded, unpadded, seconds, missing = engine.quote([
+            itinerary(travel_time='09:30'),
+            itinerary(travel_time='9:30'),
+            itinerary(travel_time='09:30:00'),
+            {**itinerary(), 'passengers': None},
+        ])
+
+        assert padded == unpadded == seconds
+        assert missing == engine.quote([itinerary()])[0]
+
+    def test_passengers_outside_the_booking_range_are_rejected(self):
+        """Test counts BookingForm wouldn't accept raise InvalidItinerary, however large."""
+        engine = FareEngine()
+        assert engine.quote([itinerary(passengers=8)])[0] is not None
+        for passengers in (0, 9, 500, -1, 10 ** 20):
+            with pytest.raises(InvalidItinerary):
+                engine.quote([itinerary(passengers=passengers)])
+
+
+class TestFareApi:
+    """Test cases for the bulk quote endpoint and repricing."""
+
+    def test_bulk_quote(self, client, app):
+        """Test one request prices every itinerary in order."""
+        response = client.post('/api/v1/fares/quote', json={'itineraries': [
+            itinerary(), itinerary(destination='Nowhere'), itinerary(travel_date=date(2025, 1, 6).isoformat())
+        ]})
+
+        data = response.get_json()
+        assert response.status_code == 200 and data['currency'] == 'INR'
+        assert data['quotes'][0] == data['quotes'][2] and data['quotes'][1] is None
+
+    def test_bad_quote_request(self, client, app):
+        """Test malformed bodies get a 400."""
+        assert client.post('/api/v1/fares/quote', json={'itineraries': []}).status_code == 400
+        response = client.post('/api/v1/fares/quote', json={'itineraries': [itinerary(travel_date='soon')]})
+        assert response.status_code == 400
+        for passengers in (500, 10 ** 20):
+            response = client.post('/api/v1/fares/quote', json={'itineraries': [itinerary(passengers=passengers)]})
+            assert response.status_code == 400
+
+    def test_repricing_fills_upcoming_fares(self, app):
+        """Test the job prices active future bookings and is idempotent."""
+        upcoming = add_booking()
+        past = add_booking(days=-2)
+        cancelled = add_booking(status='cancelled')
+
+        assert reprice_bookings(chunk_size=1) == 1
+        assert reprice_bookings() == 0
+        db.session.expire_all()
+        assert db.session.get(Booking, upcoming.id).fare > 0
+        assert db.session.get(Booking, past.id).fare is None
+        assert db.session.get(Booking, cancelled.id).fare is None
+
+    def test_admin_queues_one_repricing(self, client, app):
+        """Test the admin endpoint queues a single pending job."""
+        admin = make_user('Admin', 'admin@example.com')
+        login(client, admin)
+
+        assert client.post('/admin/fares/reprice').get_json() == {'queued': True}
+        assert client.post('/admin/fares/reprice').get_json() == {'queued': False}
+        assert Job.query.filter_by(name='reprice_bookings').count() == 1
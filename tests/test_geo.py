@@ -0,0 +1,90 @@
+import random
+
+import pytest
+
+from models import db, Ride
+from geo import cell_of, cell_ranges, haversine_km, CELL_COLUMNS
+from geo_search import rides_within, nearest_rides
+
+CENTER = (12.9784, 77.5710)
+
+
+def add_ride(lat, lon, name='Ride'):
+    ride = Ride(name=name, location='Somewhere', destination='Elsewhere',
+                contact='1234567890', origin_lat=lat, origin_lon=lon)
+    db.session.add(ride)
+    return ride
+
+
+class TestGrid:
+    """Test cases for the grid cell math."""
+
+    def test_circle_cells_are_covered(self):
+        """Test every point inside the radius falls in a returned range."""
+        rng = random.Random(7)
+        ranges = cell_ranges(*CENTER, radius_km=3)
+        for _ in range(500):
+            lat = CENTER[0] + rng.uniform(-0.03, 0.03)
+            lon = CENTER[1] + rng.uniform(-0.03, 0.03)
+            if haversine_km(*CENTER, lat, lon) <= 3:
+                cell = cell_of(lat, lon)
+                assert any(lo <= cell <= hi for lo, hi in ranges)
+
+    def test_antimeridian_wraps(self):
+        """Test boxes crossing longitude 180 are split in two ranges per row."""
+        ranges = cell_ranges(0.0, 179.999, radius_km=2)
+        columns = {lo % CELL_COLUMNS for lo, _ in ranges}
+        assert 0 in columns
+
+    def test_known_distance(self):
+        """Test haversine against a known station distance."""
+        assert haversine_km(12.9784, 77.5710, 13.1986, 77.7066) == pytest.approx(28.5, abs=0.5)
+
+
+class TestRideSearch:
+    """Test cases for radius and nearest-ride queries."""
+
+    def test_station_coordinates_filled_on_insert(self, app):
+        """Test rides from known stations get coordinates and a cell."""
+        ride = Ride(name='Station Ride', location='Airport Terminal',
+                    destination='central station', contact='1234567890')
+        db.session.add(ride)
+        db.session.commit()
+
+        assert (ride.origin_lat, ride.origin_lon) == (13.1986, 77.7066)
+        assert ride.origin_cell == cell_of(13.1986, 77.7066)
+        assert ride.dest_lat == 12.9784
+
+    def test_nearest_matches_brute_force(self, app):
+        """Test k-nearest results equal a full scan."""
+        rng = random.Random(42)
+        points = [(CENTER[0] + rng.gauss(0, 0.05), CENTER[1] + rng.gauss(0, 0.05)) for _ in range(300)]
+        for i, (lat, lon) in enumerate(points):
+            add_ride(lat, lon, name=f'Ride {i}')
+        db.session.commit()
+
+        expected = sorted(
+            (haversine_km(*CENTER, lat, lon), i + 1) for i, (lat, lon) in enumerate(points)
+        )[:10]
+        hits = nearest_rides(*CENTER, k=10)
+        assert [ride_id for ride_id, _ in hits] == [ride_id for _, ride_id in expected]
+
+    def test_radius_excludes_far_rides(self, app):
+        """Test rides outside the radius are not returned."""
+        near = add_ride(12.98, 77.572)
+        add_ride(13.1986, 77.7066)
+        db.session.commit()
+
+        assert [ride_id for ride_id, _ in rides_within(*CENTER, radius_km=2)] == [near.id]
+
+    def test_nearby_api(self, client, app):
+        """Test the API returns rides nearest first with distances."""
+        add_ride(12.99, 77.58, name='Farther')
+        add_ride(12.979, 77.571, name='Closest')
+        db.session.commit()
+
+        response = client.get(f'/api/v1/rides/nearby?lat={CENTER[0]}&lon={CENTER[1]}&k=2&fields=name')
+
+        data = response.get_json()['data']
+        assert [r['name'] for r in data] == ['Closest', 'Farther']
+        assert data[0]['distance_km'] < data[1]['distance_km']
@@ -0,0 +1,139 @@
+import threading
+from datetime import date, datetime, timedelta
+
+from flask import jsonify, request
+
+from models import db, Booking, Ride
+from idempotency import IdempotencyKey, idempotent, purge_idempotency_keys
+
+calls = []
+
+
+def post_ride():
+    calls.append(request.get_json())
+    ride = Ride(name='Ride', location='Central Station', destination='Airport Terminal',
+                contact=request.get_json()['contact'])
+    db.session.add(ride)
+    db.session.commit()
+    return jsonify({'success': True, 'ride_id': ride.id}), 201
+
+
+def add_view(app, view=post_ride):
+    app.add_url_rule('/test-submit', 'test_submit', idempotent('submit')(view), methods=['POST'])
+    calls.clear()
+
+
+class TestIdempotency:
+    """Test cases for idempotency-keyed writes."""
+
+    def test_retry_replays_original_response(self, client, app):
+        """Test a repeated key returns the first response without a second insert."""
+        add_view(app)
+        headers = {'Idempotency-Key': 'abc'}
+
+        first = client.post('/test-submit', json={'contact': '1'}, headers=headers)
+        second = client.post('/test-submit', json={'contact': '1'}, headers=headers)
+
+        assert first.status_code == second.status_code == 201
+        assert second.get_json() == first.get_json()
+        assert second.headers['Idempotent-Replayed'] == 'true'
+        assert Ride.query.count() == 1
+        assert len(calls) == 1
+
+    def test_requests_without_key_are_unchanged(self, client, app):
+        """Test writes without a key run every time."""
+        add_view(app)
+        client.post('/test-submit', json={'contact': '1'})
+        client.post('/test-submit', json={'contact': '1'})
+
+        assert Ride.query.count() == 2
+
+    def test_key_reused_for_other_body_is_rejected(self, client, app):
+        """Test a key cannot be replayed against a different request."""
+        add_view(app)
+        client.post('/test-submit', json={'contact': '1'}, headers={'Idempotency-Key': 'k'})
+
+        response = client.post('/test-submit', json={'contact': '2'}, headers={'Idempotency-Key': 'k'})
+
+        assert response.status_code == 422
+        assert Ride.query.count() == 1
+
+    def test_failed_request_can_be_retried(self, client, app):
+        """Test a key is released when the view raises."""
+        attempts = []
+
+        def flaky():
+            attempts.append(1)
+            if len(attempts) == 1:
+                raise RuntimeError('database went away')
+            return post_ride()
+
+        app.config['PROPAGATE_EXCEPTIONS'] = False
+        add_view(app, flaky)
+        headers = {'Idempotency-Key': 'retry'}
+
+        assert client.post('/test-submit', json={'contact': '1'}, headers=headers).status_code == 500
+        assert client.post('/test-submit', json={'contact': '1'}, headers=headers).status_code == 201
+        assert Ride.query.count() == 1
+
+    def test_corrected_form_can_be_resubmitted_with_the_same_key(self, client, app):
+        """Test a booking refused by validation is not kept, so the fixed form goes through under its key."""
+        booking = {
+            'name': 'John Doe', 'location': 'Central Station', 'destination': 'Airport Terminal',
+            'travel_date': (date.today() + timedelta(days=7)).isoformat(), 'travel_time': '10:00',
+            'passengers': '12', 'contact': '9876543210',
+        }
+        headers = {'Idempotency-Key': 'booking-form', 'X-Requested-With': 'XMLHttpRequest'}
+
+        refused = client.post('/book_ride', data=booking, headers=headers)
+        assert refused.status_code == 200 and refused.get_json()['success'] is False
+        assert IdempotencyKey.query.count() == 0
+
+        fixed = client.post('/book_ride', data=dict(booking, passengers='2'), headers=headers)
+        assert fixed.get_json()['success'] is True
+        assert Booking.query.count() == 1
+
+        retry = client.post('/book_ride', data=dict(booking, passengers='2'), headers=headers)
+        assert retry.headers['Idempotent-Replayed'] == 'true'
+        assert Booking.query.count() == 1
+
+    def test_client_errors_are_not_kept(self, client, app):
+        """Test a 4xx answer releases the key."""
+        def reject():
+            return jsonify({'message': 'Invalid ride'}), 400
+
+        add_view(app, reject)
+        client.post('/test-submit', json={'contact': '1'}, headers={'Idempotency-Key': 'bad'})
+
+        assert IdempotencyKey.query.count() == 0
+
+    def test_concurrent_duplicates_write_once(self, app):
+        """Test simultaneous requests with one key insert a single row."""
+        gate = threading.Barrier(8)
+        add_view(app)
+        responses = []
+
+        def send():
+            with app.test_client() as client:
+                gate.wait(timeout=5)
+                responses.append(client.post('/test-submit', json={'contact': '1'},
+                                             headers={'Idempotency-Key': 'same'}))
+
+        threads = [threading.Thread(target=send) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert [r.status_code for r in responses] == [201] * 8
+        assert len({r.get_json()['ride_id'] for r in responses}) == 1
+        assert Ride.query.count() == 1
+        assert len(calls) == 1
+
+    def test_expired_keys_are_purged(self, client, app):
+        """Test the periodic purge drops keys past their TTL."""
+        add_view(app)
+        client.post('/test-submit', json={'contact': '1'}, headers={'Idempotency-Key': 'old'})
+
+        assert purge_idempotency_keys(now=datetime.utcnow() + timedelta(days=2)) == 1
+        assert IdempotencyKey.query.count() == 0
@@ -175,7 +175,7 @@ class TestIntegration:
             user_bookings = Booking.query.filter_by(user_id=user.id).all()
             assert len(user_bookings) >= 5
 
-    def test_error_handling_and_recovery(self, client, app):
+    def test_error_handling_and_recovery(self, client, app, test_user):
         """Test error handling and system recovery."""
         # 1. Test invalid form submissions
         client.post('/login', data={'email': 'test@example.com', 'password': 'password123'})
@@ -228,7 +228,7 @@ class TestIntegration:
             # Clean up
             db.session.rollback()
 
-    def test_session_management(self, client, app):
+    def test_session_management(self, client, app, test_user):
         """Test user session management."""
         # Login
         client.post('/login', data={'email': 'test@example.com', 'password': 'password123'})
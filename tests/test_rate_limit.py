@@ -0,0 +1,133 @@
+import pytest
+
+from models import db, User
+from rate_limit import MemoryStore, SQLiteStore, AdmissionGate
+
+
+def login_new_user(client, email):
+    user = User(name='Limited', email=email, contact='1234567890')
+    user.set_password('password123')
+    db.session.add(user)
+    db.session.commit()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user.id)
+
+
+class TestTokenBucket:
+    """Test cases for the token bucket stores."""
+
+    @pytest.fixture(params=['memory', 'sqlite'])
+    def store(self, request, tmp_path):
+        if request.param == 'memory':
+            return MemoryStore()
+        return SQLiteStore(str(tmp_path / 'buckets.db'))
+
+    def test_burst_then_refill(self, store):
+        """Test a full bucket allows a burst, then refills at the rate."""
+        results = [store.take('k', rate=1.0, burst=3, now=100.0)[0] for _ in range(4)]
+        assert results == [True, True, True, False]
+
+        allowed, retry_after = store.take('k', rate=1.0, burst=3, now=100.0)
+        assert not allowed and retry_after == pytest.approx(1.0)
+        assert store.take('k', rate=1.0, burst=3, now=101.0)[0]
+
+    def test_keys_are_independent(self, store):
+        """Test one client's bucket does not drain another's."""
+        store.take('a', rate=0.1, burst=1, now=0.0)
+        assert not store.take('a', rate=0.1, burst=1, now=0.0)[0]
+        assert store.take('b', rate=0.1, burst=1, now=0.0)[0]
+
+    def test_sqlite_store_is_shared(self, tmp_path):
+        """Test two store instances on one file see the same buckets."""
+        path = str(tmp_path / 'buckets.db')
+        first, second = SQLiteStore(path), SQLiteStore(path)
+
+        assert first.take('k', rate=0.1, burst=1, now=0.0)[0]
+        assert not second.take('k', rate=0.1, burst=1, now=0.0)[0]
+
+    def test_relative_sqlite_path_is_under_instance(self, app, tmp_path, monkeypatch):
+        """Test a relative sqlite:/// store lands in the instance folder, whatever the cwd."""
+        from rate_limit import get_store
+        monkeypatch.setattr(app, 'instance_path', str(tmp_path / 'instance'))
+        monkeypatch.chdir(tmp_path)
+        app.config['RATELIMIT_STORAGE_URL'] = 'sqlite:///ratelimit.db'
+        app.extensions.pop('rate_limit_store', None)
+
+        store = get_store()
+
+        assert isinstance(store, SQLiteStore)
+        assert store.path == str(tmp_path / 'instance' / 'ratelimit.db')
+        app.extensions.pop('rate_limit_store')
+
+
+class TestAdmissionGate:
+    """Test cases for latency-aware admission control."""
+
+    def test_limit_shrinks_with_latency(self):
+        """Test the concurrency limit drops while queries are slow."""
+        gate = AdmissionGate(max_concurrent=10, latency_target=0.05, smoothing=1.0)
+        assert gate.limit == 10
+
+        gate.record_latency(0.25)
+        assert gate.limit == 2
+        assert gate.try_enter() and gate.try_enter()
+        assert not gate.try_enter()
+
+        gate.leave()
+        assert gate.try_enter()
+
+    def test_only_request_queries_are_measured(self, app):
+        """Test queries outside a request (jobs, CLI) leave the latency alone."""
+        import threading
+        from sqlalchemy import text
+        from rate_limit import get_gate
+        gate = get_gate()
+
+        def background_query():
+            # Like the in-process job worker: an app context on its own thread
+            with app.app_context():
+                db.session.execute(text('SELECT 1'))
+                db.session.remove()
+
+        thread = threading.Thread(target=background_query)
+        thread.start()
+        thread.join()
+        assert gate.latency == 0.0
+
+        with app.test_request_context('/join', method='POST'):
+            db.session.execute(text('SELECT 1'))
+        assert gate.latency > 0.0
+
+
+class TestRateLimitedRoutes:
+    """Test cases for limits on write endpoints."""
+
+    @pytest.fixture(autouse=True)
+    def limits_on(self, app):
+        # TestingConfig turns rate limiting off for the rest of the suite
+        app.config['RATELIMIT_ENABLED'] = True
+
+    def test_join_returns_429_with_retry_after(self, client, app):
+        """Test a client over the limit is rejected before any write."""
+        login_new_user(client, 'limited@example.com')
+
+        statuses = [client.post('/api/v1/rides/join', json={'ride_ids': [1]}).status_code
+                    for _ in range(31)]
+
+        assert statuses[:30] == [200] * 30
+        response = client.post('/api/v1/rides/join', json={'ride_ids': [1]})
+        assert response.status_code == 429
+        assert int(response.headers['Retry-After']) >= 1
+        assert 'error' in response.get_json()
+
+    def test_overloaded_worker_sheds_with_503(self, client, app):
+        """Test requests beyond the admission limit get 503."""
+        from rate_limit import get_gate
+        login_new_user(client, 'shed@example.com')
+        gate = get_gate()
+        gate.in_flight = gate.limit
+
+        response = client.post('/api/v1/bookings/cancel', json={'booking_ids': [1]})
+
+        assert response.status_code == 503
+        assert 'Retry-After' in response.headers
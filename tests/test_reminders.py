@@ -0,0 +1,74 @@
+import pytest
+from datetime import datetime, timedelta
+
+from models import db, Booking
+from scheduler import Job
+import reminder_service
+
+
+def make_booking(travel_at, status='pending', name='Reminder Passenger'):
+    booking = Booking(
+        name=name,
+        location='Central Station',
+        destination='Airport Terminal',
+        travel_date=travel_at.date(),
+        travel_time=travel_at.time(),
+        passengers=1,
+        contact='9876543210',
+        status=status
+    )
+    db.session.add(booking)
+    return booking
+
+
+class TestTravelReminders:
+    """Test cases for the scheduled reminder pipeline."""
+
+    def test_only_bookings_in_window_are_queued(self, app):
+        """Test bookings outside the lead window or cancelled are skipped."""
+        now = datetime(2025, 6, 1, 12, 0)
+        soon = make_booking(now + timedelta(hours=3))
+        tomorrow = make_booking(now + timedelta(hours=20))
+        make_booking(now + timedelta(days=3))
+        make_booking(now + timedelta(hours=2), status='Cancelled')
+        make_booking(now - timedelta(hours=1))
+        db.session.commit()
+
+        assert reminder_service.queue_travel_reminders(now=now) == 2
+
+        job = Job.query.filter_by(name='send_travel_reminder_batch').one()
+        assert sorted(job.args['booking_ids']) == sorted([soon.id, tomorrow.id])
+        assert db.session.get(Booking, soon.id).reminder_queued_at is not None
+
+    def test_reminders_are_not_queued_twice(self, app):
+        """Test a second run does not re-queue already stamped bookings."""
+        now = datetime(2025, 6, 1, 12, 0)
+        make_booking(now + timedelta(hours=1))
+        db.session.commit()
+
+        assert reminder_service.queue_travel_reminders(now=now) == 1
+        assert reminder_service.queue_travel_reminders(now=now) == 0
+
+    def test_pages_split_into_batches(self, app):
+        """Test large windows are fanned out as multiple batch jobs."""
+        app.config['REMINDER_BATCH_SIZE'] = 3
+        now = datetime(2025, 6, 1, 12, 0)
+        for i in range(7):
+            make_booking(now + timedelta(minutes=10 * (i + 1)), name=f'Passenger {i}')
+        db.session.commit()
+
+        assert reminder_service.queue_travel_reminders(now=now) == 7
+        batches = [job.args['booking_ids'] for job in Job.query.filter_by(name='send_travel_reminder_batch')]
+        assert [len(ids) for ids in batches] == [3, 3, 1]
+
+    def test_batch_renders_and_sends_once(self, app, mocker):
+        """Test a batch renders every reminder and hands them to the bulk sender."""
+        app.config['MAIL_DEFAULT_SENDER'] = 'noreply@travelcompany.com'
+        send = mocker.patch('reminder_service.send_bulk_messages', side_effect=len)
+        booking = make_booking(datetime.now() + timedelta(hours=2))
+        db.session.commit()
+
+        assert reminder_service.send_travel_reminder_batch([booking.id]) == 1
+        messages = send.call_args[0][0]
+        assert 'Reminder Passenger' in messages[0].html
+        assert messages[0].recipients == ['9876543210@temp.com']
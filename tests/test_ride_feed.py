@@ -0,0 +1,109 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from models import db, Ride, User
+from ride_feed import RideChange, changes_since, latest_version, purge_ride_changes
+
+
+@pytest.fixture
+def feed_app(app, tmp_path):
+    app.config['STATION_MATRIX_PATH'] = str(tmp_path / 'station_matrix.bin')
+    return app
+
+
+def add_ride(destination='Airport Terminal', location='Central Station'):
+    ride = Ride(name='Rider', location=location, destination=destination, contact='1234567890')
+    db.session.add(ride)
+    db.session.commit()
+    return ride
+
+
+def make_user(name, email):
+    user = User(name=name, email=email, contact='1234567890')
+    user.set_password('password123')
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+
+class TestRideFeed:
+    """Test cases for the ride change log and delta feed."""
+
+    def test_first_request_is_a_full_reset(self, feed_app):
+        """Test a client without a version gets every ride and the current version."""
+        first = add_ride()
+        second = add_ride('Bus Depot')
+
+        data = changes_since(None)
+
+        assert data['reset'] is True
+        assert [r['id'] for r in data['rides']] == [second.id, first.id]
+        assert data['version'] == latest_version() > 0
+        assert data['rides'][1]['group'] == 'Airport Terminal'
+        # Bus Depot is minutes from Central Station, so it joins that group
+        assert data['rides'][0]['group'] == 'Central Station'
+        assert data['rides'][0]['eta_minutes'] == 3
+
+    def test_delta_has_only_changed_rides(self, feed_app):
+        """Test a client that is current receives just the rides written since."""
+        add_ride()
+        version = changes_since(None)['version']
+        assert changes_since(version) == {'version': version, 'reset': False, 'rides': [], 'removed': []}
+
+        ride = add_ride('Metro Station')
+        data = changes_since(version)
+
+        assert data['reset'] is False
+        assert [r['id'] for r in data['rides']] == [ride.id]
+        assert data['version'] > version
+
+    def test_edits_and_deletes_are_reported(self, feed_app):
+        """Test an edited ride is resent and a deleted one is listed as removed."""
+        kept, deleted = add_ride(), add_ride()
+        version = latest_version()
+
+        kept.location = 'Bus Depot'
+        db.session.delete(deleted)
+        db.session.commit()
+        data = changes_since(version)
+
+        assert [(r['id'], r['origin']) for r in data['rides']] == [(kept.id, 'Bus Depot')]
+        assert data['removed'] == [deleted.id]
+
+    def test_bulk_writes_are_recorded(self, feed_app, client):
+        """Test Core inserts from write-behind and the batch join API log changes."""
+        from write_behind import insert_rides
+        ride = add_ride()
+        version = latest_version()
+
+        insert_rides([{'name': 'Bulk', 'location': 'Central Station', 'destination': 'Metro Station',
+                       'contact': '1234567890', 'driver_id': None}])
+        db.session.commit()
+        user = make_user('Joiner', 'joiner@example.com')
+        with client.session_transaction() as session:
+            session['_user_id'] = str(user.id)
+        assert client.post('/api/v1/rides/join', json={'ride_ids': [ride.id]}).status_code == 200
+
+        data = changes_since(version)
+        rides = {r['id']: r for r in data['rides']}
+        assert len(rides) == 2
+        assert rides[ride.id]['riders'] == 1
+
+    def test_far_behind_or_purged_clients_reset(self, feed_app):
+        """Test too many changes, or changes no longer logged, mean a full reset."""
+        add_ride()
+        version = latest_version()
+        for _ in range(3):
+            add_ride()
+
+        assert changes_since(version, max_changes=2)['reset'] is True
+        assert changes_since(version, max_changes=3)['reset'] is False
+
+        purged = purge_ride_changes(now=datetime.utcnow() + timedelta(days=2))
+
+        assert purged == 3
+        assert db.session.query(RideChange).count() == 1
+        assert changes_since(version)['reset'] is True
+        assert len(changes_since(version)['rides']) == 4
+        assert changes_since(latest_version())['reset'] is False
@@ -0,0 +1,98 @@
+import os
+
+import pytest
+
+from models import db, Ride
+from scheduler import Job
+from ride_snapshot import build_snapshot, get_snapshot, request_rebuild, RideSnapshot
+
+
+@pytest.fixture
+def snapshot_app(app, tmp_path):
+    app.config['RIDE_SNAPSHOT_PATH'] = str(tmp_path / 'rides.bin')
+    app.config['RIDE_SNAPSHOT_CHECK_SECONDS'] = 0
+    return app
+
+
+def add_ride(location, destination):
+    ride = Ride(name='Ride', location=location, destination=destination, contact='1234567890')
+    db.session.add(ride)
+    db.session.commit()
+    return ride
+
+
+class TestRideSnapshot:
+    """Test cases for the memory-mapped ride snapshot."""
+
+    def test_round_trip(self, snapshot_app):
+        """Test rides are read back newest first with strings resolved."""
+        first = add_ride('Central Station', 'Airport Terminal')
+        second = add_ride('Bus Depot', 'Airport Terminal')
+
+        assert build_snapshot() == 2
+        snapshot = get_snapshot()
+
+        records = snapshot.records(snapshot.rows)
+        assert [r['id'] for r in records] == [second.id, first.id]
+        assert records[0]['location'] == 'Bus Depot'
+        assert len(snapshot.strings) == 3
+
+    def test_sharded_ids_round_trip(self, snapshot_app):
+        """Test ids allocated on a shard (milliseconds * 256 + shard) are read back unchanged."""
+        sharded_id = 1_760_000_000_000 * 256 + 3
+        ride = Ride(id=sharded_id, name='Ride', location='Central Station', destination='Airport Terminal',
+                    contact='1234567890')
+        db.session.add(ride)
+        db.session.commit()
+
+        build_snapshot()
+        snapshot = get_snapshot()
+
+        assert snapshot.rows['id'].tolist() == [sharded_id]
+        assert snapshot.records(snapshot.filter(destination='airport'))[0]['id'] == sharded_id
+
+    def test_filter_is_case_insensitive_substring(self, snapshot_app):
+        """Test filtering matches like the SQL ILIKE fallback."""
+        add_ride('Central Station', 'Airport Terminal')
+        match = add_ride('Bus Depot', 'Airport Terminal')
+        add_ride('Bus Depot', 'Metro Station')
+        build_snapshot()
+
+        rows = get_snapshot().filter(destination='airport', location='depot')
+
+        assert rows['id'].tolist() == [match.id]
+
+    def test_rebuild_is_picked_up(self, snapshot_app):
+        """Test readers remap the file after a rebuild replaces it."""
+        add_ride('Central Station', 'Airport Terminal')
+        build_snapshot()
+        assert len(get_snapshot()) == 1
+
+        add_ride('Bus Depot', 'Metro Station')
+        build_snapshot()
+        assert len(get_snapshot()) == 2
+
+    def test_stale_or_missing_snapshot_is_ignored(self, snapshot_app):
+        """Test callers get None so they fall back to the database."""
+        assert get_snapshot() is None
+
+        build_snapshot()
+        assert get_snapshot(max_age=-1) is None
+        assert get_snapshot() is not None
+
+    def test_rejects_foreign_file(self, tmp_path):
+        """Test a file without the snapshot header is refused."""
+        path = tmp_path / 'other.bin'
+        path.write_bytes(os.urandom(64))
+
+        with pytest.raises(ValueError):
+            RideSnapshot(str(path))
+
+    def test_request_rebuild_queues_once(self, snapshot_app):
+        """Test repeated ride changes queue a single rebuild job."""
+        request_rebuild()
+        db.session.commit()
+        request_rebuild()
+        db.session.commit()
+
+        assert Job.query.filter_by(name='rebuild_ride_snapshot').count() == 1
@@ -0,0 +1,148 @@
+import pytest
+from datetime import datetime, timedelta
+
+from models import db
+from scheduler import (
+    CronSchedule, Job, PeriodicJob, Worker, task, periodic, enqueue,
+    JOB_DONE, JOB_QUEUED, JOB_FAILED
+)
+
+
+class TestCronSchedule:
+    """Test cases for cron expression parsing."""
+    def test_every_fifteen_minutes(self):
+        """Test step expressions on the minute field."""
+        schedule = CronSchedule('*/15 * * * *')
+        assert schedule.next_after(datetime(2025, 1, 1, 10, 7)) == datetime(2025, 1, 1, 10, 15)
+        assert schedule.next_after(datetime(2025, 1, 1, 10, 45)) == datetime(2025, 1, 1, 11, 0)
+
+    def test_daily_at_fixed_time(self):
+        """Test a daily schedule rolls over to the next day."""
+        schedule = CronSchedule('30 6 * * *')
+        assert schedule.next_after(datetime(2025, 1, 31, 7, 0)) == datetime(2025, 2, 1, 6, 30)
+
+    def test_weekday_schedule(self):
+        """Test day-of-week matching (0 = Sunday)."""
+        schedule = CronSchedule('0 9 * * 1')
+        # 2025-01-01 is a Wednesday, next Monday is 2025-01-06
+        assert schedule.next_after(datetime(2025, 1, 1)) == datetime(2025, 1, 6, 9, 0)
+
+    def test_invalid_expression(self):
+        """Test malformed expressions are rejected."""
+        with pytest.raises(ValueError):
+            CronSchedule('* * *')
+        with pytest.raises(ValueError):
+            CronSchedule('61 * * * *')
+
+
+class TestJobWorker:
+    """Test cases for job claiming and execution."""
+    def test_job_runs_once(self, app):
+        """Test an enqueued job is executed and marked done."""
+        calls = []
+
+        @task('test_record_call')
+        def record_call(value):
+            calls.append(value)
+
+        job = enqueue('test_record_call', {'value': 42})
+        db.session.commit()
+
+        worker = Worker(app)
+        assert worker.run_once() == 1
+        assert worker.run_once() == 0
+        assert calls == [42]
+        assert db.session.get(Job, job.id).status == JOB_DONE
+
+    def test_failed_job_is_retried(self, app):
+        """Test a failing job is requeued with backoff, then fails permanently."""
+        @task('test_always_fails', max_attempts=2, retry_backoff=0)
+        def always_fails():
+            raise RuntimeError('boom')
+
+        job = enqueue('test_always_fails')
+        db.session.commit()
+
+        worker = Worker(app)
+        worker.run_once()
+        refreshed = db.session.get(Job, job.id)
+        assert refreshed.status == JOB_QUEUED
+        assert refreshed.attempts == 1
+        assert 'boom' in refreshed.last_error
+
+        worker.run_once()
+        assert db.session.get(Job, job.id).status == JOB_FAILED
+
+    def test_lease_prevents_duplicate_claims(self, app):
+        """Test two workers never claim the same job while the lease is held."""
+        @task('test_leased', concurrency=10)
+        def leased():
+            pass
+
+        for _ in range(3):
+            enqueue('test_leased')
+        db.session.commit()
+
+        first = Worker(app, worker_id='first').claim()
+        second = Worker(app, worker_id='second').claim()
+        assert len(first) == 3
+        assert second == []
+
+        # Once the lease expires another worker may take over
+        later = datetime.utcnow() + timedelta(hours=1)
+        assert sorted(Worker(app, worker_id='second').claim(now=later)) == sorted(first)
+
+    def test_expired_lease_on_last_attempt_fails(self, app):
+        """Test a job whose worker died on its last attempt is failed, not reclaimed."""
+        @task('test_crashes_worker', max_attempts=2)
+        def crashes_worker():
+            pass
+
+        job = enqueue('test_crashes_worker')
+        db.session.commit()
+
+        now = datetime.utcnow()
+        for attempt in range(2):
+            # Each worker takes the job and dies without recording an outcome
+            now += timedelta(hours=1)
+            assert Worker(app, worker_id=f'dead-{attempt}').claim(now=now) == [job.id]
+
+        assert Worker(app, worker_id='next').claim(now=now + timedelta(hours=1)) == []
+        failed = db.session.get(Job, job.id)
+        assert (failed.status, failed.attempts, failed.locked_by) == (JOB_FAILED, 2, None)
+
+    def test_worker_command_is_registered(self, app, runner):
+        """Test create_app wires the `flask jobs worker` command the Procfile runs."""
+        result = runner.invoke(args=['jobs', 'worker', '--help'])
+        assert result.exit_code == 0
+        assert '--batch-size' in result.output
+
+    def test_concurrency_limit_per_task(self, app):
+        """Test a task never has more running jobs than its concurrency limit."""
+        @task('test_limited', concurrency=2)
+        def limited():
+            pass
+
+        for _ in range(5):
+            enqueue('test_limited')
+        db.session.commit()
+
+        assert len(Worker(app, worker_id='a').claim()) == 2
+        assert Worker(app, worker_id='b').claim() == []
+
+    def test_periodic_job_enqueued_once(self, app):
+        """Test a due periodic job is enqueued by exactly one worker."""
+        @periodic('0 * * * *', name='test_hourly')
+        def hourly():
+            pass
+
+        start = datetime(2025, 1, 1, 10, 30)
+        worker_a = Worker(app, worker_id='a')
+        worker_b = Worker(app, worker_id='b')
+        worker_a.schedule_periodic(now=start)
+        assert db.session.get(PeriodicJob, 'test_hourly').next_run_at == datetime(2025, 1, 1, 11, 0)
+
+        due = datetime(2025, 1, 1, 11, 0, 5)
+        worker_a.schedule_periodic(now=due)
+        worker_b.schedule_periodic(now=due)
+        assert Job.query.filter_by(name='test_hourly').count() == 1
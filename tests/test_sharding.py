@@ -0,0 +1,206 @@
+from datetime import date, datetime, time
+
+import pytest
+from sqlalchemy import func, select
+
+from models import db, Ride, Booking, User, user_ride
+from sharding import (
+    ID_STRIDE, ShardAssignment, find, get_engine, locate, plan_rebalance, rebalance,
+    reset_assignments, shard_context, shard_for, shard_names,
+)
+
+
+@pytest.fixture
+def sharded_app(app, tmp_path):
+    app.config['SHARD_DATABASES'] = {
+        'north': f"sqlite:///{tmp_path / 'north.db'}",
+        'south': f"sqlite:///{tmp_path / 'south.db'}",
+    }
+    app.config['STATION_MATRIX_PATH'] = str(tmp_path / 'station_matrix.bin')
+    return app
+
+
+def place(**stations):
+    for station, shard in stations.items():
+        db.session.add(ShardAssignment(station=station.replace('_', ' '), shard=shard))
+    db.session.commit()
+    reset_assignments()
+
+
+def make_user(name, email):
+    user = User(name=name, email=email, contact='1234567890')
+    user.set_password('password123')
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+
+def book(user, location, day=date(2030, 1, 1)):
+    booking = Booking(
+        user_id=user.id, name=user.name, location=location, destination='Airport Terminal',
+        travel_date=day, travel_time=time(9, 0), passengers=1, contact='9876543210'
+    )
+    with shard_context(shard_for(location)):
+        db.session.add(booking)
+        db.session.commit()
+        return booking.id
+
+
+def rows_on(shard, table):
+    with get_engine(shard).connect() as connection:
+        return connection.execute(select(func.count()).select_from(table)).scalar()
+
+
+class TestSharding:
+    """Test cases for region sharding of rides and bookings."""
+
+    def test_unsharded_app_has_one_shard(self, app):
+        """Test everything maps to the default database without SHARD_DATABASES."""
+        assert shard_names() == ['default']
+        assert shard_for('Central Station') == 'default'
+
+    def test_id_columns_hold_sharded_ids(self, app):
+        """Test ride and booking ids and their references are BIGINT on PostgreSQL, rowid keys on SQLite."""
+        from sqlalchemy.dialects import postgresql, sqlite
+        from sqlalchemy.schema import CreateTable
+        from booking_events import BookingEvent
+        from booking_summary import BookingSummary
+        from ride_feed import RideChange
+
+        columns = [Ride.id, Booking.id, user_ride.c.ride_id, BookingEvent.booking_id,
+                   BookingSummary.next_booking_id, RideChange.ride_id]
+        for column in columns:
+            assert column.type.compile(dialect=postgresql.dialect()) == 'BIGINT', column
+        for model in (Ride, Booking):
+            assert 'id INTEGER NOT NULL' in str(CreateTable(model.__table__).compile(dialect=sqlite.dialect()))
+
+        sharded_id = 1_760_000_000_000 * 256 + 3
+        db.session.add(Ride(id=sharded_id, name='Ride', location='Central Station',
+                            destination='Airport Terminal', contact='1234567890'))
+        db.session.commit()
+        assert db.session.get(Ride, sharded_id) is not None
+
+    def test_stations_map_to_shards(self, sharded_app):
+        """Test the shard map wins over the hash, which is stable and case-blind."""
+        assert shard_for('Metro Station') == shard_for(' metro station ') in shard_names()
+        assert shard_for('') == 'default'
+
+        place(metro_station='south')
+
+        assert shard_for('Metro Station') == 'south'
+
+    def test_bookings_live_on_their_shard_and_list_across_shards(self, sharded_app):
+        """Test writes go to the origin's shard and a user's pages gather every shard."""
+        from booking_events import BookingEvent
+        from booking_summary import BookingSummary, get_summary, user_bookings
+        place(central_station='north', airport_terminal='south')
+        user = make_user('Traveller', 'traveller@example.com')
+
+        first = book(user, 'Central Station')
+        second = book(user, 'Airport Terminal')
+        third = book(user, 'Central Station')
+
+        assert rows_on('north', Booking.__table__) == 2
+        assert rows_on('south', Booking.__table__) == 1
+        assert db.session.query(Booking).count() == 0
+        # Ids carry the shard that issued them and keep creation order
+        assert [first % ID_STRIDE, second % ID_STRIDE] == [1, 2]
+        assert first < second < third
+        assert [b.id for b in user_bookings(user.id)] == [third, second, first]
+        assert [b.id for b in user_bookings(user.id, before=third, limit=1)] == [second]
+        # Events and summaries are written next to the bookings
+        assert (rows_on('north', BookingEvent.__table__), rows_on('south', BookingEvent.__table__)) == (2, 1)
+        assert db.session.query(BookingEvent).count() == 0
+        assert rows_on('north', BookingSummary.__table__) == 1
+        summary = get_summary(user.id, now=datetime(2029, 1, 1))
+        assert (summary.total, summary.upcoming, summary.next_booking_id) == (3, 3, first)
+        assert find(Booking, second).location == 'Airport Terminal'
+        assert locate(Booking, [first, second, 12345]) == {first: 'north', second: 'south'}
+
+    def test_booking_feed_follows_every_shard(self, sharded_app, client):
+        """Test the change feed cursor tracks each shard and consumers read them all."""
+        from booking_events import CONFIRMED, consume, transition
+        place(central_station='north', airport_terminal='south')
+        user = make_user('Follower', 'follower@example.com')
+        with client.session_transaction() as session:
+            session['_user_id'] = str(user.id)
+        first = book(user, 'Central Station')
+        book(user, 'Airport Terminal')
+
+        start = client.get('/api/v1/bookings/changes').get_json()['next']
+        assert start == '0.1.1'
+        with shard_context('north'):
+            transition(db.session.get(Booking, first), CONFIRMED)
+            db.session.commit()
+        data = client.get(f'/api/v1/bookings/changes?since={start}').get_json()
+
+        assert [(e['booking_id'], e['to_status']) for e in data['events']] == [(first, CONFIRMED)]
+        assert data['next'] == '0.2.1'
+        assert client.get(f"/api/v1/bookings/changes?since={data['next']}").get_json()['events'] == []
+        seen = []
+        assert consume('test', seen.append) == 3
+        assert consume('test', seen.append) == 0
+
+    def test_rides_and_memberships_follow_the_ride(self, sharded_app, client):
+        """Test write-behind inserts and joins land on the ride's shard and show up in the feed."""
+        from ride_feed import changes_since
+        from write_behind import insert_rides
+        place(central_station='north', bus_depot='south')
+        rows = [
+            {'name': 'A', 'location': location, 'destination': 'Airport Terminal',
+             'contact': '1234567890', 'driver_id': None}
+            for location in ('Central Station', 'Bus Depot', 'Central Station')
+        ]
+        insert_rides(rows)
+        db.session.commit()
+        user = make_user('Joiner', 'joiner@example.com')
+        feed = changes_since(None)
+        south_ride = next(r['id'] for r in feed['rides'] if r['origin'] == 'Bus Depot')
+        with client.session_transaction() as session:
+            session['_user_id'] = str(user.id)
+
+        response = client.post('/api/v1/rides/join', json={'ride_ids': [south_ride]})
+
+        assert response.get_json()['summary']['joined'] == 1
+        assert db.session.query(Ride).count() == 0
+        assert (rows_on('north', Ride.__table__), rows_on('south', Ride.__table__)) == (2, 1)
+        assert rows_on('south', user_ride) == 1
+        assert len(feed['rides']) == 3
+        assert [r['riders'] for r in changes_since(feed['version'])['rides']] == [1]
+
+    def test_rebalance_evens_out_and_moves_rows(self, sharded_app):
+        """Test rebalance pins stations, moves misplaced rows with their members, and is idempotent."""
+        user = make_user('Member', 'member@example.com')
+        # Written before sharding: everything sits in the default database
+        for location, count in (('Central Station', 6), ('Airport Terminal', 3), ('Bus Depot', 1)):
+            for _ in range(count):
+                db.session.add(Ride(name='R', location=location, destination='Metro Station', contact='1234567890'))
+        db.session.commit()
+        central = db.session.scalars(select(Ride.id).where(Ride.location == 'Central Station')).first()
+        db.session.execute(user_ride.insert().values(user_id=user.id, ride_id=central))
+        db.session.commit()
+
+        planned = rebalance(dry_run=True)
+        assert db.session.query(ShardAssignment).count() == 0
+        report = rebalance()
+
+        assert report['moves'] == planned['moves']
+        assert sorted(report['shard_rows'].values()) == [1, 3, 6]
+        assert db.session.query(ShardAssignment).count() == 3
+        for location in ('Central Station', 'Airport Terminal', 'Bus Depot'):
+            shard = shard_for(location)
+            for name in shard_names():
+                with shard_context(name):
+                    count = db.session.scalar(select(func.count()).select_from(Ride).where(Ride.location == location))
+                assert (count > 0) == (name == shard)
+        assert locate(Ride, [central]) == {central: shard_for('Central Station')}
+        assert rows_on(shard_for('Central Station'), user_ride) == 1
+        assert rebalance()['rows_moved'] == 0
+
+    def test_plan_moves_largest_useful_station(self):
+        """Test the planner spreads stations and leaves a balanced layout alone."""
+        names = ['default', 'north', 'south']
+        everything_on_default = dict.fromkeys('abc', 'default')
+
+        assert plan_rebalance({'a': 6, 'b': 3, 'c': 1}, everything_on_default, names) == {'a': 'north', 'b': 'south'}
+        assert plan_rebalance({'a': 5, 'b': 5}, {'a': 'north', 'b': 'south'}, names) == {}
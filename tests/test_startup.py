@@ -0,0 +1,91 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Cold import + create_app must stay under this on CI hardware
+COLD_START_BUDGET_SECONDS = 1.0
+
+
+def run_fresh(code):
+    """Run code in a fresh interpreter from the project root and return stdout."""
+    out = subprocess.run([sys.executable, '-c', code], cwd=ROOT, capture_output=True, text=True, check=True)
+    return out.stdout.strip()
+
+
+class TestStartup:
+    """Test cases for application cold start."""
+
+    def test_create_app_cold_start_budget(self):
+        """Test importing the app and calling create_app stays within budget."""
+        elapsed = float(run_fresh(
+            "import time; t = time.perf_counter(); "
+            "from app import create_app; create_app(); "
+            "print(time.perf_counter() - t)"
+        ))
+
+        assert elapsed < COLD_START_BUDGET_SECONDS
+
+    def test_optional_dependencies_not_imported(self):
+        """Test booting a fully wired app does not import charting, imaging or array libraries."""
+        loaded = run_fresh(
+            "import sys, app; "
+            "print(sorted(app.app.blueprints), "
+            "[m for m in ('matplotlib', 'plotly', 'PIL', 'numpy') if m in sys.modules])"
+        )
+
+        assert loaded == "['admin', 'api', 'main'] []"
+
+    def test_models_still_importable_from_app(self):
+        """Test models and forms are resolved on first `from app import ...`, not bound at import."""
+        import app
+        assert 'Booking' not in vars(app) and 'BookingForm' not in vars(app)
+
+        from app import Booking, BookingForm
+        from models import Booking as ModelBooking
+        assert Booking is ModelBooking
+        assert BookingForm.__name__ == 'BookingForm'
+
+
+class TestLazyImports:
+    """Test cases for lazily imported optional dependencies."""
+
+    def test_module_loaded_on_first_use(self):
+        """Test the proxy defers the import until an attribute is read."""
+        from lazy_imports import lazy_import
+        calls = []
+        json_module = lazy_import('json', setup=lambda: calls.append('setup'))
+
+        assert not json_module.is_loaded
+        assert json_module.dumps([1]) == '[1]'
+        assert json_module.is_loaded
+        assert calls == ['setup']
+
+    def test_missing_dependency_fails_on_use(self):
+        """Test a missing optional dependency only errors when used."""
+        from lazy_imports import lazy_import, is_available
+        missing = lazy_import('definitely_not_installed_pkg')
+
+        assert not is_available('definitely_not_installed_pkg')
+        with pytest.raises(ImportError):
+            missing.anything
+
+
+class TestWarmup:
+    """Test cases for preload warmup."""
+
+    def test_templates_are_compiled(self, app):
+        """Test warmup compiles templates into the Jinja cache."""
+        from warmup import compile_templates
+        compiled = compile_templates(app)
+
+        assert compiled > 0
+        assert len(app.jinja_env.cache) >= compiled
+
+    def test_warm_app_without_freeze(self, app):
+        """Test the full warmup runs inside its own app context."""
+        from warmup import warm_app
+        assert warm_app(app, freeze=False) > 0
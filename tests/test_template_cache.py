@@ -0,0 +1,177 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from template_cache import SQLiteFragmentStore, init_template_cache, invalidate
+from models import db, Booking
+from booking_events import CANCELLED, bulk_transition
+
+renders = []
+
+
+def counted(label):
+    renders.append(label)
+    return label
+
+
+@pytest.fixture
+def fragments(app):
+    app.extensions.pop('fragment_store', None)
+    app.config['FRAGMENT_CACHE_URL'] = 'memory://'
+    app.jinja_env.globals['counted'] = counted
+    renders.clear()
+    return app
+
+
+def render(app, source, **context):
+    with app.test_request_context():
+        return app.jinja_env.from_string(source).render(**context)
+
+
+def add_booking(user_id=7):
+    travel_at = datetime.now() + timedelta(days=2)
+    booking = Booking(
+        user_id=user_id, name='Passenger', location='Central Station', destination='Airport Terminal',
+        travel_date=travel_at.date(), travel_time=travel_at.time(), passengers=1, contact='9876543210'
+    )
+    db.session.add(booking)
+    db.session.commit()
+    return booking
+
+
+LIST = "{% cache 'booking_list', user %}{{ counted('list ' ~ user) }}{% endcache %}"
+
+
+class TestFragmentCache:
+    """Test cases for the {% cache %} template tag."""
+
+    def test_body_is_rendered_once_per_key(self, fragments):
+        """Test the body is reused for the same name and arguments."""
+        assert render(fragments, LIST, user=1) == 'list 1'
+        assert render(fragments, LIST, user=1) == 'list 1'
+        assert render(fragments, LIST, user=2) == 'list 2'
+
+        assert renders == ['list 1', 'list 2']
+
+    def test_invalidation_by_key_and_name(self, fragments):
+        """Test invalidating one key keeps the others, invalidating the name drops all."""
+        render(fragments, LIST, user=1)
+        render(fragments, LIST, user=2)
+
+        with fragments.app_context():
+            invalidate('booking_list', 1)
+        render(fragments, LIST, user=1)
+        render(fragments, LIST, user=2)
+        assert renders == ['list 1', 'list 2', 'list 1']
+
+        with fragments.app_context():
+            invalidate('booking_list')
+        render(fragments, LIST, user=2)
+        assert renders[-1] == 'list 2' and len(renders) == 4
+
+    def test_cached_html_is_not_escaped_again(self, fragments):
+        """Test markup from the cache is emitted as-is under autoescape."""
+        source = "{% autoescape true %}{% cache 'x', ttl=60 %}<b>{{ name }}</b>{% endcache %}{% endautoescape %}"
+
+        assert render(fragments, source, name='<i>') == '<b>&lt;i&gt;</b>'
+        assert render(fragments, source, name='<i>') == '<b>&lt;i&gt;</b>'
+
+    def test_shared_fragments_skip_a_per_worker_store(self, fragments, tmp_path):
+        """Test shared=True fragments are rendered fresh from memory:// and cached in a shared store."""
+        source = "{% cache 'booking_list', user, shared=True %}{{ counted('list ' ~ user) }}{% endcache %}"
+        render(fragments, source, user=1)
+        render(fragments, source, user=1)
+        assert renders == ['list 1', 'list 1']
+        assert not any(key.startswith('f:') for key in fragments.extensions['fragment_store'].entries)
+
+        fragments.extensions['fragment_store'] = SQLiteFragmentStore(str(tmp_path / 'fragments.db'))
+        render(fragments, source, user=1)
+        render(fragments, source, user=1)
+        assert renders == ['list 1', 'list 1', 'list 1']
+        fragments.extensions.pop('fragment_store')
+
+    def test_my_bookings_is_not_cached_per_worker(self, fragments, client, test_user):
+        """Test a user's booking list is never kept in a per-worker store."""
+        client.post('/login', data={'email': 'test@example.com', 'password': 'password123'})
+        assert client.get('/my_bookings').status_code == 200
+
+        assert not any(key.startswith('f:booking_list') for key in fragments.extensions['fragment_store'].entries)
+
+    def test_disabled_cache_always_renders(self, fragments):
+        """Test FRAGMENT_CACHE_ENABLED=False renders the body every time."""
+        fragments.config['FRAGMENT_CACHE_ENABLED'] = False
+        render(fragments, LIST, user=1)
+        render(fragments, LIST, user=1)
+
+        assert len(renders) == 2
+
+    def test_booking_commit_invalidates_owner_list(self, fragments):
+        """Test ORM and bulk booking writes drop the owner's cached list."""
+        render(fragments, LIST, user=7)
+        booking = add_booking(user_id=7)
+        render(fragments, LIST, user=7)
+
+        bulk_transition(CANCELLED, Booking.id == booking.id)
+        db.session.commit()
+        render(fragments, LIST, user=7)
+
+        assert renders == ['list 7'] * 3
+
+    def test_rollback_keeps_cache(self, fragments):
+        """Test writes that roll back invalidate nothing."""
+        render(fragments, LIST, user=7)
+        db.session.add(Booking(user_id=7, name='X', location='A', destination='B',
+                               travel_date=datetime.now().date(), travel_time=datetime.now().time(),
+                               passengers=1, contact='1'))
+        db.session.flush()
+        db.session.rollback()
+        render(fragments, LIST, user=7)
+
+        assert renders == ['list 7']
+
+
+class TestCacheStores:
+    """Test cases for the shared cache backends."""
+
+    def test_sqlite_store_round_trip(self, tmp_path):
+        """Test the SQLite store keeps values, expiry and counters."""
+        store = SQLiteFragmentStore(str(tmp_path / 'fragments.db'))
+        store.set('a', '<p>a</p>', ttl=60)
+        store.set('old', 'x', ttl=-1)
+
+        assert store.get_many(['a', 'old', 'missing']) == ['<p>a</p>', None, None]
+        assert store.incr('v:a') == 1
+        assert store.incr('v:a') == 2
+
+    def test_default_store_shares_invalidations_between_workers(self, fragments, tmp_path, monkeypatch):
+        """Test the default store is a SQLite file under instance/ that every worker's invalidation reaches."""
+        from config import Config
+        from template_cache import get_store
+        monkeypatch.setattr(fragments, 'instance_path', str(tmp_path / 'instance'))
+        fragments.config['FRAGMENT_CACHE_URL'] = Config.FRAGMENT_CACHE_URL
+        worker = get_store()
+        assert worker.path == str(tmp_path / 'instance' / 'fragment_cache.db')
+        other_worker = SQLiteFragmentStore(worker.path)
+
+        render(fragments, LIST, user=1)
+        fragments.extensions['fragment_store'] = other_worker
+        invalidate('booking_list', 1)
+        fragments.extensions['fragment_store'] = worker
+        render(fragments, LIST, user=1)
+
+        assert renders == ['list 1', 'list 1']
+        fragments.extensions.pop('fragment_store')
+
+    def test_bytecode_cache_is_shared(self, app, tmp_path):
+        """Test compiled templates are written to and reused from the cache dir."""
+        app.config['TEMPLATE_BYTECODE_CACHE_DIR'] = str(tmp_path)
+        init_template_cache(app)
+        app.jinja_env.cache.clear()
+        app.jinja_env.get_template('emails/travel_reminder.html')
+
+        assert any(p.name.endswith('.cache') for p in tmp_path.iterdir())
+        # A new worker's environment finds the compiled code on disk
+        env = app.jinja_env
+        source, filename, _ = env.loader.get_source(env, 'emails/travel_reminder.html')
+        bucket = env.bytecode_cache.get_bucket(env, 'emails/travel_reminder.html', filename, source)
+        assert bucket.code is not None
@@ -0,0 +1,52 @@
+import pytest
+
+from travel_times import TravelTimes, build_matrix, get_travel_times, graph_digest, UNREACHABLE
+
+
+@pytest.fixture
+def matrix_app(app, tmp_path):
+    app.config['STATION_MATRIX_PATH'] = str(tmp_path / 'station_matrix.bin')
+    return app
+
+
+class TestTravelTimes:
+    """Test cases for the precomputed station travel-time matrix."""
+
+    def test_shortest_paths_go_through_other_stations(self, matrix_app):
+        """Test travel times use the quickest chain of links, both ways."""
+        times = get_travel_times()
+
+        assert times.minutes('Bus Depot', 'Airport Terminal') == 3 + 15 + 40
+        assert times.minutes('airport terminal', ' bus depot ') == 58
+        assert times.minutes('Central Station', 'Central Station') == 0
+        assert times.minutes('Central Station', 'Somewhere') is None
+
+    def test_unreachable_stations(self, tmp_path):
+        """Test stations without a path have no travel time."""
+        path = str(tmp_path / 'matrix.bin')
+        build_matrix(path, stations={'A': (0, 0), 'B': (0, 1), 'C': (1, 1)}, links=[('A', 'B', 5)])
+        times = TravelTimes(path)
+
+        assert times.minutes('A', 'B') == 5
+        assert times.minutes('A', 'C') is None
+        assert times.matrix[0, 2] == UNREACHABLE
+
+    def test_changed_graph_rebuilds_file(self, matrix_app, tmp_path):
+        """Test a file built from an old station graph is replaced on load."""
+        path = matrix_app.config['STATION_MATRIX_PATH']
+        build_matrix(path, stations={'A': (0, 0)}, links=[])
+        assert TravelTimes(path).digest != graph_digest()
+
+        times = get_travel_times()
+
+        assert times.digest == graph_digest()
+        assert times.minutes('Central Station', 'Bus Depot') == 3
+
+    def test_nearby_stations_share_a_cluster(self, matrix_app):
+        """Test stations within the threshold map to the same head station."""
+        times = get_travel_times()
+
+        assert times.cluster('Bus Depot', 5) == 'Central Station'
+        assert times.cluster('Metro Station', 5) == 'Metro Station'
+        assert times.cluster('Metro Station', 10) == 'Central Station'
+        assert times.cluster('Nowhere', 5) is None
@@ -0,0 +1,130 @@
+import os
+import threading
+
+import pytest
+
+import write_behind
+from models import db, Ride
+from write_behind import RideWriteBuffer, post_ride, replay_journals
+
+
+def ride_values(i, destination='airport terminal'):
+    return {'name': f'Ride {i}', 'location': 'Central Station', 'destination': destination,
+            'contact': '1234567890'}
+
+
+@pytest.fixture
+def flushes(monkeypatch):
+    sizes = []
+    insert_rides = write_behind.insert_rides
+
+    def counting(rows):
+        sizes.append(len(rows))
+        return insert_rides(rows)
+
+    monkeypatch.setattr(write_behind, 'insert_rides', counting)
+    return sizes
+
+
+class TestWriteBehind:
+    """Test cases for buffered ride inserts."""
+
+    def test_commit_mode_groups_concurrent_posts(self, app, flushes):
+        """Test concurrent posts return only once stored and share commits."""
+        buffer = RideWriteBuffer(app, batch_size=50, max_delay=0.2, durability='commit')
+        threads = [threading.Thread(target=buffer.add, args=(ride_values(i),)) for i in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        buffer.close()
+
+        assert Ride.query.count() == 20
+        assert sum(flushes) == 20 and len(flushes) < 20
+
+    def test_flushed_rows_match_orm_inserts(self, app):
+        """Test bulk inserts get canonical destinations and coordinates."""
+        buffer = RideWriteBuffer(app, durability='memory')
+        buffer.add(ride_values(1))
+        assert Ride.query.count() == 0
+
+        assert buffer.flush() == 1
+        ride = Ride.query.one()
+        assert ride.destination == 'Airport Terminal'
+        assert (ride.origin_lat, ride.dest_lat) == (12.9784, 13.1986)
+        assert ride.created_at is not None
+        buffer.close()
+
+    def test_batch_size_triggers_flush(self, app, flushes):
+        """Test a full batch is written without waiting for the delay."""
+        buffer = RideWriteBuffer(app, batch_size=5, max_delay=60, durability='memory')
+        for i in range(5):
+            buffer.add(ride_values(i))
+        buffer.close()
+
+        assert flushes == [5]
+
+    def test_journal_is_replayed_after_crash(self, app, tmp_path):
+        """Test rides journaled by a dead worker are inserted on restart."""
+        journal_dir = str(tmp_path / 'journal')
+        buffer = RideWriteBuffer(app, max_delay=60, durability='journal', journal_dir=journal_dir)
+        buffer.add(ride_values(1))
+        buffer.add(ride_values(2))
+        # Simulate the worker dying: the journal is left behind unflushed
+        buffer._journal.close()
+        (name,) = os.listdir(journal_dir)
+        os.rename(os.path.join(journal_dir, name), os.path.join(journal_dir, f'999999999-{name.split("-")[1]}'))
+
+        assert replay_journals(app, journal_dir) == 2
+        assert Ride.query.count() == 2
+        assert os.listdir(journal_dir) == []
+
+    def test_concurrent_replays_insert_each_journal_once(self, app, tmp_path):
+        """Test workers starting together replay a dead worker's journal exactly once."""
+        journal_dir = tmp_path / 'journal'
+        journal_dir.mkdir()
+        for segment in range(1, 4):
+            with open(journal_dir / f'999999999-{segment:08d}.jsonl', 'w') as f:
+                f.write(f'{{"name": "Ride {segment}", "location": "Central Station", '
+                        f'"destination": "Airport Terminal", "contact": "1234567890", '
+                        f'"driver_id": null, "created_at": "2030-01-01 09:00:00"}}\n')
+        counts, errors = [], []
+
+        def replay():
+            try:
+                counts.append(replay_journals(app, str(journal_dir)))
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=replay) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert errors == []
+        assert sum(counts) == 3
+        assert Ride.query.count() == 3
+        assert os.listdir(journal_dir) == []
+
+    def test_get_buffer_starts_one_buffer(self, app):
+        """Test concurrent first calls share one buffer."""
+        app.config.update(WRITE_BEHIND_ENABLED=True, WRITE_BEHIND_DURABILITY='memory')
+        buffers = []
+        threads = [threading.Thread(target=lambda: buffers.append(write_behind.get_buffer(app)))
+                   for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        app.extensions.pop('ride_write_buffer').close()
+
+        assert len(buffers) == 8 and len(set(map(id, buffers))) == 1
+
+    def test_post_ride_writes_directly_when_disabled(self, app):
+        """Test the default path still inserts immediately."""
+        app.config['WRITE_BEHIND_ENABLED'] = False
+        ride = post_ride(ride_values(1))
+
+        assert ride.id is not None
+        assert Ride.query.count() == 1
@@ -0,0 +1,150 @@
+import hashlib
+import json
+import mmap
+import os
+import struct
+import threading
+from array import array
+
+from flask import current_app
+
+from stations import STATIONS, STATION_LINKS
+
+# -------------------------
+#      MATRIX FORMAT
+# -------------------------
+#
+# All-pairs shortest travel times between stations, in whole minutes:
+#
+#   header   magic, version, station count, digest of the station graph
+#   matrix   count x count unsigned 16-bit minutes, native byte order
+#            (UNREACHABLE if no path)
+#   names    JSON list of station names, in matrix order
+#
+# The file is built from STATIONS/STATION_LINKS when missing or when the
+# graph changes, and memory-mapped by every worker; a lookup is two dict
+# hits and one indexed read.
+
+MAGIC = b'STTM'
+VERSION = 1
+HEADER = struct.Struct('<4sHHQ')
+UNREACHABLE = 0xFFFF
+
+
+def graph_digest(stations=STATIONS, links=STATION_LINKS):
+    data = json.dumps([list(stations), sorted(links)]).encode('utf-8')
+    return int.from_bytes(hashlib.sha1(data).digest()[:8], 'little')
+
+
+def shortest_times(names, links):
+    """Floyd-Warshall over the undirected links; returns a list of rows."""
+    index = {name: i for i, name in enumerate(names)}
+    count = len(names)
+    times = [[0 if i == j else UNREACHABLE for j in range(count)] for i in range(count)]
+    for a, b, minutes in links:
+        i, j = index[a], index[b]
+        times[i][j] = times[j][i] = min(times[i][j], minutes)
+    for k in range(count):
+        via = times[k]
+        for row in times:
+            first = row[k]
+            if first == UNREACHABLE:
+                continue
+            for j in range(count):
+                if first + via[j] < row[j]:
+                    row[j] = first + via[j]
+    return times
+
+
+def matrix_path(app=None):
+    app = app or current_app
+    return app.config.get('STATION_MATRIX_PATH') or os.path.join(app.instance_path, 'station_matrix.bin')
+
+
+def build_matrix(path, stations=STATIONS, links=STATION_LINKS):
+    """Write the travel-time matrix for the station graph to ``path``."""
+    names = list(stations)
+    times = shortest_times(names, links)
+    cells = array('H', (min(minutes, UNREACHABLE) for row in times for minutes in row))
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(names), graph_digest(stations, links)))
+        f.write(cells.tobytes())
+        f.write(json.dumps(names).encode('utf-8'))
+    os.replace(tmp_path, path)
+    return len(names)
+
+
+# -------------------------
+#          READER
+# -------------------------
+
+class TravelTimes:
+    """Read-only view of a matrix file over a shared memory map."""
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, count, self.digest = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"Not a station matrix: {path}")
+        end = HEADER.size + 2 * count * count
+        self.matrix = memoryview(self._map)[HEADER.size:end].cast('H', shape=[count, count])
+        self.names = json.loads(self._map[end:])
+        self.index = {name.lower(): i for i, name in enumerate(self.names)}
+        self._clusters = {}
+
+    def _code(self, name):
+        return self.index.get(name.strip().lower()) if name else None
+
+    def minutes(self, origin, destination):
+        """Shortest travel time between two stations, or None if unknown."""
+        i, j = self._code(origin), self._code(destination)
+        if i is None or j is None:
+            return None
+        minutes = self.matrix[i, j]
+        return None if minutes == UNREACHABLE else minutes
+
+    def cluster(self, name, within):
+        """The station that heads ``name``'s cluster of stations ``within`` minutes.
+
+        Clusters are formed greedily in station order, so every station maps
+        to exactly one head and the mapping is computed once per threshold.
+        """
+        heads = self._clusters.get(within)
+        if heads is None:
+            leaders, heads = [], []
+            for i in range(len(self.names)):
+                head = next((h for h in leaders if self.matrix[h, i] <= within), None)
+                if head is None:
+                    leaders.append(i)
+                    head = i
+                heads.append(self.names[head])
+            self._clusters[within] = heads
+        code = self._code(name)
+        return heads[code] if code is not None else None
+
+
+_readers = {}
+_readers_lock = threading.Lock()
+
+
+def get_travel_times(app=None):
+    """This app's travel-time matrix, building the file on first use if needed."""
+    path = matrix_path(app)
+    times = _readers.get(path)
+    if times is not None:
+        return times
+    with _readers_lock:
+        times = _readers.get(path)
+        if times is None:
+            try:
+                times = TravelTimes(path)
+            except (OSError, ValueError):
+                times = None
+            if times is None or times.digest != graph_digest():
+                build_matrix(path)
+                times = TravelTimes(path)
+            _readers[path] = times
+    return times
@@ -0,0 +1,54 @@
+import gc
+import time
+
+
+def compile_templates(app):
+    """Compile every Jinja template into the environment's cache.
+
+    Returns the number of templates compiled.
+    """
+    env = app.jinja_env
+    compiled = 0
+    for name in env.list_templates(extensions=['html']):
+        try:
+            env.get_template(name)
+            compiled += 1
+        except Exception as e:
+            app.logger.warning(f"Could not precompile template {name}: {str(e)}")
+    return compiled
+
+
+def configure_models():
+    """Import models and forms and resolve ORM mappers up front."""
+    from sqlalchemy.orm import configure_mappers
+    import models  # noqa: F401
+    import forms  # noqa: F401
+    configure_mappers()
+
+
+def warm_app(app, freeze=True):
+    """Load everything a worker would otherwise load on its first requests.
+
+    Meant to run once in the gunicorn master with ``preload_app`` so the
+    results are shared copy-on-write by every forked worker. ``gc.freeze``
+    moves the warmed objects out of the collector's reach so collections in
+    the workers don't touch (and un-share) those pages.
+    """
+    start = time.perf_counter()
+    with app.app_context():
+        try:
+            configure_models()
+        except ImportError as e:
+            app.logger.warning(f"Skipping model warmup: {str(e)}")
+        templates = compile_templates(app)
+        try:
+            from travel_times import get_travel_times
+            get_travel_times(app)
+        except OSError as e:
+            app.logger.warning(f"Skipping travel-time matrix: {str(e)}")
+    if freeze:
+        gc.collect()
+        gc.freeze()
+    elapsed = (time.perf_counter() - start) * 1000
+    app.logger.info(f"Warmed app: {templates} templates compiled in {elapsed:.0f} ms")
+    return templates
@@ -0,0 +1,292 @@
+import glob
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import insert
+
+from models import db, Ride
+from geo import ride_geo_values
+from destinations import canonicalize
+from ride_snapshot import request_rebuild
+from ride_feed import record_ride_changes
+from sharding import allocate_ids, current_shard, is_sharded, shard_context, shard_for
+
+# -------------------------
+#      WRITE-BEHIND RIDES
+# -------------------------
+#
+# Durability levels (WRITE_BEHIND_DURABILITY):
+#   commit   the request waits until the batch holding its ride is committed;
+#            many requests share one transaction (group commit). Nothing is
+#            acknowledged that isn't in the database.
+#   journal  the ride is appended to a per-process journal file before the
+#            request returns. Survives a worker crash (the journal is
+#            replayed on the next start), not a power loss.
+#   memory   the ride only sits in memory until the next flush; a crash
+#            loses at most WRITE_BEHIND_MAX_DELAY worth of posts.
+
+DURABILITY_LEVELS = ('commit', 'journal', 'memory')
+RIDE_COLUMNS = ('name', 'location', 'destination', 'contact', 'driver_id')
+
+
+def insert_rides(rows):
+    """Insert many ride rows in the current transaction (see below for other shards).
+
+    Core inserts skip ORM events, so destination canonicalization, the
+    coordinate columns and shard ids are applied here instead.
+    """
+    names = {}
+    for row in rows:
+        names.setdefault(row['destination'], []).append(row)
+    for raw, group in names.items():
+        name = canonicalize(raw, db.session, uses=len(group))
+        for row in group:
+            row['destination'] = name
+    for row in rows:
+        row.update(ride_geo_values(row['location'], row['destination']))
+    # Rides go to their origin's shard; rows for other shards than the
+    # caller's are committed here, the caller's commit with the caller
+    current = current_shard()
+    by_shard = {}
+    for row in rows:
+        by_shard.setdefault(shard_for(row['location']), []).append(row)
+    for shard, shard_rows in by_shard.items():
+        with shard_context(shard):
+            if is_sharded():
+                ids = allocate_ids(db.session.connection(), 'ride', len(shard_rows), shard)
+                shard_rows = [dict(row, id=ride_id) for row, ride_id in zip(shard_rows, ids)]
+            shard_ids = db.session.scalars(insert(Ride).returning(Ride.id), shard_rows).all()
+            record_ride_changes(shard_ids)
+            if shard != current:
+                db.session.commit()
+    request_rebuild()
+
+
+class _Batch:
+    def __init__(self):
+        self.rows = []
+        self.started_at = time.monotonic()
+        self.done = threading.Event()
+        self.error = None
+
+
+class RideWriteBuffer:
+    """Collects ride inserts and writes them in grouped transactions.
+
+    A batch is flushed when it reaches ``batch_size`` rows or its oldest
+    row is ``max_delay`` seconds old, by a background thread that owns an
+    app context. ``flush()`` can also be called directly, e.g. on shutdown.
+
+    With ``commit`` durability requests are waiting, so the flusher does
+    not sleep at all: rides that arrive while one transaction commits make
+    up the next one (group commit).
+    """
+
+    def __init__(self, app, batch_size=200, max_delay=0.05, durability='commit', journal_dir=None):
+        if durability not in DURABILITY_LEVELS:
+            raise ValueError(f"Unknown write-behind durability: {durability}")
+        self.app = app
+        self.batch_size = batch_size
+        self.max_delay = 0 if durability == 'commit' else max_delay
+        self.durability = durability
+        self.journal_dir = journal_dir
+        self._batch = _Batch()
+        self._journal = None
+        self._segment = 0
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._stop = False
+        if durability == 'journal':
+            os.makedirs(journal_dir, exist_ok=True)
+            self._open_segment()
+        self._thread = threading.Thread(target=self._run, name='ride-write-behind', daemon=True)
+        self._thread.start()
+
+    def _open_segment(self):
+        self._segment += 1
+        path = os.path.join(self.journal_dir, f'{os.getpid()}-{self._segment:08d}.jsonl')
+        self._journal = open(path, 'a', encoding='utf-8')
+
+    def add(self, values):
+        """Queue one ride; with ``commit`` durability, wait until it is stored."""
+        row = {column: values.get(column) for column in RIDE_COLUMNS}
+        row['created_at'] = values.get('created_at') or datetime.utcnow()
+        with self._cond:
+            batch = self._batch
+            if self._journal is not None:
+                self._journal.write(json.dumps(row, default=str) + '\n')
+                self._journal.flush()
+            batch.rows.append(row)
+            if len(batch.rows) == 1:
+                batch.started_at = time.monotonic()
+                self._cond.notify()
+            elif len(batch.rows) >= self.batch_size:
+                self._cond.notify()
+        if self.durability == 'commit':
+            batch.done.wait()
+            if batch.error is not None:
+                raise batch.error
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._stop:
+                    rows = len(self._batch.rows)
+                    if rows >= self.batch_size:
+                        break
+                    if not rows:
+                        self._cond.wait()
+                        continue
+                    remaining = self.max_delay - (time.monotonic() - self._batch.started_at)
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                stopping = self._stop
+            self.flush()
+            if stopping:
+                return
+
+    def flush(self):
+        """Write out everything queued so far; returns the number of rides."""
+        with self._flush_lock:
+            with self._cond:
+                if not self._batch.rows:
+                    return 0
+                batch, self._batch = self._batch, _Batch()
+                journal = self._journal
+                if journal is not None:
+                    self._open_segment()
+
+            with self.app.app_context():
+                try:
+                    insert_rides(batch.rows)
+                    db.session.commit()
+                except Exception as e:
+                    db.session.rollback()
+                    batch.error = e
+                    self.app.logger.error(f"Write-behind flush of {len(batch.rows)} rides failed: {str(e)}")
+                finally:
+                    db.session.remove()
+            batch.done.set()
+            if journal is not None:
+                journal.close()
+                if batch.error is None:
+                    os.unlink(journal.name)
+            return 0 if batch.error else len(batch.rows)
+
+    def close(self):
+        """Stop the flusher after writing out whatever is still queued."""
+        with self._cond:
+            self._stop = True
+            self._cond.notify()
+        self._thread.join()
+
+
+# Journals this process is replaying right now (they carry its own pid)
+_claims = set()
+
+
+def replay_journals(app, journal_dir):
+    """Insert rides left in journals by processes that died before flushing.
+
+    Returns the number of rides replayed. Journals of live processes are
+    left alone. Delivery is at-least-once: a worker that died between its
+    commit and deleting the journal has those rides inserted again.
+
+    Workers starting together race for the same journals, so each one is
+    first claimed by renaming it to a name carrying this process's pid;
+    only the worker whose rename succeeds replays it. A claim left by a
+    replayer that died is itself a dead process's journal, and is picked
+    up again on the next start.
+    """
+    replayed = 0
+    for path in sorted(glob.glob(os.path.join(journal_dir, '*.jsonl'))):
+        name = os.path.basename(path)
+        pid = int(name.split('-')[0])
+        if path in _claims or (pid != os.getpid() and _process_alive(pid)):
+            continue
+        claimed = os.path.join(journal_dir, f'{os.getpid()}-replay-{name}')
+        _claims.add(claimed)
+        try:
+            try:
+                os.rename(path, claimed)
+            except FileNotFoundError:
+                continue  # another worker claimed it first
+            with open(claimed, encoding='utf-8') as f:
+                rows = [json.loads(line) for line in f if line.endswith('\n')]
+            for row in rows:
+                row['created_at'] = datetime.fromisoformat(row['created_at'])
+            if rows:
+                with app.app_context():
+                    insert_rides(rows)
+                    db.session.commit()
+            os.unlink(claimed)
+        finally:
+            _claims.discard(claimed)
+        replayed += len(rows)
+    return replayed
+
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+_buffer_lock = threading.Lock()
+
+
+def get_buffer(app=None):
+    """The app's write buffer, started on first use; None when disabled."""
+    app = app or current_app._get_current_object()
+    config = app.config
+    if not config.get('WRITE_BEHIND_ENABLED'):
+        return None
+    buffer = app.extensions.get('ride_write_buffer')
+    if buffer is not None:
+        return buffer
+    with _buffer_lock:
+        # Concurrent first requests would each start a flusher and replay
+        # the journals; only the first one gets to
+        buffer = app.extensions.get('ride_write_buffer')
+        if buffer is not None:
+            return buffer
+        journal_dir = config.get('WRITE_BEHIND_JOURNAL_DIR') or os.path.join(app.instance_path, 'write_behind')
+        durability = config.get('WRITE_BEHIND_DURABILITY', 'commit')
+        if durability == 'journal':
+            replayed = replay_journals(app, journal_dir)
+            if replayed:
+                app.logger.warning(f"Replayed {replayed} rides from write-behind journals")
+        buffer = RideWriteBuffer(
+            app,
+            batch_size=config.get('WRITE_BEHIND_BATCH_SIZE', 200),
+            max_delay=config.get('WRITE_BEHIND_MAX_DELAY', 0.05),
+            durability=durability,
+            journal_dir=journal_dir
+        )
+        app.extensions['ride_write_buffer'] = buffer
+        return buffer
+
+
+def post_ride(values):
+    """Store a validated ride, directly or through the write-behind buffer.
+
+    Returns the new Ride when written directly, None when buffered.
+    """
+    buffer = get_buffer()
+    if buffer is not None:
+        buffer.add(values)
+        return None
+    ride = Ride(**{column: values.get(column) for column in RIDE_COLUMNS})
+    db.session.add(ride)
+    request_rebuild()
+    db.session.commit()
+    return ride